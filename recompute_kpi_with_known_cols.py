@@ -6,6 +6,10 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
+# the bootstrap helpers live with the pipeline scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from dvn_bootstrap import kpi_cis, with_cis
+
 IN = Path("expanded_per_dvn_joined.csv")
 if not IN.exists():
     print("File expanded_per_dvn_joined.csv not found in current folder.")
@@ -46,6 +50,11 @@ agg = df.groupby('DVN_NAME').agg(
 
 agg['delivered_rate'] = agg.apply(lambda r: float(r['delivered_messages']/r['unique_messages']) if r['unique_messages']>0 else None, axis=1)
 
+# 95% bootstrap intervals for delivered_rate, median and p95 latency (scripts/dvn_bootstrap.py)
+hist = df.dropna(subset=['LATENCY_SECONDS_NUM']).groupby(['DVN_NAME','LATENCY_SECONDS_NUM']).size().reset_index(name='count')
+cis = kpi_cis('DVN_NAME', agg['DVN_NAME'], agg['delivered_messages'], agg['unique_messages'], hist, 'LATENCY_SECONDS_NUM')
+agg = with_cis(agg, cis, 'DVN_NAME')
+
 agg.to_csv("kpi_by_dvn_final.csv", index=False)
 print("Saved kpi_by_dvn_final.csv")
 print(agg.sort_values('total_fees_eth', ascending=False).head(20).to_string(index=False))
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# bench_pipeline.py
+# Scaling benchmark for the DVN pipeline on synthetic exports (see synth_exports.py).
+#
+# For every requested message count it generates (or reuses) a dataset, then runs each
+# pipeline stage as its own process in a scratch directory and records wall time,
+# CPU time and peak RSS of that process. Peak RSS is the VmHWM the stage process reports
+# at exit: the ru_maxrss of a forked child starts at the parent's high-water mark.
+# Results are written as JSON so two runs (e.g. before/after a change) can be compared
+# with --compare.
+#
+# merge_expand_dvns_v2.py joins on the raw GUID cell and the fees sheet has bare GUIDs, so
+# it is given dt_merge.csv, dt_clean.csv with the ="..." wrapper stripped from GUID.
+#
+# Usage:
+#   python3 scripts/bench_pipeline.py 1e4,1e5 [--label NAME] [--stages a,b] [--compare OLD.json]
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+import synth_exports
+import dvn_instrument
+from dvn_io import read_export, unwrap
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS = REPO_ROOT / "scripts"
+BENCH_DIR = REPO_ROOT / "bench"
+DATA_CACHE = BENCH_DIR / "data"
+RESULTS_DIR = BENCH_DIR / "results"
+
+# (name, argv, files to alias before running as {link_name: existing_file})
+STAGES = [
+    ("map", [REPO_ROOT / "map_dvn.py"], {}),
+    ("explode", [SCRIPTS / "dvn_fees_explode.py"], {}),
+    ("join_kpi", [SCRIPTS / "expand_from_fees_then_join.py", "dvnFeesMapped.csv", "dt_clean.csv"], {}),
+    ("merge_expand", [SCRIPTS / "merge_expand_dvns_v2.py", "dt_merge.csv", "dvnFeesMapped.csv"], {}),
+    ("stack_latency", [SCRIPTS / "compute_dvn_stack_latency.py"], {}),
+    ("windows", [SCRIPTS / "timeframe_compare.py"], {}),
+    ("charts_stack_ts", [SCRIPTS / "stack_time_series.py"], {}),
+    ("charts_dashboard", [SCRIPTS / "dvn_dashboard_viz.py"], {"kpi_by_dvn_final.csv": "expanded_kpi_by_dvn.csv"}),
+]
+
+REGRESSION_X = 1.2  # flag stages that got 20% slower or bigger in --compare
+
+# runs a stage script in a freshly exec'd interpreter and writes its own peak RSS (MB) to argv[1]
+RSS_WRAPPER = """
+import os, sys, atexit, runpy
+out, script = sys.argv[1], sys.argv[2]
+sys.path.insert(1, {scripts!r})
+def report():
+    import dvn_instrument
+    open(out, "w").write(str(dvn_instrument.peak_rss_mb()))
+atexit.register(report)
+sys.argv = sys.argv[2:]
+sys.path[0] = os.path.dirname(os.path.abspath(script))
+runpy.run_path(script, run_name="__main__")
+""".format(scripts=str(SCRIPTS))
+
+
+def git_rev():
+    try:
+        return subprocess.check_output(["git", "-C", str(REPO_ROOT), "rev-parse", "--short", "HEAD"],
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def write_merge_input(d):
+    """dt_merge.csv: dt_clean.csv with bare GUIDs, so the fees join of merge_expand matches."""
+    tmp = d / "dt_merge.csv.tmp"
+    header = True
+    for chunk in read_export(d / "dt_clean.csv", chunksize=200_000):
+        chunk["GUID"] = unwrap(chunk["GUID"])
+        chunk.to_csv(tmp, mode="w" if header else "a", header=header, index=False)
+        header = False
+    tmp.replace(d / "dt_merge.csv")
+
+
+def dataset_for(n, seed):
+    """Generate the synthetic inputs once per (n, seed) and reuse them between runs."""
+    d = DATA_CACHE / f"n{n}_s{seed}"
+    files = ("dt_clean.csv", "dvnFeesReqOp-Sheet1.csv", "dt_merge.csv")
+    if all((d / f).exists() for f in files):
+        return d, None
+    t0 = time.perf_counter()
+    if not all((d / f).exists() for f in files[:2]):
+        synth_exports.generate(n, d, seed)
+    write_merge_input(d)
+    return d, time.perf_counter() - t0
+
+
+def run_stage(argv, cwd, log_path, run_id):
+    """Run one stage in its own process; wait4 gives CPU time for exactly that child, RSS_WRAPPER its peak RSS."""
+    # sub-stage events from dvn_instrument land in the scratch dir under one run id
+    env = dict(os.environ, MPLBACKEND="Agg", DVN_EVENTS=str(Path(cwd) / "dvn_events.jsonl"),
+               DVN_RUN_ID=run_id, DVN_SUMMARY="0")
+    with open(log_path, "w") as log:
+        t0 = time.perf_counter()
+        rss_path = Path(cwd) / f"{log_path.stem}.rss"
+        p = subprocess.Popen([sys.executable, "-c", RSS_WRAPPER, str(rss_path)] + [str(a) for a in argv],
+                             cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        _, status, ru = os.wait4(p.pid, 0)
+        wall = time.perf_counter() - t0
+    p.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "wall_s": round(wall, 4),
+        "user_s": round(ru.ru_utime, 4),
+        "sys_s": round(ru.ru_stime, 4),
+        # ru_maxrss (KiB on Linux) only if the stage died before reporting; it includes our own peak
+        "peak_rss_mb": float(rss_path.read_text()) if rss_path.exists() else round(ru.ru_maxrss / 1024.0, 1),
+        "returncode": p.returncode,
+    }
+
+
+def stage_events(path, run_id):
+    """Per-sub-stage timings the script emitted through dvn_instrument (empty if uninstrumented)."""
+    if not path.exists():
+        return []
+    keep = ("stage", "parent", "wall_s", "cpu_s", "rows_in", "rows_out", "bytes_read", "peak_rss_mb")
+    return [{k: e.get(k) for k in keep} for e in dvn_instrument.load_events(path, run_id)]
+
+
+def bench_size(n, seed, stage_names, keep):
+    data_dir, gen_s = dataset_for(n, seed)
+    work = Path(tempfile.mkdtemp(prefix=f"dvn_bench_n{n}_"))
+    for f in data_dir.iterdir():
+        (work / f.name).symlink_to(f.resolve())
+    result = {
+        "n_messages": n,
+        "seed": seed,
+        "generate_s": round(gen_s, 4) if gen_s is not None else None,
+        "input_bytes": sum(f.stat().st_size for f in data_dir.iterdir()),
+        "stages": {},
+    }
+    for name, argv, aliases in STAGES:
+        if stage_names and name not in stage_names:
+            continue
+        for link, target in aliases.items():
+            if (work / target).exists() and not (work / link).exists():
+                (work / link).symlink_to(work / target)
+        r = run_stage(argv, work, work / f"{name}.log", f"bench-n{n}-{name}")
+        r["events"] = stage_events(work / "dvn_events.jsonl", f"bench-n{n}-{name}")
+        result["stages"][name] = r
+        flag = "" if r["returncode"] == 0 else f"  FAILED (rc={r['returncode']}, see {work / (name + '.log')})"
+        print(f"  {name:<18} wall={r['wall_s']:>9.3f}s  cpu={r['user_s'] + r['sys_s']:>9.3f}s  "
+              f"peak_rss={r['peak_rss_mb']:>8.1f}MB{flag}")
+    if keep or any(r["returncode"] != 0 for r in result["stages"].values()):
+        print("  kept work dir:", work)
+    else:
+        shutil.rmtree(work, ignore_errors=True)
+    return result
+
+
+def compare(new, old):
+    """Print per-stage ratios new/old for every size present in both runs."""
+    old_by_n = {r["n_messages"]: r for r in old["runs"]}
+    print(f"\nComparison vs {old.get('label')} ({old.get('git_rev')}):")
+    regressions = 0
+    for run in new["runs"]:
+        prev = old_by_n.get(run["n_messages"])
+        if prev is None:
+            continue
+        print(f" n={run['n_messages']}")
+        for name, r in run["stages"].items():
+            p = prev["stages"].get(name)
+            if p is None or not p["wall_s"] or not p["peak_rss_mb"]:
+                continue
+            t_x = r["wall_s"] / p["wall_s"]
+            m_x = r["peak_rss_mb"] / p["peak_rss_mb"]
+            mark = "  <-- regression" if t_x > REGRESSION_X or m_x > REGRESSION_X else ""
+            regressions += bool(mark)
+            print(f"  {name:<18} time x{t_x:5.2f}  peak_rss x{m_x:5.2f}{mark}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Time and memory-profile every pipeline stage on synthetic exports.")
+    ap.add_argument("sizes", help="comma-separated message counts, e.g. 1e4,1e5,1e6")
+    ap.add_argument("--label", default=None, help="name of the results file (default: <git rev>_<utc time>)")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--stages", default="", help="comma-separated subset of: " + ",".join(s[0] for s in STAGES))
+    ap.add_argument("--compare", default=None, help="previous results JSON to compare against")
+    ap.add_argument("--keep", action="store_true", help="keep scratch directories with stage outputs and logs")
+    args = ap.parse_args()
+
+    sizes = [int(float(s)) for s in args.sizes.split(",") if s.strip()]
+    stage_names = [s.strip() for s in args.stages.split(",") if s.strip()]
+    rev = git_rev()
+    label = args.label or f"{rev}_{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}"
+
+    out = {
+        "label": label,
+        "git_rev": rev,
+        "created_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "runs": [],
+    }
+    for n in sizes:
+        print(f"Benchmark n={n} messages")
+        out["runs"].append(bench_size(n, args.seed, stage_names, args.keep))
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    out_path = RESULTS_DIR / f"{label}.json"
+    out_path.write_text(json.dumps(out, indent=2))
+    print("Saved:", out_path)
+
+    if args.compare:
+        regressions = compare(out, json.loads(Path(args.compare).read_text()))
+        if regressions:
+            print(f"{regressions} stage(s) regressed by more than x{REGRESSION_X}")
+            sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,262 @@
 #!/usr/bin/env python3
-import sys, pandas as pd
-
-if len(sys.argv) < 3:
-    print("Usage: python check_guid_match.py <dt_clean.csv> <dvnFeesMapped.csv>")
-    sys.exit(1)
-
-a = pd.read_csv(sys.argv[1], dtype=str, keep_default_na=False)
-b = pd.read_csv(sys.argv[2], dtype=str, keep_default_na=False)
-
-def find_guid_col(df):
-    for cand in ["GUID","guid","Guid","guid_hex","guidhash","sourceguid"]:
-        if cand in df.columns:
-            return cand
-    # fallback: try to find any column that looks like hex starting with 0x
-    for c in df.columns:
-        sample = str(df[c].dropna().astype(str).head(20).tolist())
-        if "0x" in sample and len(sample) > 5:
-            return c
-    return None
-
-col_a = find_guid_col(a)
-col_b = find_guid_col(b)
-print("Detected GUID columns:", "file1:", col_a, "file2:", col_b)
-if col_a is None or col_b is None:
-    print("Could not detect GUID column in one of the files. Columns file1:", a.columns.tolist(), "file2:", b.columns.tolist())
-    sys.exit(1)
-
-def norm(s):
-    if s is None: return None
-    s = str(s).strip()
-    if s.startswith('='):
-        s = s[1:].strip()
-    if (s.startswith('"') and s.endswith('"')) or (s.startswith("'") and s.endswith("'")):
-        s = s[1:-1]
-    return s.lower()
-
-a_guids = a[col_a].astype(str).apply(norm).dropna().unique()
-b_guids = b[col_b].astype(str).apply(norm).dropna().unique()
-
-print("\nSample GUIDs from file1 (first 5):", a_guids[:5].tolist())
-print("Sample GUIDs from file2 (first 5):", b_guids[:5].tolist())
-
-set_a = set(a_guids)
-set_b = set(b_guids)
-common = set_a & set_b
-print(f"\nCounts: file1 unique GUIDs = {len(set_a)}, file2 unique GUIDs = {len(set_b)}, common = {len(common)}")
-if len(set_a) > 0:
-    print("Join rate relative to file1: {:.2%}".format(len(common)/len(set_a)))
-if len(set_b) > 0:
-    print("Join rate relative to file2: {:.2%}".format(len(common)/len(set_b)))
-
-# show up to 10 sample mismatches from each side
-only_a = list(set_a - set_b)[:10]
-only_b = list(set_b - set_a)[:10]
-print("\nSample GUIDs present only in file1 (up to 10):", only_a)
-print("Sample GUIDs present only in file2 (up to 10):", only_b)
+# check_guid_match.py
+# GUID join rates between two exports (e.g. dt_clean.csv and dvnFeesMapped.csv).
+#
+# Only the GUID column is read: lines are cut with a bounded str.split and GUIDs become
+# 32-byte binary keys (dvn_io.guid_keys). Lines where the cut does not give a valid GUID
+# (quoted commas in earlier cells) are re-parsed with the csv module. Cells that still are not
+# a 32-byte hex GUID are left out of the counts: empty ones count as missing, the rest are
+# reported as malformed, with a few samples.
+#
+# Exact mode (default) keeps the distinct keys of both files (32 bytes per GUID) and
+# intersects them. --fast keeps fixed-size sketches instead, filled in one pass per file:
+#  - HyperLogLog (2^p registers) for the distinct GUIDs of each file and of their union,
+#    relative standard error 1.04/sqrt(2^p) (0.8% at p=14)
+#  - KMV, the k smallest hash values of each file, whose share of values found in both
+#    files estimates the Jaccard index; intersection = Jaccard x union.
+# GUIDs are keccak hashes, so two 64-bit words of the key serve as the hash values. The
+# sketches are exact while a file has fewer than k distinct GUIDs.
+#
+# Usage: python check_guid_match.py <dt_clean.csv> <dvnFeesMapped.csv> [--fast] [--p 14] [--k 4096]
+
+import sys
+import csv
+import math
+import argparse
+import numpy as np
+from dvn_instrument import stage
+from dvn_io import guid_keys
+from dvn_schema import detect
+
+BLOCK_BYTES = 32 << 20
+Z95 = 1.96
+
+
+def blank(cell):
+    return not cell.strip().lstrip("=").strip('"').strip()
+
+
+def guid_blocks(path, col):
+    """(keys, valid, malformed cells) per block of lines for GUID column col of a CSV file.
+
+    Invalid keys are either empty cells or the malformed ones returned."""
+    with open(path, newline="") as f:
+        header = next(csv.reader([f.readline()]))
+        i = header.index(col)
+        while True:
+            lines = f.readlines(BLOCK_BYTES)
+            if not lines:
+                break
+            cells = []
+            for line in lines:
+                parts = line.split(",", i + 1)
+                cells.append(parts[i] if len(parts) > i else "")
+            keys, valid = guid_keys(cells)
+            bad = np.flatnonzero(~valid)
+            malformed = []
+            if len(bad):
+                rows = list(csv.reader([lines[j] for j in bad]))
+                cells = [r[i] if len(r) > i else "" for r in rows]
+                fixed, ok = guid_keys(cells)
+                keys[bad[ok]], valid[bad[ok]] = fixed[ok], True
+                malformed = [c for c, good in zip(cells, ok) if not good and not blank(c)]
+            yield keys, valid, malformed
+
+
+def to_hex(keys):
+    return ["0x" + k.ljust(32, b"\0").hex() for k in keys]
+
+
+def hash_words(keys):
+    w = np.frombuffer(np.ascontiguousarray(keys).tobytes(), dtype="<u8").reshape(len(keys), 4)
+    return w[:, 0].copy(), w[:, 1].copy()
+
+
+def _clz64(x):
+    """Leading zero bits of every uint64."""
+    x = x.copy()
+    n = np.zeros(len(x), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        top_zero = x < (np.uint64(1) << np.uint64(64 - shift))
+        n[top_zero] += shift
+        x[top_zero] <<= np.uint64(shift)
+    n[x == 0] += 1
+    return n
+
+
+class HyperLogLog:
+    def __init__(self, p=14):
+        self.p = p
+        self.m = 1 << p
+        self.reg = np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, h):
+        idx = (h >> np.uint64(64 - self.p)).astype(np.int64)
+        rho = np.minimum(_clz64(h << np.uint64(self.p)) + 1, 64 - self.p + 1).astype(np.uint8)
+        np.maximum.at(self.reg, idx, rho)
+
+    def union(self, other):
+        out = HyperLogLog(self.p)
+        out.reg = np.maximum(self.reg, other.reg)
+        return out
+
+    def estimate(self):
+        m = self.m
+        e = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.reg.astype(np.int64)))
+        zeros = int((self.reg == 0).sum())
+        if e <= 2.5 * m and zeros:
+            e = m * math.log(m / zeros)      # linear counting for small cardinalities
+        return float(e)
+
+    def rel_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+
+class KMV:
+    """The k smallest distinct 64-bit hash values seen."""
+
+    def __init__(self, k=4096):
+        self.k = k
+        self.values = np.empty(0, dtype=np.uint64)
+
+    def add(self, h):
+        if len(self.values) == self.k:
+            h = h[h < self.values[-1]]
+        self.values = np.unique(np.concatenate([self.values, h]))[:self.k]
+
+    def exact(self):
+        return len(self.values) < self.k
+
+
+def jaccard(a, b):
+    """Jaccard estimate from two KMV sketches and the number of union samples it rests on."""
+    union = np.union1d(a.values, b.values)[:min(a.k, b.k)]
+    both = np.isin(union, a.values) & np.isin(union, b.values)
+    return (float(both.mean()) if len(union) else 0.0), len(union)
+
+
+class RowCounts:
+    """Rows of a file, rows without a GUID and the malformed GUID cells (count and samples)."""
+
+    def __init__(self, path):
+        self.path, self.rows, self.missing, self.malformed, self.samples = path, 0, 0, 0, []
+
+    def add(self, valid, malformed):
+        self.rows += len(valid)
+        self.missing += int((~valid).sum()) - len(malformed)
+        self.malformed += len(malformed)
+        self.samples += malformed[:5 - len(self.samples)]
+
+    def print(self):
+        print(f"{self.path}: {self.rows} rows, {self.missing} without a GUID, "
+              f"{self.malformed} with a malformed GUID (not 32 hex bytes; left out of the counts)")
+        if self.samples:
+            print("  malformed GUIDs (first 5):", self.samples)
+
+
+def scan_exact(path, col):
+    uniq, counts = [], RowCounts(path)
+    with stage("guid_exact", inputs=[path]) as ev:
+        for keys, valid, malformed in guid_blocks(path, col):
+            uniq.append(np.unique(keys[valid]))
+            counts.add(valid, malformed)
+        keys = np.unique(np.concatenate(uniq)) if uniq else np.empty(0, dtype="S32")
+        ev.rows_in, ev.rows_out = counts.rows, len(keys)
+    return keys, counts
+
+
+def scan_sketch(path, col, p, k):
+    hll, kmv, counts = HyperLogLog(p), KMV(k), RowCounts(path)
+    with stage("guid_sketch", inputs=[path]) as ev:
+        for keys, valid, malformed in guid_blocks(path, col):
+            h1, h2 = hash_words(keys[valid])
+            hll.add(h1)
+            kmv.add(h2)
+            counts.add(valid, malformed)
+        ev.rows_in = counts.rows
+    return hll, kmv, counts
+
+
+def print_rates(n_a, n_b, common, err=None):
+    """Join rates; err = (relative 95% error of the counts, of the intersection) for estimates."""
+    if err is None:
+        print(f"\nCounts: file1 unique GUIDs = {n_a}, file2 unique GUIDs = {n_b}, common = {common}")
+        fmt = lambda rate: "{:.2%}".format(rate)
+    else:
+        e_n, e_common = err
+        print(f"\nEstimates (95% bounds): file1 unique GUIDs = {n_a:,.0f} ± {e_n:.1%}, "
+              f"file2 unique GUIDs = {n_b:,.0f} ± {e_n:.1%}, common = {common:,.0f} ± {e_common:.1%}")
+        fmt = lambda rate: "{:.2%} ± {:.2%}".format(rate, rate * math.hypot(e_n, e_common))
+    if n_a > 0:
+        print("Join rate relative to file1:", fmt(common / n_a))
+    if n_b > 0:
+        print("Join rate relative to file2:", fmt(common / n_b))
+
+
+def report_exact(set_a, set_b):
+    print("\nSample GUIDs from file1 (first 5):", to_hex(set_a[:5]))
+    print("Sample GUIDs from file2 (first 5):", to_hex(set_b[:5]))
+    common = np.intersect1d(set_a, set_b, assume_unique=True)
+    print_rates(len(set_a), len(set_b), len(common))
+
+    # show up to 10 sample mismatches from each side
+    only_a = to_hex(np.setdiff1d(set_a, set_b, assume_unique=True)[:10])
+    only_b = to_hex(np.setdiff1d(set_b, set_a, assume_unique=True)[:10])
+    print("\nSample GUIDs present only in file1 (up to 10):", only_a)
+    print("Sample GUIDs present only in file2 (up to 10):", only_b)
+
+
+def report_fast(hll_a, kmv_a, hll_b, kmv_b):
+    if kmv_a.exact() and kmv_b.exact():
+        # both sketches still hold every hash value, so the counts are exact
+        common = len(np.intersect1d(kmv_a.values, kmv_b.values, assume_unique=True))
+        print_rates(len(kmv_a.values), len(kmv_b.values), common)
+        return
+    union = hll_a.union(hll_b)
+    j, n_union = jaccard(kmv_a, kmv_b)
+    print(f"\nJaccard = {j:.4f} from {n_union} KMV samples")
+    if j == 0:
+        # no shared sample: only an upper bound (rule of three)
+        upper = 3.0 / n_union * union.estimate()
+        print(f"Estimates: file1 unique GUIDs = {hll_a.estimate():,.0f}, file2 unique GUIDs = {hll_b.estimate():,.0f}, "
+              f"common < {upper:,.0f} (95%)")
+        return
+    # intersection error: binomial error of the Jaccard sample plus the error of the union estimate
+    e_common = Z95 * math.sqrt((1 - j) / (j * n_union) + union.rel_error() ** 2)
+    print_rates(hll_a.estimate(), hll_b.estimate(), j * union.estimate(), (Z95 * hll_a.rel_error(), e_common))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="GUID join rates between two exports.")
+    ap.add_argument("file1", help="e.g. dt_clean.csv")
+    ap.add_argument("file2", help="e.g. dvnFeesMapped.csv")
+    ap.add_argument("--fast", action="store_true", help="HyperLogLog + KMV estimates instead of exact sets")
+    ap.add_argument("--p", type=int, default=14, help="HyperLogLog precision (2^p registers)")
+    ap.add_argument("--k", type=int, default=4096, help="KMV sketch size")
+    args = ap.parse_args()
+
+    # GUID column by name or registered alias (dvn_schema.py)
+    cols = [detect(path).get("GUID") for path in (args.file1, args.file2)]
+    print("Detected GUID columns:", "file1:", cols[0], "file2:", cols[1])
+    if cols[0] is None or cols[1] is None:
+        print("Could not detect GUID column in one of the files.")
+        sys.exit(1)
+
+    if args.fast:
+        sketches = []
+        for path, col in zip((args.file1, args.file2), cols):
+            hll, kmv, counts = scan_sketch(path, col, args.p, args.k)
+            counts.print()
+            sketches += [hll, kmv]
+        report_fast(*sketches)
+    else:
+        sets = []
+        for path, col in zip((args.file1, args.file2), cols):
+            keys, counts = scan_exact(path, col)
+            counts.print()
+            sets.append(keys)
+        report_exact(*sets)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# dedup_guids.py
+# Streaming GUID deduplication of overlapping exports.
+#
+# The query's OR join (GUID or nonce + srcEid) and exports with overlapping date ranges give
+# some GUIDs several rows, with different destination matches and latencies. Instead of
+# drop_duplicates('GUID', keep='first') on a full frame, this stage keeps one row per GUID
+# chosen by a fixed rule:
+#   1. MATCH_METHOD: GUID, then NONCE+SRC_EID, then anything else, NO_MATCH last
+#   2. earliest DESTINATIONDELIVEREDTIMESTAMP (undelivered last)
+#   3. earlier input file, then earlier row
+# Rows without a valid GUID are kept. Inputs without MATCH_METHOD or delivery columns (e.g. the
+# fees sheet) fall back to rule 3.
+#
+# GUIDs are compared as 32-byte binary keys. By default the key and rank of every row are kept
+# in a compact array (~50 bytes per row) that is sorted once. With --bloom, a first pass only
+# feeds a Bloom filter (~--bits-per-key bits per row) to find keys that may repeat, and records
+# are kept for those candidates only. False positives cost memory, never correctness. A last
+# pass copies the kept lines verbatim into the output.
+#
+# Usage:
+#   python3 scripts/dedup_guids.py <export.csv> [more.csv ...] [--out dt_dedup.csv] [--bloom]
+#       [--bits-per-key 10] [--chunk-rows 500000]
+# Writes the deduplicated export and <out>_report.csv (per input file: rows, rows without GUID,
+# duplicates within the file, rows whose GUID is also in another file, dropped, kept).
+
+import csv
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dvn_instrument import stage
+from dvn_io import read_export, unwrap, parse_timestamps, guid_keys
+
+METHOD_RANK = {"GUID": 0, "NONCE+SRC_EID": 1, "NO_MATCH": 3}     # anything else: 2
+NOT_DELIVERED = np.iinfo(np.int64).max
+RANK_COLS = ["GUID", "MATCH_METHOD", "DESTINATIONDELIVEREDTIMESTAMP"]
+RECORD = np.dtype([("key", "S32"), ("method", "u1"), ("ts", "<i8"), ("file", "<u2"), ("row", "<i8")])
+CHUNK_ROWS = 500_000
+WRITE_BLOCK_BYTES = 64 << 20
+
+
+class Bloom:
+    """Bloom filter over binary GUIDs. GUIDs are keccak hashes, so their own bytes serve as the
+    two base hashes of double hashing."""
+
+    def __init__(self, n_keys, bits_per_key=10):
+        self.m = max(64, int(n_keys * bits_per_key))
+        self.k = max(1, round(bits_per_key * 0.693))
+        self.bits = np.zeros(self.m // 8 + 1, dtype=np.uint8)
+
+    def _positions(self, keys):
+        w = np.frombuffer(keys.tobytes(), dtype="<u8").reshape(len(keys), 4)
+        h1, h2 = w[:, 0], w[:, 1] | np.uint64(1)
+        i = np.arange(self.k, dtype=np.uint64)
+        return (h1[:, None] + i * h2[:, None]) % np.uint64(self.m)
+
+    def add(self, keys):
+        """Insert keys; True where a key may have been inserted before (earlier call or earlier in keys)."""
+        pos = self._positions(keys)
+        byte, bit = (pos >> np.uint64(3)).astype(np.int64), (pos & np.uint64(7)).astype(np.uint8)
+        seen = ((self.bits[byte] >> bit) & 1).all(axis=1)
+        # repeats inside the batch are not in the filter yet
+        _, first, counts = np.unique(keys, return_index=True, return_counts=True)
+        repeat = np.ones(len(keys), dtype=bool)
+        repeat[first] = False
+        seen |= repeat
+        seen[first[counts > 1]] = True
+        np.bitwise_or.at(self.bits, byte.ravel(), (np.uint8(1) << bit).ravel())
+        return seen
+
+
+def header_of(path):
+    with open(path, newline="") as f:
+        return f.readline()
+
+
+def chunks(path, chunk_rows, columns):
+    header = next(csv.reader([header_of(path)]))
+    cols = [c for c in columns if c in header]
+    return read_export(path, usecols=cols, chunksize=chunk_rows)
+
+
+def isin_sorted(keys, sorted_keys):
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=bool)
+    i = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return sorted_keys[i] == keys
+
+
+def chunk_records(chunk, file_idx, row0, keep=None):
+    """Records of the rows with a valid GUID (only keys in the sorted array keep, if given) and
+    the number of rows without a valid GUID."""
+    keys, valid = guid_keys(chunk["GUID"])
+    n_invalid = len(chunk) - int(valid.sum())
+    if keep is not None:
+        valid &= isin_sorted(keys, keep)
+    idx = np.flatnonzero(valid)
+    rec = np.empty(len(idx), dtype=RECORD)
+    rec["key"], rec["file"], rec["row"] = keys[idx], file_idx, row0 + idx
+    if "MATCH_METHOD" in chunk:
+        method = unwrap(chunk["MATCH_METHOD"].iloc[idx]).str.upper()
+        rec["method"] = method.map(METHOD_RANK).fillna(2).to_numpy(np.uint8)
+    else:
+        rec["method"] = 2
+    if "DESTINATIONDELIVEREDTIMESTAMP" in chunk:
+        ts = parse_timestamps(chunk["DESTINATIONDELIVEREDTIMESTAMP"].iloc[idx])
+        ns = ts.to_numpy(dtype="datetime64[ns]").view(np.int64)
+        rec["ts"] = np.where(ts.isna().to_numpy(), NOT_DELIVERED, ns)
+    else:
+        rec["ts"] = NOT_DELIVERED
+    return rec, n_invalid
+
+
+def estimate_rows(paths, sample_lines=10_000):
+    total = 0
+    for p in paths:
+        with open(p, "rb") as f:
+            f.readline()
+            sizes = [len(f.readline()) for _ in range(sample_lines)]
+        sizes = [s for s in sizes if s] or [1]
+        total += Path(p).stat().st_size / (sum(sizes) / len(sizes))
+    return int(total) + 1
+
+
+def bloom_candidates(paths, bits_per_key, chunk_rows):
+    """Sorted distinct keys that may occur more than once across all inputs."""
+    bloom = Bloom(estimate_rows(paths), bits_per_key)
+    cand = []
+    for path in paths:
+        with stage("dedup_bloom", inputs=[path]) as ev:
+            n = 0
+            for chunk in chunks(path, chunk_rows, ["GUID"]):
+                keys, valid = guid_keys(chunk["GUID"])
+                keys = keys[valid]
+                cand.append(keys[bloom.add(keys)])
+                n += len(chunk)
+            ev.rows_in = n
+    cand = np.unique(np.concatenate(cand)) if cand else np.empty(0, dtype="S32")
+    print(f"Bloom filter: {bloom.m / 8e6:.1f} MB, {bloom.k} hashes, {len(cand)} candidate GUIDs")
+    return cand
+
+
+def scan(paths, chunk_rows, keep=None):
+    """Records (all valid rows, or rows with a key in keep), plus row / no-GUID counts per file."""
+    recs, rows, no_guid = [], [], []
+    for f_idx, path in enumerate(paths):
+        with stage("dedup_scan", inputs=[path]) as ev:
+            n = bad = kept = 0
+            for chunk in chunks(path, chunk_rows, RANK_COLS):
+                rec, invalid = chunk_records(chunk.reset_index(drop=True), f_idx, n, keep)
+                recs.append(rec)
+                n += len(chunk)
+                bad += invalid
+                kept += len(rec)
+            rows.append(n)
+            no_guid.append(bad)
+            ev.rows_in, ev.rows_out = n, kept
+    rec = np.concatenate(recs) if recs else np.empty(0, dtype=RECORD)
+    return rec, rows, no_guid
+
+
+def resolve(rec, n_files):
+    """Rows to drop per file (best record of every key wins) and per-file duplicate counts."""
+    order = np.lexsort((rec["row"], rec["file"], rec["ts"], rec["method"]))
+    order = order[np.argsort(rec["key"][order], kind="stable")]
+    rec = rec[order]
+    first = np.ones(len(rec), dtype=bool)
+    first[1:] = rec["key"][1:] != rec["key"][:-1]
+    group = np.cumsum(first) - 1
+    # distinct (key, file) pairs: duplicates inside a file and keys shared between files
+    pairs = np.lexsort((rec["file"], group))
+    pf = np.ones(len(rec), dtype=bool)
+    pf[1:] = (group[pairs][1:] != group[pairs][:-1]) | (rec["file"][pairs][1:] != rec["file"][pairs][:-1])
+    files_per_key = np.bincount(group[pairs][pf], minlength=group[-1] + 1 if len(rec) else 0)
+    files = rec["file"].astype(np.int64)
+    stats = {
+        "dup_in_file": np.bincount(files, minlength=n_files) - np.bincount(files[pairs][pf], minlength=n_files),
+        "in_other_files": np.bincount(files, weights=files_per_key[group] > 1, minlength=n_files).astype(np.int64),
+        "dropped": np.bincount(files[~first], minlength=n_files),
+    }
+    drops = {f: np.sort(rec["row"][~first & (files == f)]) for f in range(n_files)}
+    return drops, stats, int(first.sum())
+
+
+def write_kept(paths, drops, rows, out):
+    """Copy every input line that is not dropped into out (header once)."""
+    header = header_of(paths[0])
+    for p in paths[1:]:
+        if header_of(p) != header:
+            raise SystemExit(f"{p}: header differs from {paths[0]}; cannot concatenate")
+    tmp = Path(f"{out}.tmp")
+    kept = 0
+    with open(tmp, "w", newline="") as o:
+        o.write(header)
+        for f_idx, path in enumerate(paths):
+            with stage("dedup_write", inputs=[path]) as ev, open(path, newline="") as f:
+                f.readline()
+                drop = np.zeros(rows[f_idx], dtype=bool)
+                drop[drops[f_idx]] = True
+                n = 0
+                while True:
+                    lines = f.readlines(WRITE_BLOCK_BYTES)
+                    if not lines:
+                        break
+                    if not lines[-1].endswith("\n"):
+                        lines[-1] += "\n"
+                    d = drop[n:n + len(lines)]
+                    if len(d) != len(lines):
+                        raise SystemExit(f"{path}: line count differs from the parsed row count "
+                                         "(cells with line breaks?)")
+                    block = [l for l, x in zip(lines, d) if not x] if d.any() else lines
+                    o.writelines(block)
+                    kept += len(block)
+                    n += len(lines)
+                if n != rows[f_idx]:
+                    raise SystemExit(f"{path}: {n} lines but {rows[f_idx]} parsed rows")
+                ev.rows_in, ev.rows_out = n, n - len(drops[f_idx])
+    tmp.replace(out)
+    return kept
+
+
+def dedup(paths, out, bloom=False, bits_per_key=10, chunk_rows=CHUNK_ROWS):
+    """Write the deduplicated concatenation of paths to out; returns the per-file report."""
+    paths = [Path(p) for p in paths]
+    keep = bloom_candidates(paths, bits_per_key, chunk_rows) if bloom else None
+    rec, rows, no_guid = scan(paths, chunk_rows, keep)
+    with stage("dedup_resolve", rows_in=len(rec)) as ev:
+        drops, stats, n_keys = resolve(rec, len(paths))
+        ev.rows_out = len(rec) - int(stats["dropped"].sum())
+    kept = write_kept(paths, drops, rows, out)
+    report = pd.DataFrame({"file": [str(p) for p in paths], "rows": rows, "no_guid": no_guid, **stats})
+    report["kept"] = report["rows"] - report["dropped"]
+    assert kept == report["kept"].sum()
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Keep one row per GUID across overlapping exports.")
+    ap.add_argument("exports", nargs="+", help="Excel-wrapped CSV exports with the same header")
+    ap.add_argument("--out", default="dt_dedup.csv")
+    ap.add_argument("--bloom", action="store_true", help="Bloom filter pre-pass: keep records for candidate duplicates only")
+    ap.add_argument("--bits-per-key", type=float, default=10, help="Bloom filter size (1%% false positives at 10)")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = ap.parse_args()
+
+    report = dedup(args.exports, args.out, args.bloom, args.bits_per_key, args.chunk_rows)
+    report_path = f"{Path(args.out).with_suffix('')}_report.csv"
+    report.to_csv(report_path, index=False)
+    print(report.to_string(index=False))
+    print(f"Kept {report['kept'].sum()} of {report['rows'].sum()} rows "
+          f"({report['dropped'].sum()} duplicates dropped)")
+    print("Saved:", args.out, report_path)
+
+
+if __name__ == "__main__":
+    main()
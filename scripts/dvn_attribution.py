@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# dvn_attribution.py
+# Per-DVN delivery latency contribution, fitted jointly over all required stacks.
+#
+# compute_dvn_stack_latency.py gives every DVN the plain mean of the medians of the stacks it is in,
+# so a fast DVN that mostly sits in slow stacks looks slow. Here every delivered message is a row
+# of a sparse message x DVN design matrix (1 where the DVN is in the message's required stack, plus
+# a shared base column), and
+#     latency = base + sum of the contributions of the stack's DVNs
+# is fitted by non-negative least squares with a ridge penalty (--alpha, in messages) on the DVN
+# contributions. The ridge keeps DVNs that always appear together identifiable; their shared
+# latency is split between them.
+#
+# All messages of a stack share the same design row, so the fit only needs n, sum and sum of
+# squares of latency per (window, stack): X'WX, X'Wy and the residuals are exact from those, and
+# the statistics merge by addition across chunks, files and pathways. The model is refitted per
+# window (before / during / after the outage, as in pathways.py, and all) from the same statistics.
+# Confidence intervals use heteroskedasticity-robust (sandwich) standard errors and are clipped at 0.
+# They leave out the ridge's shrinkage (towards the base), so keep --alpha small next to the
+# messages per stack when the intervals matter.
+#
+# Outputs (in --out-dir):
+#  - dvn_attribution.csv        per window and DVN: contribution and its CI, stacks, messages, and
+#                               the mean of its stacks' mean latency for comparison
+#  - dvn_attribution_stats.csv  per (window, stack) n / sum / sum of squares (refit with --from-stats)
+#
+# Usage:
+#   python3 scripts/dvn_attribution.py <dt_clean.csv>[,more.csv] [--out-dir .] [--alpha 1]
+#       [--names dvnNames-Sheet2.csv]
+#   python3 scripts/dvn_attribution.py --from-stats dvn_attribution_stats.csv[,more.csv] [--out-dir .]
+
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.linalg import solve_triangular
+from scipy.optimize import nnls
+from dvn_instrument import stage
+from dvn_io import dvn_names, NAMES_CSV
+from dvn_schema import read_typed
+from dvn_checkpoint import write_csv_atomic
+from pathways import window_labels, required_stack
+
+COLUMNS = ["SOURCETIMESTAMP", "REQUIREDDVNS", "LATENCYTODELIVERY_SECONDS"]
+STAT_KEYS = ["WINDOW", "Required_Stack"]
+STATS = ["n", "sum_y", "sum_y2"]
+BASE = "(base)"
+ALPHA = 1.0
+Z = 1.96
+CHUNK_ROWS = 500_000
+OUT_CSV = "dvn_attribution.csv"
+OUT_STATS = "dvn_attribution_stats.csv"
+
+
+def merge_stats(frames):
+    return pd.concat(frames, ignore_index=True).groupby(STAT_KEYS, as_index=False)[STATS].sum()
+
+
+def stack_stats(chunk, names):
+    """n, sum and sum of squares of delivery latency per (window, required stack) of a typed chunk."""
+    d = pd.DataFrame({
+        "WINDOW": window_labels(chunk["SOURCETIMESTAMP"]),
+        "Required_Stack": required_stack(chunk["REQUIREDDVNS"], names).to_numpy(),
+        "y": chunk["LATENCYTODELIVERY_SECONDS"].to_numpy(dtype=np.float64),
+    })
+    d = d[d["y"].notna() & d["Required_Stack"].notna() & (d["Required_Stack"] != "")]
+    d = d.assign(y2=d["y"] ** 2)
+    s = d.groupby(STAT_KEYS, as_index=False).agg(n=("y", "size"), sum_y=("y", "sum"), sum_y2=("y2", "sum"))
+    # every message also counts in the "all" window
+    return merge_stats([s[s["WINDOW"] != ""], s.assign(WINDOW="all")])
+
+
+def design(stacks):
+    """Sparse stack x DVN incidence matrix (CSR) and the DVN names of its columns."""
+    members = [s.split(" + ") for s in stacks]
+    dvns = sorted({d for m in members for d in m})
+    col = {d: j for j, d in enumerate(dvns)}
+    rows = np.repeat(np.arange(len(members)), [len(m) for m in members])
+    cols = np.array([col[d] for m in members for d in m], dtype=np.int64)
+    a = sparse.csr_matrix((np.ones(len(cols)), (rows, cols)), shape=(len(members), len(dvns)))
+    return a, dvns
+
+
+def attribute(stats, alpha=ALPHA):
+    """(per-DVN contributions with robust CIs, R^2) for the stack statistics of one window."""
+    n, sy, sy2 = (stats[c].to_numpy(dtype=np.float64) for c in STATS)
+    a, dvns = design(stats["Required_Stack"])
+    x = sparse.hstack([sparse.csr_matrix(np.ones((len(n), 1))), a]).tocsr()
+    g = (x.T @ sparse.diags(n) @ x).toarray()
+    h = g + alpha * np.diag(np.r_[0.0, np.ones(len(dvns))])      # the base is not penalized
+    c = x.T @ sy
+    # NNLS on the normal equations: |L'b - L^-1 c|^2 = b'Hb - 2c'b + const, with H = LL'
+    chol = np.linalg.cholesky(h)
+    beta, _ = nnls(chol.T, solve_triangular(chol, c, lower=True))
+
+    # residual sum of squares per stack from its statistics, then the sandwich covariance
+    pred = x @ beta
+    rss = np.maximum(sy2 - 2 * pred * sy + n * pred ** 2, 0.0)
+    h_inv = np.linalg.inv(h)
+    cov = h_inv @ (x.T @ sparse.diags(rss) @ x).toarray() @ h_inv
+    se = np.sqrt(np.maximum(np.diag(cov), 0.0))
+    tss = sy2.sum() - sy.sum() ** 2 / n.sum()
+    r2 = 1 - rss.sum() / tss if tss > 0 else np.nan
+
+    means = sy / n
+    out = pd.DataFrame({
+        "DVN_NAME": [BASE] + dvns,
+        "stacks": np.r_[len(n), np.asarray(a.sum(axis=0)).ravel()].astype(np.int64),
+        "messages": np.r_[n.sum(), a.T @ n].astype(np.int64),
+        "contribution_s": beta,
+        "se_s": se,
+        "ci_low_s": np.maximum(beta - Z * se, 0.0),
+        "ci_high_s": beta + Z * se,
+        # what compute_dvn_stack_latency.py reports, with stack means for medians
+        "stack_mean_s": np.r_[np.nan, (a.T @ means) / np.asarray(a.sum(axis=0)).ravel()],
+    })
+    return out, r2
+
+
+def fit_windows(stats, alpha=ALPHA):
+    """attribute() per window; returns the table and {window: R^2}."""
+    out, r2 = [], {}
+    for window, s in stats.groupby("WINDOW", sort=False):
+        t, r2[window] = attribute(s.reset_index(drop=True), alpha)
+        out.append(t.assign(WINDOW=window))
+    table = pd.concat(out, ignore_index=True)
+    table = table[["WINDOW"] + [c for c in table.columns if c != "WINDOW"]]
+    return table.sort_values(["WINDOW", "contribution_s"], ascending=[True, False], ignore_index=True), r2
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-DVN latency contribution by non-negative least squares over stacks.")
+    ap.add_argument("inputs", nargs="?", default="", help="comma-separated dt_clean.csv exports")
+    ap.add_argument("--from-stats", default="", help="refit from dvn_attribution_stats.csv files instead")
+    ap.add_argument("--out-dir", default=".")
+    ap.add_argument("--alpha", type=float, default=ALPHA, help="ridge penalty on DVN contributions, in messages")
+    ap.add_argument("--names", default=str(NAMES_CSV))
+    args = ap.parse_args()
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.from_stats:
+        paths = [p for p in args.from_stats.split(",") if p.strip()]
+        stats = merge_stats([pd.read_csv(p, keep_default_na=False) for p in paths])
+    else:
+        paths = [p for p in args.inputs.split(",") if p.strip()]
+        if not paths:
+            ap.error("give dt_clean.csv exports or --from-stats")
+        names = dvn_names(args.names)
+        parts = []
+        with stage("stack_stats", inputs=paths) as ev:
+            n = 0
+            for path in paths:
+                for chunk in read_typed(path, COLUMNS, chunksize=CHUNK_ROWS):
+                    parts = [merge_stats(parts + [stack_stats(chunk.reset_index(drop=True), names)])]
+                    n += len(chunk)
+            stats = merge_stats(parts)
+            ev.rows_in, ev.rows_out = n, len(stats)
+        write_csv_atomic(stats, out_dir / OUT_STATS)
+
+    with stage("attribute", rows_in=len(stats)) as ev:
+        table, r2 = fit_windows(stats, args.alpha)
+        ev.rows_out = len(table)
+    write_csv_atomic(table, out_dir / OUT_CSV)
+
+    for window, r in r2.items():
+        print(f"{window}: R^2 {r:.3f}")
+    print(table[table["WINDOW"] == "all"].head(20).to_string(index=False))
+    if not args.from_stats:
+        print("Saved:", out_dir / OUT_STATS)
+    print("Saved:", out_dir / OUT_CSV)
+
+
+if __name__ == "__main__":
+    main()
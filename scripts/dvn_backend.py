@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# dvn_backend.py
+# The core explode -> join -> aggregate chain of expand_from_fees_then_join.py as one logical
+# pipeline with interchangeable dataframe backends:
+#
+#   explode    fees file -> one row per (message, DVN): GUID, DVN_ADDR, DVN_NAME, ROLE, DVN_FEE_WEI.
+#              As in expand_from_fees_then_join.py, the i-th entry of RequiredDVN_Mapping /
+#              OptionalDVN_Mapping ('[(name, wei), ...]') names the i-th DVN and gives its fee; DVNs
+#              past the mapping are named by address and priced positionally from DVN_FEES_ARRAY
+#              (required + optional)
+#   join       + LATENCYTODELIVERY_SECONDS and MESSAGESTATUS of dt_clean.csv, on GUID (left join)
+#   aggregate  per DVN_NAME: unique_messages, rows, fee sums, median / p95 latency, delivered rows
+#
+#   pandas  reference implementation: eager, vectorized with dvn_io (arrays parsed once per
+#           distinct cell, no row loops, no frame copies)
+#   polars  the same plan as a Polars LazyFrame: only the needed columns are scanned, the plan
+#           is optimized as a whole and runs on all cores. Optional dependency (pip install polars).
+#
+# Cells are unwrapped (="..." Excel wrappers) in both backends, so latency and delivery columns
+# are filled; expand_from_fees_then_join.py leaves them empty for wrapped exports.
+# expand_from_fees_then_join.py explodes every chunk with expand() (--backend picks the backend).
+#
+# parity runs every installed backend on the same inputs and compares their KPI tables with
+# the pandas one (and, with --against, the count and fee columns of expanded_kpi_by_dvn.csv).
+# tests/test_dvn_backend.py runs the same comparisons.
+#
+# Usage:
+#   python3 scripts/dvn_backend.py run <dvnFeesMapped.csv> <dt_clean.csv> [--backend pandas|polars] [--out backend_kpi_by_dvn.csv]
+#   python3 scripts/dvn_backend.py parity <dvnFeesMapped.csv> <dt_clean.csv> [--against expanded_kpi_by_dvn.csv]
+
+import argparse
+import numpy as np
+import pandas as pd
+from dvn_instrument import stage
+from dvn_io import read_export, unwrap, explode_array
+from dvn_schema import detect
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+OUT_CSV = "backend_kpi_by_dvn.csv"
+FEES_COLUMNS = ["GUID", "REQUIREDDVNS", "OPTIONALDVNS", "DVN_FEES_ARRAY"]
+MAPPING_COLUMNS = ["REQUIREDDVN_MAPPING", "OPTIONALDVN_MAPPING"]     # read when the file has them
+ROLES = [("required", "REQUIREDDVNS", "REQUIREDDVN_MAPPING"), ("optional", "OPTIONALDVNS", "OPTIONALDVN_MAPPING")]
+EXPANDED_COLUMNS = ["GUID", "DVN_ADDR", "DVN_NAME", "ROLE", "DVN_FEE_WEI"]
+# one ('name', 'wei') pair of a mapping cell; the name is quoted with ' or " (Python repr)
+PAIR_RE = r"""\(\s*(?:'([^']*)'|"([^"]*)")\s*,\s*['"]?\s*(\d+)\s*['"]?\s*\)"""
+DT_COLUMNS = ["GUID", "LATENCYTODELIVERY_SECONDS", "MESSAGESTATUS"]
+KPI_COLUMNS = ["DVN_NAME", "unique_messages", "rows", "total_fees_eth", "total_required_fees_eth",
+               "total_optional_fees_eth", "median_latency", "p95_latency", "delivered_messages"]
+# columns that mean the same in expanded_kpi_by_dvn.csv (its latency / delivery read wrapped cells raw)
+SCRIPT_COLUMNS = ["unique_messages", "rows", "total_fees_eth", "total_required_fees_eth", "total_optional_fees_eth"]
+
+
+def fees_usecols(path):
+    """Header name -> canonical name for the fee file columns the pipeline reads (dvn_schema.py)."""
+    schema = detect(path)
+    missing = [c for c in FEES_COLUMNS if c not in schema]
+    if missing:
+        raise SystemExit(f"{path}: missing column(s) {', '.join(missing)}")
+    return {schema.get(c): c for c in FEES_COLUMNS + MAPPING_COLUMNS if c in schema}
+
+
+# ---------- pandas (reference) ----------
+
+def explode_mapping(s):
+    """(row, pos, map_name, map_fee) per pair of a mapping column, parsed once per distinct cell."""
+    codes, uniq = pd.factorize(s)
+    pairs = pd.Series(uniq, dtype=object).str.extractall(PAIR_RE)
+    pairs = pd.DataFrame({"u": pairs.index.get_level_values(0).to_numpy(),
+                          "pos": pairs.index.get_level_values("match").to_numpy(),
+                          "map_name": pairs[0].fillna(pairs[1]).str.strip().to_numpy(),
+                          "map_fee": pairs[2].to_numpy()})
+    rows = pd.DataFrame({"row": np.flatnonzero(codes >= 0), "u": codes[codes >= 0]})
+    return rows.merge(pairs, on="u").drop(columns="u")
+
+
+def explode_fees(fees):
+    """EXPANDED_COLUMNS plus row (source row) for a fees frame with canonical column names and a RangeIndex.
+
+    Rows come per message, required before optional, in array order; a position counts when the
+    address array or the mapping has it (expand_from_fees_then_join.py takes the longer)."""
+    fee = explode_array(fees["DVN_FEES_ARRAY"], "fee").rename(columns={"pos": "fee_pos"})
+    offset = np.zeros(len(fees), dtype=np.int64)       # fee array index of the first DVN of the role
+    parts = []
+    for rank, (role, arr, mapping) in enumerate(ROLES):
+        d = explode_array(fees[arr], "DVN_ADDR")
+        if mapping in fees:
+            d = d.merge(explode_mapping(fees[mapping]), on=["row", "pos"], how="outer")
+        else:
+            d = d.assign(map_name=np.nan, map_fee=np.nan)
+        d["ROLE"], d["rank"] = role, rank
+        d["fee_pos"] = d["pos"] + offset[d["row"].to_numpy()]
+        offset += np.bincount(d["row"].to_numpy(), minlength=len(fees))
+        parts.append(d)
+    d = pd.concat(parts, ignore_index=True).merge(fee, on=["row", "fee_pos"], how="left")
+    d = d.sort_values(["row", "rank", "pos"], ignore_index=True)
+    d["GUID"] = unwrap(fees["GUID"]).str.lower().to_numpy()[d["row"].to_numpy()]
+    d["DVN_NAME"] = d["map_name"].fillna(d["DVN_ADDR"])
+    d["DVN_FEE_WEI"] = d["map_fee"].fillna(d["fee"])
+    return d[["row"] + EXPANDED_COLUMNS]
+
+
+def fees_eth(wei):
+    try:
+        return wei.astype(np.float64).fillna(0.0) / 1e18     # NumPy parses clean digit strings much faster
+    except (ValueError, TypeError):
+        return pd.to_numeric(wei, errors="coerce").fillna(0.0) / 1e18
+
+
+def pandas_kpis(fees_csv, dt_csv):
+    cols = fees_usecols(fees_csv)
+    fees = read_export(fees_csv, usecols=list(cols)).rename(columns=cols)
+    dt = read_export(dt_csv, usecols=DT_COLUMNS)
+
+    per_dvn = explode_fees(fees)
+    per_dvn["fees_eth"] = fees_eth(per_dvn["DVN_FEE_WEI"])
+    msg = pd.DataFrame({
+        "GUID": unwrap(dt["GUID"]).str.lower(),
+        "LATENCY_S": pd.to_numeric(unwrap(dt["LATENCYTODELIVERY_SECONDS"]), errors="coerce"),
+        "DELIVERED": (unwrap(dt["MESSAGESTATUS"]).str.upper() == "DELIVERED").astype(np.int64),
+    })
+    joined = per_dvn.merge(msg, on="GUID", how="left")
+    joined["DELIVERED"] = joined["DELIVERED"].fillna(0).astype(np.int64)
+    required = joined["ROLE"] == "required"
+
+    g = joined.assign(req_fee=joined["fees_eth"].where(required, 0.0),
+                      opt_fee=joined["fees_eth"].where(~required, 0.0)).groupby("DVN_NAME")
+    kpi = pd.DataFrame({
+        "unique_messages": g["GUID"].nunique(),
+        "rows": g["GUID"].count(),
+        "total_fees_eth": g["fees_eth"].sum(),
+        "total_required_fees_eth": g["req_fee"].sum(),
+        "total_optional_fees_eth": g["opt_fee"].sum(),
+        "median_latency": g["LATENCY_S"].median(),
+        "p95_latency": g["LATENCY_S"].quantile(0.95),
+        "delivered_messages": g["DELIVERED"].sum(),
+    }).reset_index()
+    return kpi[KPI_COLUMNS].sort_values("DVN_NAME", ignore_index=True)
+
+
+# ---------- polars (lazy) ----------
+
+def _pl_unwrap(expr):
+    return expr.str.strip_chars().str.strip_chars_start("=").str.strip_chars('"').str.strip_chars()
+
+
+def _pl_array(col):
+    """Array cell '[ a;b ]' -> list of lower-case elements (as dvn_io.explode_array splits it)."""
+    return (_pl_unwrap(pl.col(col)).str.replace_all(" ", "", literal=True).str.strip_chars("[]")
+            .str.to_lowercase().str.split(";"))
+
+
+def _pl_explode(lf, col, name):
+    """(row, pos, name) for the non-empty elements of an array column; pos counts every element."""
+    return (lf.select("row", _pl_array(col).alias(name))
+            .with_columns(pl.int_ranges(0, pl.col(name).list.len()).alias("pos"))
+            .explode([name, "pos"])
+            .filter(pl.col(name).is_not_null() & (pl.col(name) != "")))
+
+
+def _pl_mapping(lf, col):
+    """(row, pos, map_name, map_fee) per ('name', 'wei') pair of a mapping column."""
+    return (lf.select("row", pl.col(col).str.extract_all(PAIR_RE).alias("pair"))
+            .with_columns(pl.int_ranges(0, pl.col("pair").list.len()).alias("pos"))
+            .explode(["pair", "pos"])
+            .filter(pl.col("pair").is_not_null())
+            .select("row", "pos",
+                    pl.coalesce(pl.col("pair").str.extract(PAIR_RE, 1), pl.col("pair").str.extract(PAIR_RE, 2))
+                    .str.strip_chars().alias("map_name"),
+                    pl.col("pair").str.extract(PAIR_RE, 3).alias("map_fee")))
+
+
+def polars_explode(fees):
+    """explode_fees() as a LazyFrame over a LazyFrame of the canonical fee columns."""
+    fees = fees.with_row_index("row")
+    names = fees.collect_schema().names()
+    fee = _pl_explode(fees, "DVN_FEES_ARRAY", "fee").rename({"pos": "fee_pos"})
+    offset = fees.select("row", pl.lit(0, dtype=pl.Int64).alias("offset"))
+    parts = []
+    for rank, (role, arr, mapping) in enumerate(ROLES):
+        d = _pl_explode(fees, arr, "DVN_ADDR")
+        if mapping in names:
+            d = d.join(_pl_mapping(fees, mapping), on=["row", "pos"], how="full", coalesce=True)
+        else:
+            d = d.with_columns(pl.lit(None, dtype=pl.String).alias("map_name"),
+                               pl.lit(None, dtype=pl.String).alias("map_fee"))
+        d = (d.join(offset, on="row", how="left")
+             .with_columns(pl.lit(role).alias("ROLE"), pl.lit(rank).alias("rank"),
+                           (pl.col("pos") + pl.col("offset")).alias("fee_pos"))
+             .drop("offset"))
+        counts = d.group_by("row").agg(pl.len().cast(pl.Int64).alias("n"))
+        offset = (offset.join(counts, on="row", how="left")
+                  .select("row", (pl.col("offset") + pl.col("n").fill_null(0)).alias("offset")))
+        parts.append(d)
+    guid = fees.select("row", _pl_unwrap(pl.col("GUID")).str.to_lowercase().alias("GUID"))
+    return (pl.concat(parts, how="vertical_relaxed")
+            .join(fee, on=["row", "fee_pos"], how="left")
+            .join(guid, on="row", how="left")
+            .sort(["row", "rank", "pos"])
+            .select("row", *[pl.col(c) for c in ["GUID", "DVN_ADDR"]],
+                    pl.coalesce("map_name", "DVN_ADDR").alias("DVN_NAME"), "ROLE",
+                    pl.coalesce("map_fee", "fee").alias("DVN_FEE_WEI")))
+
+
+def polars_plan(fees_csv, dt_csv):
+    """The pipeline as one LazyFrame; nothing is read until collect()."""
+    cols = fees_usecols(fees_csv)
+    fees = (pl.scan_csv(fees_csv, infer_schema_length=0)
+            .select([pl.col(src).alias(dst) for src, dst in cols.items()]))
+    per_dvn = polars_explode(fees).with_columns(
+        (pl.col("DVN_FEE_WEI").cast(pl.Float64, strict=False).fill_null(0.0) / 1e18).alias("fees_eth"))
+
+    msg = (pl.scan_csv(dt_csv, infer_schema_length=0)
+           .select(_pl_unwrap(pl.col("GUID")).str.to_lowercase().alias("GUID"),
+                   _pl_unwrap(pl.col("LATENCYTODELIVERY_SECONDS")).cast(pl.Float64, strict=False).alias("LATENCY_S"),
+                   (_pl_unwrap(pl.col("MESSAGESTATUS")).str.to_uppercase() == "DELIVERED").cast(pl.Int64)
+                   .alias("DELIVERED")))
+    joined = per_dvn.join(msg, on="GUID", how="left")
+    required = pl.col("ROLE") == "required"
+    return (joined.group_by("DVN_NAME")
+            .agg(pl.col("GUID").drop_nulls().n_unique().alias("unique_messages"),
+                 pl.col("GUID").count().alias("rows"),
+                 pl.col("fees_eth").sum().alias("total_fees_eth"),
+                 pl.when(required).then(pl.col("fees_eth")).otherwise(0.0).sum().alias("total_required_fees_eth"),
+                 pl.when(~required).then(pl.col("fees_eth")).otherwise(0.0).sum().alias("total_optional_fees_eth"),
+                 pl.col("LATENCY_S").median().alias("median_latency"),
+                 pl.col("LATENCY_S").quantile(0.95, interpolation="linear").alias("p95_latency"),
+                 pl.col("DELIVERED").fill_null(0).sum().alias("delivered_messages"))
+            .sort("DVN_NAME"))
+
+
+def polars_kpis(fees_csv, dt_csv):
+    if pl is None:
+        raise SystemExit("Polars is not installed (pip install polars); use --backend pandas")
+    kpi = polars_plan(fees_csv, dt_csv).collect()
+    return pd.DataFrame({c: kpi[c].to_numpy() for c in KPI_COLUMNS})
+
+
+BACKENDS = {"pandas": pandas_kpis, "polars": polars_kpis}
+
+
+def expand(fees, backend="pandas"):
+    """Per-DVN rows (EXPANDED_COLUMNS, nulls as None) of a frame of fee rows with canonical column names."""
+    fees = fees.reset_index(drop=True)
+    if backend == "polars":
+        if pl is None:
+            raise SystemExit("Polars is not installed (pip install polars); use --backend pandas")
+        frame = pl.DataFrame({c: fees[c].astype(object).where(fees[c].notna(), None).tolist() for c in fees.columns},
+                             schema={c: pl.String for c in fees.columns})
+        out = polars_explode(frame.lazy()).collect()
+        out = pd.DataFrame({c: out[c].to_list() for c in EXPANDED_COLUMNS})
+    else:
+        out = explode_fees(fees)[EXPANDED_COLUMNS]
+    return out.astype(object).where(out.notna(), None)
+
+
+def available():
+    return [b for b in BACKENDS if b != "polars" or pl is not None]
+
+
+def kpi_by_dvn(fees_csv, dt_csv, backend="pandas"):
+    """Per-DVN KPI table (KPI_COLUMNS, sorted by DVN_NAME) computed with the given backend."""
+    with stage(f"backend_{backend}", inputs=[fees_csv, dt_csv]) as ev:
+        kpi = BACKENDS[backend](fees_csv, dt_csv)
+        ev.rows_out = len(kpi)
+    return kpi
+
+
+# ---------- parity ----------
+
+def diff(ref, other, columns):
+    """(unmatched DVNs, differing cells, max relative difference) of other against ref."""
+    m = ref.merge(other, on="DVN_NAME", how="outer", suffixes=("_ref", "_other"), indicator=True)
+    unmatched = int((m["_merge"] != "both").sum())
+    both = m[m["_merge"] == "both"]
+    cells, max_rel = 0, 0.0
+    for c in columns:
+        a = pd.to_numeric(both[f"{c}_ref"], errors="coerce").to_numpy(np.float64)
+        b = pd.to_numeric(both[f"{c}_other"], errors="coerce").to_numpy(np.float64)
+        cells += int((~np.isclose(a, b, rtol=1e-9, atol=1e-15, equal_nan=True)).sum())
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rel = np.abs(a - b) / np.maximum(np.abs(a), 1e-300)
+        if np.isfinite(rel).any():
+            max_rel = max(max_rel, float(np.nanmax(rel)))
+    return unmatched, cells, max_rel
+
+
+def parity(fees_csv, dt_csv, against=None):
+    ref = kpi_by_dvn(fees_csv, dt_csv, "pandas")
+    report = []
+    for backend in BACKENDS:
+        if backend == "pandas":
+            continue
+        if backend not in available():
+            print(f"{backend}: not installed, skipped")
+            continue
+        report.append((backend, KPI_COLUMNS[1:], kpi_by_dvn(fees_csv, dt_csv, backend)))
+    if against:
+        script = pd.read_csv(against, dtype={"DVN_NAME": str})
+        report.append((against, SCRIPT_COLUMNS, script))
+    rows = []
+    for name, columns, other in report:
+        unmatched, cells, max_rel = diff(ref, other, columns)
+        rows.append({"compared": name, "dvns": len(other), "unmatched_dvns": unmatched, "differing_cells": cells,
+                     "max_rel_diff": max_rel, "status": "OK" if not unmatched and not cells else "DIFF"})
+    return pd.DataFrame(rows, columns=["compared", "dvns", "unmatched_dvns", "differing_cells", "max_rel_diff",
+                                       "status"])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Explode -> join -> aggregate on a pluggable dataframe backend.")
+    ap.add_argument("command", choices=["run", "parity"])
+    ap.add_argument("fees_csv", help="dvnFeesMapped.csv")
+    ap.add_argument("dt_csv", help="dt_clean.csv")
+    ap.add_argument("--backend", choices=list(BACKENDS), default="pandas")
+    ap.add_argument("--out", default=OUT_CSV)
+    ap.add_argument("--against", default=None, help="parity: also compare with expanded_kpi_by_dvn.csv")
+    args = ap.parse_args()
+
+    if args.command == "run":
+        kpi = kpi_by_dvn(args.fees_csv, args.dt_csv, args.backend)
+        kpi.to_csv(args.out, index=False)
+        print("Saved:", args.out)
+        print(kpi.sort_values("total_fees_eth", ascending=False).head(20).to_string(index=False))
+        return
+    report = parity(args.fees_csv, args.dt_csv, args.against)
+    if len(report):
+        print(report.to_string(index=False))
+    else:
+        print("Only the pandas backend is available; nothing to compare")
+    if (report["status"] != "OK").any():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
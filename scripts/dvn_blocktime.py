@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# dvn_blocktime.py
+# Per-chain block number -> timestamp index, built from every (block, timestamp) pair the exports hold.
+#
+# Rows often carry a block number with a missing or N/A timestamp (and so an N/A latency). Every
+# row that has both gives a point on its chain's block -> time curve:
+#   SOURCEENDPOINTID       SOURCEBLOCKNUMBER / SOURCETIMESTAMP, DVNBLOCKNUMBER / DVNTIMESTAMP
+#   DESTINATIONENDPOINTID  DESTINATIONDELIVEREDBLOCKNUMBER / DESTINATIONDELIVEREDTIMESTAMP
+# The points are kept sorted per chain, so a whole column of block numbers converts with one
+# searchsorted and a linear interpolation between the neighbouring known blocks (extrapolated
+# from the edge pair up to --max-extrapolate blocks past the known range, else null).
+#
+# The index is a CSV (EID, BLOCK, TS_US: microseconds since epoch) with a <index>.inputs.json
+# list of the files already folded in; update only reads files that are new or changed since.
+#
+# BLOCK_LATENCY_S = time(delivery block) - time(source block), from block numbers only, is a
+# second latency metric next to LATENCYTODELIVERY_SECONDS; it is set for delivered rows whose
+# timestamps are missing too. It is not exact: block timestamps have one-second resolution and
+# blocks missing from the index are interpolated. Where both are set, it differs from
+# LATENCYTODELIVERY_SECONDS by about 0.1-0.3 s on average (0.08 s mean absolute on a 20k-message
+# export, max 11 s). For blocks held out of the index the interpolation is off by 1.4 s on average
+# (p95 6 s) on that export and 2.7 s (p95 14 s) on the sparse 133-row sample.
+#
+# Usage:
+#   python3 scripts/dvn_blocktime.py update <dt_clean.csv>[,more.csv] [--index block_index.csv]
+#   python3 scripts/dvn_blocktime.py latency <dt_clean.csv> [--index block_index.csv] [--out block_latency.csv]
+
+import json
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dvn_instrument import stage
+from dvn_schema import read_typed
+from dvn_checkpoint import fingerprint, write_csv_atomic
+
+INDEX_FILE = "block_index.csv"
+INPUTS_SUFFIX = ".inputs.json"
+# (chain column, block column, timestamp column)
+PAIRS = [
+    ("SOURCEENDPOINTID", "SOURCEBLOCKNUMBER", "SOURCETIMESTAMP"),
+    ("SOURCEENDPOINTID", "DVNBLOCKNUMBER", "DVNTIMESTAMP"),
+    ("DESTINATIONENDPOINTID", "DESTINATIONDELIVEREDBLOCKNUMBER", "DESTINATIONDELIVEREDTIMESTAMP"),
+]
+PAIR_COLUMNS = list(dict.fromkeys(c for p in PAIRS for c in p))
+MAX_EXTRAPOLATE = 1000
+CHUNK_ROWS = 500_000
+
+
+def to_us(ts):
+    """datetime64 UTC column -> int64 microseconds since epoch (NaT -> null)."""
+    us = pd.Series(ts.dt.as_unit("us").array.asi8, index=ts.index, dtype="Int64")
+    return us.mask(ts.isna())
+
+
+def observed_pairs(df):
+    """(EID, BLOCK, TS_US) of every row with both a block number and a timestamp, per PAIRS."""
+    out = []
+    for eid, block, ts in PAIRS:
+        if not {eid, block, ts} <= set(df.columns):
+            continue
+        p = pd.DataFrame({"EID": df[eid].astype("Int64"), "BLOCK": df[block].astype("Int64"), "TS_US": to_us(df[ts])})
+        out.append(p.dropna())
+    if not out:
+        return pd.DataFrame({"EID": [], "BLOCK": [], "TS_US": []}, dtype=np.int64)
+    return pd.concat(out, ignore_index=True).astype(np.int64)
+
+
+class BlockIndex:
+    """Sorted (block, time) points per chain."""
+
+    def __init__(self, pairs=None):
+        self.pairs = pd.DataFrame({"EID": [], "BLOCK": [], "TS_US": []}, dtype=np.int64)
+        self.chains = {}
+        if pairs is not None:
+            self.add(pairs)
+
+    def add(self, pairs):
+        """Fold new pairs in; a block already indexed keeps its time. Returns the number of new blocks."""
+        before = len(self.pairs)
+        both = pd.concat([self.pairs, pairs], ignore_index=True)
+        self.pairs = (both.drop_duplicates(["EID", "BLOCK"]).sort_values(["EID", "BLOCK"], ignore_index=True))
+        self.chains = {eid: (g["BLOCK"].to_numpy(), g["TS_US"].to_numpy())
+                       for eid, g in self.pairs.groupby("EID")}
+        return len(self.pairs) - before
+
+    def times(self, eids, blocks, max_extrapolate=MAX_EXTRAPOLATE):
+        """Interpolated datetime64 UTC for columns of chain ids and block numbers (NaT where unknown)."""
+        eids = pd.Series(eids).astype("Int64")
+        blocks = pd.Series(blocks).astype("Int64")
+        out = np.full(len(blocks), np.nan)
+        ok = (eids.notna() & blocks.notna()).to_numpy()
+        e = eids.to_numpy(dtype=np.int64, na_value=0)
+        b = blocks.to_numpy(dtype=np.int64, na_value=0)
+        for eid in np.unique(e[ok]):
+            if eid not in self.chains:
+                continue
+            bk, ts = self.chains[eid]
+            rows = np.flatnonzero(ok & (e == eid))
+            x = b[rows]
+            if len(bk) == 1:
+                out[rows[x == bk[0]]] = ts[0]
+                continue
+            # neighbours bk[i-1] <= x < bk[i]; the edge pair outside the known range
+            i = np.clip(np.searchsorted(bk, x, side="right"), 1, len(bk) - 1)
+            lo, hi = i - 1, i
+            slope = (ts[hi] - ts[lo]) / (bk[hi] - bk[lo])
+            t = ts[lo] + (x - bk[lo]) * slope
+            far = (x < bk[0] - max_extrapolate) | (x > bk[-1] + max_extrapolate)
+            out[rows[~far]] = t[~far]
+        us = pd.array(np.round(out), dtype="Int64")
+        return pd.Series(pd.to_datetime(us, unit="us", utc=True), index=blocks.index)
+
+    def save(self, path):
+        write_csv_atomic(self.pairs, path)
+
+    @classmethod
+    def load(cls, path):
+        if not Path(path).exists():
+            return cls()
+        return cls(pd.read_csv(path, dtype=np.int64))
+
+
+def inputs_path(index_path):
+    return Path(str(index_path) + INPUTS_SUFFIX)
+
+
+def update(index_path, paths):
+    """Fold the (block, timestamp) pairs of files not yet in the index into it; returns the index."""
+    index = BlockIndex.load(index_path)
+    ipath = inputs_path(index_path)
+    done = json.loads(ipath.read_text()) if ipath.exists() else []
+    for path in paths:
+        fp = fingerprint([path])[0]
+        if fp in done:
+            print("Already indexed:", path)
+            continue
+        with stage("block_index", inputs=[path]) as ev:
+            n, new = 0, 0
+            for chunk in read_typed(path, PAIR_COLUMNS, chunksize=CHUNK_ROWS):
+                new += index.add(observed_pairs(chunk))
+                n += len(chunk)
+            ev.rows_in, ev.rows_out = n, new
+        done = [d for d in done if d["path"] != fp["path"]] + [fp]
+        print(f"{path}: {new} new blocks")
+    index.save(index_path)
+    tmp = Path(f"{ipath}.tmp")
+    tmp.write_text(json.dumps(done, indent=2))
+    tmp.replace(ipath)
+    return index
+
+
+def fill_timestamps(df, index, max_extrapolate=MAX_EXTRAPOLATE):
+    """Fill missing timestamps of PAIRS from their block numbers, in place; returns {column: filled}."""
+    filled = {}
+    for eid, block, ts in PAIRS:
+        if not {eid, block, ts} <= set(df.columns):
+            continue
+        missing = df[ts].isna() & df[block].notna()
+        if missing.any():
+            t = index.times(df.loc[missing, eid], df.loc[missing, block], max_extrapolate)
+            df.loc[missing, ts] = t.to_numpy()
+            filled[ts] = int(t.notna().sum())
+    return filled
+
+
+def block_latency(df, index, max_extrapolate=MAX_EXTRAPOLATE):
+    """Seconds from the source block to the delivery block, from block numbers only."""
+    src = index.times(df["SOURCEENDPOINTID"], df["SOURCEBLOCKNUMBER"], max_extrapolate)
+    dst = index.times(df["DESTINATIONENDPOINTID"], df["DESTINATIONDELIVEREDBLOCKNUMBER"], max_extrapolate)
+    return pd.Series((dst.to_numpy() - src.to_numpy()) / np.timedelta64(1, "s"), index=df.index)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-chain block number -> timestamp index and block-based latency.")
+    ap.add_argument("command", choices=["update", "latency"])
+    ap.add_argument("inputs", help="update: comma-separated exports; latency: one dt_clean.csv")
+    ap.add_argument("--index", default=INDEX_FILE)
+    ap.add_argument("--out", default="block_latency.csv")
+    ap.add_argument("--max-extrapolate", type=int, default=MAX_EXTRAPOLATE,
+                    help="blocks past the indexed range still converted")
+    args = ap.parse_args()
+    paths = [p for p in args.inputs.split(",") if p.strip()]
+
+    if args.command == "update":
+        index = update(args.index, paths)
+        per_chain = index.pairs.groupby("EID")["BLOCK"].agg(["size", "min", "max"])
+        print(per_chain.rename(columns={"size": "blocks"}).to_string())
+        print("Saved:", args.index)
+        return
+
+    index = update(args.index, paths)
+    cols = ["GUID"] + PAIR_COLUMNS + ["LATENCYTODELIVERY_SECONDS"]
+    with stage("block_latency", inputs=paths) as ev:
+        df = read_typed(paths[0], cols)
+        ev.rows_in = len(df)
+        df["BLOCK_LATENCY_S"] = block_latency(df, index, args.max_extrapolate)
+        filled = fill_timestamps(df, index, args.max_extrapolate)
+        ev.rows_out = len(df)
+    out = df[["GUID", "SOURCETIMESTAMP", "DESTINATIONDELIVEREDTIMESTAMP", "LATENCYTODELIVERY_SECONDS",
+              "BLOCK_LATENCY_S"]]
+    write_csv_atomic(out, args.out)
+    both = df["LATENCYTODELIVERY_SECONDS"].notna() & df["BLOCK_LATENCY_S"].notna()
+    only_blocks = df["LATENCYTODELIVERY_SECONDS"].isna() & df["BLOCK_LATENCY_S"].notna()
+    diff = (df.loc[both, "BLOCK_LATENCY_S"] - df.loc[both, "LATENCYTODELIVERY_SECONDS"]).abs()
+    print(f"{len(df)} messages: {int(both.sum())} with both latencies (mean |diff| {diff.mean():.2f}s), "
+          f"{int(only_blocks.sum())} with block latency only")
+    for c, n in filled.items():
+        print(f"  {c}: {n} timestamps filled from blocks")
+    print("Saved:", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# dvn_bootstrap.py
+# Bootstrap confidence intervals for the KPI tables, drawn for all groups at once.
+#
+#  - rates (delivery_rate): the resampled successes of a group are Binomial(n, rate), so one
+#    (groups x B) binomial draw gives every replicate of every group;
+#  - quantiles and means (median / p95 / avg latency): Poisson bootstrap on the value histograms
+#    the KPIs are computed from (pathways.py latency_hist, dvn_checkpoint.value_hist): every
+#    histogram row gets B Poisson(count) weights in one draw, and the quantile of every (group,
+#    replicate) is found with one searchsorted over the cumulated weights, the same interpolation
+#    as hist_quantile;
+#  - the per-DVN tables (recompute_kpi_with_known_cols.py, merge_expand_dvns_v2.py, the dvn_sql.py
+#    kpi_by_dvn_final view) get both through kpi_cis;
+#  - per-DVN averages over stacks (compute_dvn_stack_latency.py, timeframe_compare.py) average the
+#    replicates of the member stacks, so they get intervals from the same draws.
+# No Python loop runs per group or per replicate; replicates are drawn in batches so memory stays
+# at about MAX_CELLS counts. Intervals are the percentile interval of the replicates. Draws use a
+# fixed seed, so reruns on the same data give the same intervals.
+
+import warnings
+import numpy as np
+import pandas as pd
+
+B = 200
+LEVEL = 0.95
+SEED = 0
+MAX_CELLS = 4_000_000
+
+
+def interval(reps, level=LEVEL):
+    """(low, high) percentile interval over the last axis; NaN where every replicate is NaN."""
+    tail = (1 - level) / 2 * 100
+    if reps.size == 0:
+        return np.full(reps.shape[:-1], np.nan), np.full(reps.shape[:-1], np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)     # all-NaN groups
+        lo, hi = np.nanpercentile(reps, [tail, 100 - tail], axis=-1)
+    return lo, hi
+
+
+def rate_reps(successes, trials, b=B, seed=SEED):
+    """(groups x b) bootstrap replicates of successes / trials (NaN for empty groups)."""
+    trials = np.asarray(trials, dtype=np.int64)
+    p = np.divide(successes, trials, out=np.zeros(len(trials)), where=trials > 0)
+    rng = np.random.default_rng(seed)
+    reps = rng.binomial(trials[:, None], p[:, None], size=(len(trials), b)) / np.maximum(trials, 1)[:, None]
+    reps[trials == 0] = np.nan
+    return reps
+
+
+def hist_reps(values, counts, group, n_groups, qs, b=B, seed=SEED):
+    """(len(qs), n_groups, b) Poisson-bootstrap replicates of quantiles from value histograms.
+
+    values, counts, group (codes 0..n_groups-1) are histogram rows sorted by (group, value).
+    A q of "mean" gives replicates of the mean."""
+    values = np.asarray(values, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.int64)
+    group = np.asarray(group, dtype=np.int64)
+    r = len(values)
+    out = np.full((len(qs), n_groups, b), np.nan)
+    if r == 0:
+        return out
+    first = np.searchsorted(group, np.arange(n_groups))               # first row of every group
+    last = np.searchsorted(group, np.arange(n_groups), side="right")  # one past its last row
+    has = last > first
+    rng = np.random.default_rng(seed)
+    step = max(1, MAX_CELLS // r)
+    for j0 in range(0, b, step):
+        bb = min(step, b - j0)
+        w = rng.poisson(counts[None, :], size=(bb, r))
+        # one cumulative sum over all replicates; per (replicate, group) ranks become global offsets
+        cum = np.cumsum(w.ravel())
+        row0 = (np.arange(bb)[:, None] * r + first[None, :])[:, has]
+        rowe = (np.arange(bb)[:, None] * r + last[None, :] - 1)[:, has]
+        base = cum[row0] - w.ravel()[row0]
+        total = cum[rowe] - base
+        for i, q in enumerate(qs):
+            if q == "mean":
+                wv = (w * values[None, :]).ravel()
+                cum_v = np.cumsum(wv)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    v = (cum_v[rowe] - cum_v[row0] + wv[row0]) / total
+                out[i, has, j0:j0 + bb] = np.where(total > 0, v, np.nan).T
+                continue
+            h = (total - 1) * q
+            lo = np.floor(h)
+            hi = np.minimum(lo + 1, total - 1)
+            i_lo = np.searchsorted(cum, base + lo, side="right") % r
+            i_hi = np.searchsorted(cum, base + hi, side="right") % r
+            v = values[i_lo] + (h - lo) * (values[i_hi] - values[i_lo])
+            out[i, has, j0:j0 + bb] = np.where(total > 0, v, np.nan).T
+    return out
+
+
+def quantile_cis(hist, keys, col, qs, b=B, level=LEVEL, seed=SEED):
+    """{key tuple: [(low, high) per q]} from a value histogram with a count column."""
+    h = hist.groupby(keys + [col], as_index=False)["count"].sum().sort_values(keys + [col], ignore_index=True)
+    codes, uniq = pd.MultiIndex.from_frame(h[keys]).factorize()
+    reps = hist_reps(h[col].to_numpy(), h["count"].to_numpy(), codes, len(uniq), qs, b, seed)
+    lo, hi = interval(reps, level)
+    return {k: [(lo[i, g], hi[i, g]) for i in range(len(qs))] for g, k in enumerate(uniq)}
+
+
+def kpi_cis(key, groups, successes, trials, hist, col, b=B, level=LEVEL, seed=SEED):
+    """Intervals of the per-DVN KPI tables: delivered rate, median and p95 latency per group.
+
+    groups / successes / trials have one entry per group; hist is a (key, col, count) value histogram.
+    Returns key plus delivered_rate, median_latency and p95_latency _lo / _hi columns, sorted by
+    key, so tables built in a different row order get the same draws. Rates above 1 (more
+    delivered rows than messages) are capped at 1."""
+    f = pd.DataFrame({key: groups, "s": successes, "n": trials}).sort_values(key, ignore_index=True)
+    n = f["n"].to_numpy(dtype=np.int64)
+    lo, hi = interval(rate_reps(np.minimum(f["s"].to_numpy(dtype=np.int64), n), n, b, seed), level)
+    out = pd.DataFrame({key: f[key], "delivered_rate_lo": lo, "delivered_rate_hi": hi})
+    ci = quantile_cis(hist, [key], col, [0.5, 0.95], b, level, seed) if len(hist) else {}
+    none = [(np.nan, np.nan)] * 2
+    for i, name in enumerate(["median_latency", "p95_latency"]):
+        out[f"{name}_lo"] = [ci.get((k,), none)[i][0] for k in out[key]]
+        out[f"{name}_hi"] = [ci.get((k,), none)[i][1] for k in out[key]]
+    return out
+
+
+def with_cis(table, cis, key):
+    """table with the interval columns of cis merged in, each pair right after its KPI.
+
+    Intervals are left empty where the KPI itself is."""
+    out = table.merge(cis, on=key, how="left")
+    order = []
+    for c in table.columns:
+        pair = [x for x in (f"{c}_lo", f"{c}_hi") if x in cis.columns]
+        if pair:
+            out[pair] = out[pair].where(out[c].notna(), axis=0)
+        order += [c] + pair
+    return out[order]
+
+
+def mean_of_groups(reps, members, n_groups):
+    """(names, replicates) of the plain mean of member groups' statistics; members: name -> group codes.
+
+    reps has groups on its second-to-last axis; a NaN member makes the mean NaN."""
+    names = list(members)
+    m = np.zeros((len(names), n_groups))
+    for i, name in enumerate(names):
+        m[i, members[name]] = 1.0 / len(members[name])
+    out = np.einsum("dg,...gb->...db", m, np.nan_to_num(reps))
+    out[np.einsum("dg,...gb->...db", m > 0, np.isnan(reps)) > 0] = np.nan
+    return names, out
+
+
+def stack_cis(txs, qs, b=B, level=LEVEL, seed=SEED):
+    """CIs of per-stack latency statistics and of the per-DVN averages over the DVN's stacks.
+
+    txs has one row per message: Required_Stack ('A + B') and LATENCY_S. qs as in hist_reps.
+    Returns (per Required_Stack, per DVN_NAME) frames with (low, high) arrays per q: columns
+    lo_<i> / hi_<i> for qs[i]."""
+    h = (txs.dropna(subset=["LATENCY_S"]).groupby(["Required_Stack", "LATENCY_S"]).size()
+         .reset_index(name="count"))
+    codes, stacks = pd.factorize(h["Required_Stack"], sort=True)
+    reps = hist_reps(h["LATENCY_S"].to_numpy(), h["count"].to_numpy(), codes, len(stacks), qs, b, seed)
+    members = {}
+    for g, stack in enumerate(stacks):
+        for name in {n.strip() for n in stack.split("+") if n.strip()}:
+            members.setdefault(name, []).append(g)
+    names, dvn_reps = mean_of_groups(reps, members, len(stacks))
+    frames = []
+    for key, label, r in (("Required_Stack", stacks, reps), ("DVN_NAME", names, dvn_reps)):
+        lo, hi = interval(r, level)
+        f = pd.DataFrame({key: list(label)})
+        for i in range(len(qs)):
+            f[f"lo_{i}"], f[f"hi_{i}"] = lo[i], hi[i]
+        frames.append(f)
+    return frames[0], frames[1]
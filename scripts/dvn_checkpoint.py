@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# dvn_checkpoint.py
+# Chunk-level checkpoints for long expansion runs (expand_from_fees_then_join.py,
+# merge_expand_dvns_v2.py).
+#
+# A run processes its input in fixed row ranges ("chunks"). When a chunk is finished its
+# outputs (expanded rows, joined rows, partial aggregates) are written as part files into the
+# checkpoint directory and the chunk is recorded in manifest.json. Parts are written under a
+# temporary name and renamed, and the manifest is replaced after its parts, so after a crash
+# the manifest only lists complete chunks. A restart skips them and the final outputs are
+# assembled from the parts in chunk order, i.e. they are the same as for an uninterrupted run.
+#
+# The manifest keeps size and mtime of every input and the run parameters (chunk size, ...);
+# when any of them changed, the old parts are discarded and the run starts over.
+
+import io
+import os
+import json
+import time
+import shutil
+import hashlib
+from pathlib import Path
+import pandas as pd
+from pathways import hist_quantile
+
+MANIFEST = "manifest.json"
+VERSION = 1
+
+
+def fingerprint(paths):
+    out = []
+    for p in paths:
+        st = os.stat(p)
+        out.append({"path": str(Path(p).resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+    return out
+
+
+def consumed(path, records):
+    """(offset, hasher) of the part of an input already read, from records of earlier reads.
+
+    records hold {"offset", "sha256"} of the bytes consumed from some input (see input_record).
+    offset is the largest recorded one whose digest matches the first offset bytes of path (0
+    if none does), and hasher the running sha256 up to it. Being keyed on content, a touched
+    or renamed file is still known, and a file that grew is only read past what was consumed."""
+    size = os.path.getsize(path)
+    want = {}
+    for r in records:
+        if "sha256" in r and 0 < r["offset"] <= size:
+            want.setdefault(r["offset"], set()).add(r["sha256"])
+    h = hashlib.sha256()
+    best = (0, h.copy())
+    pos = 0
+    with open(path, "rb") as f:
+        for off in sorted(want):
+            while pos < off:
+                block = f.read(min(off - pos, 1 << 20))
+                if not block:
+                    break
+                h.update(block)
+                pos += len(block)
+            if h.hexdigest() in want[off]:
+                best = (off, h.copy())
+    return best
+
+
+def input_record(path, offset, hasher):
+    """Record of an input consumed up to offset, hasher holding the sha256 of those bytes."""
+    return {"path": str(Path(path).resolve()), "offset": offset, "sha256": hasher.hexdigest()}
+
+
+def add_record(records, start, start_hasher, record):
+    """records with the one a read from start extended (if any) replaced by record."""
+    old = start_hasher.hexdigest()
+    return [r for r in records if not (r.get("offset") == start and r.get("sha256") == old)] + [record]
+
+
+class NewBytes(io.RawIOBase):
+    """The header line of a CSV followed by its bytes [start, end), as one readable stream.
+
+    Every byte served from the consumed range is fed to hasher, so after reading to the end it
+    holds the digest of the first end bytes (pass the hasher consumed() returned for start).
+    With start 0 the header is part of that range. Wrap in io.BufferedReader for pandas."""
+
+    def __init__(self, path, start, end, hasher):
+        self.f = open(path, "rb")
+        self.head = self.f.readline() if start else b""
+        self.f.seek(start)
+        self.left = end - start
+        self.hasher = hasher
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self.head:
+            n = min(len(b), len(self.head))
+            b[:n] = self.head[:n]
+            self.head = self.head[n:]
+            return n
+        if self.left <= 0:
+            return 0
+        n = self.f.readinto(memoryview(b)[:min(len(b), self.left)])
+        self.hasher.update(memoryview(b)[:n])
+        self.left -= n
+        return n
+
+    def close(self):
+        self.f.close()
+        super().close()
+
+
+def write_csv_atomic(df, path):
+    """to_csv through a temp file + rename, so path is either complete or absent."""
+    tmp = Path(f"{path}.tmp")
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+class Checkpoint:
+    """Part files and manifest of one run in ckpt_dir."""
+
+    def __init__(self, ckpt_dir, inputs, params):
+        self.dir = Path(ckpt_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        key = {"version": VERSION, "inputs": fingerprint(inputs), "params": params}
+        path = self.dir / MANIFEST
+        old = json.loads(path.read_text()) if path.exists() else None
+        if old and all(old.get(k) == v for k, v in key.items()):
+            self.manifest = old
+            if old["chunks"]:
+                print(f"Resuming from {self.dir}: {len(old['chunks'])} chunk(s) already done")
+            return
+        if old:
+            print(f"Checkpoint in {self.dir} is for other inputs or parameters; starting over")
+        for p in self.dir.glob("*.csv*"):
+            p.unlink()
+        self.manifest = {**key, "chunks": {}}
+        self._write()
+
+    def _write(self):
+        path = self.dir / MANIFEST
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.manifest, indent=2))
+        os.replace(tmp, path)
+
+    def part(self, name, i):
+        return self.dir / f"{name}.{i:06d}.csv"
+
+    def done(self, i):
+        return str(i) in self.manifest["chunks"]
+
+    def save(self, i, frames, **meta):
+        """Write the part files of chunk i, then record it as done."""
+        for name, df in frames.items():
+            write_csv_atomic(df, self.part(name, i))
+        self.manifest["chunks"][str(i)] = {
+            "rows": {name: len(df) for name, df in frames.items()}, **meta,
+            "utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        self._write()
+
+    def parts(self, name):
+        return [self.part(name, int(i)) for i in sorted(self.manifest["chunks"], key=int)]
+
+    def read(self, name, **kw):
+        """All parts of one output as a single DataFrame (floats read back exactly)."""
+        frames = [pd.read_csv(p, float_precision="round_trip", **kw) for p in self.parts(name)]
+        return pd.concat(frames, ignore_index=True)
+
+    def concat(self, name, out_path):
+        """Concatenate the CSV parts of one output into out_path (one header)."""
+        tmp = Path(f"{out_path}.tmp")
+        with open(tmp, "wb") as out:
+            for n, p in enumerate(self.parts(name)):
+                with open(p, "rb") as f:
+                    header = f.readline()
+                    if n == 0:
+                        out.write(header)
+                    shutil.copyfileobj(f, out, 1 << 20)
+        os.replace(tmp, out_path)
+        return out_path
+
+    def remove(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def value_hist(df, keys, col):
+    """Mergeable partial for exact quantiles: count of every (keys, value) with a value."""
+    d = df[keys + [col]].dropna(subset=[col])
+    return d.groupby(keys + [col]).size().reset_index(name="count")
+
+
+def hist_quantiles(hist, keys, col, qs):
+    """{key tuple: [quantiles]} from merged value histograms (same values as pandas quantile)."""
+    hist = hist.groupby(keys + [col], as_index=False)["count"].sum()
+    out = {}
+    for k, h in hist.groupby(keys):
+        v, c = h[col].to_numpy(), h["count"].to_numpy()
+        out[k] = [hist_quantile(v, c, q) for q in qs]
+    return out
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# dvn_cube.py
+# Aggregate cube over hour x DVN x role x required stack x status, built from dt_clean.csv exports.
+#
+# Cells are keyed by
+#   GRAIN     "dvn" (one count per message and DVN) or "message" (one count per message;
+#             DVN_NAME and ROLE are empty)
+#   DAY, HOUR source timestamp in UTC, hour granularity
+#   DVN_NAME, ROLE, STACK (required stack of the message, 'A + B'), STATUS (MESSAGESTATUS)
+# and hold additive measures: messages, delivered, fees_eth. Latency is kept as an integer-second
+# histogram per cell (latency_hist.csv: CELL = row of cells.csv, LATENCY_S, count), the same
+# mergeable partial as pathways.py uses, so any slice or roll-up gets exact median / p95 by adding
+# histogram counts.
+#
+# build appends: the cells of new exports are added to the existing cube, nothing is rebuilt.
+# cube.json lists how many bytes of each ingested export were read and their sha256
+# (dvn_checkpoint.consumed): a touched or copied export is skipped and a grown one only adds the
+# lines past that offset. Appended exports must not repeat messages (run dedup_guids.py on
+# overlapping exports first).
+#
+# query answers a slice from the cube only, e.g.
+#   --by DAY,DVN_NAME --where ROLE=required --from 2025-10-19 --to 2025-10-21
+#
+# Usage:
+#   python3 scripts/dvn_cube.py build <dt_clean.csv>[,more.csv] [--cube cube] [--names dvnNames-Sheet2.csv] [--rebuild]
+#   python3 scripts/dvn_cube.py query [--cube cube] [--by DAY,DVN_NAME] [--grain dvn|message]
+#                                     [--where ROLE=required,STATUS=DELIVERED] [--from DAY] [--to DAY] [--out slice.csv]
+
+import io
+import json
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dvn_instrument import stage
+from dvn_io import read_export, unwrap, explode_dvns, parse_timestamps, dvn_names, NAMES_CSV
+from dvn_checkpoint import consumed, input_record, add_record, NewBytes, write_csv_atomic
+from pathways import required_stack
+
+CUBE_DIR = "cube"
+CELLS_FILE = "cells.csv"
+HIST_FILE = "latency_hist.csv"
+MANIFEST = "cube.json"
+CHUNK_ROWS = 500_000
+USECOLS = ["GUID", "SOURCETIMESTAMP", "REQUIREDDVNS", "OPTIONALDVNS", "DVN_FEES_ARRAY", "MESSAGESTATUS",
+           "LATENCYTODELIVERY_SECONDS"]
+DIMS = ["GRAIN", "DAY", "HOUR", "DVN_NAME", "ROLE", "STACK", "STATUS"]
+SUMS = ["messages", "delivered", "fees_eth"]
+
+
+# ---------- cells ----------
+
+def chunk_cells(chunk, names):
+    """(cells, histogram) for one chunk of an export."""
+    ts = parse_timestamps(chunk["SOURCETIMESTAMP"])
+    status = unwrap(chunk["MESSAGESTATUS"]).str.upper()
+    msg = pd.DataFrame({
+        "DAY": ts.dt.strftime("%Y-%m-%d").fillna("").to_numpy(dtype=object),
+        "HOUR": ts.dt.hour.fillna(-1).astype(np.int64).to_numpy(),
+        "STACK": required_stack(chunk["REQUIREDDVNS"], names).to_numpy(),
+        "STATUS": status.to_numpy(),
+        "delivered": (status == "DELIVERED").astype(np.int64).to_numpy(),
+        "LATENCY_S": pd.to_numeric(unwrap(chunk["LATENCYTODELIVERY_SECONDS"]), errors="coerce").round().to_numpy(),
+    })
+
+    per_dvn = explode_dvns(chunk, names).join(msg, on="row")
+    per_dvn["GRAIN"] = "dvn"
+    per_msg = msg.assign(GRAIN="message", DVN_NAME="", ROLE="", fees_eth=0.0)
+    # a message's fees are the sum over its DVNs
+    per_msg["fees_eth"] = np.bincount(per_dvn["row"], weights=per_dvn["fees_eth"], minlength=len(msg))
+
+    cols = DIMS + ["delivered", "fees_eth", "LATENCY_S"]
+    rows = pd.concat([per_dvn[cols], per_msg[cols]], ignore_index=True)
+    rows["messages"] = 1
+    cells = rows.groupby(DIMS, as_index=False)[SUMS].sum()
+    hist = (rows.dropna(subset=["LATENCY_S"]).groupby(DIMS + ["LATENCY_S"], as_index=False).size()
+            .rename(columns={"size": "count"}))
+    hist["LATENCY_S"] = hist["LATENCY_S"].astype(np.int64)
+    return cells, hist
+
+
+def merge_cells(cells, hists, keys=DIMS):
+    """Add up cells (and histogram counts) with the same key."""
+    cell = pd.concat(cells, ignore_index=True).groupby(keys, as_index=False)[SUMS].sum()
+    hist = pd.concat(hists, ignore_index=True).groupby(keys + ["LATENCY_S"], as_index=False)["count"].sum()
+    return cell, hist
+
+
+def quantiles(group, values, counts, n_groups, qs):
+    """Linear-interpolated quantiles (one array per q) of the histogram of every group 0..n_groups-1.
+
+    Same values as hist_quantile (pandas / NumPy quantiles of the raw latencies), for all groups at
+    once: bins are sorted by (group, value) and ranks are looked up in one cumulative count.
+    Groups without bins get NaN.
+    """
+    order = np.lexsort((values, group))
+    values, counts = values[order].astype(np.float64), counts[order]
+    cum = np.cumsum(counts)
+    n = np.bincount(group[order], weights=counts, minlength=n_groups).astype(np.int64)
+    base = np.cumsum(n) - n
+    has = n > 0
+    out = []
+    for q in qs:
+        pos = (n - 1) * q
+        lo = np.floor(pos)
+        i_lo = np.searchsorted(cum, base + lo, side="right")
+        i_hi = np.searchsorted(cum, base + np.minimum(lo + 1, n - 1), side="right")
+        i_lo, i_hi = np.minimum(i_lo, len(values) - 1), np.minimum(i_hi, len(values) - 1)
+        v = values[i_lo] + (pos - lo) * (values[i_hi] - values[i_lo]) if len(values) else np.zeros(n_groups)
+        out.append(np.where(has, v, np.nan))
+    return out
+
+
+# ---------- cube on disk ----------
+
+class Cube:
+    """cells.csv, latency_hist.csv and cube.json of one cube directory.
+
+    On disk and in memory the histogram refers to cells by row number (CELL), so it carries no
+    dimension columns; a slice maps its cell groups onto the bins with one array lookup.
+    """
+
+    def __init__(self, cube_dir=CUBE_DIR):
+        self.dir = Path(cube_dir)
+        self.cells = pd.DataFrame(columns=DIMS + SUMS)
+        self.hist = pd.DataFrame({"CELL": [], "LATENCY_S": [], "count": []}, dtype=np.int64)
+        self.inputs = []
+        if (self.dir / MANIFEST).exists():
+            self.inputs = json.loads((self.dir / MANIFEST).read_text())["inputs"]
+            dtypes = {c: str for c in DIMS if c != "HOUR"}
+            self.cells = pd.read_csv(self.dir / CELLS_FILE, dtype=dtypes, keep_default_na=False)
+            # few distinct values per dimension: categories make the masks and group-bys of a slice cheap
+            self.cells = self.cells.astype({c: "category" for c in dtypes if c != "DAY"})
+            self.hist = pd.read_csv(self.dir / HIST_FILE, dtype=np.int64)
+
+    def ingested(self, path):
+        """(offset, hasher) of the part of path already in the cube."""
+        return consumed(path, self.inputs)
+
+    def append(self, cells, hist):
+        """Add cells and a histogram keyed by DIMS (as chunk_cells returns them)."""
+        old = self.hist.join(self.cells[DIMS], on="CELL").drop(columns="CELL")
+        cells, hist = merge_cells([self.cells, cells], [old, hist])
+        self.cells = cells.sort_values(DIMS, ignore_index=True)
+        cell_ids = self.cells[DIMS].assign(CELL=np.arange(len(self.cells)))
+        self.hist = hist.merge(cell_ids, on=DIMS)[["CELL", "LATENCY_S", "count"]].sort_values(
+            ["CELL", "LATENCY_S"], ignore_index=True)
+
+    def save(self):
+        # cells and histogram first, the manifest last: an interrupted save leaves the old manifest
+        self.dir.mkdir(parents=True, exist_ok=True)
+        write_csv_atomic(self.cells, self.dir / CELLS_FILE)
+        write_csv_atomic(self.hist, self.dir / HIST_FILE)
+        tmp = self.dir / f"{MANIFEST}.tmp"
+        tmp.write_text(json.dumps({"dims": DIMS, "measures": SUMS, "inputs": self.inputs}, indent=1))
+        tmp.replace(self.dir / MANIFEST)
+
+    def _mask(self, where, day_from, day_to, grain):
+        df = self.cells
+        m = (df["GRAIN"] == grain).to_numpy()
+        for col, value in where.items():
+            m = m & (df[col].astype(str) == value).to_numpy()
+        if day_from:
+            m = m & (df["DAY"] >= day_from).to_numpy()
+        if day_to:
+            m = m & ((df["DAY"] <= day_to) & (df["DAY"] != "")).to_numpy()
+        return m
+
+    def slice(self, by, where=None, day_from=None, day_to=None, grain="dvn"):
+        """Sums, delivery rate, median and p95 latency per group of the by dimensions."""
+        m = self._mask(where or {}, day_from, day_to, grain)
+        cells = self.cells[m]
+        if by:
+            g = cells.groupby(by, sort=True)
+            out = g[SUMS].sum().reset_index()
+            gid = g.ngroup().to_numpy()
+        else:
+            out = pd.DataFrame({c: [cells[c].sum()] for c in SUMS})
+            gid = np.zeros(len(cells), dtype=np.int64)
+        cell_group = np.full(len(self.cells), -1, dtype=np.int64)
+        cell_group[np.flatnonzero(m)] = gid
+        bins = cell_group[self.hist["CELL"].to_numpy()]
+        keep = bins >= 0
+        med, p95 = quantiles(bins[keep], self.hist["LATENCY_S"].to_numpy()[keep],
+                             self.hist["count"].to_numpy()[keep], len(out), [0.5, 0.95])
+        out["delivery_rate"] = (out["delivered"] / out["messages"]).round(4)
+        out["median_latency"] = med
+        out["p95_latency"] = p95
+        return out
+
+
+def build(paths, cube_dir, names_csv=NAMES_CSV, chunk_rows=CHUNK_ROWS, rebuild=False):
+    """Add the cells of every new export to the cube."""
+    names = dvn_names(names_csv)
+    if rebuild and (Path(cube_dir) / MANIFEST).exists():
+        (Path(cube_dir) / MANIFEST).unlink()
+    cube = Cube(cube_dir)
+    for path in paths:
+        size = Path(path).stat().st_size
+        start, hasher = cube.ingested(path)
+        if start == size:
+            print("Already in cube, skipped:", path)
+            continue
+        if start:
+            print(f"{path}: {start} bytes already in cube, adding the rest")
+        read = hasher.copy()
+        cells, hists = [], []
+        n = 0
+        with stage("cube_build", inputs=[path]) as ev, io.BufferedReader(NewBytes(path, start, size, read)) as f:
+            for chunk in read_export(f, usecols=lambda c: c in USECOLS, chunksize=chunk_rows):
+                c, h = chunk_cells(chunk.reset_index(drop=True), names)
+                cells.append(c)
+                hists.append(h)
+                n += len(chunk)
+                # fold as we go so memory is bounded by the number of cells, not rows
+                if len(cells) > 8:
+                    c, h = merge_cells(cells, hists)
+                    cells, hists = [c], [h]
+            if cells:
+                cube.append(*merge_cells(cells, hists))
+            cube.inputs = add_record(cube.inputs, start, hasher, input_record(path, size, read))
+            ev.rows_in, ev.rows_out = n, len(cube.cells)
+        print(f"{path}: {n} messages")
+    cube.save()
+    print(f"Saved: {cube.dir} ({len(cube.cells)} cells, {len(cube.hist)} histogram bins, "
+          f"{len(cube.inputs)} inputs)")
+    return cube
+
+
+def parse_where(text):
+    where = {}
+    for item in filter(None, (text or "").split(",")):
+        col, _, value = item.partition("=")
+        col = col.strip().upper()
+        if col not in DIMS:
+            raise SystemExit(f"Unknown dimension in --where: {col} (one of {', '.join(DIMS)})")
+        where[col] = value.strip().upper() if col == "STATUS" else value.strip()
+    return where
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Hour x DVN x role x stack x status cube with mergeable latency histograms.")
+    ap.add_argument("command", choices=["build", "query"])
+    ap.add_argument("inputs", nargs="?", default="", help="build: comma-separated dt_clean.csv exports")
+    ap.add_argument("--cube", default=CUBE_DIR, help="cube directory")
+    ap.add_argument("--names", default=str(NAMES_CSV), help="DVN names CSV")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    ap.add_argument("--rebuild", action="store_true", help="build: start a new cube instead of appending")
+    ap.add_argument("--by", default="DVN_NAME", help="query: comma-separated dimensions to group by ('' for totals)")
+    ap.add_argument("--grain", choices=["dvn", "message"], default="dvn",
+                    help="query: count per (message, DVN) or per message")
+    ap.add_argument("--where", default="", help="query: filters, e.g. ROLE=required,STATUS=DELIVERED")
+    ap.add_argument("--from", dest="day_from", default=None, help="query: first day (YYYY-MM-DD)")
+    ap.add_argument("--to", dest="day_to", default=None, help="query: last day, inclusive")
+    ap.add_argument("--out", default=None, help="query: write the slice to this CSV")
+    args = ap.parse_args()
+
+    if args.command == "build":
+        paths = [p for p in args.inputs.split(",") if p]
+        if not paths:
+            ap.error("build needs at least one export")
+        build(paths, args.cube, args.names, args.chunk_rows, args.rebuild)
+        return
+    if not (Path(args.cube) / MANIFEST).exists():
+        raise SystemExit(f"No cube in {args.cube}; run build first")
+    by = [c.strip().upper() for c in args.by.split(",") if c.strip()]
+    unknown = [c for c in by if c not in DIMS]
+    if unknown:
+        ap.error(f"unknown dimension(s) {', '.join(unknown)} (one of {', '.join(DIMS)})")
+    if args.grain == "message" and {"DVN_NAME", "ROLE"} & (set(by) | set(parse_where(args.where))):
+        ap.error("DVN_NAME and ROLE are not dimensions of the message grain")
+    cube = Cube(args.cube)
+    with stage("cube_query", rows_in=len(cube.cells)) as ev:
+        out = cube.slice(by, parse_where(args.where), args.day_from, args.day_to, args.grain)
+        ev.rows_out = len(out)
+    if args.out:
+        out.to_csv(args.out, index=False)
+        print("Saved:", args.out)
+    else:
+        print(out.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
 from textwrap import shorten
+from dvn_instrument import stage
 
 # --- CONFIG ---
 OUT_LATENCY_FEES = "chart_latency_vs_fees_fixed_precision.png"
@@ -92,34 +93,35 @@ plot_df = plot_df.dropna(subset=['median_latency', 'total_fees_eth'])
 if plot_df.empty:
     print("No numeric median_latency + total_fees_eth rows found — skipping latency vs fees chart.")
 else:
-    # ensure ordering for consistent color assignment by stack if available
-    # sizes: scale by required_count for visibility
-    sizes = ((plot_df['required_count'].fillna(0).astype(float) + 1.0) * 60).clip(lower=20, upper=2000)
-
-    fig, ax = plt.subplots(figsize=(10,6))
-    sc = ax.scatter(plot_df['total_fees_eth'], plot_df['median_latency'],
-                    s=sizes, alpha=0.75, edgecolor='k', linewidth=0.3)
-
-    # labels & formatters
-    ax.set_xlabel('Total fees (ETH)')
-    ax.set_ylabel('Median latency (s)')
-    ax.set_title('DVN — total fees (ETH) vs median latency (s)')
-
-    # show more precision on x-axis (fees)
-    ax.xaxis.set_major_formatter(mtick.FormatStrFormatter('%.8f'))
-    ax.yaxis.set_major_formatter(mtick.FormatStrFormatter('%.1f'))
-
-    # annotate points; offset labels slightly to reduce overlap
-    for _, row in plot_df.iterrows():
-        x = row['total_fees_eth']
-        y = row['median_latency']
-        name = str(row['DVN_NAME'])
-        # small x offset to avoid covering the bubble
-        ax.text(x * 1.0006 if x!=0 else 0.0000001, y + 0.6, shorten(name, 24), fontsize=8, ha='left', va='bottom')
-
-    plt.tight_layout()
-    plt.savefig(OUT_LATENCY_FEES, dpi=200)
-    print("Saved:", OUT_LATENCY_FEES)
+    with stage("chart_latency_vs_fees", rows_in=len(plot_df)):
+        # ensure ordering for consistent color assignment by stack if available
+        # sizes: scale by required_count for visibility
+        sizes = ((plot_df['required_count'].fillna(0).astype(float) + 1.0) * 60).clip(lower=20, upper=2000)
+
+        fig, ax = plt.subplots(figsize=(10,6))
+        sc = ax.scatter(plot_df['total_fees_eth'], plot_df['median_latency'],
+                        s=sizes, alpha=0.75, edgecolor='k', linewidth=0.3)
+
+        # labels & formatters
+        ax.set_xlabel('Total fees (ETH)')
+        ax.set_ylabel('Median latency (s)')
+        ax.set_title('DVN — total fees (ETH) vs median latency (s)')
+
+        # show more precision on x-axis (fees)
+        ax.xaxis.set_major_formatter(mtick.FormatStrFormatter('%.8f'))
+        ax.yaxis.set_major_formatter(mtick.FormatStrFormatter('%.1f'))
+
+        # annotate points; offset labels slightly to reduce overlap
+        for _, row in plot_df.iterrows():
+            x = row['total_fees_eth']
+            y = row['median_latency']
+            name = str(row['DVN_NAME'])
+            # small x offset to avoid covering the bubble
+            ax.text(x * 1.0006 if x!=0 else 0.0000001, y + 0.6, shorten(name, 24), fontsize=8, ha='left', va='bottom')
+
+        plt.tight_layout()
+        plt.savefig(OUT_LATENCY_FEES, dpi=200)
+        print("Saved:", OUT_LATENCY_FEES)
 
 # --------------------
 # Chart 2: required vs optional breakdown (top 20 by required_count)
@@ -178,16 +180,17 @@ else:
     if top.empty:
         print("Req/Opt table empty after sorting — skipping chart.")
     else:
-        fig, ax = plt.subplots(figsize=(12,6))
-        # stacked bar: required bottom, optional on top
-        ax.bar(top.index, top['required_count'], label='Required')
-        ax.bar(top.index, top['optional_count'], bottom=top['required_count'], label='Optional')
-        ax.set_ylabel('Message Count')
-        ax.set_title('DVN Roles Count (Required vs Optional) - Top 20 by required count')
-        ax.set_xticklabels(top.index, rotation=45, ha='right', fontsize=9)
-        ax.legend()
-        plt.tight_layout()
-        plt.savefig(OUT_REQ_OPT, dpi=200)
-        print("Saved:", OUT_REQ_OPT)
+        with stage("chart_required_optional", rows_in=len(top)):
+            fig, ax = plt.subplots(figsize=(12,6))
+            # stacked bar: required bottom, optional on top
+            ax.bar(top.index, top['required_count'], label='Required')
+            ax.bar(top.index, top['optional_count'], bottom=top['required_count'], label='Optional')
+            ax.set_ylabel('Message Count')
+            ax.set_title('DVN Roles Count (Required vs Optional) - Top 20 by required count')
+            ax.set_xticklabels(top.index, rotation=45, ha='right', fontsize=9)
+            ax.legend()
+            plt.tight_layout()
+            plt.savefig(OUT_REQ_OPT, dpi=200)
+            print("Saved:", OUT_REQ_OPT)
 
 print("Done.")
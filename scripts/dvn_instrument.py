@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# dvn_instrument.py
+# Per-stage instrumentation shared by the pipeline scripts.
+#
+#   from dvn_instrument import stage
+#   with stage("explode", rows_in=len(fees), inputs=[FEES_CSV]) as ev:
+#       expanded = ...
+#       ev.rows_out = len(expanded)
+#
+# Every stage appends one JSON line with wall/CPU time, rows in/out, bytes read,
+# peak RSS and cache hits. A summary table of the run is printed at exit.
+#
+# Environment:
+#   DVN_EVENTS       events file (default dvn_events.jsonl; "-" = stderr, "off" = disabled)
+#   DVN_RUN_ID       groups events from several processes into one run (default: <utc time>-<pid>)
+#   DVN_PROFILE=1    cProfile every outermost stage, dump to <DVN_PROFILE_DIR>/<script>.<stage>.prof
+#                    (nested stages show up in their parent's profile; one profiler runs at a time)
+#   DVN_TRACEMALLOC=1  record tracemalloc peak and top allocation sites per stage (nested stages
+#                    count towards the peak of every stage around them)
+#   DVN_SUMMARY=0    do not print the summary table at exit
+#
+# Usage (summary of an existing events file):
+#   python3 scripts/dvn_instrument.py [dvn_events.jsonl] [run_id|all]
+
+import os
+import sys
+import json
+import time
+import atexit
+import resource
+from pathlib import Path
+
+EVENTS_PATH = os.environ.get("DVN_EVENTS", "dvn_events.jsonl")
+RUN_ID = os.environ.get("DVN_RUN_ID") or f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{os.getpid()}"
+PROFILE = os.environ.get("DVN_PROFILE", "") not in ("", "0")
+PROFILE_DIR = Path(os.environ.get("DVN_PROFILE_DIR", "."))
+TRACEMALLOC = os.environ.get("DVN_TRACEMALLOC", "") not in ("", "0")
+SCRIPT = Path(sys.argv[0]).stem if sys.argv and sys.argv[0] else "interactive"
+
+_events = []      # events emitted by this process, for the exit summary
+_open = []        # stack of open stages (for parent names)
+_summary_registered = False
+
+
+def peak_rss_mb():
+    # VmHWM belongs to this process's address space; ru_maxrss also counts the parent's high-water
+    # mark inherited through fork (before exec)
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(r / (1024.0 * 1024.0) if sys.platform == "darwin" else r / 1024.0, 1)
+
+
+def _emit(event):
+    if EVENTS_PATH == "off":
+        return
+    line = json.dumps(event, default=str)
+    if EVENTS_PATH == "-":
+        print(line, file=sys.stderr)
+        return
+    with open(EVENTS_PATH, "a") as f:
+        f.write(line + "\n")
+
+
+class Stage:
+    """Context manager for one pipeline stage. Set rows_out / add bytes_read, cache_hits while it runs."""
+
+    def __init__(self, name, rows_in=None, inputs=None, **extra):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.bytes_read = sum(os.path.getsize(p) for p in (inputs or []) if os.path.exists(p))
+        self.cache_hits = 0
+        self.extra = extra
+        self._prof = None
+        self._peak = 0
+
+    def add_input(self, path):
+        """Count a file towards bytes_read and return it unchanged (for inline use in read calls)."""
+        if os.path.exists(path):
+            self.bytes_read += os.path.getsize(path)
+        return path
+
+    def __enter__(self):
+        self.parent = _open[-1].name if _open else None
+        if TRACEMALLOC:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+            _fold_peak()      # keep the peak so far of the open stages before resetting it for this one
+            tracemalloc.reset_peak()
+            self._snap = tracemalloc.take_snapshot()
+        profiling = any(s._prof is not None for s in _open)
+        _open.append(self)
+        if PROFILE and not profiling:
+            import cProfile
+            self._prof = cProfile.Profile()
+            self._prof.enable()
+        self._t0 = time.perf_counter()
+        self._c0 = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._t0
+        cpu = time.process_time() - self._c0
+        if self._prof is not None:
+            self._prof.disable()
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            self._prof.dump_stats(str(PROFILE_DIR / f"{SCRIPT}.{self.name}.prof"))
+        event = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "run_id": RUN_ID,
+            "script": SCRIPT,
+            "stage": self.name,
+            "parent": self.parent,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "bytes_read": self.bytes_read,
+            "peak_rss_mb": peak_rss_mb(),
+            "cache_hits": self.cache_hits,
+            "status": "ok" if exc_type is None else f"error:{exc_type.__name__}",
+        }
+        if TRACEMALLOC:
+            import tracemalloc
+            _fold_peak()
+            event["tracemalloc_peak_mb"] = round(self._peak / (1024.0 * 1024.0), 1)
+            skip = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            snap = tracemalloc.take_snapshot().filter_traces(skip)
+            top = snap.compare_to(self._snap.filter_traces(skip), "lineno")[:5]
+            event["tracemalloc_top"] = [f"{s.traceback[0].filename}:{s.traceback[0].lineno} +{s.size_diff // 1024}KiB"
+                                        for s in top]
+        if self.extra:
+            event.update(self.extra)
+        _open.pop()
+        _events.append(event)
+        _emit(event)
+        _register_summary()
+        return False
+
+
+def _fold_peak():
+    """Fold tracemalloc's peak since the last reset into every open stage."""
+    import tracemalloc
+    _, peak = tracemalloc.get_traced_memory()
+    for s in _open:
+        s._peak = max(s._peak, peak)
+
+
+def stage(name, rows_in=None, inputs=None, **extra):
+    return Stage(name, rows_in=rows_in, inputs=inputs, **extra)
+
+
+def format_table(events):
+    """Aggregate events by (script, stage) and render where the time went."""
+    rows = {}
+    for e in events:
+        k = (e.get("script"), e.get("stage"))
+        r = rows.setdefault(k, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "rows_in": 0, "rows_out": 0,
+                                "bytes_read": 0, "peak_rss_mb": 0.0, "cache_hits": 0, "nested": bool(e.get("parent"))})
+        r["calls"] += 1
+        for f in ("wall_s", "cpu_s", "rows_in", "rows_out", "bytes_read", "cache_hits"):
+            r[f] += e.get(f) or 0
+        r["peak_rss_mb"] = max(r["peak_rss_mb"], e.get("peak_rss_mb") or 0.0)
+    total = sum(r["wall_s"] for r in rows.values() if not r["nested"]) or 1.0
+    lines = [f"{'script':<28} {'stage':<22} {'calls':>5} {'wall_s':>9} {'%':>6} {'cpu_s':>9} "
+             f"{'rows_in':>11} {'rows_out':>11} {'MB_read':>9} {'peak_MB':>8} {'cache':>6}"]
+    for (script, name), r in sorted(rows.items(), key=lambda kv: -kv[1]["wall_s"]):
+        pct = "" if r["nested"] else f"{100.0 * r['wall_s'] / total:5.1f}"
+        label = ("  " + name) if r["nested"] else name
+        lines.append(f"{str(script)[:28]:<28} {str(label)[:22]:<22} {r['calls']:>5} {r['wall_s']:>9.3f} {pct:>6} "
+                     f"{r['cpu_s']:>9.3f} {r['rows_in']:>11} {r['rows_out']:>11} "
+                     f"{r['bytes_read'] / 1e6:>9.1f} {r['peak_rss_mb']:>8.1f} {r['cache_hits']:>6}")
+    return "\n".join(lines)
+
+
+def summary():
+    if _events:
+        print(f"\nStage summary (run {RUN_ID}):")
+        print(format_table(_events))
+
+
+def _register_summary():
+    global _summary_registered
+    if not _summary_registered and os.environ.get("DVN_SUMMARY", "1") != "0":
+        atexit.register(summary)
+        _summary_registered = True
+
+
+def load_events(path, run_id=None):
+    events = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                events.append(json.loads(line))
+    if run_id == "all":
+        return events
+    if run_id is None and events:
+        run_id = events[-1].get("run_id")
+    return [e for e in events if e.get("run_id") == run_id]
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else EVENTS_PATH
+    run = sys.argv[2] if len(sys.argv) > 2 else None
+    if not os.path.exists(path):
+        print(f"Usage: python3 scripts/dvn_instrument.py [events.jsonl] [run_id|all]  ({path} not found)")
+        sys.exit(1)
+    events = load_events(path, run)
+    print(f"{len(events)} events from {path}" + (f" (run {events[-1]['run_id']})" if events and run != "all" else ""))
+    print(format_table(events))
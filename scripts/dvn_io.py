@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# dvn_io.py
+# Shared readers for the Flipside exports.
+#
+# Exports from json-to-csv.js wrap every cell in an Excel formula (="...") and write
+# arrays as [ a;b;c ]. The helpers below undo both for a whole column at once, so
+# callers never apply a per-row Python function.
+
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from payload_decode import payload_chars
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+NAMES_CSV = REPO_ROOT / "dvnNames-Sheet2.csv"
+NA_VALUES = ["", "NA", "N/A"]
+
+# LayerZero v2 endpoint ids of the chains we monitor
+CHAIN_NAMES = {
+    30101: "Ethereum", 30102: "BSC", 30106: "Avalanche", 30109: "Polygon",
+    30110: "Arbitrum", 30111: "Optimism", 30184: "Base",
+}
+
+
+def read_export(path, usecols=None, chunksize=None):
+    """Read a Flipside CSV export as strings (wrappers kept; see unwrap)."""
+    return pd.read_csv(path, dtype=str, keep_default_na=False, na_values=NA_VALUES,
+                       usecols=usecols, chunksize=chunksize)
+
+
+def _per_unique(s, fn):
+    """Apply a vectorized string transform to the distinct values of s only and map back.
+
+    Most columns repeat a handful of values (stacks, statuses, endpoint ids), so this
+    turns millions of string operations into a few dozen."""
+    codes, uniq = pd.factorize(s)
+    out = fn(pd.Series(uniq, dtype=object)).to_numpy(dtype=object)
+    return pd.Series(np.append(out, "")[codes], index=s.index)    # code -1 (null) -> ""
+
+
+def _unwrap(s):
+    return s.astype(str).str.strip().str.lstrip("=").str.strip('"').str.strip()
+
+
+def unwrap(s):
+    """Strip the ="..." Excel wrapper and surrounding whitespace from a column."""
+    return _per_unique(s, _unwrap)
+
+
+# timestamp layouts seen in the exports and older copies; the ISO ones (numpy=True) are parsed by
+# NumPy's datetime64 reader once the suffix is cut off
+TS_FORMATS = [
+    # (strptime format, suffix, numpy)
+    ("%Y-%m-%dT%H:%M:%S.%fZ", "Z", True),         # Flipside: 2025-10-25T15:10:43.000Z
+    ("%Y-%m-%dT%H:%M:%SZ", "Z", True),
+    ("%Y-%m-%d %H:%M:%S.%f UTC", " UTC", True),
+    ("%Y-%m-%d %H:%M:%S UTC", " UTC", True),
+    ("%Y-%m-%dT%H:%M:%S.%f", "", True),
+    ("%Y-%m-%dT%H:%M:%S", "", True),
+    ("%Y-%m-%d %H:%M:%S.%f", "", True),
+    ("%Y-%m-%d %H:%M:%S", "", True),
+    ("%Y-%m-%d", "", True),
+    ("%Y-%m-%dT%H:%M:%S.%f%z", "", False),
+    ("%Y-%m-%dT%H:%M:%S%z", "", False),
+    ("%b %d, %Y", "", False),
+]
+
+
+def infer_ts_format(sample):
+    """First TS_FORMATS entry that parses every value of a sample of cleaned cells (None if none does)."""
+    sample = pd.Series(sample, dtype=object)
+    sample = sample[sample.notna() & (sample != "")]
+    if len(sample) == 0:
+        return None
+    for fmt in TS_FORMATS:
+        if pd.to_datetime(sample, format=fmt[0], errors="coerce").notna().all():
+            return fmt
+    return None
+
+
+def parse_timestamps(s, sample_size=1000):
+    """Timestamp cells (wrapped or not) of a column -> datetime64 UTC, NaT where unparseable.
+
+    The format is inferred from a sample, then the whole column is parsed in one vectorized
+    call. Only the cells that call cannot parse are re-parsed with format="mixed"."""
+    present = s[s.notna() & (s != "")]
+    sample = present.iloc[:sample_size]
+    fmt = infer_ts_format(_unwrap(sample))
+    if fmt is not None and fmt[2]:
+        # fast path: cut wrapper (per cell: wrapped and bare cells can mix) and suffix by position,
+        # NumPy parses ISO text directly
+        try:
+            wrapped = present.to_numpy(dtype=object).astype("S2") == b'="'
+        except UnicodeEncodeError:
+            wrapped = present.str.startswith('="').to_numpy()
+        cut = len(fmt[1])
+        if wrapped.all():
+            text = present.str.slice(2, -(cut + 1))
+        else:
+            text = present.str.slice(0, -cut if cut else None)
+            if wrapped.any():
+                text[wrapped] = present[wrapped].str.slice(2, -(cut + 1))
+        try:
+            values = np.array(text.to_numpy(dtype=object), dtype="datetime64[us]")
+            out = pd.Series(pd.NaT, index=s.index, dtype="datetime64[us]")
+            out[present.index] = values
+            return out.dt.tz_localize("UTC")
+        except ValueError:
+            pass    # a cell in another layout: the general path below
+    clean = unwrap(s).where(s.notna())
+    if fmt is None:
+        return pd.to_datetime(clean, errors="coerce", utc=True, format="mixed")
+    out = pd.to_datetime(clean, errors="coerce", utc=True, format=fmt[0])
+    bad = out.isna() & clean.notna() & (clean != "")
+    if bad.any():
+        out[bad] = pd.to_datetime(clean[bad], errors="coerce", utc=True, format="mixed")
+    return out
+
+
+def explode_array(s, name="value"):
+    """One row per array element: columns row (position of the source row), pos, <name> (lower-cased).
+
+    Arrays are parsed once per distinct cell, then repeated for every row holding that cell.
+    Empty arrays produce no rows."""
+    codes, uniq = pd.factorize(s)
+    # elements (addresses, wei amounts) never contain spaces, so drop them before splitting
+    lists = _unwrap(pd.Series(uniq, dtype=object)).str.replace(" ", "").str.strip("[]").str.lower().str.split(";")
+    ex = pd.DataFrame({"u": range(len(lists)), name: lists.to_numpy()}).explode(name)
+    ex["pos"] = ex.groupby("u").cumcount()
+    ex = ex[ex[name].notna() & (ex[name] != "")]
+    u = ex["u"].to_numpy(dtype=np.int64)
+    cnt = np.bincount(u, minlength=len(uniq))
+    start = np.cumsum(cnt) - cnt
+    rows = np.flatnonzero(codes >= 0)
+    k = cnt[codes[rows]]
+    first = np.repeat(np.cumsum(k) - k, k)
+    idx = np.repeat(start[codes[rows]], k) + (np.arange(k.sum()) - first)
+    return pd.DataFrame({"row": np.repeat(rows, k), "pos": ex["pos"].to_numpy()[idx],
+                         name: ex[name].to_numpy()[idx]})
+
+
+def explode_dvns(chunk, names):
+    """One row per (message, DVN) of an export chunk with a RangeIndex.
+
+    Columns: row, pos, addr, ROLE, DVN_NAME (address when unnamed), fees_eth. Fees are positional
+    over required + optional, as in DVN_FEES_ARRAY."""
+    req = explode_array(chunk["REQUIREDDVNS"], "addr").assign(ROLE="required")
+    n_req = np.bincount(req["row"].to_numpy(), minlength=len(chunk))
+    opt = explode_array(chunk["OPTIONALDVNS"], "addr").assign(ROLE="optional")
+    opt["pos"] += n_req[opt["row"].to_numpy()]
+    fees = explode_array(chunk["DVN_FEES_ARRAY"], "fee")
+    per_dvn = pd.concat([req, opt], ignore_index=True).merge(fees, on=["row", "pos"], how="left")
+    try:
+        fee_wei = per_dvn["fee"].astype(np.float64)     # NumPy parses clean digit strings much faster
+    except ValueError:
+        fee_wei = pd.to_numeric(per_dvn["fee"], errors="coerce")
+    per_dvn["fees_eth"] = fee_wei.fillna(0.0) / 1e18
+    per_dvn["DVN_NAME"] = per_dvn["addr"].map(names).fillna(per_dvn["addr"])
+    return per_dvn.drop(columns="fee")
+
+
+def guid_keys(guids):
+    """GUID cells (="0x..." or 0x..., any case) as 32-byte binary keys (dtype S32), plus a valid mask.
+
+    Keys of invalid (null, short, non-hex) GUIDs are undefined; filter them with valid."""
+    chars, valid = payload_chars(guids, 32)
+    nib = np.where(chars >= ord("a"), chars - (ord("a") - 10), chars - ord("0")).astype(np.uint8)
+    key = (nib[:, 0::2] << 4) | nib[:, 1::2]
+    return np.ascontiguousarray(key).view("S32").ravel(), valid
+
+
+def excel_cell(value):
+    """Same cell formatting as json-to-csv.js (formatForExcel) for one JSON value."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, list):
+        return '="[ ' + ";".join(str(v) for v in value) + ' ]"'
+    if isinstance(value, dict):
+        return '="' + json.dumps(value, separators=(",", ":")) + '"'
+    return '="' + str(value) + '"'
+
+
+def export_lines(rows, columns):
+    """CSV lines (with trailing newline) in the json-to-csv.js layout for a list of JSON rows."""
+    return [",".join(excel_cell(r.get(c)) for c in columns) + "\n" for r in rows]
+
+
+def dvn_names(path=NAMES_CSV):
+    """address (lower-case) -> DVN name from dvnNames-Sheet2.csv."""
+    names = pd.read_csv(path)
+    names.columns = names.columns.str.strip()
+    return dict(zip(names["DVN_Address"].str.strip().str.lower(), names["DVN_Name"].str.strip()))
+
+
+def pathway_key(src_eid, dst_eid):
+    return f"{src_eid}-{dst_eid}"
+
+
+def pathway_name(src_eid, dst_eid):
+    return f"{CHAIN_NAMES.get(int(src_eid), src_eid)} -> {CHAIN_NAMES.get(int(dst_eid), dst_eid)}"
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# dvn_latency_legs.py
+# Split every message's delivery latency into legs, per DVN, required stack and window.
+#
+# LATENCYTODELIVERY_SECONDS is a single end-to-end number. The export also has the time the DVN
+# fees were paid on the source chain (DVNTIMESTAMP), and dvn_verify_latency.py gives the time each
+# DVN verified on the destination chain, so the latency splits into:
+#   source_to_fee          SOURCETIMESTAMP -> DVNTIMESTAMP
+#   fee_to_verified        DVNTIMESTAMP -> verified
+#   verified_to_delivered  verified -> DESTINATIONDELIVEREDTIMESTAMP
+#   fee_to_delivered       DVNTIMESTAMP -> DESTINATIONDELIVEREDTIMESTAMP (both middle legs; set
+#                          whether or not verifications are known)
+#   end_to_end             SOURCETIMESTAMP -> DESTINATIONDELIVEREDTIMESTAMP
+# "verified" is the DVN's own first verification on the DVN grain, and on the message/stack grain
+# the moment the last required DVN verified (null until all of them did; the optional threshold
+# is not in the export). Without --verifications only the three legs from the export are set.
+# Every leg is computed for a whole chunk at once with datetime arithmetic. With --block-index,
+# timestamps missing in the export are first filled from their block numbers (dvn_blocktime.py).
+#
+# Outputs (in --out-dir):
+#  - latency_legs_hist.csv  count of every (GRAIN, KEY, ROLE, WINDOW, LEG, seconds), mergeable
+#                           across chunks and runs like pathways.py's latency_hist.csv
+#  - latency_legs_kpi.csv   per (GRAIN, KEY, ROLE, WINDOW, LEG): messages, p50/p90/p95 seconds
+#  - latency_legs.csv       with --rows: the legs of every message
+# With --kpi-dir, <leg>_p50 and <leg>_p95 columns are added to the KPI tables pathways.py wrote under
+# that root: rollup_kpi_by_dvn.csv / rollup_kpi_by_stack.csv (all messages), kpi_by_dvn.csv /
+# kpi_by_stack.csv in every src=<eid>/dst=<eid> directory (that pathway's messages only) and
+# pathway_kpi_by_dvn.csv. Tables of pathways without messages in dt_clean.csv are left without them.
+#
+# Usage:
+#   python3 scripts/dvn_latency_legs.py <dt_clean.csv> [--verifications dvn_verifications.csv]
+#       [--block-index block_index.csv] [--out-dir .] [--kpi-dir pathways] [--rows] [--names dvnNames-Sheet2.csv]
+
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dvn_instrument import stage
+from dvn_io import explode_dvns, dvn_names, parse_timestamps, pathway_key, NAMES_CSV
+from dvn_schema import read_typed
+from dvn_checkpoint import value_hist, hist_quantiles, write_csv_atomic
+from pathways import window_labels, required_stack, find_pathways, pathway_eids, KEYS
+from dvn_blocktime import BlockIndex, fill_timestamps, PAIR_COLUMNS
+
+LEGS = ["source_to_fee", "fee_to_verified", "verified_to_delivered", "fee_to_delivered", "end_to_end"]
+USECOLS = ["GUID", "SOURCETIMESTAMP", "DVNTIMESTAMP", "DESTINATIONDELIVEREDTIMESTAMP", "REQUIREDDVNS",
+           "OPTIONALDVNS", "DVN_FEES_ARRAY"]
+PATHWAY_COLUMNS = ["SOURCEENDPOINTID", "DESTINATIONENDPOINTID"]
+HIST_KEYS = KEYS + ["LEG"]
+QS = [0.5, 0.9, 0.95]
+CHUNK_ROWS = 500_000
+OUT_HIST = "latency_legs_hist.csv"
+OUT_KPI = "latency_legs_kpi.csv"
+OUT_ROWS = "latency_legs.csv"
+
+
+def seconds(later, earlier):
+    return (later - earlier) / np.timedelta64(1, "s")
+
+
+def load_verifications(path):
+    """(per (GUID, DVN) first verification, per GUID time the last required DVN verified)."""
+    v = pd.read_csv(path, usecols=["GUID", "DVN_ADDR", "ROLE", "VERIFY_TIMESTAMP"], dtype=str,
+                    keep_default_na=False, na_values=[""])
+    v["VERIFY_TIMESTAMP"] = parse_timestamps(v["VERIFY_TIMESTAMP"])
+    per_dvn = v.dropna(subset=["VERIFY_TIMESTAMP"]).set_index(["GUID", "DVN_ADDR"])["VERIFY_TIMESTAMP"]
+    req = v[v["ROLE"] == "required"]
+    # max() skips NaT, so a message with an unverified required DVN is dropped explicitly
+    done = req.groupby("GUID")["VERIFY_TIMESTAMP"].agg(["max", "count", "size"])
+    quorum = done.loc[done["count"] == done["size"], "max"]
+    return per_dvn, quorum
+
+
+def message_legs(chunk, quorum=None):
+    """Legs (seconds) of every message of a typed chunk; verified legs null without quorum times."""
+    src, fee, dst = chunk["SOURCETIMESTAMP"], chunk["DVNTIMESTAMP"], chunk["DESTINATIONDELIVEREDTIMESTAMP"]
+    verified = (chunk["GUID"].map(quorum) if quorum is not None
+                else pd.Series(pd.NaT, index=chunk.index, dtype=src.dtype))
+    return pd.DataFrame({
+        "source_to_fee": seconds(fee, src),
+        "fee_to_verified": seconds(verified, fee),
+        "verified_to_delivered": seconds(dst, verified),
+        "fee_to_delivered": seconds(dst, fee),
+        "end_to_end": seconds(dst, src),
+    }, index=chunk.index)
+
+
+def long_legs(df, keys):
+    """(keys, LEG, LATENCY_S) rows of the non-null legs, seconds rounded as in pathways.py."""
+    out = df[keys + LEGS].melt(id_vars=keys, value_vars=LEGS, var_name="LEG", value_name="LATENCY_S")
+    out = out.dropna(subset=["LATENCY_S"])
+    out["LATENCY_S"] = out["LATENCY_S"].round().astype(np.int64)
+    return out
+
+
+def chunk_hist(chunk, names, per_dvn=None, quorum=None):
+    """(leg histogram, per-message legs) of one typed chunk with a RangeIndex."""
+    legs = message_legs(chunk, quorum)
+    msg = legs.assign(WINDOW=window_labels(chunk["SOURCETIMESTAMP"]))
+
+    stack = msg.assign(GRAIN="stack", ROLE="required", KEY=required_stack(chunk["REQUIREDDVNS"], names).to_numpy())
+
+    dvn = explode_dvns(chunk, names).rename(columns={"DVN_NAME": "KEY"})
+    dvn = dvn.join(msg, on="row")
+    # on the DVN grain the verified legs are the DVN's own verification
+    own = pd.Series(pd.NaT, index=dvn.index, dtype=chunk["SOURCETIMESTAMP"].dtype)
+    if per_dvn is not None:
+        key = pd.MultiIndex.from_arrays([chunk["GUID"].to_numpy()[dvn["row"].to_numpy()], dvn["addr"].to_numpy()])
+        own = pd.Series(per_dvn.reindex(key).to_numpy(), index=dvn.index)
+    rows = chunk.loc[dvn["row"].to_numpy()]
+    dvn["fee_to_verified"] = seconds(own.to_numpy(), rows["DVNTIMESTAMP"].to_numpy())
+    dvn["verified_to_delivered"] = seconds(rows["DESTINATIONDELIVEREDTIMESTAMP"].to_numpy(), own.to_numpy())
+    dvn = dvn.assign(GRAIN="dvn")
+    dvn = pd.concat([dvn, dvn.assign(ROLE="all")], ignore_index=True)
+
+    both = pd.concat([long_legs(dvn, KEYS), long_legs(stack, KEYS)], ignore_index=True)
+    hist = value_hist(both, HIST_KEYS, "LATENCY_S")
+    # every message also counts in the "all" window
+    hist = pd.concat([hist[hist["WINDOW"] != ""], hist.assign(WINDOW="all")], ignore_index=True)
+    return hist.groupby(HIST_KEYS + ["LATENCY_S"], as_index=False)["count"].sum(), legs
+
+
+def fold(hists):
+    return pd.concat(hists, ignore_index=True).groupby(HIST_KEYS + ["LATENCY_S"], as_index=False)["count"].sum()
+
+
+def pathway_hists(chunk, names, per_dvn=None, quorum=None):
+    """({(src_eid, dst_eid): leg histogram}, per-message legs) of one typed chunk, split by pathway.
+
+    Rows without endpoint ids are keyed (None, None)."""
+    hists, legs = {}, []
+    for (s, d), g in chunk.groupby(PATHWAY_COLUMNS, dropna=False, sort=False):
+        h, l = chunk_hist(g.reset_index(drop=True), names, per_dvn, quorum)
+        key = (None, None) if pd.isna(s) or pd.isna(d) else (int(s), int(d))
+        hists[key] = fold([hists[key], h]) if key in hists else h
+        legs.append(l.set_axis(g.index))
+    return hists, pd.concat(legs).sort_index()
+
+
+def leg_kpis(hist):
+    """Per (GRAIN, KEY, ROLE, WINDOW, LEG): messages with the leg, p50/p90/p95 seconds."""
+    kpi = hist.groupby(HIST_KEYS, as_index=False)["count"].sum().rename(columns={"count": "messages"})
+    q = hist_quantiles(hist, HIST_KEYS, "LATENCY_S", QS)
+    idx = list(kpi[HIST_KEYS].itertuples(index=False, name=None))
+    for i, name in enumerate(["p50_s", "p90_s", "p95_s"]):
+        kpi[name] = [q[k][i] for k in idx]
+    kpi["LEG"] = pd.Categorical(kpi["LEG"], LEGS)
+    return kpi.sort_values(["GRAIN", "WINDOW", "ROLE", "KEY", "LEG"], ignore_index=True)
+
+
+def leg_columns(kpi):
+    """<leg>_p50 / <leg>_p95 per (GRAIN, KEY, ROLE, WINDOW), wide."""
+    wide = kpi.pivot_table(index=KEYS, columns="LEG", values=["p50_s", "p95_s"], observed=True)
+    wide.columns = [f"{leg}_{q[:3]}" for q, leg in wide.columns]
+    return wide[[f"{leg}_{q}" for leg in LEGS for q in ("p50", "p95") if f"{leg}_{q}" in wide.columns]].reset_index()
+
+
+def merge_legs(path, wide, extra=()):
+    """Replace the leg columns of one pathways.py KPI table with those of wide; False if it is absent."""
+    if not path.exists():
+        return False
+    leg_cols = [f"{leg}_{q}" for leg in LEGS for q in ("p50", "p95")]
+    grain = "stack" if path.name.endswith("kpi_by_stack.csv") else "dvn"
+    key = "Required_Stack" if grain == "stack" else "DVN_NAME"
+    table = pd.read_csv(path, keep_default_na=False, na_values=[""])
+    table = table.drop(columns=[c for c in leg_cols if c in table.columns])
+    w = wide[wide["GRAIN"] == grain].drop(columns="GRAIN").rename(columns={"KEY": key})
+    on = list(extra) + ([key, "WINDOW"] if grain == "stack" else [key, "ROLE", "WINDOW"])
+    if grain == "stack":
+        w = w.drop(columns="ROLE")
+    write_csv_atomic(table.merge(w, on=on, how="left"), path)
+    return True
+
+
+def add_to_kpis(kpi, kpi_dir, by_pathway=None):
+    """Add <leg>_p50 / <leg>_p95 columns to the pathways.py KPI tables under kpi_dir; returns the files.
+
+    kpi goes into the rollup (and any root-level) tables; by_pathway, {(src_eid, dst_eid): leg KPIs},
+    into each pathway's own tables and pathway_kpi_by_dvn.csv."""
+    root = Path(kpi_dir)
+    wide = leg_columns(kpi)
+    done = [p for p in (root / f"{prefix}{name}" for prefix in ("", "rollup_")
+                        for name in ("kpi_by_dvn.csv", "kpi_by_stack.csv")) if merge_legs(p, wide)]
+    per_pathway = []
+    for pdir in find_pathways(root) if by_pathway is not None else []:
+        s, d = pathway_eids(pdir)
+        k = by_pathway.get((int(s), int(d)))
+        w = leg_columns(k) if k is not None else pd.DataFrame(columns=KEYS)
+        done += [p for p in (pdir / name for name in ("kpi_by_dvn.csv", "kpi_by_stack.csv")) if merge_legs(p, w)]
+        per_pathway.append(w.assign(PATHWAY_KEY=pathway_key(s, d)))
+    if per_pathway and merge_legs(root / "pathway_kpi_by_dvn.csv", pd.concat(per_pathway, ignore_index=True),
+                                  extra=["PATHWAY_KEY"]):
+        done.append(root / "pathway_kpi_by_dvn.csv")
+    return done
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-message latency legs (source -> fee -> verified -> delivered).")
+    ap.add_argument("dt_csv", help="dt_clean.csv export")
+    ap.add_argument("--verifications", default="", help="dvn_verifications.csv from dvn_verify_latency.py")
+    ap.add_argument("--block-index", default="", help="fill missing timestamps from block numbers (dvn_blocktime.py)")
+    ap.add_argument("--out-dir", default=".")
+    ap.add_argument("--kpi-dir", default="", help="add leg quantiles to the pathways.py KPI tables in this directory")
+    ap.add_argument("--rows", action="store_true", help="also write the legs of every message")
+    ap.add_argument("--names", default=str(NAMES_CSV))
+    args = ap.parse_args()
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    names = dvn_names(args.names)
+
+    per_dvn = quorum = None
+    if args.verifications:
+        with stage("load_verifications", inputs=[args.verifications]) as ev:
+            per_dvn, quorum = load_verifications(args.verifications)
+            ev.rows_out = len(per_dvn)
+
+    blocks = BlockIndex.load(args.block_index) if args.block_index else None
+    usecols = USECOLS + [c for c in PAIR_COLUMNS if c not in USECOLS] if blocks else USECOLS
+
+    if args.kpi_dir:
+        usecols = usecols + PATHWAY_COLUMNS
+
+    hists, rows, by_pathway = [], [], {}
+    n = 0
+    with stage("legs", inputs=[args.dt_csv]) as ev:
+        for chunk in read_typed(args.dt_csv, usecols, chunksize=CHUNK_ROWS):
+            chunk = chunk.reset_index(drop=True)
+            if blocks is not None:
+                fill_timestamps(chunk, blocks)
+            if args.kpi_dir:
+                # histograms add up, so the pathways' histograms together are the chunk's
+                ph, legs = pathway_hists(chunk, names, per_dvn, quorum)
+                h = fold(list(ph.values()))
+                for key, hp in ph.items():
+                    by_pathway[key] = fold([by_pathway[key], hp]) if key in by_pathway else hp
+            else:
+                h, legs = chunk_hist(chunk, names, per_dvn, quorum)
+            hists.append(h)
+            if args.rows:
+                rows.append(pd.concat([chunk[["GUID", "SOURCETIMESTAMP"]],
+                                       legs.rename(columns=lambda c: f"{c.upper()}_S")], axis=1))
+            n += len(chunk)
+            if len(hists) > 8:
+                hists = [fold(hists)]
+        hist = fold(hists)
+        kpi = leg_kpis(hist)
+        ev.rows_in, ev.rows_out = n, len(kpi)
+
+    write_csv_atomic(hist, out_dir / OUT_HIST)
+    write_csv_atomic(kpi, out_dir / OUT_KPI)
+    saved = [out_dir / OUT_HIST, out_dir / OUT_KPI]
+    if args.rows:
+        write_csv_atomic(pd.concat(rows, ignore_index=True), out_dir / OUT_ROWS)
+        saved.append(out_dir / OUT_ROWS)
+    if args.kpi_dir:
+        saved += add_to_kpis(kpi, args.kpi_dir, {k: leg_kpis(h) for k, h in by_pathway.items() if k[0] is not None})
+
+    top = kpi[(kpi["GRAIN"] == "stack") & (kpi["WINDOW"] != "all")]
+    print(top.groupby(["WINDOW", "LEG"], observed=True)["p50_s"].median().unstack("LEG").to_string())
+    for f in saved:
+        print("Saved:", f)
+
+
+if __name__ == "__main__":
+    main()
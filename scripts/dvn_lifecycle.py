@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# dvn_lifecycle.py
+# One delivery lifecycle record per GUID from the multi-event rows of the exports.
+#
+# The query's eth_dest CTE matches PacketVerified, PacketDelivered and OFTReceived, so a message
+# can have one export row per destination event (and more through the nonce join), and the
+# scripts downstream keep whichever row comes first. This stage folds all rows of a GUID into
+#   SENT_TS       SOURCETIMESTAMP
+#   FEE_PAID_TS   DVNTIMESTAMP
+#   VERIFIED_TS   first PacketVerified    (+ block)
+#   DELIVERED_TS  first PacketDelivered   (+ block)
+#   RECEIVED_TS   first OFTReceived       (+ block)
+# with the last destination event, the number of events of each type, the best MATCH_METHOD
+# (GUID before NONCE+SRC_EID, as dedup_guids.py) and STATE, the furthest step reached:
+# RECEIVED > DELIVERED > VERIFIED > FEE_PAID > SENT. LATENCYTODELIVERY_SECONDS is recomputed
+# from the lifecycle (delivered, else received, minus sent).
+#
+# Rows are reduced to compact fixed-width records while the exports stream by (~80 bytes per
+# row), sorted once by (GUID, block, event order) and folded with boundary masks and
+# reduceat; every step after the sort is a single linear pass. Exports carry no log index, so
+# within a block the protocol's event order (PacketVerified, PacketDelivered, OFTReceived)
+# stands in for it. Rows without a valid GUID are counted and left out.
+#
+# compute_dvn_stack_latency.py, timeframe_compare.py and stack_time_series.py pick up
+# dvn_lifecycle.csv when it is in their working directory: every row of a GUID then carries the
+# lifecycle latency (latency_by_guid), so their first-row-per-GUID dedup no longer decides it.
+#
+# Usage:
+#   python3 scripts/dvn_lifecycle.py <dt_clean.csv>[,more.csv] [--out dvn_lifecycle.csv] [--chunk-rows 500000]
+
+import csv
+import binascii
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dvn_instrument import stage
+from dvn_io import read_export, unwrap, parse_timestamps, guid_keys
+from dvn_checkpoint import write_csv_atomic
+
+EVENTS = ["PacketVerified", "PacketDelivered", "OFTReceived"]      # destination order within a block
+EVENT_CODE = {e: i + 1 for i, e in enumerate(EVENTS)}              # 0: no destination event
+STEPS = ["VERIFIED", "DELIVERED", "RECEIVED"]
+METHOD_RANK = {"GUID": 0, "NONCE+SRC_EID": 1, "NO_MATCH": 3}       # anything else: 2
+METHODS = np.array(["GUID", "NONCE+SRC_EID", "OTHER", "NO_MATCH"], dtype=object)
+COLUMNS = ["GUID", "SOURCETIMESTAMP", "DVNTIMESTAMP", "DESTINATIONDELIVEREDBLOCKNUMBER",
+           "DESTINATIONDELIVEREDTIMESTAMP", "DEST_EVENT_NAME", "MATCH_METHOD"]
+NAT = np.iinfo(np.int64).min          # datetime64 NaT as int64
+NO_BLOCK = np.iinfo(np.int64).max     # rows without a destination event sort last in their GUID
+RECORD = np.dtype([("key", "S32"), ("block", "<i8"), ("event", "u1"), ("method", "u1"),
+                   ("sent", "<i8"), ("fee", "<i8"), ("dest", "<i8")])
+CHUNK_ROWS = 500_000
+OUT_CSV = "dvn_lifecycle.csv"
+
+
+def ns(ts):
+    return ts.to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def chunk_records(chunk):
+    """Records of the rows with a valid GUID, and the number of rows without one."""
+    keys, valid = guid_keys(chunk["GUID"])
+    idx = np.flatnonzero(valid)
+    c = chunk.iloc[idx]
+    rec = np.empty(len(idx), dtype=RECORD)
+    rec["key"] = keys[idx]
+    col = lambda name: c[name] if name in c else pd.Series(np.nan, index=c.index, dtype=object)
+    event = unwrap(col("DEST_EVENT_NAME")).map(EVENT_CODE).fillna(0)
+    rec["event"] = event.to_numpy(np.uint8)
+    block = pd.to_numeric(unwrap(col("DESTINATIONDELIVEREDBLOCKNUMBER")), errors="coerce")
+    rec["block"] = np.where(block.notna(), block.fillna(0).to_numpy(np.int64), NO_BLOCK)
+    rec["method"] = unwrap(col("MATCH_METHOD")).str.upper().map(METHOD_RANK).fillna(2).to_numpy(np.uint8)
+    for field, name in (("sent", "SOURCETIMESTAMP"), ("fee", "DVNTIMESTAMP"), ("dest", "DESTINATIONDELIVEREDTIMESTAMP")):
+        rec[field] = ns(parse_timestamps(col(name)))
+    return rec, len(chunk) - len(idx)
+
+
+def scan(paths, chunk_rows):
+    recs, n, bad = [], 0, 0
+    for path in paths:
+        with open(path, newline="") as f:
+            header = next(csv.reader([f.readline()]))
+        cols = [c for c in COLUMNS if c in header]
+        with stage("lifecycle_scan", inputs=[path]) as ev:
+            rows = 0
+            for chunk in read_export(path, usecols=cols, chunksize=chunk_rows):
+                rec, invalid = chunk_records(chunk.reset_index(drop=True))
+                recs.append(rec)
+                rows += len(chunk)
+                bad += invalid
+            n += rows
+            ev.rows_in, ev.rows_out = rows, sum(len(r) for r in recs)
+    return (np.concatenate(recs) if recs else np.empty(0, dtype=RECORD)), n, bad
+
+
+def first_valid(values, starts):
+    """Per group (rows sorted by group, groups starting at starts): the earliest non-NaT time."""
+    v = np.where(values == NAT, np.iinfo(np.int64).max, values)
+    out = np.minimum.reduceat(v, starts) if len(v) else v
+    return np.where(out == np.iinfo(np.int64).max, NAT, out)
+
+
+def collapse(rec):
+    """Lifecycle frame, one row per GUID, from the records of all export rows."""
+    order = np.lexsort((rec["event"], rec["block"]))
+    order = order[np.argsort(rec["key"][order], kind="stable")]
+    rec = rec[order]
+    first = np.ones(len(rec), dtype=bool)
+    first[1:] = rec["key"][1:] != rec["key"][:-1]
+    starts = np.flatnonzero(first)
+    group = np.cumsum(first) - 1
+    n_groups = len(starts)
+
+    keys = rec["key"][starts]
+    guid = np.char.add("0x", np.frombuffer(binascii.hexlify(keys.tobytes()), dtype="S64").astype("U64"))
+    out = {
+        "GUID": guid,
+        "SENT_TS": first_valid(rec["sent"], starts),
+        "FEE_PAID_TS": first_valid(rec["fee"], starts),
+    }
+    for code, step in enumerate(STEPS, start=1):
+        rows = np.flatnonzero(rec["event"] == code)
+        g = group[rows]
+        head = rows[np.r_[True, g[1:] != g[:-1]]] if len(rows) else rows     # first event of the type per GUID
+        ts = np.full(n_groups, NAT)
+        block = np.full(n_groups, NO_BLOCK)
+        ts[group[head]] = rec["dest"][head]
+        block[group[head]] = rec["block"][head]
+        out[f"{step}_TS"], out[f"{step}_BLOCK"] = ts, block
+        out[f"{step}_EVENTS"] = np.bincount(g, minlength=n_groups)
+    # last destination event: rows with an event sort before the ones without, so take the last of those
+    has = np.flatnonzero(rec["event"] > 0)
+    gh = group[has]
+    tail = has[np.r_[gh[1:] != gh[:-1], True]] if len(has) else has
+    last = np.full(n_groups, "", dtype=object)
+    last[group[tail]] = np.array([""] + EVENTS, dtype=object)[rec["event"][tail]]
+    out["LAST_EVENT"] = last
+    out["EVENT_ROWS"] = np.diff(np.r_[starts, len(rec)])
+    out["MATCH_METHOD"] = METHODS[np.minimum.reduceat(rec["method"], starts)] if len(rec) else METHODS[:0]
+
+    df = pd.DataFrame(out)
+    for c in [c for c in df.columns if c.endswith("_TS")]:
+        df[c] = pd.to_datetime(df[c].to_numpy().view("datetime64[ns]"), utc=True)
+    for step in STEPS:
+        df[f"{step}_BLOCK"] = df[f"{step}_BLOCK"].astype("Int64").mask(df[f"{step}_BLOCK"] == NO_BLOCK)
+    state = np.select([df["RECEIVED_TS"].notna(), df["DELIVERED_TS"].notna(), df["VERIFIED_TS"].notna(),
+                       df["FEE_PAID_TS"].notna()], ["RECEIVED", "DELIVERED", "VERIFIED", "FEE_PAID"], "SENT")
+    df.insert(1, "STATE", state)
+    done = df["DELIVERED_TS"].fillna(df["RECEIVED_TS"])
+    df["LATENCYTODELIVERY_SECONDS"] = (done - df["SENT_TS"]).dt.total_seconds()
+    return df
+
+
+def latency_by_guid(guids, latency, path=OUT_CSV):
+    """latency, with the lifecycle latency from path (this script's output) for every GUID listed there.
+
+    GUIDs match wrapped or not, in any case. Without the file, latency is returned unchanged."""
+    if not Path(path).exists():
+        return latency
+    lc = pd.read_csv(path, usecols=["GUID", "LATENCYTODELIVERY_SECONDS"], dtype={"GUID": str})
+    by_guid = pd.Series(lc["LATENCYTODELIVERY_SECONDS"].to_numpy(), index=lc["GUID"].str.lower())
+    key = unwrap(guids.astype(str)).str.lower()
+    print(f"Latency from {path} for {int(key.isin(by_guid.index).sum())} of {len(key)} rows")
+    return key.map(by_guid).where(key.isin(by_guid.index), latency)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Collapse the destination events of every GUID into one lifecycle record.")
+    ap.add_argument("inputs", help="comma-separated dt_clean.csv exports")
+    ap.add_argument("--out", default=OUT_CSV)
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = ap.parse_args()
+    paths = [p for p in args.inputs.split(",") if p.strip()]
+
+    rec, n, no_guid = scan(paths, args.chunk_rows)
+    with stage("lifecycle_collapse", rows_in=len(rec)) as ev:
+        df = collapse(rec)
+        ev.rows_out = len(df)
+    write_csv_atomic(df, args.out)
+    print(f"{n} rows ({no_guid} without a valid GUID) -> {len(df)} GUIDs; "
+          f"{int((df['EVENT_ROWS'] > 1).sum())} had several rows")
+    print(df["STATE"].value_counts().to_string())
+    print("Saved:", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# dvn_loader.py
+# Column- and predicate-aware loader for dt_clean-style exports (CSV, JSON, JSONL, pathway stores).
+#
+#   from dvn_loader import load
+#   df = load("expanded_per_dvn_joined.csv", columns=["GUID", "ROLE", "DVN_NAME", "LATENCYTODELIVERY_SECONDS"],
+#             time_range=("2025-10-19", "2025-10-21"), dvn="Deutsche Telekom", delivered=True)
+#
+# Three things keep narrow queries from reading the whole file:
+#  - projection: only the requested columns (plus the ones the predicates need) are parsed (usecols),
+#    so ENCODED_PAYLOAD and friends are never converted;
+#  - zone maps: the first filtered read of a CSV writes <file>.zones.json with, per ~32 MB block of
+#    lines, its byte range, min/max SOURCETIMESTAMP, delivered count and the DVNs present. Blocks
+#    that cannot match are skipped without being read. The map carries the file's schema
+#    fingerprint (dvn_schema.py) and is rebuilt when the header changes;
+#  - partition pruning: for a pathway store (see pathways.py) only src=<eid>/dst=<eid> directories
+#    of the requested pathways are opened.
+# Rows of the remaining blocks are then filtered exactly. Cells are returned as stored (Excel
+# wrappers kept) unless unwrap_cells=True.
+#
+# Usage:
+#   python3 scripts/dvn_loader.py <file|store_dir> [--columns A,B] [--from TS] [--to TS] [--dvn NAME|0xADDR]
+#       [--delivered true|false] [--pathways 30184-30101] [--out out.csv]
+
+import io
+import os
+import json
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dvn_instrument import stage
+from dvn_io import NA_VALUES, unwrap, explode_array, dvn_names, parse_timestamps
+from dvn_schema import detect
+
+TS_COL = "SOURCETIMESTAMP"
+ARRAY_COLS = ("REQUIREDDVNS", "OPTIONALDVNS")
+DVN_COLS = ("DVN_NAME", "DVN_ADDR")
+DELIVERED_COLS = ("DELIVERED_BOOL", "MESSAGESTATUS")
+ZONE_BYTES = 32 << 20
+ZONES_SUFFIX = ".zones.json"
+ZONES_VERSION = 2
+
+
+# ---------- sources ----------
+
+def source_files(source, pathways=None):
+    """Files behind a source: a file, a comma-separated list, or a pathway store (pruned to pathways)."""
+    files = []
+    for part in str(source).split(","):
+        p = Path(part.strip())
+        if not part.strip():
+            continue
+        if p.is_dir():
+            for f in sorted(p.glob("src=*/dst=*/dt_clean.csv")):
+                eids = (f.parent.parent.name.split("=", 1)[1], f.parent.name.split("=", 1)[1])
+                if pathways is None or eids in pathways:
+                    files.append(f)
+        else:
+            files.append(p)
+    return files
+
+
+def header_of(path):
+    with open(path, newline="") as f:
+        return pd.read_csv(io.StringIO(f.readline())).columns.tolist()
+
+
+# ---------- predicates ----------
+
+def utc(ts):
+    """Timestamp in UTC (naive input is taken as UTC); None stays None."""
+    if ts is None or ts == "":
+        return None
+    t = pd.Timestamp(ts)
+    return t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+
+
+class Predicates:
+    """Normalized predicates; matches() filters rows, may_match() decides from a zone summary."""
+
+    def __init__(self, time_range=None, dvn=None, delivered=None, ts_col=TS_COL):
+        self.ts_col = ts_col
+        lo, hi = time_range if time_range else (None, None)
+        self.lo, self.hi = utc(lo), utc(hi)
+        self.delivered = delivered
+        self.dvn_codes = set()
+        if dvn:
+            codes = [dvn] if isinstance(dvn, str) else list(dvn)
+            names = dvn_names()
+            by_name = {v.lower(): k for k, v in names.items()}
+            for c in codes:
+                c = c.strip().lower()
+                self.dvn_codes.add(c)
+                if c in by_name:
+                    self.dvn_codes.add(by_name[c])
+                if c in names:
+                    self.dvn_codes.add(names[c].lower())
+
+    def active(self):
+        return self.lo is not None or self.hi is not None or self.delivered is not None or bool(self.dvn_codes)
+
+    def columns(self, available):
+        need = []
+        if self.lo is not None or self.hi is not None:
+            need.append(self.ts_col)
+        if self.dvn_codes:
+            need += [c for c in ARRAY_COLS + DVN_COLS if c in available]
+        if self.delivered is not None:
+            need += [c for c in DELIVERED_COLS if c in available][:1]
+        return [c for c in need if c in available]
+
+    def matches(self, df):
+        mask = np.ones(len(df), dtype=bool)
+        if (self.lo is not None or self.hi is not None) and self.ts_col in df.columns:
+            ts = parse_timestamps(df[self.ts_col])
+            if self.lo is not None:
+                mask &= (ts >= self.lo).to_numpy()
+            if self.hi is not None:
+                mask &= (ts <= self.hi).to_numpy()
+        if self.dvn_codes:
+            hit = np.zeros(len(df), dtype=bool)
+            for c in ARRAY_COLS:
+                if c in df.columns:
+                    ex = explode_array(df[c], "code")
+                    hit[ex.loc[ex["code"].isin(self.dvn_codes), "row"].to_numpy()] = True
+            for c in DVN_COLS:
+                if c in df.columns:
+                    hit |= unwrap(df[c]).str.lower().isin(self.dvn_codes).to_numpy()
+            mask &= hit
+        if self.delivered is not None:
+            flags = delivered_flags(df)
+            if flags is not None:
+                mask &= flags == self.delivered
+        return mask
+
+    def may_match(self, zone):
+        if self.lo is not None and zone.get("ts_max") and pd.Timestamp(zone["ts_max"]) < self.lo:
+            return False
+        if self.hi is not None and zone.get("ts_min") and pd.Timestamp(zone["ts_min"]) > self.hi:
+            return False
+        if self.dvn_codes and zone.get("dvns") is not None and not self.dvn_codes & set(zone["dvns"]):
+            return False
+        if self.delivered is not None and zone.get("delivered") is not None:
+            if self.delivered and zone["delivered"] == 0:
+                return False
+            if not self.delivered and zone["delivered"] == zone["rows"]:
+                return False
+        return True
+
+
+def delivered_flags(df):
+    if "DELIVERED_BOOL" in df.columns:
+        return (unwrap(df["DELIVERED_BOOL"]).str.lower() == "true").to_numpy()
+    if "MESSAGESTATUS" in df.columns:
+        return (unwrap(df["MESSAGESTATUS"]).str.upper() == "DELIVERED").to_numpy()
+    return None
+
+
+# ---------- zone maps ----------
+
+def zone_summary(df, ts_col=TS_COL):
+    z = {"rows": len(df)}
+    if ts_col in df.columns:
+        ts = parse_timestamps(df[ts_col]).dropna()
+        z["ts_min"] = ts.min().isoformat() if len(ts) else None
+        z["ts_max"] = ts.max().isoformat() if len(ts) else None
+    flags = delivered_flags(df)
+    z["delivered"] = int(flags.sum()) if flags is not None else None
+    codes = set()
+    have_dvn = False
+    for c in ARRAY_COLS:
+        if c in df.columns:
+            have_dvn = True
+            codes |= set(explode_array(pd.Series(df[c].unique()), "code")["code"])
+    for c in DVN_COLS:
+        if c in df.columns:
+            have_dvn = True
+            codes |= set(unwrap(pd.Series(df[c].unique())).str.lower())
+    z["dvns"] = sorted(codes - {""}) if have_dvn else None
+    return z
+
+
+def zone_map(path, ts_col=TS_COL, zone_bytes=ZONE_BYTES):
+    """Load <path>.zones.json, (re)building it when missing or stale."""
+    path = Path(path)
+    st = path.stat()
+    zpath = Path(str(path) + ZONES_SUFFIX)
+    schema = detect(path).fingerprint
+    if zpath.exists():
+        zm = json.loads(zpath.read_text())
+        if (zm.get("version") == ZONES_VERSION and zm.get("size") == st.st_size
+                and zm.get("mtime_ns") == st.st_mtime_ns and zm.get("ts_col") == ts_col
+                and zm.get("schema") == schema):
+            return zm
+    cols = header_of(path)
+    summary_cols = [c for c in (ts_col,) + ARRAY_COLS + DVN_COLS + DELIVERED_COLS if c in cols]
+    zones = []
+    with stage("build_zone_map", inputs=[path]) as ev, open(path, "rb") as f:
+        header = f.readline()
+        offset = len(header)
+        while True:
+            lines = f.readlines(zone_bytes)
+            if not lines:
+                break
+            block = b"".join(lines)
+            df = pd.read_csv(io.BytesIO(header + block), dtype=str, keep_default_na=False,
+                             na_values=NA_VALUES, usecols=summary_cols)
+            z = zone_summary(df, ts_col)
+            z.update(offset=offset, nbytes=len(block))
+            zones.append(z)
+            offset += len(block)
+        ev.rows_out = len(zones)
+    zm = {"version": ZONES_VERSION, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "ts_col": ts_col,
+          "schema": schema, "header_bytes": len(header), "zones": zones}
+    tmp = zpath.with_suffix(".tmp")
+    tmp.write_text(json.dumps(zm))
+    os.replace(tmp, zpath)
+    return zm
+
+
+# ---------- readers ----------
+
+def _json_frame(rows):
+    """JSON rows -> string frame shaped like an unwrapped CSV export (arrays as '[ a;b ]')."""
+    df = pd.DataFrame(rows)
+    for c in df.columns:
+        df[c] = [None if v is None else ("[ " + ";".join(str(x) for x in v) + " ]" if isinstance(v, list)
+                 else str(v).lower() if isinstance(v, bool) else str(v)) for v in df[c]]
+    return df
+
+
+def _iter_file(path, usecols, preds, stats, chunk_rows):
+    suffix = path.suffix.lower()
+    if suffix == ".json":
+        stats["bytes_total"] += path.stat().st_size
+        stats["bytes_read"] += path.stat().st_size
+        yield _json_frame(json.loads(path.read_text()))
+        return
+    if suffix in (".jsonl", ".ndjson"):
+        stats["bytes_total"] += path.stat().st_size
+        stats["bytes_read"] += path.stat().st_size
+        for chunk in pd.read_json(path, lines=True, dtype=False, chunksize=chunk_rows):
+            yield _json_frame(chunk.to_dict("records"))
+        return
+
+    cols = header_of(path)
+    use = [c for c in cols if c in usecols] if usecols is not None else None
+    stats["bytes_total"] += path.stat().st_size
+    if not preds.active():
+        stats["bytes_read"] += path.stat().st_size
+        yield from pd.read_csv(path, dtype=str, keep_default_na=False, na_values=NA_VALUES,
+                               usecols=use, chunksize=chunk_rows)
+        return
+    zm = zone_map(path, preds.ts_col)
+    stats["zones_total"] += len(zm["zones"])
+    with open(path, "rb") as f:
+        header = f.read(zm["header_bytes"])
+        for z in zm["zones"]:
+            if not preds.may_match(z):
+                continue
+            stats["zones_read"] += 1
+            stats["bytes_read"] += z["nbytes"]
+            f.seek(z["offset"])
+            block = f.read(z["nbytes"])
+            yield from pd.read_csv(io.BytesIO(header + block), dtype=str, keep_default_na=False,
+                                   na_values=NA_VALUES, usecols=use, chunksize=chunk_rows)
+
+
+def iter_load(source, columns=None, time_range=None, dvn=None, delivered=None, pathways=None,
+              ts_col=TS_COL, unwrap_cells=False, stats=None, chunk_rows=500_000):
+    """Yield filtered, projected DataFrame chunks (see load)."""
+    preds = Predicates(time_range, dvn, delivered, ts_col)
+    stats = stats if stats is not None else {}
+    for k in ("files", "bytes_total", "bytes_read", "zones_total", "zones_read", "rows_read", "rows_out"):
+        stats.setdefault(k, 0)
+    pw = {tuple(str(e) for e in p) for p in pathways} if pathways else None
+    for path in source_files(source, pw):
+        stats["files"] += 1
+        usecols = None
+        if columns is not None and path.suffix.lower() == ".csv":
+            usecols = set(columns) | set(preds.columns(header_of(path)))
+        for chunk in _iter_file(path, usecols, preds, stats, chunk_rows):
+            stats["rows_read"] += len(chunk)
+            if preds.active():
+                chunk = chunk.loc[preds.matches(chunk)]
+            if columns is not None:
+                chunk = chunk[[c for c in columns if c in chunk.columns]]
+            if unwrap_cells:
+                chunk = chunk.apply(unwrap)
+            stats["rows_out"] += len(chunk)
+            yield chunk.reset_index(drop=True)
+
+
+def load(source, columns=None, time_range=None, dvn=None, delivered=None, pathways=None,
+         ts_col=TS_COL, unwrap_cells=False, stats=None, chunk_rows=500_000):
+    """Read only `columns` of the rows matching all predicates.
+
+    source      file (.csv/.json/.jsonl), comma-separated files, or a pathway store directory
+    time_range  (lo, hi), inclusive, on ts_col; either end may be None; naive times are UTC
+    dvn         DVN name or address (or a list); matches REQUIREDDVNS/OPTIONALDVNS or DVN_NAME/DVN_ADDR
+    delivered   True/False on DELIVERED_BOOL (MESSAGESTATUS when absent)
+    pathways    [(src_eid, dst_eid), ...] to prune a pathway store
+    stats       optional dict, filled with files/bytes/zones/rows read and returned
+    """
+    stats = stats if stats is not None else {}
+    with stage("loader") as ev:
+        chunks = list(iter_load(source, columns, time_range, dvn, delivered, pathways, ts_col,
+                                unwrap_cells, stats, chunk_rows))
+        ev.bytes_read = stats["bytes_read"]
+        ev.rows_in, ev.rows_out = stats["rows_read"], stats["rows_out"]
+    if chunks:
+        return pd.concat(chunks, ignore_index=True)
+    return pd.DataFrame(columns=columns or [])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Extract columns/rows from exports with pushdown.")
+    ap.add_argument("source", help="export file(s), comma-separated, or pathway store directory")
+    ap.add_argument("--columns", default="", help="comma-separated columns (default: all)")
+    ap.add_argument("--from", dest="lo", default=None, help="earliest SOURCETIMESTAMP (inclusive)")
+    ap.add_argument("--to", dest="hi", default=None, help="latest SOURCETIMESTAMP (inclusive)")
+    ap.add_argument("--dvn", default=None, help="DVN name or address (comma-separated for several)")
+    ap.add_argument("--delivered", choices=["true", "false"], default=None)
+    ap.add_argument("--pathways", default="", help="comma-separated srcEid-dstEid pairs (pathway stores)")
+    ap.add_argument("--out", default=None, help="write the result to this CSV")
+    args = ap.parse_args()
+
+    columns = [c.strip() for c in args.columns.split(",") if c.strip()] or None
+    dvn = [d for d in args.dvn.split(",") if d.strip()] if args.dvn else None
+    pathways = [tuple(p.strip().split("-")) for p in args.pathways.split(",") if p.strip()] or None
+    delivered = None if args.delivered is None else args.delivered == "true"
+    stats = {}
+    df = load(args.source, columns, (args.lo, args.hi) if args.lo or args.hi else None, dvn, delivered,
+              pathways, stats=stats)
+    print(f"{stats['rows_out']} rows ({stats['rows_read']} scanned) from {stats['files']} file(s); "
+          f"read {stats['bytes_read'] / 1e6:.1f} of {stats['bytes_total'] / 1e6:.1f} MB, "
+          f"{stats['zones_read']}/{stats['zones_total']} zones")
+    if args.out:
+        df.to_csv(args.out, index=False)
+        print("Saved:", args.out)
+    else:
+        print(df.head(20).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# dvn_reader.py
+# Reader for the Excel-wrapped CSV dialect of the exports (json-to-csv.js, the sheet exports).
+#
+# json-to-csv.js writes every cell as ="value" (arrays as ="[ a;b ]") with no CSV quoting and
+# no newlines inside cells. read_wrapped() tokenizes that dialect with NumPy on the bytes of a
+# memory-mapped file instead of going through pandas' generic reader and a str.replace pass per
+# column:
+#  - the file is split into ~64 MB newline-aligned ranges, read in parallel (--workers);
+#  - per range, newline and comma positions give every cell's byte span at once; the ="..."
+#    wrapper is dropped by moving the span ends, so unwrapped text is never materialized twice;
+#  - the requested columns are gathered into fixed-width byte arrays and, with typed=True,
+#    converted by their dtype in the schema registry (dvn_schema.py) straight from bytes:
+#    hex lower-cased, int/float by NumPy, timestamps to datetime64 UTC, bool;
+#  - array cells [ a;b ] come back as text, as lists, or as offsets + flat values (arrays=).
+# A range with CSV-quoted cells (a cell starting with ", as to_csv writes "=""0x..."""), or whose
+# lines do not all have the header's number of commas (JSON objects), is read with pandas and
+# unwrap() instead, so the output is the same either way.
+#
+# dvn_schema.read_typed() reads through this module (iter_wrapped for chunked reads) whenever
+# a file is in the wrapped dialect, so the scripts built on it get the faster typed read; files
+# with CSV-quoted cells (to_csv output) keep the pandas read.
+#
+# Usage:
+#   python3 scripts/dvn_reader.py <file.csv> [--columns A,B] [--typed] [--arrays text|list|offsets]
+#       [--workers N] [--check]
+
+import os
+import io
+import mmap
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from dvn_io import NA_VALUES, read_export, unwrap, parse_timestamps
+from dvn_schema import REGISTRY, detect, header_of, parse
+
+CHUNK_BYTES = 64 << 20
+NL, CR, COMMA, SEMI, SPACE, EQ, QUOTE = (ord(c) for c in "\n\r,; =\"")
+NA_BYTES = [v.encode() for v in NA_VALUES]
+
+
+# ---------- byte spans ----------
+
+def _trim(a, s, e, chars):
+    """Move span ends inward past any of chars (a few vectorized passes)."""
+    s, e = s.copy(), e.copy()
+    while True:
+        m = (s < e) & np.isin(a[np.minimum(s, len(a) - 1)], chars)
+        if not m.any():
+            break
+        s[m] += 1
+    while True:
+        m = (s < e) & np.isin(a[np.maximum(e - 1, 0)], chars)
+        if not m.any():
+            break
+        e[m] -= 1
+    return s, e
+
+
+def _unwrap_spans(a, s, e):
+    s, e = _trim(a, s, e, [SPACE])
+    w = e - s >= 3
+    i = np.flatnonzero(w)
+    w[i] = (a[s[i]] == EQ) & (a[s[i] + 1] == QUOTE) & (a[e[i] - 1] == QUOTE)
+    s[w] += 2
+    e[w] -= 1
+    return _trim(a, s, e, [SPACE])
+
+
+def _gather(a, s, e, case=None):
+    """Bytes of the spans as a fixed-width S array; case='lower'|'upper' changes ASCII letters."""
+    n = e - s
+    width = int(n.max()) if len(n) else 0
+    if width == 0:
+        return np.zeros(len(s), dtype="S1")
+    # rows of a (len(a), width) window view: one row copy per span, no per-byte index
+    tail = s > len(a) - width
+    win = np.lib.stride_tricks.as_strided(a, shape=(max(len(a) - width + 1, 0), width), strides=(1, 1))
+    out = np.empty((len(s), width), dtype=np.uint8)
+    out[~tail] = win[s[~tail]]
+    if tail.any():
+        out[tail] = np.append(a, np.zeros(width, dtype=np.uint8))[s[tail][:, None] + np.arange(width)]
+    out[np.arange(width) >= n[:, None]] = 0
+    if case is not None:
+        lo, hi = (ord("A"), ord("Z")) if case == "lower" else (ord("a"), ord("z"))
+        out[(out >= lo) & (out <= hi)] ^= 0x20
+    return np.ascontiguousarray(out).view(f"S{width}").ravel()
+
+
+def _tokenize(a, ncols):
+    """(starts, ends) of shape (lines, ncols) for the cells of a, or None if a line has another
+    number of commas than the header."""
+    ends = np.flatnonzero(a == NL)
+    if len(ends) == 0 or ends[-1] != len(a) - 1:
+        ends = np.append(ends, len(a))          # last line of the file without '\n'
+    starts = np.append(0, ends[:-1] + 1)
+    cr = (ends > starts) & (a[np.maximum(ends - 1, 0)] == CR)
+    ends = ends - cr
+    keep = ends > starts
+    starts, ends = starts[keep], ends[keep]
+    commas = np.flatnonzero(a == COMMA)
+    if len(commas) != len(starts) * (ncols - 1):
+        return None
+    # sorted, so every line holds exactly its own ncols - 1 commas iff each block stays in its line
+    commas = commas.reshape(len(starts), ncols - 1)
+    if ncols > 1 and ((commas[:, 0] < starts).any() or (commas[:, -1] >= ends).any()):
+        return None
+    return np.column_stack([starts, commas + 1]), np.column_stack([commas, ends])
+
+
+def _quoted(a):
+    """True when a cell of a starts with a CSV quote: a line starting with " or a ," sequence."""
+    return len(a) > 0 and (a[0] == QUOTE or bool(((a[1:] == QUOTE) & ((a[:-1] == COMMA) | (a[:-1] == NL))).any()))
+
+
+def _spans_from_cells(cells):
+    """(buffer, starts, ends) over a list of str cells (the pandas fallback)."""
+    raw = [c.encode() for c in cells]
+    n = np.fromiter((len(c) for c in raw), dtype=np.int64, count=len(raw))
+    e = np.cumsum(n)
+    return np.frombuffer(b"".join(raw) or b"\0", dtype=np.uint8), e - n, e
+
+
+# ---------- conversions ----------
+
+def _array_elements(a, s, e):
+    """(counts, S values) of the [ a;b ] cells spanned by s, e (elements lower-cased)."""
+    s, e = _trim(a, s, e, [SPACE, ord("["), ord("]")])
+    semis = np.flatnonzero(a == SEMI)
+    cell = np.searchsorted(s, semis, side="right") - 1
+    inside = cell >= 0
+    inside[inside] = semis[inside] < e[cell[inside]]
+    semis, cell = semis[inside], cell[inside]
+    nonempty = e > s
+    counts = np.where(nonempty, np.bincount(cell, minlength=len(s)) + 1, 0)
+    es = np.sort(np.concatenate([s[nonempty], semis + 1]))
+    ee = np.sort(np.concatenate([e[nonempty], semis]))
+    es, ee = _trim(a, es, ee, [SPACE])
+    return counts, _gather(a, es, ee, "lower")
+
+
+def _present(a, s, e):
+    """Cells read_export would not read as missing: non-empty and not a bare NA value."""
+    present = e > s
+    short = np.flatnonzero(present & (e - s <= max(len(v) for v in NA_BYTES)))
+    present[short] = ~np.isin(_gather(a, s[short], e[short]), NA_BYTES)
+    return present
+
+
+def _convert(a, s, e, kind, arrays, present):
+    """One column of a range: S array for text kinds, typed array otherwise (see read_wrapped)."""
+    if kind == "array" and arrays != "text":
+        return ("offsets",) + _array_elements(a, s, e)
+    if kind == "timestamp":
+        s, e = _trim(a, s, e, [ord("Z")])
+    b = _gather(a, s, e, {"hex": "lower", "upper": "upper", "bool": "lower"}.get(kind))
+    if kind in ("int", "float", "timestamp"):
+        present = present & (b != b"") & ~np.isin(b, NA_BYTES)
+        try:
+            v = np.where(present, b, b"0" if kind != "timestamp" else b"")
+            # bytes -> datetime64 can crash NumPy on bad cells; the str cast raises ValueError instead
+            v = v.astype(f"U{v.dtype.itemsize}" if kind == "timestamp" else v.dtype).astype(
+                {"int": np.int64, "float": np.float64, "timestamp": "datetime64[us]"}[kind])
+        except ValueError:
+            # a cell NumPy rejects: pandas parses this range's column
+            text = _text(b, present)
+            if kind == "timestamp":
+                v = parse_timestamps(text).dt.tz_localize(None).to_numpy(dtype="datetime64[us]")
+            else:
+                v = pd.to_numeric(text, errors="coerce")
+                present = v.notna().to_numpy()
+                v = v.fillna(0).to_numpy(dtype=np.int64 if kind == "int" else np.float64)
+        if kind == "float":
+            v = np.where(present, v, np.nan)
+        return (kind, v, present)
+    if kind == "bool":
+        return ("bool", b == b"true")
+    return ("text", b, present)
+
+
+def _read_range(path, lo, hi, header, names, kinds, arrays):
+    """Converted columns of the lines in bytes [lo, hi) of path."""
+    a = np.memmap(path, dtype=np.uint8, mode="r", offset=lo, shape=(hi - lo,)).view(np.ndarray)
+    spans = None if _quoted(a) else _tokenize(a, len(header))
+    out = {}
+    if spans is not None:
+        for name, kind in zip(names, kinds):
+            j = header.index(name)
+            s, e = spans[0][:, j], spans[1][:, j]
+            present = _present(a, s, e)
+            s, e = _unwrap_spans(a, s, e)
+            out[name] = _convert(a, s, e, kind, arrays, present)
+        return out
+    # cells the tokenizer cannot split by commas alone: pandas, then the same conversions
+    df = read_export(io.BytesIO(",".join(header).encode() + b"\n" + a.tobytes()), usecols=names)
+    for name, kind in zip(names, kinds):
+        buf, s, e = _spans_from_cells(unwrap(df[name]).tolist())
+        out[name] = _convert(buf, s, e, kind, arrays, df[name].notna().to_numpy())
+    return out
+
+
+# ---------- assembly ----------
+
+def _text(b, present):
+    codes, uniq = pd.factorize(b)        # decode each distinct cell once
+    v = np.array([x.decode() for x in uniq.tolist()], dtype=object)[codes]
+    v[~present] = np.nan
+    return pd.Series(v, dtype=str)
+
+
+def _column(parts, arrays):
+    tag = parts[0][0]
+    if tag == "offsets":
+        counts = np.concatenate([p[1] for p in parts])
+        values = _text(np.concatenate([p[2] for p in parts]), np.ones(int(counts.sum()), dtype=bool))
+        offsets = np.append(0, np.cumsum(counts))
+        flat = values.to_numpy(dtype=object)
+        if arrays == "offsets":
+            return offsets, flat
+        return pd.Series([list(flat[i:j]) for i, j in zip(offsets[:-1], offsets[1:])], dtype=object)
+    values = np.concatenate([p[1] for p in parts])
+    if tag == "bool":
+        return pd.Series(values)
+    present = np.concatenate([p[2] for p in parts])
+    if tag == "int":
+        return pd.Series(pd.arrays.IntegerArray(values, ~present))
+    if tag == "float":
+        return pd.Series(values)
+    if tag == "timestamp":
+        return pd.Series(values).dt.tz_localize("UTC")
+    return _text(values, present)
+
+
+def ranges(path, chunk_bytes=CHUNK_BYTES):
+    """Newline-aligned [lo, hi) byte ranges of ~chunk_bytes covering the data lines of a file."""
+    size = os.path.getsize(path)
+    out = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        lo = mm.find(b"\n") + 1 or size
+        while lo < size:
+            hi = mm.find(b"\n", min(lo + chunk_bytes, size) - 1)
+            hi = size if hi < 0 else hi + 1
+            out.append((lo, hi))
+            lo = hi
+    return out
+
+
+def wrapped_dialect(path, sample_bytes=1 << 20):
+    """True when the start of a file has no CSV-quoted cells (the dialect read_wrapped reads natively)."""
+    with open(path, "rb") as f:
+        sample = np.frombuffer(f.read(sample_bytes), dtype=np.uint8)
+    return not _quoted(sample)
+
+
+def _plan(path, columns, typed):
+    """(header, names in the file, kinds) for the requested columns."""
+    header = header_of(path)
+    schema = detect(path)
+    canonical = {actual: name for name, actual in schema.columns.items()}
+    names = [c if c in header else schema.get(c) for c in columns or header]
+    missing = [c for c, n in zip(columns or header, names) if n is None]
+    if missing:
+        raise ValueError(f"{path}: no column(s) {', '.join(missing)}")
+    kinds = []
+    for n in names:
+        kind = REGISTRY[canonical[n]].dtype if n in canonical else "text"
+        kinds.append(kind if typed or kind == "array" else "text")
+    return header, names, kinds
+
+
+def iter_wrapped(path, columns=None, typed=False, chunk_bytes=CHUNK_BYTES):
+    """read_wrapped() one ~chunk_bytes range at a time, in one process (for streaming large files).
+
+    Frames are indexed on from the previous one, as pandas' chunked reads are."""
+    if os.path.getsize(path) == 0:
+        return
+    header, names, kinds = _plan(path, columns, typed)
+    columns = list(columns or header)
+    row0 = 0
+    for lo, hi in ranges(path, chunk_bytes):
+        r = _read_range(path, lo, hi, header, names, kinds, "text")
+        frame = pd.DataFrame({c: _column([r[n]], "text") for c, n in zip(columns, names)})
+        frame.index = pd.RangeIndex(row0, row0 + len(frame))
+        row0 += len(frame)
+        yield frame
+
+
+def read_wrapped(path, columns=None, typed=False, arrays="text", workers=0, chunk_bytes=CHUNK_BYTES):
+    """Read an export in the ="..." dialect with the wrappers removed.
+
+    columns are header or canonical names (all columns when None) and keep the given names.
+    typed=False returns unwrapped strings like read_export + unwrap (empty cells missing);
+    typed=True parses registered columns by their registry dtype like dvn_schema.read_typed.
+    Registered array columns come back as '[ a;b ]' text (arrays="text"), Python lists
+    ("list"), or, with arrays="offsets", as the tuple (offsets, values): the elements of row i
+    are values[offsets[i]:offsets[i + 1]]."""
+    if os.path.getsize(path) == 0:
+        return pd.DataFrame()
+    header, names, kinds = _plan(path, columns, typed)
+    columns = list(columns or header)
+    jobs = [(path, lo, hi, header, names, kinds, arrays) for lo, hi in ranges(path, chunk_bytes)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    if workers == 1:
+        results = [_read_range(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(_read_range, *zip(*jobs)))
+    if not results:
+        frame = pd.DataFrame({c: pd.Series(dtype=str) for c in columns})
+        return (frame, {}) if arrays == "offsets" else frame
+    data = {c: _column([r[n] for r in results], arrays) for c, n in zip(columns, names)}
+    frame = pd.DataFrame({c: v for c, v in data.items() if not isinstance(v, tuple)})
+    if arrays != "offsets":
+        return frame
+    return frame, {c: v for c, v in data.items() if isinstance(v, tuple)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Read an Excel-wrapped CSV export with the native dialect reader.")
+    ap.add_argument("csv")
+    ap.add_argument("--columns", help="comma-separated header or canonical names (default: all)")
+    ap.add_argument("--typed", action="store_true", help="parse registered columns by their dtype")
+    ap.add_argument("--arrays", choices=["text", "list", "offsets"], default="text")
+    ap.add_argument("--workers", type=int, default=0, help="parallel ranges (default: one per CPU)")
+    ap.add_argument("--check", action="store_true", help="compare with the pandas read and report timings")
+    args = ap.parse_args()
+    columns = args.columns.split(",") if args.columns else None
+
+    t0 = time.perf_counter()
+    out = read_wrapped(args.csv, columns, typed=args.typed, arrays=args.arrays, workers=args.workers)
+    t_native = time.perf_counter() - t0
+    df = out[0] if isinstance(out, tuple) else out
+    print(f"{args.csv}: {len(df)} rows, {len(df.columns)} columns in {t_native:.2f}s")
+    if isinstance(out, tuple):
+        for c, (offsets, values) in out[1].items():
+            print(f"  {c}: {len(values)} elements over {len(offsets) - 1} rows")
+    if not args.check:
+        print(df.head().to_string())
+        return
+
+    t0 = time.perf_counter()
+    schema = detect(args.csv)
+    header = header_of(args.csv)
+    names = [c if c in header else schema.get(c) for c in (columns or header)]
+    ref = read_export(args.csv, usecols=names)[names]
+    ref.columns = columns or header
+    for c in ref.columns:
+        ref[c] = unwrap(ref[c]).where(ref[c].notna())
+    if args.typed:
+        canonical = {actual: name for name, actual in schema.columns.items()}
+        ref = parse(ref.rename(columns=canonical)).set_axis(ref.columns, axis=1)
+    t_pandas = time.perf_counter() - t0
+    differing = [c for c in df.columns if not df[c].equals(ref[c])]
+    print(f"pandas read + unwrap{' + parse' if args.typed else ''}: {t_pandas:.2f}s "
+          f"({t_pandas / t_native:.1f}x)")
+    print("differing columns:", ", ".join(differing) if differing else "none")
+
+
+if __name__ == "__main__":
+    main()
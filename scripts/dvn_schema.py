@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# dvn_schema.py
+# Column registry for every file the pipeline reads: canonical name, aliases, dtype and parser.
+#
+# Exports name the same column differently (REQUIREDDVNS in the Flipside export, requiredDVNs in
+# the sheet export, required_dvns in older copies). resolve() maps a header to canonical names
+# once per file: exact name first, then the same name ignoring case and '_'/' ', then the
+# aliases. read_typed() reads only the resolved columns, renames them to canonical names and
+# parses each with the vectorized parser of its dtype:
+#   hex        unwrapped, lower-case (GUIDs, hashes, addresses, payloads)
+#   text       unwrapped
+#   upper      unwrapped, upper-case (MESSAGESTATUS)
+#   int        nullable Int64 (block numbers, endpoint ids, counts)
+#   float      float64, N/A -> NaN (latencies, fee amounts)
+#   timestamp  datetime64 UTC, format inferred per column (dvn_io.parse_timestamps)
+#   bool       TRUE/true -> True, anything else False
+#   array      unwrapped '[ a;b ]' text (explode with dvn_io.explode_array)
+# Parsers run once per distinct cell where columns repeat (dvn_io.unwrap).
+#
+# A detected schema has a fingerprint (hash of the canonical -> actual mapping); detection is
+# cached per file (path, size, mtime) and caches over a file (dvn_loader zone maps) carry the
+# fingerprint, so a changed header invalidates them.
+#
+# Usage: python3 scripts/dvn_schema.py <file.csv> [more.csv ...]   (print the detected schema)
+
+import csv
+import json
+import hashlib
+import argparse
+from collections import namedtuple
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dvn_io import read_export, unwrap, parse_timestamps
+
+VERSION = 1
+Column = namedtuple("Column", ["name", "dtype", "aliases"])
+
+
+def col(name, dtype, *aliases):
+    return Column(name, dtype, aliases)
+
+
+COLUMNS = [
+    # dt_clean.csv (Flipside export), in export order
+    col("SOURCETXHASH", "hex", "source_tx_hash", "source_tx"),
+    col("SOURCEBLOCKNUMBER", "int"),
+    col("SOURCETIMESTAMP", "timestamp", "source_ts"),
+    col("SOURCEENDPOINTID", "int", "src_eid"),
+    col("DESTINATIONENDPOINTID", "int", "dst_eid"),
+    col("SOURCE_CHAIN_NAME", "text"),
+    col("DEST_CHAIN_NAME", "text"),
+    col("GUID", "hex", "guid_hex", "guidhash", "sourceguid"),
+    col("MESSAGENONCEDECIMAL", "int", "nonce"),
+    col("TRANSACTIONSENDER", "hex"),
+    col("SENDERADDRESSHEX", "hex"),
+    col("RECEIVERADDRESS", "hex"),
+    col("ENCODED_PAYLOAD", "hex"),
+    col("REQUIREDDVNS", "array"),
+    col("OPTIONALDVNS", "array"),
+    col("REQUIREDDVNCOUNT", "int"),
+    col("OPTIONALDVNCOUNT", "int"),
+    col("DVNTXHASH", "hex"),
+    col("DVNBLOCKNUMBER", "int"),
+    col("DVNTIMESTAMP", "timestamp"),
+    col("DVN_FEES_ARRAY", "array", "dvn_fees", "fees_array"),
+    col("DESTINATIONDELIVEREDTXHASH", "hex"),
+    col("DESTINATIONDELIVEREDBLOCKNUMBER", "int"),
+    col("DESTINATIONDELIVEREDTIMESTAMP", "timestamp", "dest_timestamp"),
+    col("DEST_EVENT_NAME", "text"),
+    col("DEST_ORIGIN_NONCE", "int"),
+    col("DEST_ORIGIN_SRCEID", "int"),
+    col("DEST_ORIGIN_SENDER", "hex"),
+    col("EXECUTOR_TXHASH", "hex"),
+    col("EXECUTORADDRESS", "hex"),
+    col("EXECUTORFEE", "float"),
+    col("MESSAGESTATUS", "upper", "message_status", "status"),
+    col("LATENCYTODELIVERY_SECONDS", "float", "latency_seconds", "latency"),
+    col("MATCH_METHOD", "text"),
+    col("DEUTSCHE_IS_REQUIRED", "bool"),
+    col("DEUTSCHE_IS_OPTIONAL", "bool"),
+    col("DELIVERED_BOOL", "bool"),
+    col("MESSAGE_PAIR_KEY", "text"),
+    col("DVN_SOURCE_PAIR_KEY", "text"),
+    # dvnFeesMapped.csv / dvnFeesReqOp-Sheet1.csv
+    col("REQUIREDDVN_MAPPING", "text", "requiredDvnMapping"),
+    col("OPTIONALDVN_MAPPING", "text", "optionalDvnMapping"),
+    # expanded per-DVN tables (expand_from_fees_then_join.py, merge_expand_dvns_v2.py)
+    col("DVN_ADDR", "hex", "dvn_address"),
+    col("DVN_NAME", "text"),
+    col("ROLE", "text"),
+    col("DVN_FEE_WEI", "float"),
+    col("DVN_FEE_ETH", "float"),
+    col("DVN_FEE_IF_REQUIRED_ETH", "float"),
+    col("DVN_FEE_IF_OPTIONAL_ETH", "float"),
+]
+REGISTRY = {c.name: c for c in COLUMNS}
+
+# file layouts, in column order
+DT_COLUMNS = [c.name for c in COLUMNS[:COLUMNS.index(REGISTRY["DVN_SOURCE_PAIR_KEY"]) + 1]]
+FEES_COLUMNS = ["GUID", "requiredDVNs", "optionalDVNs", "DVN_FEES_ARRAY"]     # header of the sheet export
+
+
+def _norm(name):
+    return "".join(ch for ch in str(name).lower() if ch.isalnum())
+
+
+# ---------- parsers ----------
+
+def _bool(s):
+    return (unwrap(s).str.upper() == "TRUE").astype(bool)
+
+
+PARSERS = {
+    "hex": lambda s: unwrap(s).str.lower(),
+    "text": unwrap,
+    "upper": lambda s: unwrap(s).str.upper(),
+    "array": unwrap,
+    "int": lambda s: pd.to_numeric(unwrap(s), errors="coerce").astype("Int64"),
+    "float": lambda s: pd.to_numeric(unwrap(s), errors="coerce").astype(np.float64),
+    "timestamp": parse_timestamps,
+    "bool": _bool,
+}
+
+
+def parse(df):
+    """Parse the registered columns of a string frame in place (unknown columns stay strings)."""
+    for c in df.columns:
+        if c in REGISTRY:
+            v = PARSERS[REGISTRY[c].dtype](df[c])
+            # unwrap() fills missing cells with ""; keep them missing
+            df[c] = v.where(df[c].notna()) if REGISTRY[c].dtype in ("hex", "text", "upper", "array") else v
+    return df
+
+
+# ---------- detection ----------
+
+class Schema:
+    """Canonical name -> header name of one file, plus the headers the registry does not know."""
+
+    def __init__(self, header):
+        self.header = list(header)
+        self.columns = resolve(self.header)
+        taken = set(self.columns.values())
+        self.unknown = [h for h in self.header if h not in taken]
+        mapping = json.dumps([VERSION, sorted(self.columns.items())])
+        self.fingerprint = hashlib.sha1(mapping.encode()).hexdigest()[:16]
+
+    def get(self, name, default=None):
+        return self.columns.get(name, default)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def usecols(self, names):
+        """Header names of the given canonical names (the ones present)."""
+        return [self.columns[n] for n in names if n in self.columns]
+
+    def renames(self):
+        return {actual: name for name, actual in self.columns.items() if actual != name}
+
+
+def resolve(header):
+    """{canonical name: header name} for every registered column found in header."""
+    header = list(header)
+    exact = set(header)
+    by_norm = {}
+    for h in header:
+        by_norm.setdefault(_norm(h), h)
+    found, used = {}, set()
+    # exact names first, so an alias never steals a column another entry owns
+    for c in COLUMNS:
+        if c.name in exact:
+            found[c.name] = c.name
+            used.add(c.name)
+    for c in COLUMNS:
+        if c.name in found:
+            continue
+        for cand in (c.name,) + c.aliases:
+            h = by_norm.get(_norm(cand))
+            if h is not None and h not in used:
+                found[c.name] = h
+                used.add(h)
+                break
+    return found
+
+
+def header_of(path):
+    with open(path, newline="") as f:
+        return next(csv.reader([f.readline()]), [])
+
+
+_detected = {}
+
+
+def detect(path):
+    """Schema of a CSV file; cached per (path, size, mtime)."""
+    st = Path(path).stat()
+    key = (str(Path(path).resolve()), st.st_size, st.st_mtime_ns)
+    if key not in _detected:
+        _detected[key] = Schema(header_of(path))
+    return _detected[key]
+
+
+def line_bytes(path, sample_bytes=1 << 20):
+    """Average line length of the start of a file (sizes row-count chunks in bytes)."""
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+    return max(1, len(sample) // max(1, sample.count(b"\n")))
+
+
+def read_typed(path, columns=None, chunksize=None, raw=False):
+    """Read the canonical columns of a CSV export (all registered ones when None), typed.
+
+    Returns frames with canonical column names; with raw=True the cells stay as exported strings.
+    Missing columns are left out, check with detect(path). Files in the ="..." dialect are read by
+    dvn_reader (chunks of about chunksize rows); others, and raw reads, by pandas.
+    """
+    schema = detect(path)
+    names = [c for c in (columns or schema.columns) if c in schema]
+    if not raw and names:
+        from dvn_reader import read_wrapped, iter_wrapped, wrapped_dialect, CHUNK_BYTES   # imports this module
+        if wrapped_dialect(path):
+            # the native dialect reader parses straight from bytes (same frames, ~1.8x faster)
+            if chunksize is None:
+                return read_wrapped(path, names, typed=True)
+            return iter_wrapped(path, names, typed=True, chunk_bytes=min(CHUNK_BYTES, chunksize * line_bytes(path)))
+    usecols = schema.usecols(names)
+    frames = read_export(path, usecols=usecols, chunksize=chunksize)
+    prepare = lambda df: df.rename(columns=schema.renames())[names] if raw else \
+        parse(df.rename(columns=schema.renames())[names])
+    if chunksize is None:
+        return prepare(frames)
+    return (prepare(df) for df in frames)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Print the columns the schema registry detects in CSV files.")
+    ap.add_argument("files", nargs="+")
+    args = ap.parse_args()
+    for path in args.files:
+        schema = detect(path)
+        print(f"{path}: schema {schema.fingerprint}")
+        for name, actual in schema.columns.items():
+            alias = "" if actual == name else f"  (as {actual})"
+            print(f"  {name:<34} {REGISTRY[name].dtype:<10}{alias}")
+        if schema.unknown:
+            print("  not registered:", ", ".join(schema.unknown))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# dvn_sql.py
+# Embedded SQL store for ad-hoc queries over the per-DVN table (expanded_per_dvn_joined.csv).
+#
+# sync loads the table once into a local SQLite file (or DuckDB, when installed and asked for)
+# with typed columns and indexes:
+#   per_dvn        one row per (message, DVN): GUID, DVN_ADDR, DVN_NAME, ROLE, fees in ETH,
+#                  SOURCETIMESTAMP (ISO text and TS_MS), LATENCY_S, DELIVERED, pathway eids
+#   messages       one row per GUID: first timestamp, first latency, required stack
+#   stack_members  the DVN names of every required stack
+#   windows        the before / during / after windows of timeframe_compare.py
+#   kpi_ci, stack_ci, dvn_ci
+#                  95% bootstrap intervals of the view KPIs, drawn at sync with dvn_bootstrap.py
+#                  from the same counts as the pandas scripts, so they match theirs
+# and views with the same columns and numbers as the pandas outputs:
+#   kpi_by_dvn_final                  recompute_kpi_with_known_cols.py
+#   stack_latency_summary,
+#   dvn_stack_reliability             compute_dvn_stack_latency.py
+#   stack_before/during/after,
+#   dvn_before/during/after           timeframe_compare.py
+# Medians and p95 use the same linear interpolation as pandas/NumPy, computed with window
+# functions over per-value counts. Cells are parsed the way the pandas scripts parse them (latency: digits and '.' of
+# the cell), except that kpi_by_dvn_final also reads Excel-wrapped latencies, which
+# recompute_kpi_with_known_cols.py leaves empty.
+#
+# compare checks the views against the CSVs the pandas scripts wrote (same rows, numbers equal
+# up to float summation order), interval columns included.
+#
+# Usage:
+#   python3 scripts/dvn_sql.py sync [expanded_per_dvn_joined.csv] [--db dvn.sqlite] [--engine sqlite|duckdb] [--force]
+#   python3 scripts/dvn_sql.py query "<SQL or view name>" [--db dvn.sqlite] [--out result.csv]
+#   python3 scripts/dvn_sql.py compare [--dir .] [--db dvn.sqlite]
+
+import json
+import sqlite3
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dvn_instrument import stage
+from dvn_io import read_export, unwrap, parse_timestamps
+from dvn_checkpoint import fingerprint
+from pathways import WINDOWS
+from dvn_bootstrap import kpi_cis, stack_cis
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+IN_CSV = "expanded_per_dvn_joined.csv"
+DB = "dvn.sqlite"
+CHUNK_ROWS = 200_000
+SOURCE_COLUMNS = ["GUID", "DVN_ADDR", "DVN_NAME", "ROLE", "DVN_FEE_ETH", "DVN_FEE_IF_REQUIRED_ETH",
+                  "DVN_FEE_IF_OPTIONAL_ETH", "DVN_FEE_IF_REQUIRED_ETH_NUM", "DVN_FEE_IF_OPTIONAL_ETH_NUM",
+                  "SOURCETIMESTAMP", "SOURCEENDPOINTID", "DESTINATIONENDPOINTID", "LATENCYTODELIVERY_SECONDS",
+                  "DELIVERED_BOOL"]
+PER_DVN = [("rid", "BIGINT"), ("msg_id", "BIGINT"), ("GUID", "TEXT"), ("DVN_ADDR", "TEXT"), ("DVN_NAME", "TEXT"),
+           ("ROLE", "TEXT"), ("FEE_ETH", "DOUBLE"), ("FEE_REQUIRED_ETH", "DOUBLE"), ("FEE_OPTIONAL_ETH", "DOUBLE"),
+           ("SOURCETIMESTAMP", "TEXT"), ("TS_MS", "BIGINT"), ("SRC_EID", "BIGINT"), ("DST_EID", "BIGINT"),
+           ("LATENCY_S", "DOUBLE"), ("DELIVERED", "INTEGER")]
+
+# (view, CSV written by the pandas script, key columns) for compare
+OUTPUTS = [("kpi_by_dvn_final", "kpi_by_dvn_final.csv", ["DVN_NAME"]),
+           ("stack_latency_summary", "stack_latency_summary.csv", ["Required_Stack"]),
+           ("dvn_stack_reliability", "dvn_stack_reliability.csv", ["DVN_NAME"])]
+OUTPUTS += [(f"{kind}_{w}", f"{kind}_{w}.csv", [key]) for w in WINDOWS
+            for kind, key in (("stack", "Required_Stack"), ("dvn", "DVN_NAME"))]
+
+
+# ---------- typed rows ----------
+
+def _per_unique(s, fn):
+    codes, uniq = pd.factorize(s)
+    out = np.asarray(fn(pd.Series(uniq, dtype=object)), dtype=object)
+    return np.where(codes >= 0, out[np.maximum(codes, 0)] if len(out) else None, None)
+
+
+def _number(s):
+    return pd.to_numeric(s, errors="coerce").to_numpy(np.float64)
+
+
+def _text(s):
+    """Unwrapped, stripped text; empty cells become None."""
+    return _per_unique(s, lambda u: unwrap(u).replace("", None).to_numpy(dtype=object))
+
+
+def typed(chunk, codes, rid0):
+    """per_dvn rows (as a DataFrame in PER_DVN order) for one chunk of the joined CSV."""
+    chunk = chunk.reindex(columns=SOURCE_COLUMNS)
+    n = len(chunk)
+    guid = _per_unique(chunk["GUID"], lambda u: unwrap(u).str.lower().replace("", None).to_numpy(dtype=object))
+    msg_id = np.array([None if g is None else codes.setdefault(g, len(codes)) for g in guid], dtype=object)
+    name = _text(chunk["DVN_NAME"]) if chunk["DVN_NAME"].notna().any() else _text(chunk["DVN_ADDR"])
+    # latency as compute_dvn_stack_latency.py / timeframe_compare.py read it: digits and '.' of the cell
+    lat = _per_unique(chunk["LATENCYTODELIVERY_SECONDS"],
+                      lambda u: pd.to_numeric(u.str.replace(r"[^0-9\.]", "", regex=True).replace("", np.nan),
+                                              errors="coerce").to_numpy())
+    ts = parse_timestamps(chunk["SOURCETIMESTAMP"])
+    ts_ms = ts.dt.as_unit("ms").astype("int64").astype(object).where(ts.notna(), None)
+    # fee columns as recompute_kpi_with_known_cols.py picks them (the *_NUM columns when present)
+    fee_req = chunk["DVN_FEE_IF_REQUIRED_ETH_NUM"].fillna(chunk["DVN_FEE_IF_REQUIRED_ETH"])
+    fee_opt = chunk["DVN_FEE_IF_OPTIONAL_ETH_NUM"].fillna(chunk["DVN_FEE_IF_OPTIONAL_ETH"])
+    return pd.DataFrame({
+        "rid": np.arange(rid0, rid0 + n),
+        "msg_id": msg_id,
+        "GUID": guid,
+        "DVN_ADDR": _per_unique(chunk["DVN_ADDR"], lambda u: unwrap(u).str.lower().replace("", None)
+                                .to_numpy(dtype=object)),
+        "DVN_NAME": name,
+        "ROLE": _per_unique(chunk["ROLE"], lambda u: unwrap(u).str.lower().replace("", None).to_numpy(dtype=object)),
+        "FEE_ETH": _number(chunk["DVN_FEE_ETH"]),
+        "FEE_REQUIRED_ETH": _number(fee_req),
+        "FEE_OPTIONAL_ETH": _number(fee_opt),
+        "SOURCETIMESTAMP": _text(chunk["SOURCETIMESTAMP"]),
+        "TS_MS": ts_ms.to_numpy(dtype=object),
+        "SRC_EID": _per_unique(chunk["SOURCEENDPOINTID"], lambda u: pd.to_numeric(unwrap(u), errors="coerce")
+                               .astype(object).where(lambda x: x.notna(), None).to_numpy()),
+        "DST_EID": _per_unique(chunk["DESTINATIONENDPOINTID"], lambda u: pd.to_numeric(unwrap(u), errors="coerce")
+                               .astype(object).where(lambda x: x.notna(), None).to_numpy()),
+        "LATENCY_S": np.asarray(lat, dtype=np.float64),
+        "DELIVERED": _per_unique(chunk["DELIVERED_BOOL"], lambda u: (unwrap(u).str.upper() == "TRUE")
+                                 .astype(int).to_numpy()),
+    })[[c for c, _ in PER_DVN]].fillna({"DELIVERED": 0})
+
+
+# ---------- SQL ----------
+
+def quantile_sql(src, keys, value):
+    """Per-key n, mean, median and p95 of value over the rows of src, as pandas / NumPy compute them.
+
+    Rows are first counted per distinct value (latencies are whole seconds, so few remain); running
+    counts give the rank range of each value. p95 interpolates linearly between ranks floor(h) and
+    floor(h)+1, h = (n-1)*0.95, with NumPy's formula; the median averages the two middle values of
+    an even count.
+    """
+    k = ", ".join(keys)
+    has = lambda rank: f"cum - c <= {rank} AND {rank} < cum"
+    return f"""
+        WITH g AS (
+            SELECT {k}, {value} AS v, COUNT(*) AS c
+            FROM ({src}) AS s WHERE {value} IS NOT NULL GROUP BY {k}, {value}),
+        r AS (
+            SELECT {k}, v, c, SUM(c) OVER (PARTITION BY {k} ORDER BY v ROWS UNBOUNDED PRECEDING) AS cum,
+                   SUM(c) OVER (PARTITION BY {k}) AS n, FLOOR((SUM(c) OVER (PARTITION BY {k}) - 1) * 0.95) AS lo,
+                   (SUM(c) OVER (PARTITION BY {k}) - 1) * 0.95 AS h
+            FROM g),
+        p AS (
+            SELECT {k}, MAX(n) AS n, SUM(v * c) / MAX(n) AS mean,
+                   MAX(CASE WHEN {has("(n - 1) / 2.0")} THEN v END) AS mid_lo,
+                   MAX(CASE WHEN {has("n / 2.0")} THEN v END) AS mid_hi,
+                   MAX(CASE WHEN {has("lo")} THEN v END) AS a,
+                   MAX(CASE WHEN {has("lo + 1")} THEN v END) AS b,
+                   MAX(h - lo) AS t
+            FROM r GROUP BY {k})
+        SELECT {k}, n, mean,
+               CASE WHEN n % 2 = 1 THEN mid_lo ELSE (mid_lo + mid_hi) / 2.0 END AS median,
+               CASE WHEN b IS NULL THEN a WHEN t >= 0.5 THEN b - (b - a) * (1 - t) ELSE a + (b - a) * t END AS p95
+        FROM p"""
+
+
+def dvn_from_stacks_sql(stacks, window):
+    """Per-DVN averages over the stacks a DVN is part of (the dvn_from_stacks step of the pandas scripts)."""
+    return f"""
+        SELECT m.DVN_NAME, COUNT(*) AS stacks_involved, SUM(s.transactions) AS total_transactions,
+               AVG(s.median_latency) AS avg_median_latency, MAX(c.avg_median_latency_lo) AS avg_median_latency_lo,
+               MAX(c.avg_median_latency_hi) AS avg_median_latency_hi, AVG(s.p95_latency) AS avg_p95_latency,
+               MAX(c.avg_p95_latency_lo) AS avg_p95_latency_lo, MAX(c.avg_p95_latency_hi) AS avg_p95_latency_hi
+        FROM ({stacks}) AS s JOIN stack_members AS m ON m.REQUIRED_STACK = s.Required_Stack
+        LEFT JOIN dvn_ci AS c ON c.WINDOW = '{window}' AND c.DVN_NAME = m.DVN_NAME
+        GROUP BY m.DVN_NAME"""
+
+
+# messages with a required stack, overall and per window (stack_latency_summary, stack_<window>)
+MSGS_SQL = """
+    SELECT CASE WHEN REQUIRED_STACK = '' THEN 'Unknown' ELSE REQUIRED_STACK END AS stack, LATENCY_S
+    FROM messages WHERE REQUIRED_STACK IS NOT NULL"""
+WIN_MSGS_SQL = """
+    SELECT w.WINDOW, m.REQUIRED_STACK, m.LATENCY_S
+    FROM messages AS m JOIN windows AS w ON m.TS_MS >= w.START_MS AND m.TS_MS <= w.END_MS
+    WHERE m.REQUIRED_STACK IS NOT NULL"""
+# interval tables: key columns and the KPIs of dvn_bootstrap.stack_cis (qs median, mean, p95; None: not kept)
+CI_KPIS = {
+    "kpi_ci": (["DVN_NAME"], ["delivered_rate", "median_latency", "p95_latency"]),
+    "stack_ci": (["WINDOW", "Required_Stack"], ["median_latency", "avg_latency", "p95_latency"]),
+    "dvn_ci": (["WINDOW", "DVN_NAME"], ["avg_median_latency", None, "avg_p95_latency"]),
+}
+CI_TABLES = {t: [(k, "TEXT") for k in keys] + [(f"{c}_{e}", "DOUBLE") for c in kpis if c for e in ("lo", "hi")]
+             for t, (keys, kpis) in CI_KPIS.items()}
+
+
+def ci_frames(store):
+    """95% bootstrap intervals (dvn_bootstrap.py) of the view KPIs, as rows of the CI_TABLES.
+
+    They are drawn from the same counts and rows the pandas scripts draw from, so the intervals
+    match theirs; 'all' is the WINDOW of the whole-period tables."""
+    per = store.query("""
+        SELECT DVN_NAME, COUNT(DISTINCT msg_id) AS messages, SUM(DELIVERED) AS delivered
+        FROM per_dvn WHERE DVN_NAME IS NOT NULL GROUP BY DVN_NAME""")
+    hist = store.query("""
+        SELECT DVN_NAME, LATENCY_S, COUNT(*) AS count
+        FROM per_dvn WHERE DVN_NAME IS NOT NULL AND LATENCY_S IS NOT NULL GROUP BY DVN_NAME, LATENCY_S""")
+    frames = {"kpi_ci": kpi_cis("DVN_NAME", per["DVN_NAME"], per["delivered"].fillna(0), per["messages"],
+                                hist, "LATENCY_S")}
+    msgs = store.query(f"SELECT stack AS Required_Stack, LATENCY_S FROM ({MSGS_SQL}) AS s")
+    win = store.query(f"SELECT WINDOW, REQUIRED_STACK AS Required_Stack, LATENCY_S FROM ({WIN_MSGS_SQL}) AS s")
+    parts = {"stack_ci": [], "dvn_ci": []}
+    for w, txs in [("all", msgs)] + [(w, win[win["WINDOW"] == w]) for w in WINDOWS]:
+        if txs["LATENCY_S"].notna().any():
+            for table, f in zip(parts, stack_cis(txs, [0.5, "mean", 0.95])):
+                parts[table].append(f.assign(WINDOW=w))
+    for table, fs in parts.items():
+        keys, kpis = CI_KPIS[table]
+        names = {f"{e}_{i}": f"{c}_{e}" for i, c in enumerate(kpis) if c for e in ("lo", "hi")}
+        f = pd.concat(fs, ignore_index=True) if fs else pd.DataFrame(columns=keys + list(names))
+        frames[table] = f.rename(columns=names)[[c for c, _ in CI_TABLES[table]]]
+    return frames
+
+
+def schema_sql():
+    stack_summary = f"""
+        SELECT q.stack AS Required_Stack, n AS transactions, median AS median_latency,
+               c.median_latency_lo, c.median_latency_hi, mean AS avg_latency, c.avg_latency_lo, c.avg_latency_hi,
+               p95 AS p95_latency, c.p95_latency_lo, c.p95_latency_hi
+        FROM ({quantile_sql(MSGS_SQL, ["stack"], "LATENCY_S")}) AS q
+        LEFT JOIN stack_ci AS c ON c.WINDOW = 'all' AND c.Required_Stack = q.stack"""
+    win_stack = f"""
+        SELECT q.WINDOW, q.REQUIRED_STACK AS Required_Stack, n AS transactions, median AS median_latency,
+               c.median_latency_lo, c.median_latency_hi, p95 AS p95_latency, c.p95_latency_lo, c.p95_latency_hi
+        FROM ({quantile_sql(WIN_MSGS_SQL, ["WINDOW", "REQUIRED_STACK"], "LATENCY_S")}) AS q
+        LEFT JOIN stack_ci AS c ON c.WINDOW = q.WINDOW AND c.Required_Stack = q.REQUIRED_STACK"""
+    kpi = f"""
+        SELECT d.DVN_NAME, d.unique_messages, d.rows, d.total_fees_eth, d.total_required_fees_eth,
+               d.total_optional_fees_eth, q.median AS median_latency, c.median_latency_lo, c.median_latency_hi,
+               q.p95 AS p95_latency, c.p95_latency_lo, c.p95_latency_hi, d.delivered_messages,
+               CASE WHEN d.unique_messages > 0 THEN 1.0 * d.delivered_messages / d.unique_messages END
+                   AS delivered_rate, c.delivered_rate_lo, c.delivered_rate_hi
+        FROM (SELECT DVN_NAME, COUNT(DISTINCT msg_id) AS unique_messages, COUNT(msg_id) AS rows,
+                     COALESCE(SUM(FEE_ETH), 0.0) AS total_fees_eth,
+                     COALESCE(SUM(FEE_REQUIRED_ETH), 0.0) AS total_required_fees_eth,
+                     COALESCE(SUM(FEE_OPTIONAL_ETH), 0.0) AS total_optional_fees_eth,
+                     SUM(DELIVERED) AS delivered_messages
+              FROM per_dvn WHERE DVN_NAME IS NOT NULL GROUP BY DVN_NAME) AS d
+        LEFT JOIN ({quantile_sql("SELECT DVN_NAME, LATENCY_S FROM per_dvn WHERE DVN_NAME IS NOT NULL",
+                                 ["DVN_NAME"], "LATENCY_S")}) AS q ON q.DVN_NAME = d.DVN_NAME
+        LEFT JOIN kpi_ci AS c ON c.DVN_NAME = d.DVN_NAME
+        ORDER BY d.DVN_NAME"""
+    views = {
+        "kpi_by_dvn_final": kpi,
+        "stack_latency_summary": f"{stack_summary} ORDER BY transactions DESC, Required_Stack",
+        "dvn_stack_reliability": dvn_from_stacks_sql(
+            "SELECT * FROM stack_latency_summary WHERE Required_Stack <> 'Unknown'", "all") + " ORDER BY m.DVN_NAME",
+        "stack_by_window": win_stack,
+    }
+    for w in WINDOWS:
+        views[f"stack_{w}"] = (f"SELECT Required_Stack, transactions, median_latency, median_latency_lo, "
+                               f"median_latency_hi, p95_latency, p95_latency_lo, p95_latency_hi FROM stack_by_window "
+                               f"WHERE WINDOW = '{w}' ORDER BY transactions DESC, Required_Stack")
+        views[f"dvn_{w}"] = dvn_from_stacks_sql(f"SELECT * FROM stack_{w}", w) + " ORDER BY m.DVN_NAME"
+    return views
+
+
+def messages_sql():
+    """messages from per_dvn: timestamp of the first row, first latency, sorted set of required DVN names."""
+    return """
+        CREATE TABLE messages AS
+        SELECT f.msg_id, p.GUID, p.TS_MS, l.LATENCY_S, s.REQUIRED_STACK
+        FROM (SELECT msg_id, MIN(rid) AS rid FROM per_dvn WHERE msg_id IS NOT NULL GROUP BY msg_id) AS f
+        JOIN per_dvn AS p ON p.rid = f.rid
+        LEFT JOIN (SELECT x.msg_id, x.LATENCY_S FROM per_dvn AS x
+                   JOIN (SELECT msg_id, MIN(rid) AS rid FROM per_dvn
+                         WHERE msg_id IS NOT NULL AND LATENCY_S IS NOT NULL GROUP BY msg_id) AS y
+                   ON x.rid = y.rid) AS l ON l.msg_id = f.msg_id
+        LEFT JOIN (SELECT msg_id, COALESCE(GROUP_CONCAT(DVN_NAME, ' + '), '') AS REQUIRED_STACK
+                   FROM (SELECT DISTINCT msg_id, DVN_NAME FROM per_dvn
+                         WHERE ROLE = 'required' AND msg_id IS NOT NULL ORDER BY msg_id, DVN_NAME) AS r
+                   GROUP BY msg_id) AS s ON s.msg_id = f.msg_id"""
+
+
+def messages_sql_duckdb():
+    # DuckDB does not keep subquery order in aggregates; order the names inside STRING_AGG instead
+    return messages_sql().replace("GROUP_CONCAT(DVN_NAME, ' + ')", "STRING_AGG(DVN_NAME, ' + ' ORDER BY DVN_NAME)")
+
+
+def stack_members(stacks):
+    """(REQUIRED_STACK, DVN_NAME) pairs, split like the pandas scripts split a stack string."""
+    rows = set()
+    for s in stacks:
+        if s and s != "Unknown":
+            rows.update((s, n.strip()) for n in s.split("+") if n.strip())
+    return pd.DataFrame(sorted(rows), columns=["REQUIRED_STACK", "DVN_NAME"])
+
+
+def windows_frame():
+    to_ms = lambda t: int(t.value // 1_000_000)
+    return pd.DataFrame([(w, to_ms(s), to_ms(e)) for w, (s, e) in WINDOWS.items()],
+                        columns=["WINDOW", "START_MS", "END_MS"])
+
+
+# ---------- engines ----------
+
+class Store:
+    """The same tables and views on SQLite (default) or DuckDB."""
+
+    def __init__(self, path, engine=None):
+        self.path = Path(path)
+        self.engine = engine or ("duckdb" if self.path.suffix in (".duckdb", ".ddb") else "sqlite")
+        if self.engine == "duckdb":
+            if duckdb is None:
+                raise SystemExit("DuckDB is not installed (pip install duckdb); use --engine sqlite")
+            self.con = duckdb.connect(str(self.path))
+        else:
+            self.con = sqlite3.connect(self.path)
+            self.con.execute("PRAGMA journal_mode = OFF")
+            self.con.execute("PRAGMA synchronous = OFF")
+
+    def execute(self, sql, params=()):
+        return self.con.execute(sql, params)
+
+    def query(self, sql):
+        cur = self.con.execute(sql)
+        cols = [d[0] for d in cur.description]
+        return pd.DataFrame(cur.fetchall(), columns=cols)
+
+    def insert(self, table, df):
+        if self.engine == "duckdb":
+            self.con.register("_frame", df)
+            self.con.execute(f"INSERT INTO {table} SELECT * FROM _frame")
+            self.con.unregister("_frame")
+        else:
+            cols = [df[c].to_numpy(dtype=object) for c in df.columns]
+            # SQLite stores NaN as NULL
+            self.con.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(cols))})", zip(*cols))
+
+    def meta(self):
+        try:
+            return json.loads(self.query("SELECT value FROM meta WHERE key = 'source'").iloc[0, 0])
+        except Exception:
+            return None
+
+    def commit(self):
+        if self.engine == "sqlite":
+            self.con.commit()
+
+
+def sync(in_csv, db, engine=None, force=False, chunk_rows=CHUNK_ROWS):
+    """(Re)build the store from the joined per-DVN CSV; skipped when the CSV is unchanged."""
+    store = Store(db, engine)
+    source = {"input": fingerprint([in_csv])}
+    if not force and store.meta() == source:
+        print(f"{db} is up to date with {in_csv}")
+        return store
+    for view in list(schema_sql())[::-1]:
+        store.execute(f"DROP VIEW IF EXISTS {view}")
+    for table in ("per_dvn", "messages", "stack_members", "windows", *CI_TABLES, "meta"):
+        store.execute(f"DROP TABLE IF EXISTS {table}")
+    store.execute(f"CREATE TABLE per_dvn ({', '.join(f'{c} {t}' for c, t in PER_DVN)})")
+
+    codes = {}
+    with stage("sql_load", inputs=[in_csv]) as ev:
+        n = 0
+        for chunk in read_export(in_csv, usecols=lambda c: c in SOURCE_COLUMNS, chunksize=chunk_rows):
+            rows = typed(chunk.reset_index(drop=True), codes, n)
+            store.insert("per_dvn", rows)
+            n += len(rows)
+        ev.rows_in = ev.rows_out = n
+    with stage("sql_derive", rows_in=n) as ev:
+        store.execute("CREATE UNIQUE INDEX per_dvn_rid ON per_dvn (rid)")
+        store.execute("CREATE INDEX per_dvn_msg ON per_dvn (msg_id, rid)")
+        store.execute("CREATE INDEX per_dvn_name_lat ON per_dvn (DVN_NAME, LATENCY_S)")
+        store.execute("CREATE INDEX per_dvn_ts ON per_dvn (TS_MS)")
+        store.execute(messages_sql_duckdb() if store.engine == "duckdb" else messages_sql())
+        store.execute("CREATE INDEX messages_stack_lat ON messages (REQUIRED_STACK, LATENCY_S)")
+        store.execute("CREATE INDEX messages_ts ON messages (TS_MS)")
+        stacks = store.query("SELECT DISTINCT REQUIRED_STACK FROM messages WHERE REQUIRED_STACK IS NOT NULL")
+        store.execute("CREATE TABLE stack_members (REQUIRED_STACK TEXT, DVN_NAME TEXT)")
+        store.insert("stack_members", stack_members(stacks["REQUIRED_STACK"]))
+        store.execute("CREATE INDEX stack_members_stack ON stack_members (REQUIRED_STACK)")
+        store.execute("CREATE TABLE windows (WINDOW TEXT, START_MS BIGINT, END_MS BIGINT)")
+        store.insert("windows", windows_frame())
+        for table, frame in ci_frames(store).items():
+            store.execute(f"CREATE TABLE {table} ({', '.join(f'{c} {t}' for c, t in CI_TABLES[table])})")
+            store.insert(table, frame)
+        for view, sql in schema_sql().items():
+            store.execute(f"CREATE VIEW {view} AS {sql}")
+        store.execute("CREATE TABLE meta (key TEXT, value TEXT)")
+        store.insert("meta", pd.DataFrame({"key": ["source"], "value": [json.dumps(source)]}))
+        store.commit()
+        if store.engine == "sqlite":
+            store.execute("ANALYZE")
+        ev.rows_out = len(codes)
+    print(f"Saved: {db} ({n} per-DVN rows, {len(codes)} messages)")
+    return store
+
+
+def compare(store, out_dir):
+    """Every view against the CSV its pandas script wrote; numbers equal up to float summation order.
+
+    filled_cells counts values the view has where the CSV is empty; they do not count as differences.
+    """
+    report = []
+    for view, csv_name, keys in OUTPUTS:
+        path = Path(out_dir) / csv_name
+        if not path.exists():
+            continue
+        want = pd.read_csv(path)
+        got = store.query(f"SELECT * FROM {view}")
+        m = want.merge(got, on=keys, how="outer", suffixes=("_pandas", "_sql"), indicator=True)
+        missing = int((m["_merge"] != "both").sum())
+        both = m[m["_merge"] == "both"]
+        diff_cells, filled, max_rel = 0, 0, 0.0
+        for c in [c for c in want.columns if c not in keys and c in got.columns]:
+            a = pd.to_numeric(both[f"{c}_pandas"], errors="coerce").to_numpy(np.float64)
+            b = pd.to_numeric(both[f"{c}_sql"], errors="coerce").to_numpy(np.float64)
+            bad = ~np.isclose(a, b, rtol=1e-9, atol=1e-12, equal_nan=True)
+            # cells the pandas script left empty (wrapped latencies in kpi_by_dvn_final)
+            gap = bad & np.isnan(a) & ~np.isnan(b)
+            filled += int(gap.sum())
+            diff_cells += int((bad & ~gap).sum())
+            with np.errstate(invalid="ignore", divide="ignore"):
+                rel = np.abs(a - b) / np.maximum(np.abs(a), 1e-300)
+            if np.isfinite(rel).any():
+                max_rel = max(max_rel, float(np.nanmax(rel)))
+        report.append({"view": view, "csv": csv_name, "rows": len(want), "unmatched_rows": missing,
+                       "differing_cells": diff_cells, "filled_cells": filled, "max_rel_diff": max_rel,
+                       "status": "OK" if not missing and not diff_cells else "DIFF"})
+    return pd.DataFrame(report, columns=["view", "csv", "rows", "unmatched_rows", "differing_cells",
+                                         "filled_cells", "max_rel_diff", "status"])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local SQL store (SQLite / DuckDB) with views matching the pandas outputs.")
+    ap.add_argument("command", choices=["sync", "query", "compare"])
+    ap.add_argument("arg", nargs="?", default=None, help="sync: joined per-DVN CSV; query: SQL or view name")
+    ap.add_argument("--db", default=DB, help="store file (.duckdb selects DuckDB)")
+    ap.add_argument("--engine", choices=["sqlite", "duckdb"], default=None)
+    ap.add_argument("--force", action="store_true", help="sync: rebuild even if the CSV is unchanged")
+    ap.add_argument("--out", default=None, help="query: write the result to this CSV")
+    ap.add_argument("--dir", default=".", help="compare: directory with the pandas outputs")
+    args = ap.parse_args()
+
+    if args.command == "sync":
+        sync(args.arg or IN_CSV, args.db, args.engine, args.force)
+        return
+    if not Path(args.db).exists():
+        raise SystemExit(f"{args.db} not found; run sync first")
+    store = Store(args.db, args.engine)
+    if args.command == "query":
+        if not args.arg:
+            ap.error("query needs SQL or a view name")
+        sql = args.arg if " " in args.arg.strip() else f"SELECT * FROM {args.arg.strip()}"
+        with stage("sql_query") as ev:
+            df = store.query(sql)
+            ev.rows_out = len(df)
+        if args.out:
+            df.to_csv(args.out, index=False)
+            print("Saved:", args.out)
+        else:
+            print(df.to_string(index=False))
+    else:
+        report = compare(store, args.dir)
+        print(report.to_string(index=False) if len(report) else f"No pandas outputs found in {args.dir}")
+        if (report["status"] != "OK").any():
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
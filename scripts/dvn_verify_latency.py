@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# dvn_verify_latency.py
+# Per-DVN verification latency from the destination chain's PayloadVerified events.
+#
+# Per-DVN latency elsewhere is a proxy: compute_dvn_stack_latency.py spreads each stack's
+# delivery latency over the DVNs in the stack (see Limitations in docs/README.md). On the
+# destination chain, ReceiveUln302 emits PayloadVerified(dvn, header, confirmations, proofHash)
+# once per DVN and packet, so every DVN's own source -> verification time can be measured.
+#
+# Matching verifications to messages (hash and sorted joins only, no per-row lookups):
+#  - verifications of one packet share proofHash (the payload hash) and the 81-byte packet
+#    header, which is decoded for the whole column at once (nonce, srcEid, sender, dstEid,
+#    receiver; payload_decode.py);
+#  - GUID when the decoded log carries one;
+#  - else the delivery: PacketDelivered(origin) and OFTReceived(guid) in the same destination
+#    transaction give (srcEid, sender, nonce) -> GUID for every delivered message;
+#  - else an as-of join for messages with a nonce in the export: the latest message with the same
+#    (srcEid, dstEid, nonce) sent before the packet's first verification, within --max-lag.
+# Per (message, DVN) the first verification counts (re-verifications are ignored). The DVN's role
+# comes from the message's stack; a DVN that verified without being in it is 'unlisted'. Stack
+# slots count only for messages with at least one matched verification, so a log window that
+# does not cover a message does not count against its DVNs.
+#
+# Outputs (in --out-dir):
+#  - dvn_verifications.csv        one row per (message, DVN): timestamps, latency, match method
+#  - dvn_verify_latency.csv       per DVN and role: slots, verified, rate, latency mean and
+#                                 p50/p90/p95/p99, next to the delivery latency of the same messages
+#  - dvn_verify_latency_hist.csv  per DVN and role: count of every latency (s), mergeable across runs
+#
+# Usage:
+#   python3 scripts/dvn_verify_latency.py <dt_clean.csv> <dest_logs> [--out-dir .] [--max-lag 86400]
+#       [--names dvnNames-Sheet2.csv]
+# dest_logs are decoded destination event logs (JSON, JSON lines or CSV; comma-separated for several),
+# as read by match_events.py.
+
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dvn_instrument import stage
+from dvn_io import explode_dvns, dvn_names, NAMES_CSV
+from dvn_schema import read_typed
+from dvn_checkpoint import value_hist, hist_quantiles, write_csv_atomic
+from match_events import read_logs, decoded
+from payload_decode import payload_chars, hex_field, uint_field
+
+VERIFY_EVENT = "PayloadVerified"
+# packet header: version (1) | nonce (8) | srcEid (4) | sender (32) | dstEid (4) | receiver (32)
+HEADER_BYTES = 81
+MSG_COLUMNS = ["GUID", "SOURCETIMESTAMP", "SOURCEENDPOINTID", "DESTINATIONENDPOINTID", "MESSAGENONCEDECIMAL",
+               "DEST_ORIGIN_NONCE", "REQUIREDDVNS", "OPTIONALDVNS", "DVN_FEES_ARRAY", "LATENCYTODELIVERY_SECONDS"]
+QS = [0.5, 0.9, 0.95, 0.99]
+OUT_ROWS = "dvn_verifications.csv"
+OUT_KPI = "dvn_verify_latency.csv"
+OUT_HIST = "dvn_verify_latency_hist.csv"
+
+
+def decode_header(headers):
+    """nonce, src_eid, sender, dst_eid, receiver of packet headers (null where undecodable)."""
+    chars, valid = payload_chars(headers, HEADER_BYTES)
+    out = pd.DataFrame({
+        "nonce": pd.Series(uint_field(chars, 1, 9).astype(np.int64), dtype="Int64"),
+        "src_eid": pd.Series(uint_field(chars, 9, 13).astype(np.int64), dtype="Int64"),
+        "sender": hex_field(chars, 25, 45),
+        "dst_eid": pd.Series(uint_field(chars, 45, 49).astype(np.int64), dtype="Int64"),
+        "receiver": hex_field(chars, 61, 81),
+    })
+    out.loc[~valid, :] = None
+    return out
+
+
+def lower_hex(s):
+    return s.astype(str).str.lower().replace({"none": None, "nan": None})
+
+
+def verification_table(logs):
+    v = logs[logs["event_name"] == VERIFY_EVENT]
+    v = pd.concat([v[["tx_hash", "block_number", "block_timestamp"]], decoded(v, {
+        "dvn": "dvn", "header": "header", "confirmations": "confirmations", "payload_hash": "proofHash",
+        "guid": "guid"})], axis=1).reset_index(drop=True)
+    v = pd.concat([v, decode_header(v["header"])], axis=1)
+    for c in ("dvn", "payload_hash", "guid", "header"):
+        v[c] = lower_hex(v[c])
+    # one key per packet: the payload hash, or the header when a decoder dropped it
+    v["packet"] = v["payload_hash"].fillna(v["header"])
+    return v.rename(columns={"tx_hash": "verify_tx_hash", "block_number": "verify_block_number",
+                             "block_timestamp": "verify_timestamp"})
+
+
+def delivery_guids(logs):
+    """(src_eid, sender, nonce) -> GUID from PacketDelivered + OFTReceived of the same transaction.
+
+    Several packets delivered in one transaction pair up in event order."""
+    def nth(df):
+        df = df.sort_values(["tx_hash", "event_index"], kind="stable")
+        return df.assign(k=df.groupby("tx_hash").cumcount())
+    pd_ = logs[logs["event_name"] == "PacketDelivered"]
+    pd_ = nth(pd.concat([pd_[["tx_hash", "event_index"]], decoded(pd_, {
+        "src_eid": "origin.srcEid", "sender": "origin.sender", "nonce": "origin.nonce"})], axis=1))
+    oft = logs[logs["event_name"] == "OFTReceived"]
+    oft = nth(pd.concat([oft[["tx_hash", "event_index"]], decoded(oft, {"guid": "guid"})], axis=1))
+    m = pd_.merge(oft[["tx_hash", "k", "guid"]], on=["tx_hash", "k"], how="inner")
+    out = pd.DataFrame({
+        "src_eid": pd.to_numeric(m["src_eid"], errors="coerce").astype("Int64"),
+        # origin.sender is bytes32; the header's sender is its low 20 bytes
+        "sender": "0x" + lower_hex(m["sender"]).str[-40:],
+        "nonce": pd.to_numeric(m["nonce"], errors="coerce").astype("Int64"),
+        "GUID": lower_hex(m["guid"]),
+    })
+    return out.dropna().drop_duplicates(["src_eid", "sender", "nonce"])
+
+
+def match_packets(msgs, ver, deliveries, max_lag):
+    """msg row (-1 when unmatched) and MATCH_METHOD for every packet of the verifications."""
+    packets = ver.groupby("packet", sort=False).agg(
+        first_ts=("verify_timestamp", "min"), guid=("guid", "first"), nonce=("nonce", "first"),
+        src_eid=("src_eid", "first"), sender=("sender", "first"), dst_eid=("dst_eid", "first")).reset_index()
+    guid_row = pd.Series(msgs.index, index=msgs["GUID"]).groupby(level=0).first()
+    packets["msg"], packets["MATCH_METHOD"] = -1, "NO_MATCH"
+
+    # on GUID, from the log itself or from the delivery transaction
+    keyed = packets.merge(deliveries, on=["src_eid", "sender", "nonce"], how="left")["GUID"].to_numpy()
+    for method, guids in (("GUID", packets["guid"]), ("DELIVERY", pd.Series(keyed, index=packets.index))):
+        rows = guids.map(guid_row)
+        hit = (packets["msg"] < 0) & rows.notna()
+        packets.loc[hit, "msg"] = rows[hit].astype(np.int64)
+        packets.loc[hit, "MATCH_METHOD"] = method
+
+    # as-of on (srcEid, dstEid, nonce) for the rest, where the export has nonces
+    nonce = msgs["MESSAGENONCEDECIMAL"].fillna(msgs["DEST_ORIGIN_NONCE"])
+    right = pd.DataFrame({"src_eid": msgs["SOURCEENDPOINTID"], "dst_eid": msgs["DESTINATIONENDPOINTID"],
+                          "nonce": nonce, "ts": msgs["SOURCETIMESTAMP"].dt.as_unit("us"),
+                          "row": msgs.index}).dropna()
+    left = packets[(packets["msg"] < 0)][["src_eid", "dst_eid", "nonce", "first_ts"]].dropna()
+    if len(left) and len(right):
+        keys = ["src_eid", "dst_eid", "nonce"]
+        left, right = left.astype({k: np.int64 for k in keys}), right.astype({k: np.int64 for k in keys})
+        left["ts"] = left["first_ts"].dt.as_unit("us")
+        asof = pd.merge_asof(left.reset_index().sort_values("ts"), right.sort_values("ts"), on="ts", by=keys,
+                             direction="backward", tolerance=pd.Timedelta(seconds=max_lag))
+        asof = asof.dropna(subset=["row"])
+        packets.loc[asof["index"], "msg"] = asof["row"].astype(np.int64).to_numpy()
+        packets.loc[asof["index"], "MATCH_METHOD"] = "NONCE_ASOF"
+    return packets[["packet", "msg", "MATCH_METHOD"]]
+
+
+def verifications(msgs, ver, packets, names):
+    """One row per (message, DVN): the first verification, the DVN's role in the stack, latency."""
+    v = ver.merge(packets, on="packet")
+    v = v[v["msg"] >= 0].sort_values("verify_timestamp", kind="stable").drop_duplicates(["msg", "dvn"])
+    stack = explode_dvns(msgs, names)[["row", "addr", "ROLE", "DVN_NAME"]]
+    covered = np.unique(v["msg"].to_numpy())
+    stack = stack[np.isin(stack["row"].to_numpy(), covered)]
+    out = stack.merge(v, left_on=["row", "addr"], right_on=["msg", "dvn"], how="outer")
+    out["row"] = out["row"].fillna(out["msg"]).astype(np.int64)
+    out["addr"] = out["addr"].fillna(out["dvn"])
+    out["ROLE"] = out["ROLE"].fillna("unlisted")
+    out["DVN_NAME"] = out["DVN_NAME"].fillna(out["addr"].map(names)).fillna(out["addr"])
+    m = msgs.loc[out["row"].to_numpy()]
+    lat = (out["verify_timestamp"].to_numpy() - m["SOURCETIMESTAMP"].to_numpy()) / np.timedelta64(1, "s")
+    return pd.DataFrame({
+        "GUID": m["GUID"].to_numpy(),
+        "SOURCETIMESTAMP": m["SOURCETIMESTAMP"].to_numpy(),
+        "DVN_ADDR": out["addr"].to_numpy(),
+        "DVN_NAME": out["DVN_NAME"].to_numpy(),
+        "ROLE": out["ROLE"].to_numpy(),
+        "VERIFY_TXHASH": out["verify_tx_hash"].to_numpy(),
+        "VERIFY_BLOCKNUMBER": out["verify_block_number"].astype("Int64").array,
+        "VERIFY_TIMESTAMP": out["verify_timestamp"].to_numpy(),
+        "CONFIRMATIONS": pd.to_numeric(out["confirmations"], errors="coerce").to_numpy(),
+        "VERIFY_LATENCY_S": lat,
+        "DELIVERY_LATENCY_S": m["LATENCYTODELIVERY_SECONDS"].to_numpy(),
+        "MATCH_METHOD": out["MATCH_METHOD"].fillna("NOT_VERIFIED").to_numpy(),
+    }).sort_values(["SOURCETIMESTAMP", "GUID", "ROLE", "DVN_NAME"], kind="stable", ignore_index=True)
+
+
+def latency_kpis(rows):
+    """(per DVN and role summary, latency histogram) of the verification rows."""
+    keys = ["DVN_NAME", "ROLE"]
+    rows = rows.assign(LATENCY_S=rows["VERIFY_LATENCY_S"].round(), verified=rows["VERIFY_LATENCY_S"].notna())
+    hist = value_hist(rows, keys, "LATENCY_S")
+    kpi = rows.groupby(keys).agg(slots=("GUID", "size"), verified=("verified", "sum"),
+                                 mean_latency_s=("VERIFY_LATENCY_S", "mean"),
+                                 delivery_p50_s=("DELIVERY_LATENCY_S", "median")).reset_index()
+    kpi.loc[kpi["ROLE"] == "unlisted", "slots"] = 0
+    kpi["verified_rate"] = (kpi["verified"] / kpi["slots"].where(kpi["slots"] > 0)).round(4)
+    q = hist_quantiles(hist, keys, "LATENCY_S", QS)
+    for i, name in enumerate(["p50_s", "p90_s", "p95_s", "p99_s"]):
+        kpi[name] = [q.get((d, r), [np.nan] * len(QS))[i] for d, r in zip(kpi["DVN_NAME"], kpi["ROLE"])]
+    cols = keys + ["slots", "verified", "verified_rate", "mean_latency_s", "p50_s", "p90_s", "p95_s", "p99_s",
+                   "delivery_p50_s"]
+    return kpi[cols].sort_values(["ROLE", "verified"], ascending=[False, False], ignore_index=True), hist
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-DVN source -> verification latency from PayloadVerified events.")
+    ap.add_argument("dt_csv", help="dt_clean.csv export (messages and their DVN stacks)")
+    ap.add_argument("dest_logs", help="destination decoded logs with PayloadVerified (+ PacketDelivered, OFTReceived)")
+    ap.add_argument("--out-dir", default=".")
+    ap.add_argument("--max-lag", type=float, default=86400, help="as-of join: max seconds from send to verification")
+    ap.add_argument("--names", default=str(NAMES_CSV))
+    args = ap.parse_args()
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    names = dvn_names(args.names)
+
+    with stage("load", inputs=[args.dt_csv] + [p for p in args.dest_logs.split(",") if p]) as ev:
+        msgs = read_typed(args.dt_csv, MSG_COLUMNS)
+        for c in MSG_COLUMNS:
+            if c not in msgs:
+                msgs[c] = pd.NA
+        logs = read_logs(args.dest_logs)
+        ev.rows_out = len(msgs) + len(logs)
+    with stage("decode", rows_in=len(logs)) as ev:
+        ver = verification_table(logs)
+        deliveries = delivery_guids(logs)
+        ev.rows_out = len(ver)
+    with stage("match", rows_in=len(ver)) as ev:
+        packets = match_packets(msgs, ver, deliveries, args.max_lag)
+        rows = verifications(msgs, ver, packets, names)
+        ev.rows_out = len(rows)
+    with stage("kpi", rows_in=len(rows)) as ev:
+        kpi, hist = latency_kpis(rows)
+        ev.rows_out = len(kpi)
+
+    write_csv_atomic(rows, out_dir / OUT_ROWS)
+    write_csv_atomic(kpi, out_dir / OUT_KPI)
+    write_csv_atomic(hist, out_dir / OUT_HIST)
+    print(f"{len(ver)} verifications, {len(packets)} packets:")
+    print(packets["MATCH_METHOD"].value_counts().to_string())
+    print(kpi.to_string(index=False))
+    for f in (OUT_ROWS, OUT_KPI, OUT_HIST):
+        print("Saved:", out_dir / f)
+
+
+if __name__ == "__main__":
+    main()
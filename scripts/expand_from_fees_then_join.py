@@ -1,54 +1,46 @@
 #!/usr/bin/env python3
 # expand_from_fees_then_join.py
-import sys, re, ast
+#
+# The fees file is exploded per DVN and joined in chunks of --chunk-rows rows. The explode step is
+# dvn_backend.expand (--backend pandas|polars): DVN names and fees come from RequiredDVN_Mapping /
+# OptionalDVN_Mapping by position, else from the address and DVN_FEES_ARRAY. Every finished chunk
+# is checkpointed (rows + partial KPI aggregates, see dvn_checkpoint.py), so a crashed run
+# restarted with the same arguments resumes after the last finished chunk and writes the
+# same outputs. The checkpoint directory is removed after a successful run unless
+# --keep-checkpoint is given.
+#
+# Usage: python expand_from_fees_then_join.py <dvnFeesMapped.csv> <dt_clean.csv>
+#            [--chunk-rows 50000] [--checkpoint-dir expanded.checkpoint] [--keep-checkpoint]
+#            [--backend pandas|polars]
+import re, argparse
 from decimal import Decimal, getcontext
 from pathlib import Path
 import pandas as pd
 import numpy as np
+from dvn_instrument import stage
+from dvn_checkpoint import Checkpoint, value_hist, hist_quantiles
+from dvn_backend import expand, fees_usecols, available, BACKENDS
 
 getcontext().prec = 36
 
-if len(sys.argv) < 3:
-    print("Usage: python expand_from_fees_then_join.py <dvnFeesMapped.csv> <dt_clean.csv>")
-    sys.exit(1)
-
-FEES_CSV = Path(sys.argv[1])
-DT_CSV = Path(sys.argv[2])
 OUT_PREFIX = "expanded"
-
+ap = argparse.ArgumentParser(description="Expand fees per DVN, join with dt_clean and aggregate KPIs.")
+ap.add_argument("fees_csv", help="dvnFeesMapped.csv")
+ap.add_argument("dt_csv", help="dt_clean.csv")
+ap.add_argument("--chunk-rows", type=int, default=50_000, help="fee rows per checkpointed chunk")
+ap.add_argument("--checkpoint-dir", default=f"{OUT_PREFIX}.checkpoint")
+ap.add_argument("--keep-checkpoint", action="store_true", help="keep part files after a successful run")
+ap.add_argument("--backend", choices=list(BACKENDS), default="pandas", help="dataframe backend of the explode step")
+args = ap.parse_args()
+
+FEES_CSV = Path(args.fees_csv)
+DT_CSV = Path(args.dt_csv)
 assert FEES_CSV.exists(), f"{FEES_CSV} not found"
 assert DT_CSV.exists(), f"{DT_CSV} not found"
+assert args.backend in available(), f"backend {args.backend} is not installed"
 
 pd.set_option('display.max_colwidth', 400)
 
-def parse_array_field(s):
-    if s is None: return []
-    text = str(s).strip()
-    if text == "" or text.lower() in ("nan","none"): return []
-    # remove surrounding [] and whitespace; choose ';' if appears to be used
-    t = re.sub(r'^[\[\(]\s*','', re.sub(r'\s*[\]\)]$','', text))
-    # prefer semicolon separator when present
-    sep = ';' if ';' in t and t.count(';') >= t.count(',') else ','
-    parts = [p.strip().strip("'\"") for p in re.split(r'[;,]+', t) if p.strip()]
-    return parts
-
-def safe_parse_list_of_tuples(s):
-    if s is None: return []
-    text = str(s).strip()
-    if text == "" or text.lower() in ("nan","none"): return []
-    try:
-        val = ast.literal_eval(text)
-        out=[]
-        if isinstance(val, (list, tuple)):
-            for item in val:
-                if isinstance(item, (list, tuple)) and len(item)>=2:
-                    out.append((str(item[0]).strip(), str(item[1]).strip()))
-        return out
-    except Exception:
-        # regex fallback: ('Name','123')
-        pairs = re.findall(r"['\"]?([^,'\"\)\(]+?)['\"]?\s*[,;]\s*['\"]?([0-9]+)['\"]?", text)
-        return [(p[0].strip(), p[1].strip()) for p in pairs]
-
 def wei_to_eth_decimal_str(x):
     if x is None or str(x).strip()=="":
         return None
@@ -59,10 +51,13 @@ def wei_to_eth_decimal_str(x):
     except Exception:
         return None
 
-# load fees file
-fees = pd.read_csv(FEES_CSV, dtype=str, keep_default_na=False, na_values=['','NA','N/A'])
-# load dt
-dt = pd.read_csv(DT_CSV, dtype=str, keep_default_na=False, na_values=['','NA','N/A'])
+with stage("load", inputs=[FEES_CSV, DT_CSV]) as ev:
+    # load fees file
+    fees = pd.read_csv(FEES_CSV, dtype=str, keep_default_na=False, na_values=['','NA','N/A'])
+    fees = fees.rename(columns=fees_usecols(FEES_CSV))
+    # load dt
+    dt = pd.read_csv(DT_CSV, dtype=str, keep_default_na=False, na_values=['','NA','N/A'])
+    ev.rows_out = len(fees) + len(dt)
 
 # normalize GUIDs (strip ="" wrappers if any, lowercase)
 def norm_guid(s):
@@ -74,83 +69,77 @@ def norm_guid(s):
         s = s[1:-1]
     return s.lower()
 
-fees = fees.assign(GUID = fees['GUID'].astype(str).apply(norm_guid))
-dt = dt.assign(GUID = dt['GUID'].astype(str).apply(norm_guid))
-
-rows = []
-for i, r in fees.iterrows():
-    guid = r['GUID']
-    # parse arrays and maps
-    req_addrs = parse_array_field(r.get('requiredDVNs'))
-    opt_addrs = parse_array_field(r.get('optionalDVNs'))
-    fees_arr = parse_array_field(r.get('DVN_FEES_ARRAY'))
-    req_map = safe_parse_list_of_tuples(r.get('RequiredDVN_Mapping'))
-    opt_map = safe_parse_list_of_tuples(r.get('OptionalDVN_Mapping'))
-    # required: pair by index; name from req_map if available else addr; fee from map or fees_arr
-    n_req = max(len(req_addrs), len(req_map))
-    n_opt = max(len(opt_addrs), len(opt_map))
-    # required
-    for j in range(n_req):
-        addr = req_addrs[j] if j < len(req_addrs) else None
-        name = req_map[j][0] if j < len(req_map) else (addr if addr is not None else None)
-        fee_wei = None
-        if j < len(req_map):
-            fee_wei = req_map[j][1]
-        else:
-            if j < len(fees_arr):
-                fee_wei = fees_arr[j]
-        rows.append({
-            'GUID': guid, 'DVN_ADDR': addr, 'DVN_NAME': name, 'ROLE': 'required', 'DVN_FEE_WEI': fee_wei
-        })
-    # optional
-    for j in range(n_opt):
-        addr = opt_addrs[j] if j < len(opt_addrs) else None
-        name = opt_map[j][0] if j < len(opt_map) else (addr if addr is not None else None)
-        fee_index = j + max(len(req_addrs), len(req_map))
-        fee_wei = None
-        if j < len(opt_map):
-            fee_wei = opt_map[j][1]
-        else:
-            if fee_index < len(fees_arr):
-                fee_wei = fees_arr[fee_index]
-        rows.append({
-            'GUID': guid, 'DVN_ADDR': addr, 'DVN_NAME': name, 'ROLE': 'optional', 'DVN_FEE_WEI': fee_wei
-        })
-
-expanded = pd.DataFrame(rows)
-print("Expanded rows:", len(expanded))
-# convert fees
-expanded['DVN_FEE_WEI_CLEAN'] = expanded['DVN_FEE_WEI'].apply(lambda x: None if x is None or str(x).strip()=='' else int(re.sub(r'[^\d\-]','', str(x))))
-expanded['DVN_FEE_ETH'] = expanded['DVN_FEE_WEI_CLEAN'].apply(lambda x: wei_to_eth_decimal_str(x))
-# separate required/optional fee columns
-expanded['DVN_FEE_IF_REQUIRED_ETH'] = expanded.apply(lambda r: r['DVN_FEE_ETH'] if r['ROLE']=='required' else None, axis=1)
-expanded['DVN_FEE_IF_OPTIONAL_ETH'] = expanded.apply(lambda r: r['DVN_FEE_ETH'] if r['ROLE']=='optional' else None, axis=1)
-# numeric
-expanded['DVN_FEE_ETH_NUM'] = pd.to_numeric(expanded['DVN_FEE_ETH'], errors='coerce')
-expanded['DVN_FEE_IF_REQUIRED_ETH_NUM'] = pd.to_numeric(expanded['DVN_FEE_IF_REQUIRED_ETH'], errors='coerce')
-expanded['DVN_FEE_IF_OPTIONAL_ETH_NUM'] = pd.to_numeric(expanded['DVN_FEE_IF_OPTIONAL_ETH'], errors='coerce')
-
-# join with dt on GUID to pick up latency/tx/timestamps etc
-joined = expanded.merge(dt, on='GUID', how='left', suffixes=('','_dt'))
-
-# Save files
-expanded.to_csv(f"{OUT_PREFIX}_per_dvn.csv", index=False)
-joined.to_csv(f"{OUT_PREFIX}_per_dvn_joined.csv", index=False)
-
-# KPI aggregation by DVN_NAME
-joined['LATENCY_SECONDS'] = pd.to_numeric(joined.get('LATENCYTODELIVERY_SECONDS', joined.get('LATENCY_SECONDS')), errors='coerce')
-kpi = joined.groupby('DVN_NAME').agg(
-    unique_messages=('GUID','nunique'),
-    rows=('GUID','count'),
-    total_fees_eth=('DVN_FEE_ETH_NUM', lambda s: float(s.dropna().sum()) if s.dropna().size>0 else 0.0),
-    total_required_fees_eth=('DVN_FEE_IF_REQUIRED_ETH_NUM', lambda s: float(s.dropna().sum()) if s.dropna().size>0 else 0.0),
-    total_optional_fees_eth=('DVN_FEE_IF_OPTIONAL_ETH_NUM', lambda s: float(s.dropna().sum()) if s.dropna().size>0 else 0.0),
-    median_latency=('LATENCY_SECONDS', lambda s: float(s.dropna().median()) if s.dropna().size>0 else None),
-    p95_latency=('LATENCY_SECONDS', lambda s: float(s.dropna().quantile(0.95)) if s.dropna().size>0 else None),
-    delivered_messages=('MESSAGESTATUS', lambda s: int(s.dropna().apply(lambda x: 1 if str(x).upper()=='DELIVERED' else 0).sum()))
-).reset_index()
+with stage("normalize_guid", rows_in=len(fees) + len(dt)):
+    fees = fees.assign(GUID = fees['GUID'].astype(str).apply(norm_guid))
+    dt = dt.assign(GUID = dt['GUID'].astype(str).apply(norm_guid))
+
+def convert_fees(expanded):
+    # convert fees (kept as Python ints, so the column prints the same in every chunk)
+    expanded['DVN_FEE_WEI_CLEAN'] = pd.Series([None if x is None or str(x).strip()=='' else int(re.sub(r'[^\d\-]','', str(x)))
+                                               for x in expanded['DVN_FEE_WEI']], index=expanded.index, dtype=object)
+    expanded['DVN_FEE_ETH'] = expanded['DVN_FEE_WEI_CLEAN'].apply(lambda x: wei_to_eth_decimal_str(x))
+    # separate required/optional fee columns
+    expanded['DVN_FEE_IF_REQUIRED_ETH'] = expanded['DVN_FEE_ETH'].where(expanded['ROLE']=='required')
+    expanded['DVN_FEE_IF_OPTIONAL_ETH'] = expanded['DVN_FEE_ETH'].where(expanded['ROLE']=='optional')
+    # numeric
+    expanded['DVN_FEE_ETH_NUM'] = pd.to_numeric(expanded['DVN_FEE_ETH'], errors='coerce')
+    expanded['DVN_FEE_IF_REQUIRED_ETH_NUM'] = pd.to_numeric(expanded['DVN_FEE_IF_REQUIRED_ETH'], errors='coerce')
+    expanded['DVN_FEE_IF_OPTIONAL_ETH_NUM'] = pd.to_numeric(expanded['DVN_FEE_IF_OPTIONAL_ETH'], errors='coerce')
+    return expanded
+
+def kpi_partials(joined):
+    """Per-chunk KPI partials: sums per DVN_NAME, distinct (DVN_NAME, GUID), latency histogram."""
+    joined = joined.assign(
+        LATENCY_SECONDS=pd.to_numeric(joined.get('LATENCYTODELIVERY_SECONDS', joined.get('LATENCY_SECONDS')), errors='coerce'),
+        DELIVERED=joined['MESSAGESTATUS'].fillna('').astype(str).str.upper()=='DELIVERED')
+    # fee sums in row order, as one pass over the whole file adds them (groupby 'sum' is compensated
+    # and differs in the last digit); several chunks add their sums, which can still differ by an ULP
+    fee_sum = lambda s: float(s.dropna().sum()) if s.dropna().size>0 else 0.0
+    sums = joined.groupby('DVN_NAME').agg(
+        rows=('GUID','count'),
+        total_fees_eth=('DVN_FEE_ETH_NUM', fee_sum),
+        total_required_fees_eth=('DVN_FEE_IF_REQUIRED_ETH_NUM', fee_sum),
+        total_optional_fees_eth=('DVN_FEE_IF_OPTIONAL_ETH_NUM', fee_sum),
+        delivered_messages=('DELIVERED','sum')
+    ).reset_index()
+    guids = joined[['DVN_NAME','GUID']].dropna().drop_duplicates()
+    return sums, guids, value_hist(joined, ['DVN_NAME'], 'LATENCY_SECONDS')
+
+ckpt = Checkpoint(args.checkpoint_dir, [FEES_CSV, DT_CSV], {"chunk_rows": args.chunk_rows})
+n_chunks = max(1, -(-len(fees) // args.chunk_rows))
+with stage("expand_chunks", rows_in=len(fees)) as ev:
+    for c in range(n_chunks):
+        if ckpt.done(c):
+            ev.cache_hits += 1
+            continue
+        expanded = convert_fees(expand(fees.iloc[c * args.chunk_rows:(c + 1) * args.chunk_rows], args.backend))
+        # join with dt on GUID to pick up latency/tx/timestamps etc
+        joined = expanded.merge(dt, on='GUID', how='left', suffixes=('','_dt'))
+        sums, guids, hist = kpi_partials(joined)
+        ckpt.save(c, {"per_dvn": expanded, "joined": joined, "kpi_sums": sums, "kpi_guids": guids, "kpi_latency": hist})
+        print(f"chunk {c + 1}/{n_chunks}: {len(expanded)} expanded rows")
+    n_expanded = ev.rows_out = sum(m["rows"]["per_dvn"] for m in ckpt.manifest["chunks"].values())
+
+print("Expanded rows:", n_expanded)
+with stage("save_rows", rows_in=n_expanded):
+    # Save files
+    ckpt.concat("per_dvn", f"{OUT_PREFIX}_per_dvn.csv")
+    ckpt.concat("joined", f"{OUT_PREFIX}_per_dvn_joined.csv")
+
+with stage("kpi", rows_in=n_expanded) as ev:
+    # KPI aggregation by DVN_NAME, merged from the chunk partials
+    kpi = ckpt.read("kpi_sums", dtype={'DVN_NAME': str}).groupby('DVN_NAME').sum()
+    guids = ckpt.read("kpi_guids", dtype=str).drop_duplicates()
+    kpi.insert(0, 'unique_messages', guids.groupby('DVN_NAME').size().reindex(kpi.index, fill_value=0))
+    q = hist_quantiles(ckpt.read("kpi_latency", dtype={'DVN_NAME': str}), ['DVN_NAME'], 'LATENCY_SECONDS', [0.5, 0.95])
+    kpi.insert(5, 'median_latency', [q[(k,)][0] if (k,) in q else None for k in kpi.index])
+    kpi.insert(6, 'p95_latency', [q[(k,)][1] if (k,) in q else None for k in kpi.index])
+    kpi = kpi.reset_index()
+    ev.rows_out = len(kpi)
 
 kpi.to_csv(f"{OUT_PREFIX}_kpi_by_dvn.csv", index=False)
+if not args.keep_checkpoint:
+    ckpt.remove()
 
 print("Saved:", f"{OUT_PREFIX}_per_dvn.csv", f"{OUT_PREFIX}_per_dvn_joined.csv", f"{OUT_PREFIX}_kpi_by_dvn.csv")
 print("Top DVNs by total_fees_eth:")
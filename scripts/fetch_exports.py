@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# fetch_exports.py
+# Concurrent, resumable download of query results into the pathway store (see pathways.py).
+#
+# For every pathway the first page gives the page count and the head block; the remaining
+# pages are fetched concurrently (at most --concurrency requests in flight) and handed to a
+# single writer through a bounded queue, so a slow disk holds the fetchers back instead of
+# piling pages up in memory. Failed requests (network errors, 429, 5xx) are retried with
+# exponential backoff, honouring Retry-After.
+#
+# Pages are written in the json-to-csv.js layout to a staging file first. Only when all pages
+# of a pathway arrived is the staging file appended to src=<eid>/dst=<eid>/dt_clean.csv and
+# checkpoint.json advanced to the head block, so the next run only asks for newer blocks. The head
+# block is the API's toBlock, else --to-block; when neither is given the cursor moves to the highest
+# SOURCEBLOCKNUMBER of the committed pages, and a pathway whose new rows have none fails rather
+# than keep a cursor that never advances.
+# Before appending, the checkpoint records the export's size as "pending"; a run that finds a
+# pending commit (the previous one was interrupted mid-append) truncates the export back to that
+# size first, so an interrupted run leaves the store as it was. If the writer fails, the fetchers
+# are cancelled rather than left blocked on the full queue.
+#
+# Usage:
+#   python3 scripts/fetch_exports.py <base_url> [--pathways 30184-30101,30110-30101] [--root pathways]
+#       [--from-block N] [--to-block N] [--page-size 10000] [--concurrency 8] [--retries 5]
+# The API key is read from FLIPSIDE_API_KEY (sent as x-api-key) when set.
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from dvn_instrument import stage
+from dvn_io import export_lines
+from pathways import pathway_dir, DT_FILE
+from dvn_schema import DT_COLUMNS
+
+CHECKPOINT_FILE = "checkpoint.json"
+STAGING_FILE = "dt_clean.fetch.csv"
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class ResultsClient:
+    """Paginated results API client; blocking urllib calls run in worker threads."""
+
+    def __init__(self, base_url, api_key=None, concurrency=8, retries=5, timeout=60.0, page_size=10000):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.sem = asyncio.Semaphore(concurrency)
+        self.retries = retries
+        self.timeout = timeout
+        self.page_size = page_size
+        self.requests = 0
+        self.retried = 0
+
+    def _get(self, params):
+        url = f"{self.base_url}/results?{urllib.parse.urlencode(params)}"
+        req = urllib.request.Request(url, headers={"x-api-key": self.api_key} if self.api_key else {})
+        with urllib.request.urlopen(req, timeout=self.timeout) as r:
+            return json.loads(r.read())
+
+    async def page(self, src_eid, dst_eid, from_block, to_block, number):
+        params = {"src_eid": src_eid, "dst_eid": dst_eid, "from_block": from_block,
+                  "to_block": "" if to_block is None else to_block, "page": number, "page_size": self.page_size}
+        for attempt in range(self.retries + 1):
+            wait = None
+            async with self.sem:
+                self.requests += 1
+                try:
+                    return await asyncio.to_thread(self._get, params)
+                except urllib.error.HTTPError as e:
+                    if e.code not in RETRY_STATUS or attempt == self.retries:
+                        raise
+                    after = e.headers.get("Retry-After") if e.headers else None
+                    wait = float(after) if after and after.replace(".", "", 1).isdigit() else None
+                except (urllib.error.URLError, TimeoutError, ConnectionError):
+                    if attempt == self.retries:
+                        raise
+            # back off outside the semaphore so other pages keep the connection slots busy
+            self.retried += 1
+            await asyncio.sleep(wait if wait is not None else min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random()))
+
+
+def read_checkpoint(pdir):
+    path = Path(pdir) / CHECKPOINT_FILE
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def write_checkpoint(pdir, data):
+    path = Path(pdir) / CHECKPOINT_FILE
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=2))
+    os.replace(tmp, path)
+
+
+def recover(pdir):
+    """Undo the append of an interrupted commit: cut the export back to its size before it."""
+    cp = read_checkpoint(pdir)
+    if not cp or "pending" not in cp:
+        return
+    out = Path(pdir) / DT_FILE
+    size = cp.pop("pending")["dt_bytes"]
+    if size < 0:
+        out.unlink(missing_ok=True)
+    elif out.exists():
+        os.truncate(out, size)
+    write_checkpoint(pdir, cp)
+    print(f"{pdir}: rolled back an interrupted commit")
+
+
+def max_block(rows):
+    """Highest SOURCEBLOCKNUMBER of a page (None when no row has one)."""
+    blocks = [int(b) for b in (str(r.get("SOURCEBLOCKNUMBER") or "").strip('="') for r in rows) if b.isdigit()]
+    return max(blocks) if blocks else None
+
+
+async def writer(queue, staged, top):
+    """Single consumer: append pages to the staging file of their pathway; top gets its highest block."""
+    files = {}
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            pdir, rows = item
+            if pdir not in files:
+                files[pdir] = open(pdir / STAGING_FILE, "w", newline="")
+            files[pdir].writelines(export_lines(rows, DT_COLUMNS))
+            staged[pdir] = staged.get(pdir, 0) + len(rows)
+            b = max_block(rows)
+            if b is not None:
+                top[pdir] = max(b, top.get(pdir, b))
+            queue.task_done()
+    finally:
+        for f in files.values():
+            f.close()
+
+
+async def fetch_pathway(client, queue, root, src_eid, dst_eid, from_block, to_block):
+    """Fetch every page of one pathway into the queue; returns (pdir, from_block, head block)."""
+    pdir = pathway_dir(root, src_eid, dst_eid)
+    pdir.mkdir(parents=True, exist_ok=True)
+    recover(pdir)
+    if from_block is None:
+        cp = read_checkpoint(pdir)
+        from_block = cp["last_block"] + 1 if cp else 0
+    first = await client.page(src_eid, dst_eid, from_block, to_block, 1)
+    head = first.get("toBlock", to_block)
+    n_pages = first["page"]["totalPages"]
+    await queue.put((pdir, first["rows"]))
+
+    async def one(number):
+        # pin the head block of page 1 so later pages see the same snapshot
+        p = await client.page(src_eid, dst_eid, from_block, head, number)
+        await queue.put((pdir, p["rows"]))   # blocks while the writer is behind
+
+    tasks = [asyncio.create_task(one(n)) for n in range(2, n_pages + 1)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        raise
+    print(f"src={src_eid} dst={dst_eid}: blocks {from_block}..{head}, {n_pages} page(s)")
+    return pdir, from_block, head
+
+
+def commit(pdir, src_eid, dst_eid, from_block, head, n_rows, top=None):
+    """Append the staged pages to the pathway export and advance its checkpoint.
+
+    The cursor moves to head, or without one to top, the highest block of the staged rows.
+    The export's size before the append is checkpointed as pending first, so recover() can undo
+    a partial append; the final checkpoint write drops it and moves the cursor in one replace."""
+    staging = pdir / STAGING_FILE
+    out = pdir / DT_FILE
+    if head is None and n_rows and top is None:
+        raise ValueError("no toBlock from the API, no --to-block and no SOURCEBLOCKNUMBER in the new rows; "
+                         "the checkpoint could not advance")
+    with stage(f"commit_{src_eid}_{dst_eid}", rows_in=n_rows, inputs=[staging] if staging.exists() else []) as ev:
+        prev = read_checkpoint(pdir) or {}
+        if n_rows:
+            fresh = not out.exists()
+            write_checkpoint(pdir, {**prev, "pending": {"dt_bytes": -1 if fresh else out.stat().st_size}})
+            with open(out, "a", newline="") as f, open(staging, newline="") as s:
+                if fresh:
+                    f.write(",".join(DT_COLUMNS) + "\n")
+                for block in iter(lambda: s.read(1 << 20), ""):
+                    f.write(block)
+                f.flush()
+                os.fsync(f.fileno())
+        if staging.exists():
+            staging.unlink()
+        last = head if head is not None else top if n_rows else prev.get("last_block", from_block - 1)
+        write_checkpoint(pdir, {
+            "src_eid": int(src_eid), "dst_eid": int(dst_eid), "last_block": int(last),
+            "rows": prev.get("rows", 0) + n_rows,
+            "updated_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        })
+        ev.rows_out = n_rows
+
+
+async def fetch_all(base_url, pathways, root, from_block=None, to_block=None, page_size=10000,
+                    concurrency=8, retries=5, queue_pages=None):
+    client = ResultsClient(base_url, os.environ.get("FLIPSIDE_API_KEY"), concurrency, retries, page_size=page_size)
+    queue = asyncio.Queue(maxsize=queue_pages or 2 * concurrency)
+    staged, top = {}, {}
+    write_task = asyncio.create_task(writer(queue, staged, top))
+    fetch_task = asyncio.gather(*(fetch_pathway(client, queue, root, s, d, from_block, to_block)
+                                  for s, d in pathways), return_exceptions=True)
+    try:
+        # the writer only returns after the None below, so finishing first means it failed
+        await asyncio.wait([fetch_task, write_task], return_when=asyncio.FIRST_COMPLETED)
+        if write_task.done():
+            write_task.result()
+        results = await fetch_task
+        await queue.put(None)
+        await write_task
+    except BaseException:
+        fetch_task.cancel()
+        write_task.cancel()
+        await asyncio.gather(fetch_task, write_task, return_exceptions=True)
+        for s, d in pathways:
+            staging = pathway_dir(root, s, d) / STAGING_FILE
+            if staging.exists():
+                staging.unlink()
+        raise
+    failed = 0
+    for (s, d), res in zip(pathways, results):
+        if isinstance(res, Exception):
+            failed += 1
+            print(f"src={s} dst={d}: FAILED ({res}); store and checkpoint left unchanged")
+            staging = pathway_dir(root, s, d) / STAGING_FILE
+            if staging.exists():
+                staging.unlink()
+            continue
+        pdir, lo, head = res
+        try:
+            commit(pdir, s, d, lo, head, staged.get(pdir, 0), top.get(pdir))
+        except ValueError as e:
+            failed += 1
+            print(f"src={s} dst={d}: FAILED ({e}); store and checkpoint left unchanged")
+            (pdir / STAGING_FILE).unlink(missing_ok=True)
+            continue
+        print(f"src={s} dst={d}: {staged.get(pdir, 0)} new rows -> {pdir / DT_FILE}")
+    print(f"{client.requests} requests, {client.retried} retried")
+    return failed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fetch paginated query results into the pathway store.")
+    ap.add_argument("base_url", help="results API base URL, e.g. http://127.0.0.1:8765")
+    ap.add_argument("--pathways", default="30184-30101", help="comma-separated srcEid-dstEid pairs")
+    ap.add_argument("--root", default="pathways", help="pathway store directory")
+    ap.add_argument("--from-block", type=int, default=None, help="ignore checkpoints and start here")
+    ap.add_argument("--to-block", type=int, default=None, help="stop at this block (default: API head)")
+    ap.add_argument("--page-size", type=int, default=10000)
+    ap.add_argument("--concurrency", type=int, default=8, help="requests in flight")
+    ap.add_argument("--retries", type=int, default=5)
+    args = ap.parse_args()
+
+    pathways = [tuple(p.strip().split("-")) for p in args.pathways.split(",") if p.strip()]
+    with stage("fetch", rows_in=len(pathways)):
+        failed = asyncio.run(fetch_all(args.base_url, pathways, args.root, args.from_block, args.to_block,
+                                       args.page_size, args.concurrency, args.retries))
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# match_events.py
+# Local replacement for the joins in docs/flipside_dvn_query.sql.
+#
+# Takes raw decoded event-log exports (rows of <chain>.core.ez_decoded_event_logs with
+# TX_HASH, BLOCK_NUMBER, BLOCK_TIMESTAMP, CONTRACT_ADDRESS, EVENT_NAME, DECODED_LOG)
+# from the source and destination chains and builds the same per-message table as the
+# Flipside query, without the LIMIT 200 and without warehouse time.
+#
+# The expensive `guid = guid OR (nonce, srcEid)` condition becomes two hash joins:
+# every message is first matched on GUID, and only the still-unmatched messages are
+# matched on (nonce, srcEid). MATCH_METHOD records which join produced the row.
+#
+# Usage:
+#   python3 scripts/match_events.py <source_logs> <dest_logs> [out_csv]
+#       [--src-eid 30184] [--dst-eid 30101] [--dvn 0xc2a0...|any]
+# Inputs may be JSON arrays, JSON lines or CSV; several files can be comma-separated.
+
+import json
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dvn_instrument import stage
+from dvn_schema import DT_COLUMNS
+from payload_decode import decode_payloads
+from dvn_io import CHAIN_NAMES
+
+SEND_LIB = "0xb5320b0b3a13cc860893e2bd79fcd7e13484dda2"   # SendUln302 on Base (DVNFeePaid / ExecutorFeePaid)
+DT_ADDRESS = "0xc2a0c36f5939a14966705c7cec813163faeea1f0"
+DEST_EVENTS = ("PacketDelivered", "PacketVerified", "OFTReceived")
+LOG_COLUMNS = ["tx_hash", "block_number", "block_timestamp", "event_index", "contract_address", "event_name", "decoded_log"]
+
+
+def read_log_file(path):
+    """Read one raw event-log export into lower-cased LOG_COLUMNS."""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        df = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=["", "NA", "N/A"])
+    elif path.suffix.lower() in (".jsonl", ".ndjson"):
+        df = pd.read_json(path, lines=True, dtype=False)
+    else:
+        df = pd.DataFrame(json.loads(path.read_text()))
+    df.columns = [c.strip().lower() for c in df.columns]
+    if "decoded_log" not in df.columns and "full_decoded_log" in df.columns:
+        df = df.rename(columns={"full_decoded_log": "decoded_log"})
+    for c in LOG_COLUMNS:
+        if c not in df.columns:
+            df[c] = None
+    return df[LOG_COLUMNS]
+
+
+def read_logs(paths):
+    frames = [read_log_file(p) for p in str(paths).split(",") if p.strip()]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=LOG_COLUMNS)
+    df["event_name"] = df["event_name"].astype(str)
+    df["contract_address"] = df["contract_address"].astype(str).str.lower()
+    df["block_number"] = pd.to_numeric(df["block_number"], errors="coerce").astype("Int64")
+    df["block_timestamp"] = pd.to_datetime(df["block_timestamp"], errors="coerce", utc=True)
+    return df
+
+
+def decoded(df, fields):
+    """Pull the given keys (or key paths like 'origin.nonce') out of DECODED_LOG for every row.
+
+    All JSON cells are parsed in one json.loads call and every key path becomes a column of
+    a record frame; keys missing from a log come out as None/NaN."""
+    logs = df["decoded_log"].tolist()
+    text = [i for i, x in enumerate(logs) if isinstance(x, str)]
+    for i, d in zip(text, json.loads("[" + ",".join(logs[i] for i in text) + "]")):
+        logs[i] = d
+    frames = {}
+
+    def frame(keys):
+        """Record frame of the dicts at key path `keys` (no columns where a row has none)."""
+        if keys not in frames:
+            if keys:
+                parent = frame(keys[:-1])
+                dicts = parent[keys[-1]] if keys[-1] in parent.columns else []
+            else:
+                dicts = logs
+            frames[keys] = pd.DataFrame.from_records([d if isinstance(d, dict) else {} for d in dicts] or
+                                                     [{}] * len(df), index=df.index)
+        return frames[keys]
+
+    out = {}
+    for name, path in fields.items():
+        keys = tuple(path.split("."))
+        f = frame(keys[:-1])
+        out[name] = f[keys[-1]] if keys[-1] in f.columns else pd.Series(None, index=df.index, dtype=object)
+    return pd.DataFrame(out, index=df.index)
+
+
+def as_eid(s):
+    return pd.to_numeric(s, errors="coerce").astype("Int64")
+
+
+def array_cell(v):
+    if isinstance(v, str):
+        try:
+            v = json.loads(v)
+        except ValueError:
+            return v
+    if not isinstance(v, (list, tuple)):
+        return None
+    return "[ " + ";".join(str(x) for x in v) + " ]" if len(v) else "[  ]"
+
+
+def array_len(v):
+    if isinstance(v, str):
+        try:
+            v = json.loads(v)
+        except ValueError:
+            return None
+    return len(v) if isinstance(v, (list, tuple)) else None
+
+
+def contains(v, addr):
+    if isinstance(v, str):
+        try:
+            v = json.loads(v)
+        except ValueError:
+            return addr in v.lower()
+    return isinstance(v, (list, tuple)) and addr in [str(x).lower() for x in v]
+
+
+def source_tables(src, dvn, dst_eid):
+    oft = src[src["event_name"] == "OFTSent"]
+    oft = pd.concat([oft[["tx_hash", "block_number", "block_timestamp"]], decoded(oft, {
+        "guid": "guid", "oft_nonce": "nonce", "payload_dst_eid": "dstEid", "payload_src_eid": "srcEid",
+        "transaction_sender": "fromAddress", "encoded_payload": "encodedPayload"})], axis=1)
+    # only this pathway's messages; rows without a decoded dstEid are kept, as in the query
+    dst = as_eid(oft["payload_dst_eid"])
+    oft = oft[dst.isna() | (dst == dst_eid)].copy()
+    oft["guid"] = oft["guid"].astype(str).str.lower().replace({"none": None, "nan": None})
+    oft["oft_nonce"] = pd.to_numeric(oft["oft_nonce"], errors="coerce").astype("Int64")
+
+    fee = src[(src["event_name"] == "DVNFeePaid") & (src["contract_address"] == SEND_LIB)]
+    fee = pd.concat([fee[["tx_hash", "block_number", "block_timestamp"]], decoded(fee, {
+        "required_dvns": "requiredDVNs", "optional_dvns": "optionalDVNs", "dvn_fees": "fees"})], axis=1)
+    if dvn != "any":
+        keep = [contains(r, dvn) or contains(o, dvn) for r, o in zip(fee["required_dvns"], fee["optional_dvns"])]
+        fee = fee[np.array(keep, dtype=bool)] if len(fee) else fee
+    fee = fee.rename(columns={"tx_hash": "dvn_tx_hash", "block_number": "dvn_block_number",
+                              "block_timestamp": "dvn_timestamp"}).drop_duplicates("dvn_tx_hash")
+
+    exe = src[(src["event_name"] == "ExecutorFeePaid") & (src["contract_address"] == SEND_LIB)]
+    exe = pd.concat([exe[["tx_hash"]], decoded(exe, {"executor_address": "executor", "executor_fee": "fee"})], axis=1)
+    exe = exe.rename(columns={"tx_hash": "executor_tx_hash"}).drop_duplicates("executor_tx_hash")
+    return oft, fee, exe
+
+
+def dest_table(dst):
+    ed = dst[dst["event_name"].isin(DEST_EVENTS)]
+    ed = pd.concat([ed[["tx_hash", "block_number", "block_timestamp", "event_name"]], decoded(ed, {
+        "guid": "guid", "origin_nonce": "origin.nonce", "origin_src_eid": "origin.srcEid",
+        "origin_sender": "origin.sender", "payload_hash": "payloadHash"})], axis=1)
+    ed = ed.rename(columns={"tx_hash": "dest_tx_hash", "block_number": "dest_block_number",
+                            "block_timestamp": "dest_timestamp", "event_name": "dest_event_name",
+                            "guid": "dest_guid"})
+    ed["dest_guid"] = ed["dest_guid"].astype(str).str.lower().replace({"none": None, "nan": None})
+    ed["origin_nonce"] = pd.to_numeric(ed["origin_nonce"], errors="coerce").astype("Int64")
+    ed["origin_src_eid"] = as_eid(ed["origin_src_eid"])
+    return ed
+
+
+def match_dest(msgs, ed, src_eid):
+    """GUID hash join, then (nonce, srcEid) hash join for the messages the first join missed."""
+    by_guid = msgs.merge(ed[ed["dest_guid"].notna()], left_on="guid", right_on="dest_guid", how="inner")
+    by_guid["MATCH_METHOD"] = "GUID"
+    rest = msgs[~msgs["_msg"].isin(by_guid["_msg"])]
+    ed_nonce = ed[ed["origin_nonce"].notna() & (ed["origin_src_eid"] == src_eid)]
+    by_nonce = rest[rest["oft_nonce"].notna()].merge(ed_nonce, left_on="oft_nonce", right_on="origin_nonce", how="inner")
+    by_nonce["MATCH_METHOD"] = "NONCE+SRC_EID"
+    unmatched = rest[~rest["_msg"].isin(by_nonce["_msg"])].copy()
+    unmatched["MATCH_METHOD"] = "NO_MATCH"
+    return pd.concat([by_guid, by_nonce, unmatched], ignore_index=True)
+
+
+def num_str(s):
+    return s.astype("Int64").astype(str).fillna("").replace({"<NA>": ""})
+
+
+def iso(s):
+    return s.dt.strftime("%Y-%m-%dT%H:%M:%S.000Z").fillna("")
+
+
+def build_export(m, src_eid, dst_eid, dvn):
+    delivered = m["dest_tx_hash"].notna()
+    lat = (m["dest_timestamp"] - m["block_timestamp"]).dt.total_seconds()
+    dvn_addr = DT_ADDRESS if dvn == "any" else dvn
+    payload = decode_payloads(m["encoded_payload"])
+    out = pd.DataFrame({
+        "SOURCETXHASH": m["tx_hash"],
+        "SOURCEBLOCKNUMBER": num_str(m["block_number"]),
+        "SOURCETIMESTAMP": iso(m["block_timestamp"]),
+        "SOURCEENDPOINTID": str(src_eid),
+        "DESTINATIONENDPOINTID": str(dst_eid),
+        "SOURCE_CHAIN_NAME": CHAIN_NAMES.get(src_eid, "Unknown"),
+        "DEST_CHAIN_NAME": CHAIN_NAMES.get(dst_eid, "Unknown"),
+        "GUID": m["guid"],
+        "MESSAGENONCEDECIMAL": num_str(m["oft_nonce"]),
+        "TRANSACTIONSENDER": m["transaction_sender"],
+        "SENDERADDRESSHEX": payload["SENDERADDRESSHEX"],
+        "RECEIVERADDRESS": payload["RECEIVERADDRESS"],
+        "ENCODED_PAYLOAD": m["encoded_payload"],
+        "REQUIREDDVNS": m["required_dvns"].map(array_cell),
+        "OPTIONALDVNS": m["optional_dvns"].map(array_cell),
+        "REQUIREDDVNCOUNT": num_str(m["required_dvns"].map(array_len)),
+        "OPTIONALDVNCOUNT": num_str(m["optional_dvns"].map(array_len)),
+        "DVNTXHASH": m["dvn_tx_hash"],
+        "DVNBLOCKNUMBER": num_str(m["dvn_block_number"]),
+        "DVNTIMESTAMP": iso(m["dvn_timestamp"]),
+        "DVN_FEES_ARRAY": m["dvn_fees"].map(array_cell),
+        "DESTINATIONDELIVEREDTXHASH": m["dest_tx_hash"],
+        "DESTINATIONDELIVEREDBLOCKNUMBER": num_str(m["dest_block_number"]),
+        "DESTINATIONDELIVEREDTIMESTAMP": iso(m["dest_timestamp"]),
+        "DEST_EVENT_NAME": m["dest_event_name"],
+        "DEST_ORIGIN_NONCE": num_str(m["origin_nonce"]),
+        "DEST_ORIGIN_SRCEID": num_str(m["origin_src_eid"]),
+        "DEST_ORIGIN_SENDER": m["origin_sender"],
+        "EXECUTOR_TXHASH": m["executor_tx_hash"],
+        "EXECUTORADDRESS": m["executor_address"],
+        "EXECUTORFEE": m["executor_fee"],
+        "MESSAGESTATUS": np.where(delivered, "DELIVERED", "SENT"),
+        "LATENCYTODELIVERY_SECONDS": lat.round().astype("Int64").astype(str).fillna("N/A").replace({"<NA>": "N/A"}),
+        "MATCH_METHOD": m["MATCH_METHOD"],
+        "DEUTSCHE_IS_REQUIRED": [str(contains(v, dvn_addr)).lower() for v in m["required_dvns"]],
+        "DEUTSCHE_IS_OPTIONAL": [str(contains(v, dvn_addr)).lower() for v in m["optional_dvns"]],
+        "DELIVERED_BOOL": np.where(delivered, "true", "false"),
+        "MESSAGE_PAIR_KEY": np.where(delivered, num_str(m["block_number"]) + "_" + num_str(m["dest_block_number"]), ""),
+        "DVN_SOURCE_PAIR_KEY": num_str(m["dvn_block_number"]) + "_" + num_str(m["block_number"]),
+    })
+    return out[DT_COLUMNS]
+
+
+def match(source_logs, dest_logs, src_eid=30184, dst_eid=30101, dvn=DT_ADDRESS):
+    """Return the Flipside-shaped per-message table built from raw event logs."""
+    with stage("load_logs", inputs=[p for p in f"{source_logs},{dest_logs}".split(",") if p]) as ev:
+        src = read_logs(source_logs)
+        dst = read_logs(dest_logs)
+        ev.rows_out = len(src) + len(dst)
+    with stage("decode", rows_in=len(src) + len(dst)) as ev:
+        oft, fee, exe = source_tables(src, dvn, dst_eid)
+        ed = dest_table(dst)
+        ev.rows_out = len(oft) + len(fee) + len(exe) + len(ed)
+    with stage("join_source", rows_in=len(oft)) as ev:
+        # base_oft JOIN deutsche_telekom_dvn_txs ON tx_hash (the query's WHERE dt.dvn_tx_hash IS NOT NULL)
+        msgs = oft.merge(fee, left_on="tx_hash", right_on="dvn_tx_hash", how="inner")
+        msgs = msgs.merge(exe, left_on="tx_hash", right_on="executor_tx_hash", how="left")
+        msgs["_msg"] = np.arange(len(msgs))
+        ev.rows_out = len(msgs)
+    with stage("join_dest", rows_in=len(msgs) + len(ed)) as ev:
+        m = match_dest(msgs, ed, src_eid)
+        m = m.sort_values(["block_number", "_msg"], ascending=[False, True], kind="stable")
+        ev.rows_out = len(m)
+    with stage("build_export", rows_in=len(m)) as ev:
+        out = build_export(m, src_eid, dst_eid, dvn)
+        ev.rows_out = len(out)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Match OFTSent / DVNFeePaid / destination events locally.")
+    ap.add_argument("source_logs", help="source-chain decoded logs (OFTSent, DVNFeePaid, ExecutorFeePaid)")
+    ap.add_argument("dest_logs", help="destination-chain decoded logs (PacketVerified, PacketDelivered, OFTReceived)")
+    ap.add_argument("out_csv", nargs="?", default="dt_matched.csv")
+    ap.add_argument("--src-eid", type=int, default=30184)
+    ap.add_argument("--dst-eid", type=int, default=30101)
+    ap.add_argument("--dvn", default=DT_ADDRESS, help="keep messages whose stack contains this DVN ('any' keeps all)")
+    args = ap.parse_args()
+
+    out = match(args.source_logs, args.dest_logs, args.src_eid, args.dst_eid, args.dvn.lower())
+    out.to_csv(args.out_csv, index=False)
+    print(f"Saved {len(out)} rows -> {args.out_csv}")
+    print("MATCH_METHOD counts:")
+    print(out["MATCH_METHOD"].value_counts().to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,41 @@
 #!/usr/bin/env python3
 # merge_expand_dvns_v2.py
-import sys, ast, re
+#
+# The merged rows are expanded in chunks of --chunk-rows rows, each checkpointed with its
+# partial KPI aggregates (see dvn_checkpoint.py); rerunning the same command after a crash
+# resumes after the last finished chunk and writes the same outputs.
+#
+# Usage: python3 merge_expand_dvns_v2.py <dt_clean.csv> <dvnFeesMapped.csv>
+#            [--chunk-rows 50000] [--checkpoint-dir dvn_enriched_v2.checkpoint] [--keep-checkpoint]
+import sys, ast, re, argparse
 from decimal import Decimal, getcontext
 from pathlib import Path
 import pandas as pd
 import numpy as np
+from dvn_instrument import stage
+from dvn_checkpoint import Checkpoint, value_hist, hist_quantiles, write_csv_atomic
+from dvn_bootstrap import kpi_cis, with_cis
+from dvn_schema import detect
 
 getcontext().prec = 36
 
-if len(sys.argv) < 3:
-    print("Usage: python3 merge_expand_dvns_v2.py <dt_clean.csv> <dvnFeesMapped.csv>")
-    sys.exit(1)
-
-DT_PATH = Path(sys.argv[1])
-FEES_PATH = Path(sys.argv[2])
 OUT_PREFIX = "dvn_enriched_v2"
+ap = argparse.ArgumentParser(description="Merge dt_clean with the fees file and expand to one row per DVN.")
+ap.add_argument("dt_csv", help="dt_clean.csv")
+ap.add_argument("fees_csv", help="dvnFeesMapped.csv")
+ap.add_argument("--chunk-rows", type=int, default=50_000, help="merged rows per checkpointed chunk")
+ap.add_argument("--checkpoint-dir", default=f"{OUT_PREFIX}.checkpoint")
+ap.add_argument("--keep-checkpoint", action="store_true", help="keep part files after a successful run")
+args = ap.parse_args()
+
+DT_PATH = Path(args.dt_csv)
+FEES_PATH = Path(args.fees_csv)
+PER_COLUMNS = ['GUID', 'SOURCETXHASH', 'DVN_ADDR', 'DVN_NAME', 'ROLE', 'DVN_FEE_WEI', 'LATENCY_SECONDS',
+               'MESSAGESTATUS', 'SOURCEBLOCKNUMBER', 'SOURCETIMESTAMP', 'DEST_CHAIN_NAME']
 
 assert DT_PATH.exists(), f"{DT_PATH} not found"
 assert FEES_PATH.exists(), f"{FEES_PATH} not found"
 
-def find_col(df, candidates):
-    cols = {c.lower(): c for c in df.columns}
-    for cand in candidates:
-        if cand.lower() in cols:
-            return cols[cand.lower()]
-    return None
-
 def parse_array_field(s):
     """Handle formats like:
        - "[ 0xabc;0xdef ]"
@@ -88,20 +98,27 @@ def wei_to_eth_decimal_str(x):
         return None
 
 # Load files
-dt = pd.read_csv(DT_PATH, dtype=str, keep_default_na=False, na_values=["", "NA", "N/A"])
-fees = pd.read_csv(FEES_PATH, dtype=str, keep_default_na=False, na_values=["", "NA", "N/A"])
-
-# identify key cols
-guid_dt = find_col(dt, ["GUID","guid"])
-guid_fees = find_col(fees, ["GUID","guid"])
-tx_col = find_col(dt, ["SOURCETXHASH","source_tx_hash","source_tx","source_txhash"])
-lat_col = find_col(dt, ["LATENCYTODELIVERY_SECONDS","latencytodelivery_seconds","latency"])
-
-req_addr_col = find_col(fees, ["requiredDVNs","required_dvns","requireddvns","requireddvns"])
-opt_addr_col = find_col(fees, ["optionalDVNs","optional_dvns","optionaldvns","optionaldvns"])
-fees_arr_col = find_col(fees, ["DVN_FEES_ARRAY","dvn_fees_array","dvn_fees","fees_array","dvnfeesarray"])
-req_map_col = find_col(fees, ["RequiredDVN_Mapping","requireddvn_mapping","requiredDvnMapping","RequiredDVN_Mapping"])
-opt_map_col = find_col(fees, ["OptionalDVN_Mapping","optionaldvn_mapping","optionalDvnMapping","OptionalDVN_Mapping"])
+with stage("load", inputs=[DT_PATH, FEES_PATH]) as ev:
+    dt = pd.read_csv(DT_PATH, dtype=str, keep_default_na=False, na_values=["", "NA", "N/A"])
+    fees = pd.read_csv(FEES_PATH, dtype=str, keep_default_na=False, na_values=["", "NA", "N/A"])
+    ev.rows_out = len(dt) + len(fees)
+
+# identify key cols (names and aliases from the schema registry, dvn_schema.py), once per file
+dt_schema, fees_schema = detect(DT_PATH), detect(FEES_PATH)
+guid_dt = dt_schema.get("GUID")
+guid_fees = fees_schema.get("GUID")
+tx_col = dt_schema.get("SOURCETXHASH")
+lat_col = dt_schema.get("LATENCYTODELIVERY_SECONDS")
+status_col = dt_schema.get("MESSAGESTATUS")
+block_col = dt_schema.get("SOURCEBLOCKNUMBER")
+ts_col = dt_schema.get("SOURCETIMESTAMP")
+chain_col = dt_schema.get("DEST_CHAIN_NAME")
+
+req_addr_col = fees_schema.get("REQUIREDDVNS")
+opt_addr_col = fees_schema.get("OPTIONALDVNS")
+fees_arr_col = fees_schema.get("DVN_FEES_ARRAY")
+req_map_col = fees_schema.get("REQUIREDDVN_MAPPING")
+opt_map_col = fees_schema.get("OPTIONALDVN_MAPPING")
 
 print("Columns found (dt):", guid_dt, tx_col, lat_col)
 print("Columns found (fees):", guid_fees, req_addr_col, opt_addr_col, fees_arr_col, req_map_col, opt_map_col)
@@ -111,171 +128,198 @@ if not guid_dt or not guid_fees:
     sys.exit(1)
 
 # merge
-merged = dt.merge(fees, left_on=guid_dt, right_on=guid_fees, how='left', suffixes=("","_fees"))
+with stage("merge", rows_in=len(dt) + len(fees)) as ev:
+    merged = dt.merge(fees, left_on=guid_dt, right_on=guid_fees, how='left', suffixes=("","_fees"))
+    ev.rows_out = len(merged)
 
 # build per-dvn rows
 # ----------------- START REPLACEMENT LOOP -----------------
-rows = []
-row_counter = 0
-for idx, r in merged.iterrows():
-    row_counter += 1
-    guid = r.get(guid_dt)
-    tx = r.get(tx_col) if tx_col else None
-    latency = None
-    if lat_col and str(r.get(lat_col)).strip() != "":
-        try:
-            latency = int(re.sub(r'[^\d\-]','', str(r.get(lat_col))))
-        except:
-            latency = None
-    message_status = r.get(find_col(merged, ["MESSAGESTATUS","message_status","status"]))
-
-    # parse address arrays (required + optional)
-    req_addrs = parse_array_field(r.get(req_addr_col)) if req_addr_col else []
-    opt_addrs = parse_array_field(r.get(opt_addr_col)) if opt_addr_col else []
-    all_addrs = req_addrs + opt_addrs
-
-    # parse fee array (raw wei list)
-    fees_arr = parse_array_field(r.get(fees_arr_col)) if fees_arr_col else []
-
-    # parse mapping tuples (name, fee) for required and optional (may not include addresses)
-    req_map = safe_parse_list_of_tuples(r.get(req_map_col)) if req_map_col else []
-    opt_map = safe_parse_list_of_tuples(r.get(opt_map_col)) if opt_map_col else []
-
-    # Determine counts
-    n_req = max(len(req_addrs), len(req_map))
-    n_opt = max(len(opt_addrs), len(opt_map))
-    # If fees_arr present, its ordering is required followed by optional; use as fallback
-    # Build required rows
-    for i in range(n_req):
-        addr = req_addrs[i] if i < len(req_addrs) else None
-        name = req_map[i][0] if i < len(req_map) else (addr if addr is not None else None)
-        fee_wei = None
-        # prefer fee from mapping if available
-        if i < len(req_map):
-            fee_wei = req_map[i][1]
-        else:
-            # fallback to fees array by same index
-            if i < len(fees_arr):
-                fee_wei = fees_arr[i]
-        rows.append({
-            'GUID': guid,
-            'SOURCETXHASH': tx,
-            'DVN_ADDR': addr,
-            'DVN_NAME': name,
-            'ROLE': 'required',
-            'DVN_FEE_WEI': fee_wei,
-            'LATENCY_SECONDS': latency,
-            'MESSAGESTATUS': message_status,
-            'SOURCEBLOCKNUMBER': r.get(find_col(merged, ['SOURCEBLOCKNUMBER','sourceblocknumber'])),
-            'SOURCETIMESTAMP': r.get(find_col(merged, ['SOURCETIMESTAMP','sourcetimestamp'])),
-            'DEST_CHAIN_NAME': r.get(find_col(merged, ['DEST_CHAIN_NAME','dest_chain_name','destchainname']))
-        })
-
-    # Build optional rows (index offset into fees_arr = len(req_addrs))
-    for j in range(n_opt):
-        addr = opt_addrs[j] if j < len(opt_addrs) else None
-        name = opt_map[j][0] if j < len(opt_map) else (addr if addr is not None else None)
-        fee_wei = None
-        # fee index in fees_arr is req_count + j
-        fee_index = j + (len(req_addrs) if len(req_addrs)>0 else len(req_map))
-        if j < len(opt_map):
-            fee_wei = opt_map[j][1]
-        else:
-            if fee_index < len(fees_arr):
-                fee_wei = fees_arr[fee_index]
-        rows.append({
-            'GUID': guid,
-            'SOURCETXHASH': tx,
-            'DVN_ADDR': addr,
-            'DVN_NAME': name,
-            'ROLE': 'optional',
-            'DVN_FEE_WEI': fee_wei,
-            'LATENCY_SECONDS': latency,
-            'MESSAGESTATUS': message_status,
-            'SOURCEBLOCKNUMBER': r.get(find_col(merged, ['SOURCEBLOCKNUMBER','sourceblocknumber'])),
-            'SOURCETIMESTAMP': r.get(find_col(merged, ['SOURCETIMESTAMP','sourcetimestamp'])),
-            'DEST_CHAIN_NAME': r.get(find_col(merged, ['DEST_CHAIN_NAME','dest_chain_name','destchainname']))
-        })
-
-    # small progress debug every 200 rows
-    if row_counter % 200 == 0:
-        print(f"Processed {row_counter} merged rows...")
+def expand(chunk):
+    rows = []
+    row_counter = 0
+    for idx, r in chunk.iterrows():
+        row_counter += 1
+        guid = r.get(guid_dt)
+        tx = r.get(tx_col) if tx_col else None
+        latency = None
+        if lat_col and str(r.get(lat_col)).strip() != "":
+            try:
+                latency = int(re.sub(r'[^\d\-]','', str(r.get(lat_col))))
+            except:
+                latency = None
+        message_status = r.get(status_col)
+
+        # parse address arrays (required + optional)
+        req_addrs = parse_array_field(r.get(req_addr_col)) if req_addr_col else []
+        opt_addrs = parse_array_field(r.get(opt_addr_col)) if opt_addr_col else []
+        all_addrs = req_addrs + opt_addrs
+
+        # parse fee array (raw wei list)
+        fees_arr = parse_array_field(r.get(fees_arr_col)) if fees_arr_col else []
+
+        # parse mapping tuples (name, fee) for required and optional (may not include addresses)
+        req_map = safe_parse_list_of_tuples(r.get(req_map_col)) if req_map_col else []
+        opt_map = safe_parse_list_of_tuples(r.get(opt_map_col)) if opt_map_col else []
+
+        # Determine counts
+        n_req = max(len(req_addrs), len(req_map))
+        n_opt = max(len(opt_addrs), len(opt_map))
+        # If fees_arr present, its ordering is required followed by optional; use as fallback
+        # Build required rows
+        for i in range(n_req):
+            addr = req_addrs[i] if i < len(req_addrs) else None
+            name = req_map[i][0] if i < len(req_map) else (addr if addr is not None else None)
+            fee_wei = None
+            # prefer fee from mapping if available
+            if i < len(req_map):
+                fee_wei = req_map[i][1]
+            else:
+                # fallback to fees array by same index
+                if i < len(fees_arr):
+                    fee_wei = fees_arr[i]
+            rows.append({
+                'GUID': guid,
+                'SOURCETXHASH': tx,
+                'DVN_ADDR': addr,
+                'DVN_NAME': name,
+                'ROLE': 'required',
+                'DVN_FEE_WEI': fee_wei,
+                'LATENCY_SECONDS': latency,
+                'MESSAGESTATUS': message_status,
+                'SOURCEBLOCKNUMBER': r.get(block_col),
+                'SOURCETIMESTAMP': r.get(ts_col),
+                'DEST_CHAIN_NAME': r.get(chain_col)
+            })
+
+        # Build optional rows (index offset into fees_arr = len(req_addrs))
+        for j in range(n_opt):
+            addr = opt_addrs[j] if j < len(opt_addrs) else None
+            name = opt_map[j][0] if j < len(opt_map) else (addr if addr is not None else None)
+            fee_wei = None
+            # fee index in fees_arr is req_count + j
+            fee_index = j + (len(req_addrs) if len(req_addrs)>0 else len(req_map))
+            if j < len(opt_map):
+                fee_wei = opt_map[j][1]
+            else:
+                if fee_index < len(fees_arr):
+                    fee_wei = fees_arr[fee_index]
+            rows.append({
+                'GUID': guid,
+                'SOURCETXHASH': tx,
+                'DVN_ADDR': addr,
+                'DVN_NAME': name,
+                'ROLE': 'optional',
+                'DVN_FEE_WEI': fee_wei,
+                'LATENCY_SECONDS': latency,
+                'MESSAGESTATUS': message_status,
+                'SOURCEBLOCKNUMBER': r.get(block_col),
+                'SOURCETIMESTAMP': r.get(ts_col),
+                'DEST_CHAIN_NAME': r.get(chain_col)
+            })
+    return pd.DataFrame(rows, columns=PER_COLUMNS)
 
 # ----------------- END REPLACEMENT LOOP -----------------
 
-per = pd.DataFrame(rows)
-
-# Debug: report row/column counts so we can spot empty results quickly
-print(f"DEBUG: per-dvn rows created = {len(per)}")
-print("DEBUG: per columns =", per.columns.tolist())
-
-# Ensure DVN_FEE_WEI column exists (create empty if not) to avoid KeyError on very sparse datasets
-if 'DVN_FEE_WEI' not in per.columns:
-    print("WARNING: 'DVN_FEE_WEI' column missing; creating empty column and continuing.")
-    per['DVN_FEE_WEI'] = None
+def convert(per):
+    # Safely create cleaned numeric fee column (strip non-digits); Python ints so every chunk prints alike
+    per['DVN_FEE_WEI_CLEAN'] = pd.Series([None if x is None or str(x).strip()=='' else int(re.sub(r'[^\d\-]', '', str(x)))
+                                          for x in per['DVN_FEE_WEI']], index=per.index, dtype=object)
 
-# Safely create cleaned numeric fee column (strip non-digits)
-import re
-per['DVN_FEE_WEI_CLEAN'] = per['DVN_FEE_WEI'].apply(
-    lambda x: None if x is None or str(x).strip()=='' else int(re.sub(r'[^\d\-]', '', str(x)))
-)
-
-# Convert WEI -> ETH (Decimal used earlier in script)
-from decimal import Decimal
-def wei_to_eth_str_safe(x):
-    try:
-        if x is None:
+    # Convert WEI -> ETH (Decimal used earlier in script)
+    def wei_to_eth_str_safe(x):
+        try:
+            if x is None:
+                return None
+            eth = (Decimal(int(x)) / Decimal(10**18))
+            return format(eth.normalize(), 'f')
+        except Exception:
             return None
-        eth = (Decimal(int(x)) / Decimal(10**18))
-        return format(eth.normalize(), 'f')
-    except Exception:
-        return None
-
-per['DVN_FEE_ETH'] = per['DVN_FEE_WEI_CLEAN'].apply(lambda x: wei_to_eth_str_safe(x))
-
-# separate required vs optional fee columns for quick pivoting/aggregation
-if 'ROLE' not in per.columns:
-    per['ROLE'] = None
-
-per['DVN_FEE_IF_REQUIRED_ETH'] = per.apply(lambda r: r['DVN_FEE_ETH'] if str(r.get('ROLE')).lower()=='required' else None, axis=1)
-per['DVN_FEE_IF_OPTIONAL_ETH'] = per.apply(lambda r: r['DVN_FEE_ETH'] if str(r.get('ROLE')).lower()=='optional' else None, axis=1)
 
-# numeric helper columns
-per['DVN_FEE_ETH_NUM'] = pd.to_numeric(per['DVN_FEE_ETH'], errors='coerce')
-per['DVN_FEE_IF_REQUIRED_ETH_NUM'] = pd.to_numeric(per['DVN_FEE_IF_REQUIRED_ETH'], errors='coerce')
-per['DVN_FEE_IF_OPTIONAL_ETH_NUM'] = pd.to_numeric(per['DVN_FEE_IF_OPTIONAL_ETH'], errors='coerce')
-per['LATENCY_SECONDS'] = pd.to_numeric(per.get('LATENCY_SECONDS', None), errors='coerce')
+    per['DVN_FEE_ETH'] = per['DVN_FEE_WEI_CLEAN'].apply(lambda x: wei_to_eth_str_safe(x))
+
+    # separate required vs optional fee columns for quick pivoting/aggregation
+    role = per['ROLE'].astype(str).str.lower()
+    per['DVN_FEE_IF_REQUIRED_ETH'] = per['DVN_FEE_ETH'].where(role=='required')
+    per['DVN_FEE_IF_OPTIONAL_ETH'] = per['DVN_FEE_ETH'].where(role=='optional')
+
+    # numeric helper columns
+    per['DVN_FEE_ETH_NUM'] = pd.to_numeric(per['DVN_FEE_ETH'], errors='coerce')
+    per['DVN_FEE_IF_REQUIRED_ETH_NUM'] = pd.to_numeric(per['DVN_FEE_IF_REQUIRED_ETH'], errors='coerce')
+    per['DVN_FEE_IF_OPTIONAL_ETH_NUM'] = pd.to_numeric(per['DVN_FEE_IF_OPTIONAL_ETH'], errors='coerce')
+    # float in every chunk (64.0), as the one-pass script wrote it: undelivered messages leave NaN in the
+    # column. Only an export where every message has a latency used to print ints (64).
+    per['LATENCY_SECONDS'] = pd.to_numeric(per['LATENCY_SECONDS'], errors='coerce').astype(float)
+    return per
+
+def kpi_partials(per):
+    """Per-chunk KPI partials: sums/counts per DVN_NAME, distinct (DVN_NAME, GUID, delivered), latency histogram."""
+    per = per.assign(DELIVERED=per['MESSAGESTATUS'].astype(str).str.upper()=='DELIVERED')
+    # fee sums in row order as in one pass (groupby 'sum' is compensated and differs in the last digit)
+    fee_sum = lambda s: float(s.dropna().sum()) if s.dropna().size>0 else 0.0
+    sums = per.groupby('DVN_NAME').agg(
+        rows=('GUID','count'),
+        total_fees_eth=('DVN_FEE_ETH_NUM', fee_sum),
+        total_required_fees_eth=('DVN_FEE_IF_REQUIRED_ETH_NUM', fee_sum),
+        total_optional_fees_eth=('DVN_FEE_IF_OPTIONAL_ETH_NUM', fee_sum),
+        required_fee_count=('DVN_FEE_IF_REQUIRED_ETH_NUM','count'),
+        optional_fee_count=('DVN_FEE_IF_OPTIONAL_ETH_NUM','count'),
+        delivered_messages=('DELIVERED','sum')
+    ).reset_index()
+    guids = per[['DVN_NAME','GUID','DELIVERED']].dropna().drop_duplicates()
+    return sums, guids, value_hist(per, ['DVN_NAME'], 'LATENCY_SECONDS')
+
+ckpt = Checkpoint(args.checkpoint_dir, [DT_PATH, FEES_PATH], {"chunk_rows": args.chunk_rows})
+n_chunks = max(1, -(-len(merged) // args.chunk_rows))
+with stage("expand", rows_in=len(merged)) as ev:
+    for c in range(n_chunks):
+        if ckpt.done(c):
+            ev.cache_hits += 1
+            continue
+        per = convert(expand(merged.iloc[c * args.chunk_rows:(c + 1) * args.chunk_rows]))
+        sums, guids, hist = kpi_partials(per)
+        ckpt.save(c, {"per_dvn_rows": per, "kpi_sums": sums, "kpi_guids": guids, "kpi_latency": hist})
+        print(f"chunk {c + 1}/{n_chunks}: {len(per)} per-DVN rows")
+    n_per = ev.rows_out = sum(m["rows"]["per_dvn_rows"] for m in ckpt.manifest["chunks"].values())
+
+with stage("save_rows", rows_in=n_per + len(merged)):
+    # Save canonical per-DVN rows
+    ckpt.concat("per_dvn_rows", f"{OUT_PREFIX}_per_dvn_rows.csv")
+    write_csv_atomic(merged, f"{OUT_PREFIX}_merged_dt_enriched.csv")
 
-# Final debug checkpoint
-print(f"DEBUG after conversions: rows={len(per)}, columns={per.columns.tolist()}")
 print("Sample rows (first 5):")
-print(per.head(5).to_string(index=False))
-
-# Save canonical per-DVN rows
-per.to_csv(f"{OUT_PREFIX}_per_dvn_rows.csv", index=False)
-merged.to_csv(f"{OUT_PREFIX}_merged_dt_enriched.csv", index=False)
-
-# KPI aggregation per DVN_NAME
-agg = per.groupby('DVN_NAME').agg(
-    unique_messages=('GUID','nunique'),
-    rows=('GUID','count'),
-    total_fees_eth=('DVN_FEE_ETH_NUM', lambda s: float(s.dropna().sum()) if s.dropna().size>0 else 0.0),
-    total_required_fees_eth=('DVN_FEE_IF_REQUIRED_ETH_NUM', lambda s: float(s.dropna().sum()) if s.dropna().size>0 else 0.0),
-    total_optional_fees_eth=('DVN_FEE_IF_OPTIONAL_ETH_NUM', lambda s: float(s.dropna().sum()) if s.dropna().size>0 else 0.0),
-    avg_fee_required=('DVN_FEE_IF_REQUIRED_ETH_NUM', lambda s: float(s.dropna().mean()) if s.dropna().size>0 else None),
-    avg_fee_optional=('DVN_FEE_IF_OPTIONAL_ETH_NUM', lambda s: float(s.dropna().mean()) if s.dropna().size>0 else None),
-    median_latency=('LATENCY_SECONDS', lambda s: float(s.dropna().median()) if s.dropna().size>0 else None),
-    p95_latency=('LATENCY_SECONDS', lambda s: float(s.dropna().quantile(0.95)) if s.dropna().size>0 else None),
-    delivered_messages=('MESSAGESTATUS', lambda s: int(s.dropna().apply(lambda x: 1 if str(x).upper()=='DELIVERED' else 0).sum()))
-).reset_index()
-
-# delivered rate per DVN
-delivered_counts = per[per['MESSAGESTATUS'].astype(str).str.upper()=='DELIVERED'].groupby('DVN_NAME').agg(delivered_unique=('GUID','nunique')).reset_index()
-msg_counts = per.groupby('DVN_NAME').agg(unique_messages=('GUID','nunique')).reset_index()
-agg = agg.merge(delivered_counts, on='DVN_NAME', how='left').merge(msg_counts, on='DVN_NAME', how='left')
-agg['delivered_rate'] = agg.apply(lambda r: float(r['delivered_unique']/r['unique_messages']) if r['unique_messages']>0 and not pd.isna(r['delivered_unique']) else None, axis=1)
-
-agg.to_csv(f"{OUT_PREFIX}_kpi_by_dvn.csv", index=False)
+print(pd.read_csv(f"{OUT_PREFIX}_per_dvn_rows.csv", nrows=5).to_string(index=False))
+
+with stage("kpi", rows_in=n_per) as ev:
+    # KPI aggregation per DVN_NAME, merged from the chunk partials
+    sums = ckpt.read("kpi_sums", dtype={'DVN_NAME': str}).groupby('DVN_NAME').sum()
+    guids = ckpt.read("kpi_guids", dtype={'DVN_NAME': str, 'GUID': str}).drop_duplicates()
+    latency = ckpt.read("kpi_latency", dtype={'DVN_NAME': str})
+    q = hist_quantiles(latency, ['DVN_NAME'], 'LATENCY_SECONDS', [0.5, 0.95])
+    agg = pd.DataFrame({
+        'unique_messages': guids.drop_duplicates(['DVN_NAME','GUID']).groupby('DVN_NAME').size().reindex(sums.index, fill_value=0),
+        'rows': sums['rows'],
+        'total_fees_eth': sums['total_fees_eth'],
+        'total_required_fees_eth': sums['total_required_fees_eth'],
+        'total_optional_fees_eth': sums['total_optional_fees_eth'],
+        'avg_fee_required': (sums['total_required_fees_eth'] / sums['required_fee_count']).where(sums['required_fee_count']>0),
+        'avg_fee_optional': (sums['total_optional_fees_eth'] / sums['optional_fee_count']).where(sums['optional_fee_count']>0),
+        'median_latency': [q[(k,)][0] if (k,) in q else None for k in sums.index],
+        'p95_latency': [q[(k,)][1] if (k,) in q else None for k in sums.index],
+        'delivered_messages': sums['delivered_messages'],
+        # delivered rate per DVN
+        'delivered_unique': guids[guids['DELIVERED'].astype(bool)].groupby('DVN_NAME')['GUID'].nunique().reindex(sums.index),
+    }, index=sums.index)
+    agg['delivered_rate'] = (agg['delivered_unique'] / agg['unique_messages']).where(agg['unique_messages']>0)
+    agg = agg.reset_index()
+    # 95% bootstrap intervals for delivered_rate, median and p95 latency (dvn_bootstrap.py)
+    cis = kpi_cis('DVN_NAME', agg['DVN_NAME'], agg['delivered_unique'].fillna(0), agg['unique_messages'],
+                  latency, 'LATENCY_SECONDS')
+    agg = with_cis(agg, cis, 'DVN_NAME')
+
+    agg.to_csv(f"{OUT_PREFIX}_kpi_by_dvn.csv", index=False)
+    ev.rows_out = len(agg)
+if not args.keep_checkpoint:
+    ckpt.remove()
 
 print("Saved files:")
 print(f" - {OUT_PREFIX}_per_dvn_rows.csv")
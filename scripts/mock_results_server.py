@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# mock_results_server.py
+# Local stand-in for the results API used by fetch_exports.py.
+#
+# Serves the rows of a query export (JSON array like query-DT3-NOV2.json, or an Excel-wrapped
+# CSV like data/dt_clean.csv) page by page:
+#
+#   GET /results?src_eid=30184&dst_eid=30101&from_block=0&to_block=&page=1&page_size=1000
+#   -> {"rows": [...], "toBlock": <head>, "page": {"currentPageNumber": 1, "totalPages": T, "totalRows": R}}
+#
+# Rows are ordered by SOURCEBLOCKNUMBER. --head hides newer blocks (restart without it to
+# "produce" new blocks), --fail-rate answers a share of requests with 503 + Retry-After and
+# --delay slows every response, to exercise retries and concurrency.
+#
+# Usage: python3 scripts/mock_results_server.py <export.json|export.csv> [--port 8765]
+#            [--head BLOCK] [--fail-rate 0.1] [--delay 0.05]
+
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+from dvn_io import read_export, unwrap
+
+
+def load_rows(path):
+    """Export rows as JSON-style dicts (arrays as lists, flags as bools, empty cells as None)."""
+    path = Path(path)
+    if path.suffix.lower() == ".json":
+        return json.loads(path.read_text())
+    df = read_export(path)
+    for c in df.columns:
+        df[c] = unwrap(df[c])
+    rows = df.to_dict("records")
+    for r in rows:
+        for k, v in r.items():
+            if v == "":
+                r[k] = None
+            elif v in ("true", "false"):
+                r[k] = v == "true"
+            elif v.startswith("[") and v.endswith("]"):
+                r[k] = [x.strip() for x in v.strip("[] ").split(";") if x.strip()]
+    return rows
+
+
+class Results:
+    def __init__(self, rows, head=None):
+        rows = [r for r in rows if str(r.get("SOURCEBLOCKNUMBER") or "").isdigit()]
+        rows.sort(key=lambda r: int(r["SOURCEBLOCKNUMBER"]))
+        self.rows = rows
+        self.blocks = np.array([int(r["SOURCEBLOCKNUMBER"]) for r in rows], dtype=np.int64)
+        self.src = np.array([str(r.get("SOURCEENDPOINTID")) for r in rows])
+        self.dst = np.array([str(r.get("DESTINATIONENDPOINTID")) for r in rows])
+        self.head = head if head is not None else (int(self.blocks.max()) if len(rows) else 0)
+
+    def page(self, src_eid, dst_eid, from_block, to_block, number, size):
+        to_block = min(to_block, self.head) if to_block is not None else self.head
+        idx = np.flatnonzero((self.src == src_eid) & (self.dst == dst_eid) &
+                             (self.blocks >= from_block) & (self.blocks <= to_block))
+        total_pages = max(1, -(-len(idx) // size))
+        chunk = idx[(number - 1) * size:number * size]
+        return {
+            "rows": [self.rows[i] for i in chunk],
+            "toBlock": to_block,
+            "page": {"currentPageNumber": number, "totalPages": total_pages, "totalRows": int(len(idx))},
+        }
+
+
+def make_handler(results, fail_rate, delay):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/results":
+                self.send_error(404)
+                return
+            if delay:
+                time.sleep(delay)
+            if fail_rate and random.random() < fail_rate:
+                self.send_response(503)
+                self.send_header("Retry-After", "0")
+                self.end_headers()
+                return
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                body = results.page(q["src_eid"], q["dst_eid"], int(q.get("from_block") or 0),
+                                    int(q["to_block"]) if q.get("to_block") else None,
+                                    int(q.get("page", 1)), int(q.get("page_size", 1000)))
+            except (KeyError, ValueError) as e:
+                self.send_error(400, f"bad query: {e}")
+                return
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve a query export through a paginated results API.")
+    ap.add_argument("export", help="query export (.json array or Excel-wrapped .csv)")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--head", type=int, default=None, help="newest block visible to clients")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with 503")
+    ap.add_argument("--delay", type=float, default=0.0, help="seconds to wait before every response")
+    args = ap.parse_args()
+
+    results = Results(load_rows(args.export), args.head)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(results, args.fail_rate, args.delay))
+    print(f"Serving {len(results.rows)} rows up to block {results.head} on http://127.0.0.1:{args.port}/results")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
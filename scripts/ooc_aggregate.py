@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# ooc_aggregate.py
+# Per-DVN and per-stack KPIs with exact median/p95 for exports whose exploded table does not fit in memory.
+#
+# The exploded (message x DVN) table is 5-6x the message count. Instead of building it as one
+# DataFrame, every input chunk is exploded and its rows are reduced to a compact binary record
+#   (group code int32, latency float32, fee ETH float64, delivered uint8, GUID hash uint64)
+# and hash-partitioned by group code into spill files. Each partition then holds every row of
+# its groups, so it is aggregated on its own, with exact quantiles, and only one partition is
+# in memory at a time. When the estimated exploded size fits the budget the same code runs
+# without spilling.
+#
+# The budget covers chunks, spill buffers and one partition; the interpreter and pandas add
+# roughly 100 MB on top.
+#
+# Output columns follow expanded_kpi_by_dvn.csv (expand_from_fees_then_join.py) and
+# stack_latency_summary.csv (compute_dvn_stack_latency.py). A GUID repeated by the export's OR join
+# has the same group key every time, so its rows share a partition: each group keeps one record per
+# 64-bit GUID hash (the first with a latency, as compute_dvn_stack_latency.py takes) before fees,
+# delivered counts, transactions and quantiles are computed. rows still counts every exploded row.
+#
+# Usage:
+#   python3 scripts/ooc_aggregate.py <dt_clean.csv> [--memory-mb 512] [--partitions N]
+#       [--spill-dir DIR] [--out-prefix ooc] [--names dvnNames-Sheet2.csv]
+
+import os
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dvn_instrument import stage
+from dvn_io import read_export, unwrap, explode_dvns, dvn_names, NAMES_CSV
+from pathways import required_stack
+
+USECOLS = ["GUID", "REQUIREDDVNS", "OPTIONALDVNS", "DVN_FEES_ARRAY", "MESSAGESTATUS", "LATENCYTODELIVERY_SECONDS"]
+RECORD = np.dtype([("key", "<i4"), ("lat", "<f4"), ("fee", "<f8"), ("dlv", "u1"), ("guid", "<u8")])
+# rough bytes of working memory per exploded row while a chunk is being exploded (strings, merges)
+EXPLODE_BYTES_PER_ROW = 600
+
+
+class KeyCodes:
+    """Dense int codes for group keys, assigned in first-seen order."""
+
+    def __init__(self):
+        self.codes = {}
+
+    def encode(self, values):
+        uniq, inv = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+        table = np.array([self.codes.setdefault(u, len(self.codes)) for u in uniq], dtype=np.int32)
+        return table[inv]
+
+    def labels(self):
+        out = np.empty(len(self.codes), dtype=object)
+        for k, v in self.codes.items():
+            out[v] = k
+        return out
+
+
+class Spill:
+    """Hash-partitioned record files (or a single in-memory list when n_parts == 0)."""
+
+    def __init__(self, n_parts, spill_dir, name):
+        self.n_parts = n_parts
+        self.mem = []
+        self.paths = []
+        if n_parts:
+            Path(spill_dir).mkdir(parents=True, exist_ok=True)
+            self.paths = [Path(spill_dir) / f"{name}.part{i:04d}.bin" for i in range(n_parts)]
+            for p in self.paths:
+                p.write_bytes(b"")
+        self.bytes = 0
+
+    def add(self, rec):
+        self.bytes += rec.nbytes
+        if not self.n_parts:
+            self.mem.append(rec)
+            return
+        # multiplicative hash so neighbouring codes land in different partitions
+        part = ((rec["key"].astype(np.uint64) * np.uint64(2654435761)) >> np.uint64(7)) % np.uint64(self.n_parts)
+        order = np.argsort(part, kind="stable")
+        rec, part = rec[order], part[order]
+        bounds = np.searchsorted(part, np.arange(self.n_parts + 1, dtype=np.uint64))
+        for i in range(self.n_parts):
+            if bounds[i + 1] > bounds[i]:
+                with open(self.paths[i], "ab") as f:
+                    rec[bounds[i]:bounds[i + 1]].tofile(f)
+
+    def partitions(self):
+        if not self.n_parts:
+            yield np.concatenate(self.mem) if self.mem else np.empty(0, dtype=RECORD)
+            return
+        for p in self.paths:
+            yield np.fromfile(p, dtype=RECORD)
+            p.unlink()
+
+
+def aggregate(rec, labels):
+    """One output row per group code in rec (all rows of a group are in rec), one record per GUID."""
+    if not len(rec):
+        return []
+    n_rows = np.bincount(rec["key"])
+    # by group, then GUID, records with a latency first; lexsort is stable, so ties keep input order
+    rec = rec[np.lexsort((np.isnan(rec["lat"]), rec["guid"], rec["key"]))]
+    first = np.ones(len(rec), dtype=bool)
+    first[1:] = (rec["key"][1:] != rec["key"][:-1]) | (rec["guid"][1:] != rec["guid"][:-1])
+    rec = rec[first]
+    codes, starts = np.unique(rec["key"], return_index=True)
+    ends = np.append(starts[1:], len(rec))
+    rows = []
+    for code, a, b in zip(codes, starts, ends):
+        g = rec[a:b]
+        lat = g["lat"][~np.isnan(g["lat"])].astype(np.float64)
+        med, p95 = np.percentile(lat, [50, 95]) if len(lat) else (None, None)
+        rows.append({"key": labels[code], "rows": int(n_rows[code]), "latency_rows": len(lat),
+                     "unique_messages": b - a,
+                     "fees_eth": float(g["fee"].sum()), "delivered": int(g["dlv"].sum()),
+                     "median_latency": None if med is None else float(med),
+                     "p95_latency": None if p95 is None else float(p95)})
+    return rows
+
+
+def chunk_records(chunk, names, dvn_codes, stack_codes):
+    """(per-DVN records, per-stack records) for one export chunk."""
+    chunk = chunk.reset_index(drop=True)
+    lat = pd.to_numeric(unwrap(chunk["LATENCYTODELIVERY_SECONDS"]), errors="coerce").to_numpy(np.float32)
+    dlv = (unwrap(chunk["MESSAGESTATUS"]).str.upper() == "DELIVERED").to_numpy(np.uint8)
+    guid = pd.util.hash_pandas_object(unwrap(chunk["GUID"]).str.lower(), index=False).to_numpy(np.uint64)
+
+    per_dvn = explode_dvns(chunk, names)
+    r = per_dvn["row"].to_numpy()
+    d = np.empty(len(per_dvn), dtype=RECORD)
+    d["key"] = dvn_codes.encode(per_dvn["DVN_NAME"] + "\t" + per_dvn["ROLE"])
+    d["lat"], d["fee"], d["dlv"], d["guid"] = lat[r], per_dvn["fees_eth"].to_numpy(), dlv[r], guid[r]
+
+    # required stack per message, as in compute_dvn_stack_latency.py
+    stack = required_stack(chunk["REQUIREDDVNS"], names).to_numpy()
+    keep = np.flatnonzero(stack != "")
+    s = np.empty(len(keep), dtype=RECORD)
+    s["key"] = stack_codes.encode(stack[keep])
+    s["lat"], s["fee"], s["dlv"], s["guid"] = lat[keep], 0.0, dlv[keep], guid[keep]
+    return d, s
+
+
+def plan(in_csv, memory_mb, sample_rows=20_000):
+    """Chunk size and whether to spill, from a sample of the input and the memory budget."""
+    budget = memory_mb * 1024 * 1024
+    sample = next(iter(read_export(in_csv, usecols=lambda c: c in USECOLS, chunksize=sample_rows)))
+    with open(in_csv, "rb") as f:
+        f.readline()
+        sample_bytes = sum(len(f.readline()) for _ in range(len(sample))) or 1
+    est_msgs = os.path.getsize(in_csv) / (sample_bytes / max(len(sample), 1))
+    fanout = max(len(explode_dvns(sample.reset_index(drop=True), {})) / max(len(sample), 1), 1.0)
+    est_bytes = est_msgs * (fanout + 1) * RECORD.itemsize
+    # keep the exploding chunk at ~1/4 of the budget; partitions get the rest
+    chunk_rows = int(max(1_000, min(250_000, budget / 4 / (fanout * EXPLODE_BYTES_PER_ROW))))
+    return chunk_rows, est_bytes, budget
+
+
+def run(in_csv, memory_mb=512, partitions=None, spill_dir=None, out_prefix="ooc", names_csv=NAMES_CSV):
+    names = dvn_names(names_csv)
+    chunk_rows, est_bytes, budget = plan(in_csv, memory_mb)
+    spill = est_bytes > budget / 2 if partitions is None else partitions > 0
+    n_parts = (partitions or max(2, int(np.ceil(est_bytes / (budget / 4))))) if spill else 0
+    tmp = Path(spill_dir) if spill_dir else Path(tempfile.mkdtemp(prefix="dvn_ooc_"))
+    print(f"Estimated exploded records: {est_bytes / 1e6:.0f} MB for a {memory_mb} MB budget -> "
+          + (f"spilling to {n_parts} partitions in {tmp}" if spill else "in memory") + f", {chunk_rows} rows/chunk")
+
+    dvn_codes, stack_codes = KeyCodes(), KeyCodes()
+    dvn_spill, stack_spill = Spill(n_parts, tmp, "dvn"), Spill(n_parts, tmp, "stack")
+    try:
+        with stage("explode_spill", inputs=[in_csv]) as ev:
+            n = 0
+            for chunk in read_export(in_csv, usecols=lambda c: c in USECOLS, chunksize=chunk_rows):
+                d, s = chunk_records(chunk, names, dvn_codes, stack_codes)
+                dvn_spill.add(d)
+                stack_spill.add(s)
+                n += len(chunk)
+            ev.rows_in, ev.rows_out = n, (dvn_spill.bytes + stack_spill.bytes) // RECORD.itemsize
+        with stage("aggregate_partitions", rows_in=dvn_spill.bytes // RECORD.itemsize) as ev:
+            dvn_rows, stack_rows = [], []
+            for part in dvn_spill.partitions():
+                dvn_rows += aggregate(part, dvn_codes.labels())
+            for part in stack_spill.partitions():
+                stack_rows += aggregate(part, stack_codes.labels())
+            ev.rows_out = len(dvn_rows) + len(stack_rows)
+    finally:
+        if spill and not spill_dir:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    cols = ["key", "rows", "latency_rows", "unique_messages", "fees_eth", "delivered", "median_latency", "p95_latency"]
+    dvn = pd.DataFrame(dvn_rows, columns=cols)
+    dvn[["DVN_NAME", "ROLE"]] = dvn["key"].str.split("\t", expand=True) if len(dvn) else None
+    kpi = (dvn.rename(columns={"fees_eth": "total_fees_eth", "delivered": "delivered_messages"})
+           [["DVN_NAME", "ROLE", "unique_messages", "rows", "total_fees_eth", "median_latency", "p95_latency",
+             "delivered_messages"]].sort_values(["DVN_NAME", "ROLE"]))
+    # like compute_dvn_stack_latency.py, a stack's transactions are its messages with a latency
+    stack = (pd.DataFrame(stack_rows, columns=cols)
+             .rename(columns={"key": "Required_Stack", "latency_rows": "transactions"})
+             [["Required_Stack", "transactions", "median_latency", "p95_latency"]]
+             .sort_values(["transactions", "Required_Stack"], ascending=[False, True]))
+    kpi.to_csv(f"{out_prefix}_kpi_by_dvn.csv", index=False)
+    stack.to_csv(f"{out_prefix}_stack_latency_summary.csv", index=False)
+    print("Saved:", f"{out_prefix}_kpi_by_dvn.csv", f"{out_prefix}_stack_latency_summary.csv")
+    return kpi, stack
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-DVN / per-stack KPIs with a memory budget (spills to disk).")
+    ap.add_argument("dt_csv", help="dt_clean.csv export")
+    ap.add_argument("--memory-mb", type=int, default=512, help="memory budget for the aggregation")
+    ap.add_argument("--partitions", type=int, default=None, help="force N spill partitions (0 = in memory)")
+    ap.add_argument("--spill-dir", default=None, help="keep spill files here (default: temp dir, removed)")
+    ap.add_argument("--out-prefix", default="ooc")
+    ap.add_argument("--names", default=str(NAMES_CSV))
+    args = ap.parse_args()
+    kpi, stack = run(args.dt_csv, args.memory_mb, args.partitions, args.spill_dir, args.out_prefix, args.names)
+    print(kpi.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
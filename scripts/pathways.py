@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# pathways.py
+# Pathway-partitioned processing for many (srcEid, dstEid) pathways.
+#
+#   split   dt_clean.csv -> <root>/src=<eid>/dst=<eid>/dt_clean.csv   (rows kept as exported;
+#           only the bytes of an export not split into <root> yet are appended, see split_inputs.json)
+#   run     expand, aggregate and window every pathway on its own (in parallel with --workers),
+#           then roll the pathways up per DVN
+#   rollup  only the cross-pathway rollup, from partials already on disk
+#
+# Every pathway writes *partial aggregates*: message/delivery counts, fee sums and integer-second
+# latency histograms per (DVN, role, window) and per (required stack, window). These merge by
+# plain addition, so chunks of a pathway and pathways of a run are combined without touching raw
+# rows, and median/p95 computed from the merged histogram are the same as over the raw latencies.
+# Delivery rate, median and p95 also get 95% bootstrap intervals (dvn_bootstrap.py; --boot 0 turns them off).
+# The export's OR join can repeat a GUID; each pathway keeps one row per GUID (dedup_guids.py's
+# rule) before aggregating, so messages counts distinct GUIDs. A GUID belongs to one pathway, so
+# message counts add up across pathways as well.
+# With run --validate, rows that fail validation (validate_export.py, the rules over the columns the
+# partials read) are written to <pathway>/quarantine.csv with their reason codes and left out of the
+# partials. It adds about 5% to a run; validate_export.py checks a whole export once instead.
+#
+# Usage:
+#   python3 scripts/pathways.py split <dt_clean.csv>[,more.csv] [--root pathways]
+#   python3 scripts/pathways.py run [--root pathways] [--workers N] [--names dvnNames-Sheet2.csv] [--boot 200]
+#                                   [--validate]
+#   python3 scripts/pathways.py rollup [--root pathways]
+
+import io
+import os
+import csv
+import json
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from dvn_instrument import stage
+from dvn_io import read_export, unwrap, parse_timestamps, explode_array, explode_dvns, dvn_names, pathway_key, pathway_name, NAMES_CSV
+from validate_export import Quarantine
+from dedup_guids import scan as dedup_scan, resolve as dedup_resolve
+from dvn_bootstrap import interval, rate_reps, quantile_cis, B
+
+DT_FILE = "dt_clean.csv"
+PARTIALS_FILE = "partials.csv"
+HIST_FILE = "latency_hist.csv"
+QUARANTINE_FILE = "quarantine.csv"
+SPLIT_MANIFEST = "split_inputs.json"
+CHUNK_ROWS = 500_000
+SPLIT_BLOCK_BYTES = 64 << 20
+
+# same windows as timeframe_compare.py, plus the whole period
+START = pd.Timestamp("2025-09-26", tz="UTC")
+OUTAGE_START = pd.Timestamp("2025-10-19", tz="UTC")
+OUTAGE_END = pd.Timestamp("2025-10-21", tz="UTC")
+END = pd.Timestamp("2025-10-25", tz="UTC")
+WINDOWS = {
+    "before": (START, OUTAGE_START - pd.Timedelta(days=1)),
+    "during": (OUTAGE_START, OUTAGE_END),
+    "after": (OUTAGE_END + pd.Timedelta(days=1), END),
+}
+
+USECOLS = ["GUID", "SOURCEENDPOINTID", "DESTINATIONENDPOINTID", "SOURCETIMESTAMP", "REQUIREDDVNS",
+           "OPTIONALDVNS", "DVN_FEES_ARRAY", "MESSAGESTATUS", "LATENCYTODELIVERY_SECONDS"]
+# the columns chunk_partials reads: only their rules are checked per chunk (GUIDs go through dedup_guids)
+VALIDATE = ["SOURCETIMESTAMP", "REQUIREDDVNS", "OPTIONALDVNS", "DVN_FEES_ARRAY", "MESSAGESTATUS",
+            "LATENCYTODELIVERY_SECONDS"]
+KEYS = ["GRAIN", "KEY", "ROLE", "WINDOW"]       # GRAIN is "dvn" (KEY = DVN name) or "stack" (KEY = required stack)
+SUMS = ["messages", "delivered", "fees_eth"]
+
+
+# ---------- split ----------
+
+def pathway_dir(root, src_eid, dst_eid):
+    return Path(root) / f"src={src_eid}" / f"dst={dst_eid}"
+
+
+def load_manifest(root):
+    path = Path(root) / SPLIT_MANIFEST
+    return json.loads(path.read_text()) if path.exists() else {"done": [], "pending": None}
+
+
+def save_manifest(root, manifest):
+    path = Path(root) / SPLIT_MANIFEST
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(f"{path}.tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    tmp.replace(path)
+
+
+def roll_back(manifest):
+    """Cut the pathway files back to their sizes before an interrupted split of one input."""
+    pending = manifest.get("pending")
+    if pending:
+        for out, size in pending["sizes"].items():
+            if size < 0:
+                Path(out).unlink(missing_ok=True)
+            elif Path(out).exists():
+                os.truncate(out, size)
+        print("Rolled back interrupted split of", pending["input"]["path"])
+    manifest["pending"] = None
+
+
+def split(dt_paths, root):
+    """Append every new line of the exports to the dt_clean.csv of its pathway.
+
+    Lines are routed as raw bytes (no CSV parsing or re-quoting): the endpoint-id columns come
+    before any free-text column in the export, so a bounded split finds them.
+    <root>/split_inputs.json records how many bytes of each export were split and their sha256
+    (dvn_checkpoint.consumed), so splitting an export again, touched, renamed or grown, only
+    appends the lines past that offset. It also records the sizes of the pathway files before
+    the export in progress, so an interrupted split is undone on the next one."""
+    from dvn_checkpoint import consumed, input_record, add_record, NewBytes     # dvn_checkpoint imports this module
+    manifest = load_manifest(root)
+    roll_back(manifest)
+    save_manifest(root, manifest)
+    outs = {}
+    try:
+        for path in dt_paths:
+            size = os.path.getsize(path)
+            start, hasher = consumed(path, manifest["done"])
+            if start == size:
+                print("Already split:", path)
+                continue
+            if start:
+                print(f"{path}: {start} bytes already split, appending the rest")
+            manifest["pending"] = {"input": {"path": str(Path(path).resolve()), "offset": start}, "sizes": {}}
+            sizes = manifest["pending"]["sizes"]
+            h = hasher.copy()
+            with stage("split", inputs=[path]) as ev, io.BufferedReader(NewBytes(path, start, size, h)) as f:
+                header = f.readline()
+                cols = next(csv.reader([header.decode()]))
+                i_src, i_dst = cols.index("SOURCEENDPOINTID"), cols.index("DESTINATIONENDPOINTID")
+                cut = max(i_src, i_dst) + 1
+                n = 0
+                while True:
+                    lines = f.readlines(SPLIT_BLOCK_BYTES)
+                    if not lines:
+                        break
+                    groups = {}
+                    for line in lines:
+                        parts = line.split(b",", cut)
+                        groups.setdefault((parts[i_src], parts[i_dst]), []).append(line)
+                    for (s, d), rows in groups.items():
+                        key = tuple(c.decode().strip().lstrip("=").strip('"') or "unknown" for c in (s, d))
+                        out = pathway_dir(root, *key) / DT_FILE
+                        if str(out) not in sizes:
+                            # size before this export (-1: file is new), saved before the first write to it
+                            sizes[str(out)] = out.stat().st_size if out.exists() else -1
+                            save_manifest(root, manifest)
+                        if key not in outs:
+                            out.parent.mkdir(parents=True, exist_ok=True)
+                            fresh = not out.exists()
+                            outs[key] = open(out, "ab")
+                            if fresh:
+                                outs[key].write(header)
+                        if not rows[-1].endswith(b"\n"):
+                            rows[-1] += b"\n"
+                        outs[key].writelines(rows)
+                    n += len(lines)
+                ev.rows_in = ev.rows_out = n
+            for f in outs.values():
+                f.flush()
+                os.fsync(f.fileno())
+            manifest["done"] = add_record(manifest["done"], start, hasher, input_record(path, size, h))
+            manifest["pending"] = None
+            save_manifest(root, manifest)
+    finally:
+        for f in outs.values():
+            f.close()
+    return sorted(f.name for f in outs.values())
+
+
+def find_pathways(root):
+    return sorted(p.parent for p in Path(root).glob(f"src=*/dst=*/{DT_FILE}"))
+
+
+# ---------- per-pathway partial aggregates ----------
+
+def window_labels(ts):
+    """Window name per message ('' outside every window); windows do not overlap."""
+    label = np.full(len(ts), "", dtype=object)
+    for name, (lo, hi) in WINDOWS.items():
+        label[((ts >= lo) & (ts <= hi)).to_numpy()] = name
+    return label
+
+
+def required_stack(cells, names):
+    """'A + B + C' per message, computed once per distinct REQUIREDDVNS cell."""
+    u = pd.Series(cells.unique())
+    ex = explode_array(u, "addr")
+    ex["name"] = ex["addr"].map(names).fillna(ex["addr"])
+    stacks = ex.groupby("row")["name"].agg(lambda s: " + ".join(sorted(set(s))))
+    lookup = dict(zip(u, [stacks.get(i, "") for i in range(len(u))]))
+    return cells.map(lookup)
+
+
+def chunk_partials(chunk, names):
+    """(partials, histogram) for one chunk of a pathway export."""
+    msg = pd.DataFrame({
+        "WINDOW": window_labels(parse_timestamps(chunk["SOURCETIMESTAMP"])),
+        "delivered": (unwrap(chunk["MESSAGESTATUS"]).str.upper() == "DELIVERED").astype(np.int64).to_numpy(),
+        "LATENCY_S": pd.to_numeric(unwrap(chunk["LATENCYTODELIVERY_SECONDS"]), errors="coerce").round().to_numpy(),
+    })
+
+    per_dvn = explode_dvns(chunk, names).rename(columns={"DVN_NAME": "KEY"}).join(msg, on="row")
+    per_dvn["GRAIN"] = "dvn"
+
+    per_stack = msg.assign(GRAIN="stack", ROLE="required", fees_eth=0.0,
+                           KEY=required_stack(chunk["REQUIREDDVNS"], names).to_numpy())
+
+    rows = pd.concat([per_dvn[KEYS + ["delivered", "fees_eth", "LATENCY_S"]],
+                      per_stack[KEYS + ["delivered", "fees_eth", "LATENCY_S"]]], ignore_index=True)
+    rows["messages"] = 1
+    part = rows.groupby(KEYS, as_index=False)[SUMS].sum()
+    hist = (rows.dropna(subset=["LATENCY_S"]).groupby(KEYS + ["LATENCY_S"], as_index=False).size()
+            .rename(columns={"size": "count"}))
+    hist["LATENCY_S"] = hist["LATENCY_S"].astype(np.int64)
+    # every message also counts in the "all" window; derived from the groups, not the rows
+    part, hist = merge_partials([part[part["WINDOW"] != ""], part.assign(WINDOW="all")],
+                                [hist[hist["WINDOW"] != ""], hist.assign(WINDOW="all")])
+    return part, hist
+
+
+def merge_partials(parts, hists, keys=KEYS):
+    """Combine partial aggregates by addition (chunks of a pathway, or pathways of a run)."""
+    part = pd.concat(parts, ignore_index=True).groupby(keys, as_index=False)[SUMS].sum()
+    hist = pd.concat(hists, ignore_index=True).groupby(keys + ["LATENCY_S"], as_index=False)["count"].sum()
+    return part, hist
+
+
+def hist_quantile(values, counts, q):
+    """Quantile with linear interpolation (pandas/numpy default) from a value histogram."""
+    order = np.argsort(values)
+    values, cum = values[order], np.cumsum(counts[order])
+    h = (cum[-1] - 1) * q
+    lo = int(np.floor(h))
+    v_lo = values[np.searchsorted(cum, lo, side="right")]
+    v_hi = values[np.searchsorted(cum, min(lo + 1, cum[-1] - 1), side="right")]
+    return float(v_lo + (h - lo) * (v_hi - v_lo))
+
+
+def finalize(part, hist, keys=KEYS, boot=0):
+    """KPI table from merged partials: counts, delivery rate, fees, median and p95 latency.
+
+    With boot replicates, every rate and latency gets a 95% bootstrap interval (<kpi>_lo / _hi)."""
+    out = part.copy()
+    out["delivery_rate"] = (out["delivered"] / out["messages"]).round(4)
+    if boot:
+        lo, hi = interval(rate_reps(out["delivered"].to_numpy(), out["messages"].to_numpy(), boot))
+        out["delivery_rate_lo"], out["delivery_rate_hi"] = lo.round(4), hi.round(4)
+    med, p95 = {}, {}
+    for k, h in hist.groupby(keys, sort=False):
+        v, c = h["LATENCY_S"].to_numpy(), h["count"].to_numpy()
+        med[k] = hist_quantile(v, c, 0.5)
+        p95[k] = hist_quantile(v, c, 0.95)
+    idx = list(out[keys].itertuples(index=False, name=None))
+    out["median_latency"] = [med.get(k) for k in idx]
+    out["p95_latency"] = [p95.get(k) for k in idx]
+    if boot:
+        ci = quantile_cis(hist, keys, "LATENCY_S", [0.5, 0.95], boot)
+        none = [(np.nan, np.nan)] * 2
+        for i, name in enumerate(["median_latency", "p95_latency"]):
+            out[f"{name}_lo"] = [ci.get(k, none)[i][0] for k in idx]
+            out[f"{name}_hi"] = [ci.get(k, none)[i][1] for k in idx]
+        # each interval next to its KPI
+        order = []
+        for c in out.columns:
+            if not c.endswith(("_lo", "_hi")):
+                order += [c] + [x for x in (f"{c}_lo", f"{c}_hi") if x in out.columns]
+        out = out[order]
+    return out
+
+
+def with_all_roles(part, hist):
+    """Add ROLE='all' rows (required + optional) to DVN-grain partials."""
+    dvn_p, dvn_h = part[part["GRAIN"] == "dvn"], hist[hist["GRAIN"] == "dvn"]
+    return merge_partials([part, dvn_p.assign(ROLE="all")], [hist, dvn_h.assign(ROLE="all")])
+
+
+def write_kpis(part, hist, out_dir, prefix="", boot=B):
+    kpi = finalize(*with_all_roles(part, hist), boot=boot)
+    dvn = (kpi[kpi["GRAIN"] == "dvn"].drop(columns="GRAIN").rename(columns={"KEY": "DVN_NAME"})
+           .sort_values(["WINDOW", "ROLE", "messages", "DVN_NAME"], ascending=[True, True, False, True]))
+    stack = (kpi[kpi["GRAIN"] == "stack"].drop(columns=["GRAIN", "ROLE", "fees_eth"])
+             .rename(columns={"KEY": "Required_Stack", "messages": "transactions"})
+             .sort_values(["WINDOW", "transactions", "Required_Stack"], ascending=[True, False, True]))
+    dvn.to_csv(Path(out_dir) / f"{prefix}kpi_by_dvn.csv", index=False)
+    stack.to_csv(Path(out_dir) / f"{prefix}kpi_by_stack.csv", index=False)
+    return dvn, stack
+
+
+def process_pathway(pdir, names_csv=NAMES_CSV, chunk_rows=CHUNK_ROWS, boot=B, validate=False):
+    """Expand, aggregate and window one pathway; writes partials and KPI tables into its directory.
+
+    With validate, rows failing validation (validate_export.py) go to quarantine.csv and are left out
+    of the partials.
+    """
+    pdir = Path(pdir)
+    names = dvn_names(names_csv)
+    (pdir / QUARANTINE_FILE).unlink(missing_ok=True)
+    quarantine = Quarantine(pdir / QUARANTINE_FILE, VALIDATE) if validate else None
+    parts, hists = [], []
+    n = 0
+    with stage(f"pathway_{pdir.parent.name}_{pdir.name}", inputs=[pdir / DT_FILE]) as ev:
+        # one row per GUID (dedup_guids.py's rule), so messages counts distinct GUIDs
+        rec, rows, _ = dedup_scan([pdir / DT_FILE], chunk_rows)
+        drop = np.zeros(rows[0], dtype=bool)
+        drop[dedup_resolve(rec, 1)[0][0]] = True
+        for chunk in read_export(pdir / DT_FILE, usecols=lambda c: c in USECOLS, chunksize=chunk_rows):
+            chunk = chunk.reset_index(drop=True)
+            valid = quarantine.split(chunk, n)[0] if quarantine else chunk
+            valid = valid[~drop[n + valid.index.to_numpy()]]
+            n += len(chunk)
+            p, h = chunk_partials(valid.reset_index(drop=True), names)
+            parts.append(p)
+            hists.append(h)
+            # fold as we go so memory is bounded by the number of groups, not rows
+            if len(parts) > 8:
+                p, h = merge_partials(parts, hists)
+                parts, hists = [p], [h]
+        part, hist = merge_partials(parts, hists) if parts else (pd.DataFrame(columns=KEYS + SUMS),
+                                                                   pd.DataFrame(columns=KEYS + ["LATENCY_S", "count"]))
+        part.to_csv(pdir / PARTIALS_FILE, index=False)
+        hist.to_csv(pdir / HIST_FILE, index=False)
+        write_kpis(part, hist, pdir, boot=boot)
+        ev.rows_in, ev.rows_out = n, len(part)
+    if quarantine and quarantine.failed:
+        quarantine.print_summary(f"{pdir}: ")
+    return str(pdir), n
+
+
+# ---------- cross-pathway rollup ----------
+
+def pathway_eids(pdir):
+    return pdir.parent.name.split("=", 1)[1], pdir.name.split("=", 1)[1]
+
+
+def rollup(root, boot=B):
+    """Merge the partials of every pathway into per-DVN / per-stack rollups at <root>."""
+    root = Path(root)
+    parts, hists, per_pathway = [], [], []
+    for pdir in find_pathways(root):
+        if not (pdir / PARTIALS_FILE).exists():
+            print("No partials (run it first):", pdir)
+            continue
+        p = pd.read_csv(pdir / PARTIALS_FILE, keep_default_na=False)
+        h = pd.read_csv(pdir / HIST_FILE, keep_default_na=False)
+        parts.append(p)
+        hists.append(h)
+        s, d = pathway_eids(pdir)
+        kpi = pd.read_csv(pdir / "kpi_by_dvn.csv", keep_default_na=False)
+        kpi.insert(0, "PATHWAY", pathway_name(s, d))
+        kpi.insert(0, "PATHWAY_KEY", pathway_key(s, d))
+        per_pathway.append(kpi)
+    if not parts:
+        print("No pathways under", root)
+        return None
+    with stage("rollup", rows_in=sum(len(p) for p in parts)) as ev:
+        part, hist = merge_partials(parts, hists)
+        dvn, stack = write_kpis(part, hist, root, prefix="rollup_", boot=boot)
+        pd.concat(per_pathway, ignore_index=True).to_csv(root / "pathway_kpi_by_dvn.csv", index=False)
+        ev.rows_out = len(dvn) + len(stack)
+    return dvn
+
+
+def run(root, workers, names_csv, boot=B, validate=False):
+    pdirs = find_pathways(root)
+    if not pdirs:
+        print("No pathways under", root, "- run split first")
+        return None
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pdirs)))
+    if workers == 1:
+        done = [process_pathway(p, names_csv, CHUNK_ROWS, boot, validate) for p in pdirs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            n = len(pdirs)
+            done = list(ex.map(process_pathway, pdirs, [names_csv] * n, [CHUNK_ROWS] * n, [boot] * n,
+                               [validate] * n))
+    for pdir, n in done:
+        print(f"{pdir}: {n} messages")
+    return rollup(root, boot)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Partition exports by (srcEid, dstEid) and process pathways independently.")
+    ap.add_argument("command", choices=["split", "run", "rollup"])
+    ap.add_argument("inputs", nargs="?", default="", help="split: comma-separated dt_clean.csv exports")
+    ap.add_argument("--root", default="pathways", help="pathway store directory")
+    ap.add_argument("--workers", type=int, default=0, help="parallel pathways (default: one per CPU)")
+    ap.add_argument("--names", default=str(NAMES_CSV), help="DVN address -> name sheet")
+    ap.add_argument("--boot", type=int, default=B, help="bootstrap replicates for KPI intervals (0: none)")
+    ap.add_argument("--validate", action="store_true", help="run: quarantine rows failing validate_export.py")
+    args = ap.parse_args()
+
+    if args.command == "split":
+        paths = [p for p in args.inputs.split(",") if p.strip()]
+        if not paths:
+            ap.error("split needs at least one dt_clean.csv")
+        for out in split(paths, args.root):
+            print("Saved:", out)
+    elif args.command == "run":
+        dvn = run(args.root, args.workers, args.names, args.boot, args.validate)
+        if dvn is not None:
+            print("Saved:", Path(args.root) / "rollup_kpi_by_dvn.csv", Path(args.root) / "rollup_kpi_by_stack.csv",
+                  Path(args.root) / "pathway_kpi_by_dvn.csv")
+            top = dvn[(dvn["WINDOW"] == "all") & (dvn["ROLE"] == "all")]
+            print(top.head(20).to_string(index=False))
+    else:
+        dvn = rollup(args.root, args.boot)
+        if dvn is not None:
+            print("Saved:", Path(args.root) / "rollup_kpi_by_dvn.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,9 @@ import json
 import math
 import pandas as pd
 from datetime import datetime
+from dvn_instrument import stage
+from dvn_schema import detect
+from dvn_io import parse_timestamps
 
 if len(sys.argv) < 2:
     print("Usage: python3 process_dvn.py <input_csv>")
@@ -17,13 +20,6 @@ out_prefix = "dvn_processed"
 
 pd.set_option('display.max_columns', 200)
 
-def find_col(df, names):
-    cols = {c.lower(): c for c in df.columns}
-    for n in names:
-        if n.lower() in cols:
-            return cols[n.lower()]
-    return None
-
 def parse_array_field(s):
     """Parse a Flipside-style array field robustly.
     Accepts: JSON array string, or comma-separated values without brackets"""
@@ -60,35 +56,22 @@ def parse_int_safe(x):
         except:
             return None
 
-def parse_datetime_safe(x):
-    if pd.isna(x):
-        return pd.NaT
-    s = str(x).strip()
-    # try common formats
-    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%b %d, %Y", "%Y-%m-%d"):
-        try:
-            return pd.to_datetime(s, format=fmt)
-        except Exception:
-            pass
-    # fallback: pandas to_datetime
-    try:
-        return pd.to_datetime(s, errors='coerce')
-    except:
-        return pd.NaT
-
 print("Loading CSV:", input_csv)
-df = pd.read_csv(input_csv, dtype=str, keep_default_na=False, na_values=['', 'NA', 'N/A', 'None'])
+with stage("load", inputs=[input_csv]) as ev:
+    df = pd.read_csv(input_csv, dtype=str, keep_default_na=False, na_values=['', 'NA', 'N/A', 'None'])
+    ev.rows_out = len(df)
 
-# locate important columns (case-insensitive)
+# locate important columns (names and aliases from the schema registry, dvn_schema.py)
+schema = detect(input_csv)
 col_map = {
-    'source_tx': find_col(df, ['SOURCETXHASH','source_tx_hash','source_tx']),
-    'source_ts': find_col(df, ['SOURCETIMESTAMP','source_timestamp','source_ts']),
-    'dest_ts': find_col(df, ['DESTINATIONDELIVEREDTIMESTAMP','dest_timestamp','destinationdeliveredtimestamp']),
-    'dvn_fees': find_col(df, ['DVN_FEES_ARRAY','DVN_FEES_ARRAY','dvn_fees','dvn_fees_array','dvN_fees']),
-    'req_dvns': find_col(df, ['REQUIREDDVNS','required_dvns','requiredDvns']),
-    'opt_dvns': find_col(df, ['OPTIONALDVNS','optional_dvns','optionalDvns']),
-    'latency': find_col(df, ['LATENCYTODELIVERY_SECONDS','latencytodelivery seconds','latencytodelivery_seconds','latency']),
-    'message_status': find_col(df, ['MESSAGESTATUS','message_status','status']),
+    'source_tx': schema.get('SOURCETXHASH'),
+    'source_ts': schema.get('SOURCETIMESTAMP'),
+    'dest_ts': schema.get('DESTINATIONDELIVEREDTIMESTAMP'),
+    'dvn_fees': schema.get('DVN_FEES_ARRAY'),
+    'req_dvns': schema.get('REQUIREDDVNS'),
+    'opt_dvns': schema.get('OPTIONALDVNS'),
+    'latency': schema.get('LATENCYTODELIVERY_SECONDS'),
+    'message_status': schema.get('MESSAGESTATUS'),
 }
 print("Detected column mapping:", col_map)
 
@@ -97,14 +80,18 @@ for k,v in col_map.items():
     if v is None:
         print(f"Warning: could not find column for '{k}' -- some outputs may be limited.")
 
+# timestamps: one vectorized parse per column, format inferred from a sample (dvn_io.parse_timestamps)
+parsed_ts = {k: parse_timestamps(df[col_map[k]]) if col_map[k] else pd.Series(pd.NaT, index=df.index)
+             for k in ('source_ts', 'dest_ts')}
+
 # parse arrays and numeric fields
 def build_parsed_row(row):
     parsed = {}
     parsed['source_tx'] = row.get(col_map['source_tx']) if col_map['source_tx'] else None
     parsed['source_timestamp_raw'] = row.get(col_map['source_ts']) if col_map['source_ts'] else None
     parsed['dest_timestamp_raw'] = row.get(col_map['dest_ts']) if col_map['dest_ts'] else None
-    parsed['source_timestamp'] = parse_datetime_safe(parsed['source_timestamp_raw'])
-    parsed['dest_timestamp'] = parse_datetime_safe(parsed['dest_timestamp_raw'])
+    parsed['source_timestamp'] = parsed_ts['source_ts'].at[row.name]
+    parsed['dest_timestamp'] = parsed_ts['dest_ts'].at[row.name]
     parsed['latency_seconds'] = parse_int_safe(row.get(col_map['latency'])) if col_map['latency'] else None
     parsed['message_status'] = row.get(col_map['message_status']) if col_map['message_status'] else None
 
@@ -126,62 +113,66 @@ def build_parsed_row(row):
     return parsed
 
 print("Parsing rows and building expanded per-DVN rows...")
-parsed_rows = []
-for _, r in df.iterrows():
-    p = build_parsed_row(r)
-    dvns = p['all_dvns']
-    fees = p['dvn_fees_array']
-    # if lengths mismatch, allow mapping of min(len)
-    n = max(len(dvns), len(fees))
-    if n == 0:
-        # no dvn info; skip
-        continue
-    for i in range(n):
-        dvn_addr = dvns[i] if i < len(dvns) else None
-        fee = fees[i] if i < len(fees) else None
-        is_required = (i < len(p['required_dvns']))
-        parsed_rows.append({
-            'source_tx': p['source_tx'],
-            'source_timestamp': p['source_timestamp'],
-            'dest_timestamp': p['dest_timestamp'],
-            'latency_seconds': p['latency_seconds'],
-            'message_status': p['message_status'],
-            'dvn_addr': dvn_addr,
-            'dvn_fee': fee,
-            'is_required': is_required
-        })
-
-expanded_df = pd.DataFrame(parsed_rows)
-print("Expanded rows:", len(expanded_df))
+with stage("expand", rows_in=len(df)) as ev:
+    parsed_rows = []
+    for _, r in df.iterrows():
+        p = build_parsed_row(r)
+        dvns = p['all_dvns']
+        fees = p['dvn_fees_array']
+        # if lengths mismatch, allow mapping of min(len)
+        n = max(len(dvns), len(fees))
+        if n == 0:
+            # no dvn info; skip
+            continue
+        for i in range(n):
+            dvn_addr = dvns[i] if i < len(dvns) else None
+            fee = fees[i] if i < len(fees) else None
+            is_required = (i < len(p['required_dvns']))
+            parsed_rows.append({
+                'source_tx': p['source_tx'],
+                'source_timestamp': p['source_timestamp'],
+                'dest_timestamp': p['dest_timestamp'],
+                'latency_seconds': p['latency_seconds'],
+                'message_status': p['message_status'],
+                'dvn_addr': dvn_addr,
+                'dvn_fee': fee,
+                'is_required': is_required
+            })
+
+    expanded_df = pd.DataFrame(parsed_rows)
+    print("Expanded rows:", len(expanded_df))
+    ev.rows_out = len(expanded_df)
 
 # coerce types
 expanded_df['dvn_fee'] = expanded_df['dvn_fee'].apply(lambda x: int(x) if (x is not None and not (isinstance(x, float) and math.isnan(x))) else None)
 expanded_df['latency_seconds'] = expanded_df['latency_seconds'].apply(lambda x: int(x) if x is not None else None)
 
-# basic KPIs per DVN operator
-agg = expanded_df.groupby('dvn_addr').agg(
-    messages=('source_tx','nunique'),
-    rows=('dvn_addr','size'),
-    total_fees=('dvn_fee', lambda s: sum([int(x) for x in s if x is not None])),
-    avg_fee=('dvn_fee', lambda s: (sum([int(x) for x in s if x is not None]) / len([x for x in s if x is not None])) if len([x for x in s if x is not None])>0 else None),
-).reset_index()
-
-# latency stats (only delivered)
-delivered = expanded_df[expanded_df['message_status'].str.upper()=='DELIVERED'] if 'message_status' in expanded_df.columns else expanded_df
-latency_stats = delivered.groupby('dvn_addr')['latency_seconds'].agg(['count','median', lambda s: s.dropna().quantile(0.95)]).reset_index()
-latency_stats.columns = ['dvn_addr','delivered_count','median_latency','p95_latency']
-
-# delivered rate per dvn (unique messages delivered / unique messages seen)
-msg_status = expanded_df.groupby(['dvn_addr']).apply(
-    lambda g: pd.Series({
-        'unique_messages': g['source_tx'].nunique(),
-        'delivered_messages': g[g['message_status'].str.upper()=='DELIVERED']['source_tx'].nunique() if 'message_status' in g else 0
-    })
-).reset_index()
-msg_status['delivered_rate'] = msg_status.apply(lambda r: r['delivered_messages']/r['unique_messages'] if r['unique_messages']>0 else None, axis=1)
+with stage("kpi", rows_in=len(expanded_df)) as ev:
+    # basic KPIs per DVN operator
+    agg = expanded_df.groupby('dvn_addr').agg(
+        messages=('source_tx','nunique'),
+        rows=('dvn_addr','size'),
+        total_fees=('dvn_fee', lambda s: sum([int(x) for x in s if x is not None])),
+        avg_fee=('dvn_fee', lambda s: (sum([int(x) for x in s if x is not None]) / len([x for x in s if x is not None])) if len([x for x in s if x is not None])>0 else None),
+    ).reset_index()
+
+    # latency stats (only delivered)
+    delivered = expanded_df[expanded_df['message_status'].str.upper()=='DELIVERED'] if 'message_status' in expanded_df.columns else expanded_df
+    latency_stats = delivered.groupby('dvn_addr')['latency_seconds'].agg(['count','median', lambda s: s.dropna().quantile(0.95)]).reset_index()
+    latency_stats.columns = ['dvn_addr','delivered_count','median_latency','p95_latency']
+
+    # delivered rate per dvn (unique messages delivered / unique messages seen)
+    msg_status = expanded_df.groupby(['dvn_addr']).apply(
+        lambda g: pd.Series({
+            'unique_messages': g['source_tx'].nunique(),
+            'delivered_messages': g[g['message_status'].str.upper()=='DELIVERED']['source_tx'].nunique() if 'message_status' in g else 0
+        })
+    ).reset_index()
+    msg_status['delivered_rate'] = msg_status.apply(lambda r: r['delivered_messages']/r['unique_messages'] if r['unique_messages']>0 else None, axis=1)
 
-# merge tables
-kpi = agg.merge(latency_stats, on='dvn_addr', how='left').merge(msg_status[['dvn_addr','delivered_rate']], on='dvn_addr', how='left')
+    # merge tables
+    kpi = agg.merge(latency_stats, on='dvn_addr', how='left').merge(msg_status[['dvn_addr','delivered_rate']], on='dvn_addr', how='left')
+    ev.rows_out = len(kpi)
 
 # Save outputs
 expanded_df.to_csv(f"{out_prefix}_per_dvn_rows.csv", index=False)
@@ -198,8 +189,8 @@ print(kpi.sort_values('rows', ascending=False).head(10).to_string(index=False))
 # quick pre/post outage comparison (if source_timestamp present)
 try:
     expanded_df['source_timestamp'] = pd.to_datetime(expanded_df['source_timestamp'])
-    outage_start = pd.to_datetime("2025-10-19")
-    outage_end = pd.to_datetime("2025-10-21")
+    outage_start = pd.to_datetime("2025-10-19", utc=True)
+    outage_end = pd.to_datetime("2025-10-21", utc=True)
     before = expanded_df[expanded_df['source_timestamp'] < outage_start]
     during = expanded_df[(expanded_df['source_timestamp'] >= outage_start) & (expanded_df['source_timestamp'] <= outage_end)]
     print("\nCounts around outage period:")
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# synth_exports.py
+# Deterministic generator of schema-faithful Flipside exports at production volume.
+#
+# Writes, for N messages:
+#  - dt_clean.csv                 (39 columns, Excel-wrapped ="..." cells, same layout as data/dt_clean.csv)
+#  - dvnFeesReqOp-Sheet1.csv      (GUID, requiredDVNs, optionalDVNs, DVN_FEES_ARRAY sheet export)
+#  - dvnNames-Sheet2.csv          (copied from the repo so map_dvn.py runs unchanged)
+#
+# Rows are generated in chunks with a per-chunk seeded RNG, so the output for a given
+# (N, seed, chunk_size) is byte-identical between runs and memory stays flat at 10^8 messages.
+#
+# Messages are Base -> Ethereum unless a list of pathways is given, in which case every
+# message is assigned one of them uniformly (e.g. 30184-30101,30110-30101,30184-30110).
+#
+# Usage: python3 scripts/synth_exports.py <n_messages> <out_dir> [seed] [chunk_size] [pathways]
+
+import sys
+import shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dvn_io import CHAIN_NAMES
+from dvn_schema import DT_COLUMNS, FEES_COLUMNS
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+NAMES_CSV = REPO_ROOT / "dvnNames-Sheet2.csv"
+
+DT_ADDRESS = "0xc2a0c36f5939a14966705c7cec813163faeea1f0"
+EXECUTOR_ADDRESS = "0x2cca08ae69e0c44b18a57ab2a87644234daebae4"
+
+# --- timeline: query window and the Oct 19-21 outage (same dates as timeframe_compare.py) ---
+START = pd.Timestamp("2025-09-26", tz="UTC")
+END = pd.Timestamp("2025-10-26", tz="UTC")
+OUTAGES = [(pd.Timestamp("2025-10-19", tz="UTC"), pd.Timestamp("2025-10-21", tz="UTC"))]
+
+# block anchors observed in data/dt_clean.csv (Base ~2s blocks, Ethereum ~12s blocks)
+SRC_BLOCK0, SRC_T0, SRC_BLOCK_S = 36030021, pd.Timestamp("2025-09-26T01:16:29Z"), 2
+DST_BLOCK0, DST_T0, DST_BLOCK_S = 23443865, pd.Timestamp("2025-09-26T01:17:47Z"), 12
+
+# --- stack configurations (required, optional) with weights from the 133-message sample,
+# plus a long tail of rarer configurations so groupbys see more than three stacks ---
+STACKS = [
+    (["0x554833698ae0fb22ecc90b01222903fd62ca4b47", "0x5b6735c66d97479ccd18294fc96b3084ecb2fa3f", DT_ADDRESS],
+     [], 62),
+    (["0x9e059a54699a285714207b43b055483e78faac25", "0xd56e4eab23cb81f43168f9f45211eb027b9ac7cc"],
+     ["0x554833698ae0fb22ecc90b01222903fd62ca4b47", "0xa0af56164f02bdf9d75287ee77c568889f11d5f2", DT_ADDRESS], 57),
+    (["0x9e059a54699a285714207b43b055483e78faac25", "0xcd37ca043f8479064e10635020c65ffc005d36f6",
+      "0xd56e4eab23cb81f43168f9f45211eb027b9ac7cc"],
+     ["0x133e9fb2d339d8428476a714b1113b024343811e", "0x554833698ae0fb22ecc90b01222903fd62ca4b47",
+      "0x5b6735c66d97479ccd18294fc96b3084ecb2fa3f", "0xa7b5189bca84cd304d8553977c7c614329750d99",
+      "0xb3ce0a5d132cd9bf965aba435e650c55edce0062", DT_ADDRESS, "0xcdf31d62140204c08853b547e64707110fbc6680",
+      "0xdd7b5e1db4aafd5c8ec3b764efb8ed265aa5445b", "0xeede111103535e473451311e26c3e6660b0f77e1"], 14),
+    ([DT_ADDRESS, "0x9e059a54699a285714207b43b055483e78faac25"], ["0xa0af56164f02bdf9d75287ee77c568889f11d5f2"], 4),
+    (["0x9e059a54699a285714207b43b055483e78faac25", "0x93ac538152e1bc4f093ae5666ee9fd1d84f4f4bf"], [DT_ADDRESS], 3),
+    (["0x589dedbd617e0cbcb916a9223f4d1300c294236b", DT_ADDRESS], [], 1),
+]
+# per-stack median latency (s) in normal operation; the sample sits between 56 and 78s
+STACK_BASE_LATENCY = [64.0, 66.0, 68.0, 62.0, 70.0, 90.0]
+
+DELIVERED_P = 0.44           # share of delivered messages in the sample (58/133)
+OUTAGE_DELIVERED_P = 0.15    # delivery collapses during outage windows
+OUTAGE_LATENCY_X = 6.0       # and delivered messages are much slower
+N_SENDERS_PER_K = 400        # distinct senders per 1000 messages (54/133 in the sample)
+
+
+def wrap(s):
+    """Excel wrapper used by json-to-csv.js: value -> ="value" (vectorized over a Series)."""
+    return '="' + s + '"'
+
+
+def hex_strings(rng, n, nbytes):
+    """n random 0x-prefixed hex strings of nbytes each, without a per-row Python loop."""
+    raw = rng.bytes(n * nbytes).hex().encode("ascii")
+    return "0x" + pd.Series(np.frombuffer(raw, dtype=f"S{2 * nbytes}").astype(str))
+
+
+def iso(ts):
+    return pd.Series(ts).dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def array_cell(items):
+    return "[ " + ";".join(items) + " ]" if items else "[  ]"
+
+
+def stack_tables():
+    """Pre-render the array cells for every stack so rows only pick an index."""
+    weights = np.array([w for _, _, w in STACKS], dtype=float)
+    req_cells = np.array([array_cell(r) for r, _, _ in STACKS], dtype=object)
+    opt_cells = np.array([array_cell(o) for _, o, _ in STACKS], dtype=object)
+    n_req = np.array([len(r) for r, _, _ in STACKS])
+    n_opt = np.array([len(o) for _, o, _ in STACKS])
+    dt_req = np.array([DT_ADDRESS in r for r, _, _ in STACKS])
+    dt_opt = np.array([DT_ADDRESS in o for _, o, _ in STACKS])
+    return weights / weights.sum(), req_cells, opt_cells, n_req, n_opt, dt_req, dt_opt
+
+
+def fees_cells(rng, stack_idx, n_req, n_opt):
+    """One fee for all required DVNs and one for all optional DVNs of a message, like the sample."""
+    n = len(stack_idx)
+    req_fee = np.round(rng.lognormal(np.log(1.3e13), 1.2, n)).astype(np.int64).astype(str)
+    opt_fee = np.round(rng.lognormal(np.log(1.3e13), 1.2, n)).astype(np.int64).astype(str)
+    out = np.empty(n, dtype=object)
+    # group by stack so each group is assembled with vectorized string ops
+    for s in np.unique(stack_idx):
+        m = stack_idx == s
+        parts = [pd.Series(req_fee[m])] * n_req[s] + [pd.Series(opt_fee[m])] * n_opt[s]
+        out[m] = ("[ " + parts[0].str.cat(parts[1:], sep=";") + " ]").to_numpy()
+    return pd.Series(out)
+
+
+def pathway_cells(rng, n, pathways):
+    """SOURCEENDPOINTID, DESTINATIONENDPOINTID and chain-name cells for n messages."""
+    if not pathways:
+        pathways = [(30184, 30101)]
+    # drawn only for several pathways so the default output stays byte-identical
+    pick = rng.integers(len(pathways), size=n) if len(pathways) > 1 else np.zeros(n, dtype=np.int64)
+    cells = []
+    for side in (0, 1):
+        eids = [p[side] for p in pathways]
+        cells.append(pd.Series(np.array([f'="{e}"' for e in eids], dtype=object)[pick]))
+    for side in (0, 1):
+        names = [CHAIN_NAMES.get(p[side], "Unknown") for p in pathways]
+        cells.append(pd.Series(np.array([f'="{c}"' for c in names], dtype=object)[pick]))
+    return cells
+
+
+def generate_chunk(seed, chunk_idx, n, t_lo, t_hi, tables, pathways=None):
+    """Generate n messages with source timestamps in [t_lo, t_hi). Returns (dt_lines, fees_lines)."""
+    rng = np.random.default_rng([seed, chunk_idx])
+    probs, req_cells, opt_cells, n_req, n_opt, dt_req, dt_opt = tables
+
+    # source side
+    span_s = max((t_hi - t_lo).total_seconds(), 1.0)
+    offs = np.sort(rng.uniform(0, span_s, n)).astype(np.int64)
+    src_ts = t_lo.tz_convert(None) + pd.to_timedelta(offs, unit="s")
+    src_block = SRC_BLOCK0 + ((src_ts - SRC_T0.tz_convert(None)).total_seconds().to_numpy() // SRC_BLOCK_S).astype(np.int64)
+    stack_idx = rng.choice(len(probs), size=n, p=probs)
+
+    # delivery and latency, degraded inside outage windows
+    in_outage = np.zeros(n, dtype=bool)
+    for o_lo, o_hi in OUTAGES:
+        in_outage |= (src_ts >= o_lo.tz_convert(None)) & (src_ts < o_hi.tz_convert(None))
+    delivered = rng.random(n) < np.where(in_outage, OUTAGE_DELIVERED_P, DELIVERED_P)
+    base_lat = np.array(STACK_BASE_LATENCY)[stack_idx]
+    lat = np.round(base_lat * rng.lognormal(0, 0.12, n) * np.where(in_outage, OUTAGE_LATENCY_X, 1.0) / 2) * 2
+    lat = lat.astype(np.int64)
+    dst_ts = src_ts + pd.to_timedelta(lat, unit="s")
+    dst_block = DST_BLOCK0 + ((dst_ts - DST_T0.tz_convert(None)).total_seconds().to_numpy() // DST_BLOCK_S).astype(np.int64)
+
+    tx = hex_strings(rng, n, 32)
+    guid = hex_strings(rng, n, 32)
+    dst_tx = hex_strings(rng, n, 32)
+    n_senders = max(1, (n * N_SENDERS_PER_K) // 1000)
+    sender_pool = hex_strings(rng, n_senders, 20)
+    # Zipf-like sender popularity, as in the sample where one sender has 26/133 messages
+    sender = sender_pool.iloc[np.minimum(rng.zipf(1.6, n) - 1, n_senders - 1)].reset_index(drop=True)
+    exec_fee = np.round(rng.lognormal(np.log(1.2e14), 0.6, n)).astype(np.int64).astype(str)
+
+    src_block_s = pd.Series(src_block.astype(str))
+    src_ts_s = iso(src_ts)
+    empty = pd.Series([""] * n)
+    req_s = pd.Series(req_cells[stack_idx])
+    opt_s = pd.Series(opt_cells[stack_idx])
+    fees_s = fees_cells(rng, stack_idx, n_req, n_opt)
+    dst_block_s = pd.Series(dst_block.astype(str))
+    dst_ts_s = iso(dst_ts)
+
+    src_eid_s, dst_eid_s, src_name_s, dst_name_s = pathway_cells(rng, n, pathways)
+
+    def when_delivered(s):
+        return pd.Series(np.where(delivered, wrap(s), ""))
+
+    cols = [
+        wrap(tx), wrap(src_block_s), wrap(src_ts_s), src_eid_s, dst_eid_s, src_name_s, dst_name_s,
+        wrap(guid), empty, wrap(sender), empty, empty, empty, wrap(req_s), wrap(opt_s),
+        wrap(pd.Series(n_req[stack_idx].astype(str))), wrap(pd.Series(n_opt[stack_idx].astype(str))),
+        wrap(tx), wrap(src_block_s), wrap(src_ts_s), wrap(fees_s),
+        when_delivered(dst_tx), when_delivered(dst_block_s), when_delivered(dst_ts_s),
+        pd.Series(np.where(delivered, '="OFTReceived"', "")), empty, empty, empty,
+        wrap(tx), pd.Series([f'="{EXECUTOR_ADDRESS}"'] * n), wrap(pd.Series(exec_fee)),
+        pd.Series(np.where(delivered, '="DELIVERED"', '="SENT"')),
+        pd.Series(np.where(delivered, wrap(pd.Series(lat.astype(str))), '="N/A"')),
+        pd.Series(np.where(delivered, '="GUID"', '="NO_MATCH"')),
+        pd.Series(np.where(dt_req[stack_idx], "true", "false")),
+        pd.Series(np.where(dt_opt[stack_idx], "true", "false")),
+        pd.Series(np.where(delivered, "true", "false")),
+        when_delivered(src_block_s + "_" + dst_block_s),
+        wrap(src_block_s + "_" + src_block_s),
+    ]
+    dt_lines = cols[0].str.cat(cols[1:], sep=",")
+    fees_lines = guid.str.cat([req_s, opt_s, fees_s], sep=",")
+    return dt_lines, fees_lines
+
+
+def generate(n_messages, out_dir, seed=7, chunk_size=250_000, pathways=None):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tables = stack_tables()
+    n_chunks = max(1, -(-n_messages // chunk_size))
+    edges = pd.date_range(START, END, periods=n_chunks + 1)
+    dt_path = out_dir / "dt_clean.csv"
+    fees_path = out_dir / "dvnFeesReqOp-Sheet1.csv"
+    with open(dt_path, "w", newline="") as f_dt, open(fees_path, "w", newline="") as f_fees:
+        f_dt.write(",".join(DT_COLUMNS) + "\n")
+        f_fees.write(",".join(FEES_COLUMNS) + "\n")
+        written = 0
+        for i in range(n_chunks):
+            n = min(chunk_size, n_messages - written)
+            dt_lines, fees_lines = generate_chunk(seed, i, n, edges[i], edges[i + 1], tables, pathways)
+            f_dt.write("\n".join(dt_lines) + "\n")
+            f_fees.write("\n".join(fees_lines) + "\n")
+            written += n
+            if n_chunks > 1 and (i + 1) % 20 == 0:
+                print(f"Generated {written}/{n_messages} messages...")
+    shutil.copy(NAMES_CSV, out_dir / NAMES_CSV.name)
+    return dt_path, fees_path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python3 scripts/synth_exports.py <n_messages> <out_dir> [seed] [chunk_size] [pathways]")
+        sys.exit(1)
+    n_messages = int(float(sys.argv[1]))
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 7
+    chunk_size = int(float(sys.argv[4])) if len(sys.argv) > 4 else 250_000
+    pathways = [tuple(int(e) for e in p.split("-")) for p in sys.argv[5].split(",")] if len(sys.argv) > 5 else None
+    dt_path, fees_path = generate(n_messages, sys.argv[2], seed, chunk_size, pathways)
+    print("Saved:", dt_path)
+    print("Saved:", fees_path)
@@ -2,16 +2,28 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from dvn_instrument import stage
+from dvn_loader import load
+from dvn_io import parse_timestamps
+from dvn_bootstrap import stack_cis
+from dvn_lifecycle import latency_by_guid
 
-df = pd.read_csv("expanded_per_dvn_joined.csv", dtype=str, keep_default_na=False)
-# clean then parse timestamps (ensure UTC tz-aware)
-df['SOURCETIMESTAMP'] = df['SOURCETIMESTAMP'].astype(str).str.strip().str.replace(r'^\=+','',regex=True).str.replace(r'^[\"\']+|[\"\']+$','',regex=True)
-df['SOURCETIMESTAMP'] = pd.to_datetime(df['SOURCETIMESTAMP'], errors='coerce', utc=True)
+COLUMNS = ['GUID', 'DVN_NAME', 'ROLE', 'SOURCETIMESTAMP', 'LATENCYTODELIVERY_SECONDS']
 
-# normalize role and latency
-df['ROLE'] = df['ROLE'].astype(str).str.lower().fillna('')
+with stage("load", inputs=["expanded_per_dvn_joined.csv"]) as ev:
+    # only the columns used below, and only rows inside the windows' overall span
+    df = load("expanded_per_dvn_joined.csv", columns=COLUMNS,
+              time_range=("2025-09-26", "2025-10-25")).fillna('')
+    # wrapped or not, format inferred once per column (dvn_io.parse_timestamps)
+    df['SOURCETIMESTAMP'] = parse_timestamps(df['SOURCETIMESTAMP'])
 
-df['LATENCY_S'] = pd.to_numeric(df['LATENCYTODELIVERY_SECONDS'].astype(str).str.replace(r'[^0-9\.]','',regex=True), errors='coerce')
+    # normalize role and latency
+    df['ROLE'] = df['ROLE'].astype(str).str.lower().fillna('')
+
+    df['LATENCY_S'] = pd.to_numeric(df['LATENCYTODELIVERY_SECONDS'].astype(str).str.replace(r'[^0-9\.]','',regex=True), errors='coerce')
+    # the GUID's lifecycle latency when dvn_lifecycle.csv is here (dvn_lifecycle.py)
+    df['LATENCY_S'] = latency_by_guid(df['GUID'], df['LATENCY_S'])
+    ev.rows_out = len(df)
 
 # time windows (adjust dates to exact outage period you want)
 start = pd.Timestamp("2025-09-26", tz="UTC")
@@ -27,6 +39,13 @@ windows = {
 }
 
 
+STACK_COLS = ['Required_Stack','transactions','median_latency','p95_latency',
+              'median_latency_lo','median_latency_hi','p95_latency_lo','p95_latency_hi']
+DVN_COLS = ['DVN_NAME','stacks_involved','total_transactions','avg_median_latency','avg_p95_latency',
+            'avg_median_latency_lo','avg_median_latency_hi','avg_p95_latency_lo','avg_p95_latency_hi']
+CI_COLS = ['lo_0','hi_0','lo_1','hi_1']
+
+
 def compute_for_window(dfw):
     # Build required stack per GUID
     req = (dfw[dfw['ROLE'].str.lower()=='required']
@@ -42,9 +61,7 @@ def compute_for_window(dfw):
 
     # if nothing left, return empty shaped DataFrames (prevents KeyErrors)
     if txs.empty:
-        stack_cols = ['Required_Stack','transactions','median_latency','p95_latency']
-        dvn_cols = ['DVN_NAME','stacks_involved','total_transactions','avg_median_latency','avg_p95_latency']
-        return pd.DataFrame(columns=stack_cols), pd.DataFrame(columns=dvn_cols)
+        return pd.DataFrame(columns=STACK_COLS), pd.DataFrame(columns=DVN_COLS)
 
     # compute stack-level stats
     stack = (txs.groupby('Required_Stack')['LATENCY_S']
@@ -60,21 +77,28 @@ def compute_for_window(dfw):
                 rows.append({'DVN_NAME':n,'stack':r['Required_Stack'],'transactions':int(r['transactions']),
                              'median_latency':float(r['median_latency']),'p95_latency':float(r['p95_latency'])})
     if len(rows)==0:
-        dvn = pd.DataFrame(columns=['DVN_NAME','stacks_involved','total_transactions','avg_median_latency','avg_p95_latency'])
+        dvn = pd.DataFrame(columns=DVN_COLS[:5])
     else:
         dvn = (pd.DataFrame(rows).groupby('DVN_NAME')
                .agg(stacks_involved=('stack','nunique'), total_transactions=('transactions','sum'),
                     avg_median_latency=('median_latency','mean'), avg_p95_latency=('p95_latency','mean'))
                .reset_index())
-    return stack, dvn
+
+    # 95% bootstrap intervals, per stack and for the DVN averages over its stacks (dvn_bootstrap.py)
+    stack_ci, dvn_ci = stack_cis(txs, [0.5, 0.95])
+    stack = stack.merge(stack_ci.rename(columns=dict(zip(CI_COLS, STACK_COLS[4:]))), on='Required_Stack', how='left')
+    dvn = dvn.merge(dvn_ci.rename(columns=dict(zip(CI_COLS, DVN_COLS[5:]))), on='DVN_NAME', how='left')
+    return stack[STACK_COLS], dvn[DVN_COLS]
 
 
 
 results = {}
 for name,(s,e) in windows.items():
-    mask = (df['SOURCETIMESTAMP'] >= pd.to_datetime(s)) & (df['SOURCETIMESTAMP'] <= pd.to_datetime(e))
-    stacked, dvn = compute_for_window(df.loc[mask])
-    results[name] = (stacked, dvn)
-    stacked.to_csv(f"stack_{name}.csv", index=False)
-    dvn.to_csv(f"dvn_{name}.csv", index=False)
+    with stage(f"window_{name}", rows_in=len(df)) as ev:
+        mask = (df['SOURCETIMESTAMP'] >= pd.to_datetime(s)) & (df['SOURCETIMESTAMP'] <= pd.to_datetime(e))
+        stacked, dvn = compute_for_window(df.loc[mask])
+        results[name] = (stacked, dvn)
+        stacked.to_csv(f"stack_{name}.csv", index=False)
+        dvn.to_csv(f"dvn_{name}.csv", index=False)
+        ev.rows_out = len(stacked) + len(dvn)
     print(f"{name}: stacks={len(stacked)}, dvns={len(dvn)}")
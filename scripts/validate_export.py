@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# validate_export.py
+# Bulk validation of export rows, with a quarantine file for the rows that break an invariant.
+#
+# Every rule is a column-wise check over a whole chunk (no per-row Python):
+#   - columns that repeat a few values (DVN arrays, counts, statuses, latencies) are checked
+#     once per distinct cell and mapped back;
+#   - mostly-unique columns (GUID, SOURCETIMESTAMP, DVN_FEES_ARRAY) are joined into one uint8
+#     buffer per chunk and checked with byte lookups; per-row counts (fee entries, bad bytes)
+#     come from the positions of the matching bytes.
+# A row fails when any rule fails; it is written to the quarantine file with its reason codes
+# and left out of the valid output. Rules whose columns are missing are skipped.
+#
+# pathways.py run --validate checks every chunk the same way, limited to the columns it reads, and
+# quarantines into the pathway directory.
+#
+# Usage: python3 scripts/validate_export.py <dt_clean.csv> [--valid dt_valid.csv]
+#            [--quarantine dt_quarantine.csv] [--chunk-rows 500000]
+# Valid lines are copied verbatim. Quarantined lines get two leading columns: REASONS
+# (';'-separated codes) and ROW (0-based data row in the input). Column names match in any case,
+# so the fee sheet read by map_dvn.py (requiredDVNs, optionalDVNs, DVN_FEES_ARRAY) is checked too.
+
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dvn_instrument import stage
+from dvn_io import read_export, unwrap
+
+RULES = {
+    "GUID_INVALID": "GUID is not 0x + 64 hex digits",
+    "SRC_TS_INVALID": "SOURCETIMESTAMP is not YYYY-MM-DDTHH:MM:SS",
+    "DVN_ADDR_INVALID": "an entry of REQUIREDDVNS / OPTIONALDVNS is not a 0x + 40 hex address",
+    "REQ_COUNT_MISMATCH": "REQUIREDDVNCOUNT differs from the number of REQUIREDDVNS",
+    "OPT_COUNT_MISMATCH": "OPTIONALDVNCOUNT differs from the number of OPTIONALDVNS",
+    "FEES_LEN_MISMATCH": "DVN_FEES_ARRAY length differs from the DVN count (REQUIRED + OPTIONAL)",
+    "FEE_NOT_INT": "DVN_FEES_ARRAY holds something other than unsigned integers",
+    "LATENCY_INVALID": "LATENCYTODELIVERY_SECONDS is neither N/A nor a non-negative integer",
+    "STATUS_INVALID": "MESSAGESTATUS is not DELIVERED or SENT",
+    "STATUS_LATENCY_MISMATCH": "DELIVERED without a latency, or SENT with one",
+}
+COLUMNS = ["GUID", "SOURCETIMESTAMP", "REQUIREDDVNS", "OPTIONALDVNS", "REQUIREDDVNCOUNT", "OPTIONALDVNCOUNT",
+           "DVN_FEES_ARRAY", "MESSAGESTATUS", "LATENCYTODELIVERY_SECONDS"]
+MISSING = ("", "N/A", "NA", "NONE", "NULL", "NAN")
+CHUNK_ROWS = 500_000
+_TS_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+_TS_SEPS = {4: "-", 7: "-", 10: "T", 13: ":", 16: ":"}
+
+
+class Cells:
+    """The cells of one column as a single uint8 buffer ('\n' after every cell) with per-row offsets.
+
+    start / length locate the cell text inside its ="..." wrapper (or the whole cell when it is bare).
+    ascii is False when a cell is not plain ASCII; the checks then fall back to per-distinct-cell regexes.
+    """
+
+    def __init__(self, s):
+        values = s.tolist()
+        # a few NUL bytes of padding so fixed offsets from short cells stay inside the buffer
+        try:
+            text = "\n".join(values + ["\0" * 4])
+        except TypeError:                # nulls
+            values = s.fillna("").tolist()
+            text = "\n".join(values + ["\0" * 4])
+        self.ascii = text.isascii()
+        if not self.ascii:
+            return
+        self.buf = b = np.frombuffer(text.encode(), dtype=np.uint8)
+        self.raw_len = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+        self.raw_start = np.zeros(len(values), dtype=np.int64)
+        np.cumsum(self.raw_len[:-1] + 1, out=self.raw_start[1:])
+        self.raw_end = self.raw_start + self.raw_len        # the '\n' after each cell
+        self.wrapped = ((self.raw_len >= 3) & (b[self.raw_start] == ord("=")) & (b[self.raw_start + 1] == ord('"'))
+                        & (b[self.raw_end - 1] == ord('"')))
+        self.start = self.raw_start + 2 * self.wrapped
+        self.length = self.raw_len - 3 * self.wrapped
+
+    def head(self, width):
+        """(rows x width) uint8 of the first width bytes of every cell (rows shorter than width hold junk)."""
+        buf = self.buf if len(self.buf) >= width else np.pad(self.buf, (0, width))
+        start = np.minimum(self.start, len(buf) - width)
+        step = int(start[1] - start[0]) if len(start) > 1 else 0
+        if step >= width and (np.diff(start) == step).all():
+            # equal-length cells: a strided view instead of a gather
+            return np.lib.stride_tricks.as_strided(buf[start[0]:], (len(start), width), (step, 1), writeable=False)
+        return buf[start[:, None] + np.arange(width)]
+
+    def rows_of(self, pos):
+        """Row of every buffer position in pos."""
+        return np.searchsorted(self.raw_start, pos, side="right") - 1
+
+
+def _digits(b):
+    return (b - ord("0")) < 10
+
+
+def _hex(b):
+    return ((b - ord("0")) < 10) | (((b | 0x20) - ord("a")) < 6)
+
+
+def _per_unique(s, fn):
+    """fn(distinct cells as unwrapped strings) -> tuple of arrays, each mapped back to every row of s."""
+    codes, uniq = pd.factorize(s, use_na_sentinel=False)
+    return tuple(np.asarray(a)[codes] for a in fn(unwrap(pd.Series(uniq, dtype=object).fillna(""))))
+
+
+def _array_stats(cells):
+    """(entries, all entries are 0x + 40 hex) per distinct DVN array cell."""
+    compact = cells.str.replace(" ", "")
+    n = compact.str.strip("[]").str.split(";").map(lambda x: sum(1 for v in x if v)).to_numpy()
+    ok = compact.str.fullmatch(r"\[?((0x[0-9a-fA-F]{40})(;0x[0-9a-fA-F]{40})*)?\]?").to_numpy()
+    return n, ok
+
+
+def _fee_stats(cells):
+    n = cells.str.count(r"\d+").to_numpy()
+    ok = cells.str.fullmatch(r"\s*\[?\s*(\d+(;\d+)*)?\s*\]?\s*").to_numpy()
+    return n, ok
+
+
+def fee_stats(s):
+    """(entries, only unsigned integers) per DVN_FEES_ARRAY cell.
+
+    Cells in the export's own layout, [ digits;digits;... ], are checked on the byte buffer: nothing but
+    digits and ';' inside the brackets, and every ';' between two digits. Any other cell goes through
+    the regex of _fee_stats.
+    """
+    c = Cells(s)
+    if not c.ascii:
+        return _per_unique(s, _fee_stats)
+    b = c.buf
+    end = c.start + c.length
+    digit = _digits(b)
+    semi = b == ord(";")
+    canonical = ((c.length >= 4) & (b[c.start] == ord("[")) & (b[c.start + 1] == ord(" "))
+                 & (b[end - 2] == ord(" ")) & (b[end - 1] == ord("]")))
+    other = ~(digit | semi | (b == ord("\n")))
+    for off in (c.start, c.start + 1, end - 2, end - 1):
+        other[off[canonical]] = False
+    for off in (c.raw_start, c.raw_start + 1, c.raw_end - 1):
+        other[off[c.wrapped & canonical]] = False
+    canonical[c.rows_of(np.flatnonzero(other))] = False
+    # inside a canonical frame there are only digits and ';', so entries = separators + 1 unless empty
+    p = np.flatnonzero(semi)
+    rows = c.rows_of(p)
+    n = np.bincount(rows, minlength=len(c.length)) + (c.length > 4)
+    ok = np.ones(len(n), dtype=bool)
+    ok[rows[~(digit[p - 1] & digit[p + 1])]] = False
+    if not canonical.all():
+        slow = ~canonical
+        n[slow], ok[slow] = _per_unique(s[slow], _fee_stats)
+    return n, ok
+
+
+def guid_ok(s):
+    """GUID cells that are 0x + 64 hex digits."""
+    c = Cells(s)
+    if not c.ascii:
+        return _per_unique(s, lambda u: (u.str.fullmatch(r"0x[0-9a-fA-F]{64}").to_numpy(),))[0]
+    h = c.head(66)
+    return (c.length == 66) & (h[:, 0] == ord("0")) & ((h[:, 1] | 0x20) == ord("x")) & _hex(h[:, 2:]).all(axis=1)
+
+
+def ts_ok(s):
+    """SOURCETIMESTAMP cells that start with YYYY-MM-DDTHH:MM:SS."""
+    c = Cells(s)
+    if not c.ascii:
+        return _per_unique(s, lambda u: (u.str.match(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d").to_numpy(),))[0]
+    h = c.head(19)
+    ok = (c.length >= 19) & _digits(h[:, _TS_DIGITS]).all(axis=1)
+    for i, ch in _TS_SEPS.items():
+        ok &= h[:, i] == ord(ch)
+    return ok
+
+
+def _latency_stats(u):
+    """(cell is missing, cell is a non-negative integer) per distinct cell."""
+    missing = u.str.upper().isin(MISSING).to_numpy()
+    v = pd.to_numeric(u, errors="coerce").to_numpy(dtype=np.float64)
+    return missing, ~np.isnan(v) & (v >= 0) & (np.floor(v) == v)
+
+
+def check(chunk, columns=None):
+    """Boolean failure flags, one column per rule that applies to the chunk's columns (any case).
+
+    columns limits the rules to the ones over those columns, e.g. the columns a stage reads."""
+    chunk = chunk.rename(columns=str.upper)
+    cols = set(chunk.columns)
+    if columns is not None:
+        cols &= {c.upper() for c in columns}
+    f = {}
+    if "GUID" in cols:
+        f["GUID_INVALID"] = ~guid_ok(chunk["GUID"])
+    if "SOURCETIMESTAMP" in cols:
+        f["SRC_TS_INVALID"] = ~ts_ok(chunk["SOURCETIMESTAMP"])
+    n_dvns = {}
+    for c in ("REQUIREDDVNS", "OPTIONALDVNS"):
+        if c in cols:
+            n_dvns[c], ok = _per_unique(chunk[c], _array_stats)
+            f["DVN_ADDR_INVALID"] = f.get("DVN_ADDR_INVALID", False) | ~ok
+    counts = {}
+    for c, arr, rule in (("REQUIREDDVNCOUNT", "REQUIREDDVNS", "REQ_COUNT_MISMATCH"),
+                         ("OPTIONALDVNCOUNT", "OPTIONALDVNS", "OPT_COUNT_MISMATCH")):
+        if c in cols:
+            counts[c], = _per_unique(chunk[c], lambda u: (pd.to_numeric(u, errors="coerce").to_numpy(np.float64),))
+            if arr in n_dvns:
+                f[rule] = counts[c] != n_dvns[arr]      # NaN counts fail too
+    if "DVN_FEES_ARRAY" in cols:
+        n_fees, fees_ok = fee_stats(chunk["DVN_FEES_ARRAY"])
+        f["FEE_NOT_INT"] = ~fees_ok
+        if len(counts) == 2:
+            f["FEES_LEN_MISMATCH"] = n_fees != counts["REQUIREDDVNCOUNT"] + counts["OPTIONALDVNCOUNT"]
+        elif len(n_dvns) == 2:
+            f["FEES_LEN_MISMATCH"] = n_fees != n_dvns["REQUIREDDVNS"] + n_dvns["OPTIONALDVNS"]
+    if "LATENCYTODELIVERY_SECONDS" in cols:
+        missing, is_int = _per_unique(chunk["LATENCYTODELIVERY_SECONDS"], _latency_stats)
+        f["LATENCY_INVALID"] = ~missing & ~is_int
+    if "MESSAGESTATUS" in cols:
+        status, = _per_unique(chunk["MESSAGESTATUS"], lambda u: (u.str.upper().to_numpy(),))
+        f["STATUS_INVALID"] = (status != "DELIVERED") & (status != "SENT")
+        if "LATENCYTODELIVERY_SECONDS" in cols:
+            f["STATUS_LATENCY_MISMATCH"] = (((status == "DELIVERED") & missing) |
+                                            ((status == "SENT") & ~missing))
+    return pd.DataFrame({k: np.broadcast_to(v, len(chunk)) for k, v in f.items()}, index=chunk.index)
+
+
+def reasons(flags):
+    """';'-joined failing rule codes per failing row (Series indexed like flags, failing rows only)."""
+    bad = flags[flags.any(axis=1)]
+    if not len(bad):
+        return pd.Series(dtype=object)
+    # the failing rules as a bit pattern per row; one string per distinct pattern
+    bits = bad.to_numpy().astype(np.int64) @ (1 << np.arange(bad.shape[1], dtype=np.int64))
+    uniq, inv = np.unique(bits, return_inverse=True)
+    text = np.array([";".join(c for j, c in enumerate(bad.columns) if u >> j & 1) for u in uniq], dtype=object)
+    return pd.Series(text[inv], index=bad.index)
+
+
+class Quarantine:
+    """Per-rule counters plus a CSV of the failing rows (REASONS, ROW, then the columns read).
+
+    columns: check only the rules over these columns (default: every column of the chunk)."""
+
+    def __init__(self, path=None, columns=None):
+        self.path = Path(path) if path else None
+        self.columns = columns
+        self.counts = dict.fromkeys(RULES, 0)
+        self.rows = 0
+        self.failed = 0
+        self._fresh = True
+
+    def split(self, chunk, row0=0):
+        """(valid rows of chunk, failure flags); failing rows go to the quarantine file."""
+        flags = check(chunk, self.columns)
+        for k, v in flags.sum().items():
+            self.counts[k] += int(v)
+        bad = flags.any(axis=1).to_numpy()
+        self.rows += len(chunk)
+        self.failed += int(bad.sum())
+        if bad.any() and self.path:
+            q = chunk[bad].copy()
+            q.insert(0, "ROW", row0 + np.flatnonzero(bad))
+            q.insert(0, "REASONS", reasons(flags).to_numpy())
+            q.to_csv(self.path, mode="w" if self._fresh else "a", header=self._fresh, index=False)
+            self._fresh = False
+        return (chunk[~bad] if bad.any() else chunk), flags
+
+    def summary(self):
+        out = pd.DataFrame({"rule": list(self.counts), "rows": list(self.counts.values()),
+                            "description": [RULES[k] for k in self.counts]})
+        return out[out["rows"] > 0]
+
+    def print_summary(self, label=""):
+        print(f"{label}validation: {self.failed} of {self.rows} rows quarantined"
+              + (f" -> {self.path}" if self.failed and self.path else ""))
+        s = self.summary()
+        if len(s):
+            print(s.to_string(index=False))
+
+
+def records(f):
+    """The raw text of every CSV record of f (after the header), in the order pandas parses them.
+
+    A record spans several lines when a quoted cell holds a line break: it ends on the line where the
+    count of '"' becomes even again (quotes inside a quoted cell are doubled, the ="..." wrapper has
+    two). Blank lines are not records."""
+    pending = []
+    quotes = 0
+    for line in f:
+        if not pending and line in ("\n", "\r\n"):
+            continue
+        pending.append(line)
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            yield pending[0] if len(pending) == 1 else "".join(pending)
+            pending.clear()
+            quotes = 0
+    if pending:
+        yield "".join(pending)
+
+
+def validate_file(path, valid_out, quarantine_out, chunk_rows=CHUNK_ROWS):
+    """Stream one export; valid lines are copied verbatim, failing lines go to the quarantine file."""
+    q = Quarantine()
+    bad_rows = []
+    with stage("validate", inputs=[path]) as ev:
+        n = 0
+        for chunk in read_export(path, usecols=lambda c: c.upper() in COLUMNS, chunksize=chunk_rows):
+            chunk = chunk.reset_index(drop=True)
+            _, flags = q.split(chunk, n)
+            bad = flags.any(axis=1).to_numpy()
+            if bad.any():
+                bad_rows.append(pd.DataFrame({"ROW": n + np.flatnonzero(bad), "REASONS": reasons(flags).to_numpy()}))
+            n += len(chunk)
+        ev.rows_in, ev.rows_out = n, n - q.failed
+    bad = pd.concat(bad_rows, ignore_index=True) if bad_rows else pd.DataFrame({"ROW": [], "REASONS": []})
+    with stage("validate_write", inputs=[path], rows_in=n) as ev, open(path, newline="") as f, \
+            open(valid_out, "w", newline="") as v, open(quarantine_out, "w", newline="") as qf:
+        header = f.readline()
+        v.write(header)
+        qf.write("REASONS,ROW," + header)
+        rows = bad["ROW"].to_numpy(dtype=np.int64)
+        why = dict(zip(rows, bad["REASONS"]))
+        # parsed row i is record i: a multi-line cell or a blank line does not shift the mapping
+        i = 0
+        for i, text in enumerate(records(f), start=1):
+            if i - 1 in why:
+                qf.write(f"{why[i - 1]},{i - 1},{text}")
+            else:
+                v.write(text)
+        if i != n:
+            raise SystemExit(f"{path}: {i} CSV records but {n} parsed rows")
+        ev.rows_out = n - len(rows)
+    return q
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Validate an export and quarantine rows that break an invariant.")
+    ap.add_argument("export", help="Excel-wrapped CSV export (dt_clean.csv layout)")
+    ap.add_argument("--valid", default=None, help="valid rows (default: <export>_valid.csv)")
+    ap.add_argument("--quarantine", default=None, help="failing rows (default: <export>_quarantine.csv)")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = ap.parse_args()
+    stem = Path(args.export).with_suffix("")
+    valid = args.valid or f"{stem}_valid.csv"
+    quarantine = args.quarantine or f"{stem}_quarantine.csv"
+    q = validate_file(args.export, valid, quarantine, args.chunk_rows)
+    q.print_summary()
+    print("Saved:", valid, quarantine)
+
+
+if __name__ == "__main__":
+    main()
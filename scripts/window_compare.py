@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# window_compare.py
+# Before / during / after comparison of every DVN and stack, with significance tests.
+#
+# timeframe_compare.py writes one table per window; this puts each window pair side by side for
+# every group (DVN per role, and required stack) and tests the differences:
+#  - latency: Mann-Whitney U, two-sided, with the asymptotic normal approximation: tie-corrected
+#    variance, no continuity correction (scipy.stats.mannwhitneyu(method="asymptotic",
+#    use_continuity=False) gives the same U and p). It is computed from the per-group latency
+#    histograms of both windows, not from raw latencies. Per window pair, the two windows'
+#    histograms are pivoted into one table and sorted once by (group, latency). Cumulative sums
+#    of the counts then give every latency's rank offset within its group, and bincounts over
+#    the group codes give n_a, n_b, U and the tie term of all groups together. The only Python
+#    loop is over the three window pairs;
+#  - delivery rate: two-proportion z-test with the pooled rate, vectorized across groups.
+# p-values get Benjamini-Hochberg q-values within each window pair. A group is "degraded" when the
+# later window is significantly slower (median up) or delivers less (rate down) at q < --alpha;
+# the table is ranked per pair, degraded groups first, by the larger of the latency z and the
+# negated delivery z.
+#
+# Input is the partials of a pathways.py store (same merge as its rollup) or dt_clean.csv exports,
+# aggregated with the same chunk partials.
+#
+# Usage:
+#   python3 scripts/window_compare.py --root pathways [--out window_compare.csv] [--alpha 0.05]
+#   python3 scripts/window_compare.py <dt_clean.csv>[,more.csv] [--names dvnNames-Sheet2.csv]
+
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+from dvn_instrument import stage
+from dvn_io import read_export, dvn_names, NAMES_CSV
+from dvn_checkpoint import write_csv_atomic
+from pathways import (chunk_partials, merge_partials, with_all_roles, finalize, find_pathways, USECOLS,
+                      CHUNK_ROWS, PARTIALS_FILE, HIST_FILE)
+
+PAIRS = [("before", "during"), ("during", "after"), ("before", "after")]
+GROUP = ["GRAIN", "KEY", "ROLE"]
+ALPHA = 0.05
+OUT_CSV = "window_compare.csv"
+
+
+def load_store(root):
+    """Merged (partials, histogram) of every pathway under a pathways.py store."""
+    parts, hists = [], []
+    for pdir in find_pathways(root):
+        if (pdir / PARTIALS_FILE).exists():
+            parts.append(pd.read_csv(pdir / PARTIALS_FILE, keep_default_na=False))
+            hists.append(pd.read_csv(pdir / HIST_FILE, keep_default_na=False))
+    if not parts:
+        raise SystemExit(f"No partials under {root} (run pathways.py run first)")
+    return merge_partials(parts, hists)
+
+
+def load_exports(paths, names):
+    """(partials, histogram) of dt_clean.csv exports, chunk by chunk as pathways.py does."""
+    parts, hists = [], []
+    for path in paths:
+        for chunk in read_export(path, usecols=lambda c: c in USECOLS, chunksize=CHUNK_ROWS):
+            p, h = chunk_partials(chunk.reset_index(drop=True), names)
+            parts.append(p)
+            hists.append(h)
+    return merge_partials(parts, hists)
+
+
+def mann_whitney(hist, a, b):
+    """Per group: latency counts of windows a and b, P(b slower than a) and the U test z / p."""
+    h = hist[hist["WINDOW"].isin([a, b])]
+    h = h.pivot_table(index=GROUP + ["LATENCY_S"], columns="WINDOW", values="count", aggfunc="sum", fill_value=0)
+    h = h.reindex(columns=[a, b], fill_value=0).sort_index()     # the one sort: (group, latency)
+    ca, cb = h[a].to_numpy(np.float64), h[b].to_numpy(np.float64)
+    codes, groups = h.index.droplevel("LATENCY_S").factorize()
+    # b values below each latency, within its group: global cumulative sum minus the group's start
+    cum_b = np.cumsum(cb)
+    first = np.r_[0, np.flatnonzero(np.diff(codes)) + 1]
+    start = (cum_b - cb)[first][codes]
+    below_b = cum_b - cb - start
+    k = len(groups)
+    n_a, n_b = np.bincount(codes, ca, k), np.bincount(codes, cb, k)
+    u_a = np.bincount(codes, ca * (below_b + 0.5 * cb), k)     # pairs with a slower, ties half
+    t = ca + cb
+    ties = np.bincount(codes, t ** 3 - t, k)
+    n = n_a + n_b
+    pairs = n_a * n_b
+    u = pairs - u_a                                              # pairs with b slower
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sigma = np.sqrt(pairs / 12 * ((n + 1) - ties / (n * (n - 1))))
+        z = np.where(sigma > 0, (u - pairs / 2) / sigma, np.nan)
+        out = pd.DataFrame({"latency_n_a": n_a.astype(np.int64), "latency_n_b": n_b.astype(np.int64),
+                            "p_slower": u / pairs, "latency_z": z, "latency_p": 2 * ndtr(-np.abs(z))},
+                           index=pd.MultiIndex.from_tuples(list(groups), names=GROUP))
+    return out
+
+
+def two_proportions(d_a, n_a, d_b, n_b):
+    """z (b minus a) and two-sided p of the pooled two-proportion test, for arrays of groups."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = (d_a + d_b) / (n_a + n_b)
+        se = np.sqrt(p * (1 - p) * (1 / n_a + 1 / n_b))
+        z = np.where(se > 0, (d_b / n_b - d_a / n_a) / se, np.nan)
+    return z, 2 * ndtr(-np.abs(z))
+
+
+def bh(p):
+    """Benjamini-Hochberg q-values (NaN p-values stay NaN and do not count)."""
+    p = np.asarray(p, dtype=np.float64)
+    q = np.full(len(p), np.nan)
+    ok = np.flatnonzero(~np.isnan(p))
+    order = ok[np.argsort(p[ok])]
+    m = len(order)
+    if m:
+        ranked = p[order] * m / np.arange(1, m + 1)
+        q[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+    return q
+
+
+def compare(part, hist, alpha=ALPHA):
+    """Ranked comparison table for every window pair."""
+    part, hist = with_all_roles(part, hist)
+    kpi = finalize(part, hist)
+    cols = ["messages", "delivered", "delivery_rate", "median_latency"]
+    out = []
+    for a, b in PAIRS:
+        ka = kpi[kpi["WINDOW"] == a].set_index(GROUP)[cols]
+        kb = kpi[kpi["WINDOW"] == b].set_index(GROUP)[cols]
+        t = ka.join(kb, how="inner", lsuffix="_a", rsuffix="_b")
+        t = t.join(mann_whitney(hist, a, b), how="left")
+        t["median_delta"] = t["median_latency_b"] - t["median_latency_a"]
+        t["rate_delta"] = (t["delivery_rate_b"] - t["delivery_rate_a"]).round(4)
+        t["rate_z"], t["rate_p"] = two_proportions(t["delivered_a"].to_numpy(np.float64), t["messages_a"].to_numpy(np.float64),
+                                                   t["delivered_b"].to_numpy(np.float64), t["messages_b"].to_numpy(np.float64))
+        t["latency_q"], t["rate_q"] = bh(t["latency_p"]), bh(t["rate_p"])
+        t["degraded"] = (((t["latency_q"] < alpha) & (t["median_delta"] > 0)) |
+                         ((t["rate_q"] < alpha) & (t["rate_delta"] < 0)))
+        t["score"] = np.fmax(t["latency_z"].to_numpy(), -t["rate_z"].to_numpy())
+        t = t.reset_index().sort_values(["degraded", "score"], ascending=[False, False], na_position="last",
+                                        ignore_index=True)
+        t.insert(0, "rank", np.arange(1, len(t) + 1))
+        t.insert(0, "PAIR", f"{a}->{b}")
+        out.append(t)
+    cols = ["PAIR", "rank"] + GROUP + ["degraded", "score", "messages_a", "messages_b",
+                                       "median_latency_a", "median_latency_b", "median_delta", "p_slower",
+                                       "latency_z", "latency_p", "latency_q", "delivery_rate_a", "delivery_rate_b",
+                                       "rate_delta", "rate_z", "rate_p", "rate_q"]
+    return pd.concat(out, ignore_index=True)[cols]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Window-pair deltas with significance for every DVN and stack.")
+    ap.add_argument("inputs", nargs="?", default="", help="comma-separated dt_clean.csv exports (instead of --root)")
+    ap.add_argument("--root", default="", help="pathways.py store to read partials from")
+    ap.add_argument("--out", default=OUT_CSV)
+    ap.add_argument("--alpha", type=float, default=ALPHA, help="q-value threshold for 'degraded'")
+    ap.add_argument("--names", default=str(NAMES_CSV))
+    args = ap.parse_args()
+
+    paths = [p for p in args.inputs.split(",") if p.strip()]
+    if not paths and not args.root:
+        ap.error("give dt_clean.csv exports or --root")
+    with stage("window_partials", inputs=paths or [args.root]) as ev:
+        part, hist = load_store(args.root) if args.root else load_exports(paths, dvn_names(args.names))
+        ev.rows_out = len(part)
+    with stage("window_tests", rows_in=len(part)) as ev:
+        table = compare(part, hist, args.alpha)
+        ev.rows_out = len(table)
+    write_csv_atomic(table, args.out)
+
+    show = ["rank", "GRAIN", "KEY", "ROLE", "degraded", "messages_b", "median_delta", "latency_q", "rate_delta", "rate_q"]
+    for pair, t in table.groupby("PAIR", sort=False):
+        print(f"\n{pair}: {int(t['degraded'].sum())} degraded of {len(t)}")
+        print(t[show].head(10).to_string(index=False))
+    print("Saved:", Path(args.out))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+# the pipeline scripts import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+os.environ.setdefault("DVN_EVENTS", "off")
+os.environ.setdefault("DVN_SUMMARY", "0")
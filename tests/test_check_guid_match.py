@@ -0,0 +1,74 @@
+import numpy as np
+
+from check_guid_match import HyperLogLog, KMV, jaccard, hash_words, scan_exact, scan_sketch, Z95
+
+
+def _keys(rng, n):
+    return np.frombuffer(rng.bytes(32 * n), dtype="S32")
+
+
+def _sketch(keys, p=12, k=4096):
+    hll, kmv = HyperLogLog(p), KMV(k)
+    for block in np.array_split(keys, 7):             # filled block by block, as from a file
+        h1, h2 = hash_words(block)
+        hll.add(h1)
+        kmv.add(h2)
+    return hll, kmv
+
+
+def test_hyperloglog_within_its_error_bound():
+    rng = np.random.default_rng(1)
+    for n in (300, 20_000, 200_000):
+        keys = _keys(rng, n)
+        hll, _ = _sketch(np.concatenate([keys, keys[: n // 3]]))     # repeats do not count
+        assert abs(hll.estimate() / n - 1) < 3 * hll.rel_error()
+
+
+def test_kmv_jaccard_and_intersection_within_their_error_bounds():
+    rng = np.random.default_rng(2)
+    shared, only_a, only_b = _keys(rng, 10_000), _keys(rng, 30_000), _keys(rng, 30_000)
+    hll_a, kmv_a = _sketch(np.concatenate([shared, only_a]))
+    hll_b, kmv_b = _sketch(np.concatenate([only_b, shared]))
+    j, n_union = jaccard(kmv_a, kmv_b)
+    assert n_union == 4096
+    truth = 10_000 / 70_000
+    assert abs(j - truth) < 3 * np.sqrt(truth * (1 - truth) / n_union)
+
+    union = hll_a.union(hll_b)
+    e_common = Z95 * np.sqrt((1 - j) / (j * n_union) + union.rel_error() ** 2)   # as report_fast
+    assert abs(j * union.estimate() / 10_000 - 1) < 1.5 * e_common
+
+
+def test_small_inputs_are_exact():
+    rng = np.random.default_rng(3)
+    shared = _keys(rng, 100)
+    _, kmv_a = _sketch(np.concatenate([shared, _keys(rng, 50)]))
+    _, kmv_b = _sketch(shared)
+    assert kmv_a.exact() and kmv_b.exact()
+    assert len(kmv_a.values) == 150
+    assert len(np.intersect1d(kmv_a.values, kmv_b.values)) == 100
+
+
+def test_missing_and_malformed_guids_are_counted_apart(tmp_path):
+    g = lambda i: "0x" + f"{i:02x}" * 32
+    lines = [
+        "NAME,GUID,X",
+        f'a,="{g(1)}",1',
+        f'"b, quoted",="{g(2)}",2',           # a comma in an earlier cell
+        f"c,{g(1).upper()},3",
+        "d,,4",
+        'e,="",5',
+        'f,="0x12",6',                         # short
+        f'g,="{g(3)[:-1]}z",7',                # non-hex
+    ]
+    path = tmp_path / "guids.csv"
+    path.write_text("\n".join(lines) + "\n")
+
+    keys, counts = scan_exact(path, "GUID")
+    assert len(keys) == 2
+    assert (counts.rows, counts.missing, counts.malformed) == (7, 2, 2)
+    assert counts.samples == ['="0x12"', f'="{g(3)[:-1]}z"']
+
+    hll, kmv, counts = scan_sketch(path, "GUID", 12, 64)
+    assert len(kmv.values) == 2 and kmv.exact()
+    assert (counts.rows, counts.missing, counts.malformed) == (7, 2, 2)
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dedup_guids import dedup, METHOD_RANK
+from dvn_io import unwrap, parse_timestamps
+from synth_exports import generate
+
+
+def _set_cell(line, i, value):
+    cells = line.split(",")
+    if cells[i]:                                         # delivered rows only
+        cells[i] = value
+    return ",".join(cells)
+
+
+def _inputs(tmp_path):
+    """Two overlapping exports: a.csv rows 0-599, b.csv rows 400-999, with changed duplicates."""
+    dt, _ = generate(1000, tmp_path / "src", seed=9, chunk_size=500)
+    header, *body = open(dt).read().splitlines(keepends=True)
+    a, b = body[:600], body[400:1000]
+    # overlap 400-449: a.csv lost the GUID match, so b.csv's copies win where they matched on GUID
+    a[400:450] = [line.replace('="GUID"', '="NO_MATCH"') for line in a[400:450]]
+    # overlap 450-469: b.csv matched them on nonce, a.csv on GUID
+    b[50:70] = [line.replace('="GUID"', '="NONCE+SRC_EID"') for line in b[50:70]]
+    # overlap 470-499 in b.csv: delivered earlier, same method
+    b[70:100] = [_set_cell(line, 23, '="2025-01-01T00:00:00.000Z"') for line in b[70:100]]
+    guid = lambda line: line.split(",")[7]
+    a += [body[10], body[20].replace(guid(body[20]), '="0x12"'), body[21].replace(guid(body[21]), "")]
+    b += [body[10]]                                      # in a.csv twice and in b.csv
+    paths = [tmp_path / "a.csv", tmp_path / "b.csv"]
+    for p, lines in zip(paths, (a, b)):
+        p.write_text(header + "".join(lines))
+    return paths
+
+
+def _expected(paths):
+    """Kept lines by the rule, from full frames sorted with pandas."""
+    frames = []
+    for i, p in enumerate(paths):
+        df = pd.read_csv(p, dtype=str, keep_default_na=False)
+        frames.append(df.assign(file=i, row=np.arange(len(df))))
+    df = pd.concat(frames, ignore_index=True)
+    df["key"] = unwrap(df["GUID"]).str.lower()
+    valid = df["key"].str.fullmatch("0x[0-9a-f]{64}")
+    df["method"] = unwrap(df["MATCH_METHOD"]).str.upper().map(METHOD_RANK).fillna(2)
+    df["ts"] = parse_timestamps(df["DESTINATIONDELIVEREDTIMESTAMP"]).fillna(pd.Timestamp.max.tz_localize("UTC"))
+    best = df[valid].sort_values(["method", "ts", "file", "row"], kind="stable").drop_duplicates("key")
+    keep = set(zip(best["file"], best["row"])) | set(zip(df.loc[~valid, "file"], df.loc[~valid, "row"]))
+    lines = []
+    for i, p in enumerate(paths):
+        body = open(p).read().splitlines(keepends=True)[1:]
+        lines += [line for r, line in enumerate(body) if (i, r) in keep]
+    return lines
+
+
+@pytest.mark.parametrize("bloom", [False, True])
+def test_overlapping_exports_keep_the_best_row_per_guid(tmp_path, bloom):
+    paths = _inputs(tmp_path)
+    out = tmp_path / "out.csv"
+    report = dedup(paths, out, bloom=bloom, chunk_rows=128).set_index("file")
+    header, *kept = open(out).read().splitlines(keepends=True)
+    assert header == open(paths[0]).readline()
+    assert kept == _expected(paths)
+
+    a, b = (report.loc[str(p)] for p in paths)
+    # b.csv's copy wins for the delivered (GUID-matched) rows of 400-449 and 470-499
+    body = open(paths[1]).read().splitlines()[1:]
+    b_wins = sum('="GUID"' in line for line in body[0:50] + body[70:100])
+    assert 0 < b_wins < 80
+    assert a["dropped"] == b_wins + 1
+    assert (a["rows"], a["no_guid"], a["dup_in_file"]) == (603, 2, 1)
+    assert (b["rows"], b["no_guid"], b["dup_in_file"]) == (601, 0, 0)
+    assert b["in_other_files"] == 201                     # the overlap and body[10]
+    assert report["dropped"].sum() == 1 + 201
+    assert report["kept"].sum() == len(kept) == 1204 - 202
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from scipy.optimize import nnls
+
+from dvn_attribution import attribute, stack_stats, merge_stats, BASE
+
+TRUTH = {BASE: 20.0, "A": 10.0, "B": 30.0, "C": 5.0, "D": 50.0}
+STACKS = ["A", "D", "A + B", "B + C", "C + D", "B + D", "A + C + D"]
+NAMES = {"0x" + c.lower() * 40: c for c in "ABCD"}
+ADDR = {v: k for k, v in NAMES.items()}
+
+
+def _messages(seed, per_stack=400):
+    """Delivery latencies of messages of every stack: base + its DVNs' contributions + noise."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i, stack in enumerate(STACKS):
+        mean = TRUTH[BASE] + sum(TRUTH[d] for d in stack.split(" + "))
+        # heteroskedastic: the noise grows with the stack
+        y = mean + rng.normal(0, 1 + i, per_stack)
+        rows.append(pd.DataFrame({"stack": stack, "y": y}))
+    return pd.concat(rows, ignore_index=True)
+
+
+def _chunk(msgs):
+    cells = msgs["stack"].map(lambda s: "[ " + ";".join(ADDR[d] for d in s.split(" + ")) + " ]")
+    return pd.DataFrame({
+        "SOURCETIMESTAMP": pd.Timestamp("2025-09-30", tz="UTC"),
+        "REQUIREDDVNS": cells.to_numpy(),
+        "LATENCYTODELIVERY_SECONDS": msgs["y"].to_numpy(),
+    })
+
+
+def _stats(msgs):
+    chunk = _chunk(msgs)
+    # chunks of interleaved messages: the statistics merge by addition
+    parts = [stack_stats(chunk.iloc[i::3].reset_index(drop=True), NAMES) for i in range(3)]
+    stats = merge_stats(parts)
+    return stats[stats["WINDOW"] == "all"].reset_index(drop=True)
+
+
+def test_planted_contributions_are_recovered():
+    table, r2 = attribute(_stats(_messages(seed=1)))
+    table = table.set_index("DVN_NAME")
+    assert r2 > 0.9
+    for name, truth in TRUTH.items():
+        assert abs(table.loc[name, "contribution_s"] - truth) < 1.0
+    assert table.loc["D", "stacks"] == 4
+    assert table.loc["A", "messages"] == 3 * 400
+
+
+def test_intervals_cover_the_planted_contributions():
+    # without the ridge, whose shrinkage the intervals do not include
+    inside = []
+    for seed in range(40):
+        table = attribute(_stats(_messages(seed, per_stack=100)), alpha=1e-6)[0].set_index("DVN_NAME")
+        inside += [table.loc[k, "ci_low_s"] <= v <= table.loc[k, "ci_high_s"] for k, v in TRUTH.items()]
+    assert 0.9 <= np.mean(inside) <= 0.99
+
+
+def test_fit_from_stats_equals_fit_on_expanded_messages():
+    msgs = _messages(seed=2, per_stack=50)
+    alpha = 3.0
+    table, r2 = attribute(_stats(msgs), alpha)
+    dvns = list(table["DVN_NAME"])                      # base first, then DVNs by name
+    assert dvns == [BASE, "A", "B", "C", "D"]
+
+    # message x DVN design with the base column; ridge rows for the DVN columns
+    x = np.array([[1.0] + [float(d in s.split(" + ")) for d in dvns[1:]] for s in msgs["stack"]])
+    y = msgs["y"].to_numpy()
+    ridge = np.sqrt(alpha) * np.eye(len(dvns))[1:]
+    beta, _ = nnls(np.vstack([x, ridge]), np.r_[y, np.zeros(len(ridge))])
+    assert np.allclose(table["contribution_s"], beta, rtol=1e-8, atol=1e-8)
+
+    e = y - x @ beta
+    h_inv = np.linalg.inv(x.T @ x + alpha * np.diag(np.r_[0.0, np.ones(len(dvns) - 1)]))
+    se = np.sqrt(np.diag(h_inv @ (x.T * e ** 2) @ x @ h_inv))
+    assert np.allclose(table["se_s"], se, rtol=1e-6)
+    assert np.isclose(r2, 1 - (e ** 2).sum() / ((y - y.mean()) ** 2).sum())
@@ -0,0 +1,85 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dvn_backend
+from dvn_backend import explode_fees, expand, kpi_by_dvn, diff, available, KPI_COLUMNS, SCRIPT_COLUMNS
+from synth_exports import generate
+
+REPO = Path(__file__).resolve().parent.parent
+FEES_CSV = REPO / "dvnFeesMapped.csv"
+DT_CSV = REPO / "data" / "dt_clean.csv"
+EXPAND = REPO / "scripts" / "expand_from_fees_then_join.py"
+
+FEES = pd.DataFrame({
+    "GUID": ["0xAA", "0xBB", '="0xCC"'],
+    "REQUIREDDVNS": ["[ 0xa;0xb ]", "[ 0xa;0xb ]", '="[ 0xa ]"'],
+    "OPTIONALDVNS": ["[ 0xc ]", "[ 0xc;0xd ]", '="[  ]"'],
+    "DVN_FEES_ARRAY": ["[ 1;2;3 ]", "[ 1;2;3;4 ]", '="[ 5 ]"'],
+    "REQUIREDDVN_MAPPING": ["[('A', '10'), ('B', '20')]", "[('A', '10')]", None],
+    "OPTIONALDVN_MAPPING": ["[]", "[(\"O'Neil\", '7')]", None],
+})
+EXPECTED = [
+    ("0xaa", "0xa", "A", "required", "10"),
+    ("0xaa", "0xb", "B", "required", "20"),
+    ("0xaa", "0xc", "0xc", "optional", "3"),
+    ("0xbb", "0xa", "A", "required", "10"),
+    ("0xbb", "0xb", "0xb", "required", "2"),
+    ("0xbb", "0xc", "O'Neil", "optional", "7"),
+    ("0xbb", "0xd", "0xd", "optional", "4"),
+    ("0xcc", "0xa", "0xa", "required", "5"),
+]
+
+
+@pytest.mark.parametrize("backend", available())
+def test_explode_names_and_fees_from_mapping(backend):
+    got = expand(FEES, backend)
+    assert [tuple(r) for r in got.itertuples(index=False)] == EXPECTED
+
+
+@pytest.mark.parametrize("backend", available())
+def test_explode_without_mapping_columns(backend):
+    fees = FEES.drop(columns=["REQUIREDDVN_MAPPING", "OPTIONALDVN_MAPPING"])
+    got = expand(fees, backend)
+    assert (got["DVN_NAME"] == got["DVN_ADDR"]).all()
+    assert got["DVN_FEE_WEI"].tolist() == ["1", "2", "3", "1", "2", "3", "4", "5"]
+
+
+def run_expand(fees_csv, dt_csv, cwd, *extra):
+    subprocess.run([sys.executable, str(EXPAND), str(fees_csv), str(dt_csv), *extra], cwd=cwd, check=True,
+                   capture_output=True, env={"DVN_EVENTS": "off", "DVN_SUMMARY": "0", "PATH": ""})
+    return pd.read_csv(Path(cwd) / "expanded_kpi_by_dvn.csv", dtype={"DVN_NAME": str})
+
+
+@pytest.fixture(scope="module")
+def synthetic(tmp_path_factory):
+    out = tmp_path_factory.mktemp("synth")
+    dt_csv, fees_csv = generate(2000, out, seed=7)
+    return fees_csv, dt_csv
+
+
+@pytest.mark.parametrize("data", ["repo", "synthetic"])
+def test_backends_match_expansion_script(data, synthetic, tmp_path):
+    fees_csv, dt_csv = (FEES_CSV, DT_CSV) if data == "repo" else synthetic
+    script = run_expand(fees_csv, dt_csv, tmp_path)
+    ref = kpi_by_dvn(fees_csv, dt_csv, "pandas")
+    assert list(ref.columns) == KPI_COLUMNS
+    assert diff(ref, script, SCRIPT_COLUMNS)[:2] == (0, 0)
+    for backend in available():
+        assert diff(ref, kpi_by_dvn(fees_csv, dt_csv, backend), KPI_COLUMNS[1:])[:2] == (0, 0)
+
+
+@pytest.mark.skipif("polars" not in available(), reason="polars not installed")
+def test_expansion_script_backends_agree(synthetic, tmp_path):
+    fees_csv, dt_csv = synthetic
+    (tmp_path / "pandas").mkdir()
+    (tmp_path / "polars").mkdir()
+    a = run_expand(fees_csv, dt_csv, tmp_path / "pandas", "--chunk-rows", "700")
+    b = run_expand(fees_csv, dt_csv, tmp_path / "polars", "--chunk-rows", "700", "--backend", "polars")
+    pd.testing.assert_frame_equal(a, b)
+    rows_a = (tmp_path / "pandas" / "expanded_per_dvn_joined.csv").read_bytes()
+    assert rows_a == (tmp_path / "polars" / "expanded_per_dvn_joined.csv").read_bytes()
@@ -0,0 +1,56 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from dvn_bootstrap import kpi_cis, with_cis
+from dvn_sql import ci_frames, CI_TABLES
+
+
+def _table():
+    rng = np.random.default_rng(1)
+    rows = pd.DataFrame({"DVN_NAME": rng.choice(["A", "B", "C"], 3000),
+                         "LATENCY_S": rng.integers(40, 120, 3000).astype(float)})
+    hist = rows.groupby(["DVN_NAME", "LATENCY_S"]).size().reset_index(name="count")
+    kpi = pd.DataFrame({"DVN_NAME": ["A", "B", "C", "D"], "messages": [1000, 1000, 1000, 0],
+                        "delivered": [900, 500, 1000, 0]})
+    kpi["delivered_rate"] = (kpi["delivered"] / kpi["messages"]).where(kpi["messages"] > 0)
+    kpi["median_latency"] = kpi["DVN_NAME"].map(rows.groupby("DVN_NAME")["LATENCY_S"].median())
+    kpi["p95_latency"] = kpi["DVN_NAME"].map(rows.groupby("DVN_NAME")["LATENCY_S"].quantile(0.95))
+    return kpi, hist
+
+
+def test_kpi_cis_cover_the_estimates_and_ignore_row_order():
+    kpi, hist = _table()
+    cis = kpi_cis("DVN_NAME", kpi["DVN_NAME"], kpi["delivered"], kpi["messages"], hist, "LATENCY_S")
+    rev = kpi.iloc[::-1]
+    again = kpi_cis("DVN_NAME", rev["DVN_NAME"], rev["delivered"], rev["messages"], hist.iloc[::-1], "LATENCY_S")
+    pd.testing.assert_frame_equal(cis, again)
+    out = with_cis(kpi, cis, "DVN_NAME")
+    assert list(out.columns[-3:]) == ["p95_latency", "p95_latency_lo", "p95_latency_hi"]
+    known = out.iloc[:3]
+    for c in ("delivered_rate", "median_latency", "p95_latency"):
+        assert (known[f"{c}_lo"] <= known[c]).all() and (known[c] <= known[f"{c}_hi"]).all()
+    assert known.loc[2, "delivered_rate_lo"] == known.loc[2, "delivered_rate_hi"] == 1.0
+    assert out.iloc[3].filter(like="_lo").isna().all()          # no messages: no intervals
+
+
+def test_sql_intervals_match_kpi_cis():
+    kpi, hist = _table()
+    con = sqlite3.connect(":memory:")
+    rows = hist.loc[hist.index.repeat(hist["count"]), ["DVN_NAME", "LATENCY_S"]].reset_index(drop=True)
+    rows["msg_id"] = np.arange(len(rows))
+    rows["DELIVERED"] = 0
+    rows.to_sql("per_dvn", con)
+    pd.DataFrame(columns=["msg_id", "TS_MS", "LATENCY_S", "REQUIRED_STACK"]).to_sql("messages", con)
+    pd.DataFrame(columns=["WINDOW", "START_MS", "END_MS"]).to_sql("windows", con)
+
+    class Store:
+        def query(self, sql):
+            return pd.read_sql_query(sql, con)
+
+    frames = ci_frames(Store())
+    per = rows.groupby("DVN_NAME").agg(messages=("msg_id", "nunique"), delivered=("DELIVERED", "sum")).reset_index()
+    want = kpi_cis("DVN_NAME", per["DVN_NAME"], per["delivered"], per["messages"], hist, "LATENCY_S")
+    pd.testing.assert_frame_equal(frames["kpi_ci"], want[[c for c, _ in CI_TABLES["kpi_ci"]]])
+    assert frames["stack_ci"].empty and frames["dvn_ci"].empty
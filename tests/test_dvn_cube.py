@@ -0,0 +1,28 @@
+import os
+import shutil
+
+import pandas as pd
+
+from dvn_cube import build, Cube
+from synth_exports import generate
+
+
+def test_rebuild_of_touched_or_grown_export_adds_only_new_rows(tmp_path):
+    dt, _ = generate(300, tmp_path / "src", seed=5, chunk_size=300)
+    cube_dir = tmp_path / "cube"
+    build([dt], cube_dir, chunk_rows=100)
+    before = Cube(cube_dir).cells.copy()
+
+    os.utime(dt)
+    shutil.copy(dt, tmp_path / "copy.csv")
+    build([dt, tmp_path / "copy.csv"], cube_dir)
+    pd.testing.assert_frame_equal(Cube(cube_dir).cells, before)
+
+    with open(dt) as f:
+        head, *rows = f.readlines()
+    with open(dt, "a") as f:
+        f.writelines(rows[:40])
+    build([dt], cube_dir)
+    msgs = Cube(cube_dir).slice([], grain="message")["messages"].iloc[0]
+    assert msgs == 340
+    assert [r["offset"] for r in Cube(cube_dir).inputs] == [os.path.getsize(dt)]
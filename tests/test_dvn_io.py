@@ -0,0 +1,19 @@
+import pandas as pd
+
+from dvn_io import parse_timestamps
+
+
+def test_parse_timestamps_mixed_wrapping():
+    wrapped = ['="2025-10-25T15:10:43.000Z"'] * 1200       # the sample only sees wrapped cells
+    cells = pd.Series(wrapped + ["2025-10-26T01:00:00.000Z", None, "", '="not a time"'])
+    out = parse_timestamps(cells)
+    assert (out.iloc[:1200] == pd.Timestamp("2025-10-25T15:10:43", tz="UTC")).all()
+    assert out.iloc[1200] == pd.Timestamp("2025-10-26T01:00:00", tz="UTC")
+    assert out.iloc[1201:].isna().all()
+
+
+def test_parse_timestamps_bare_sample_then_wrapped():
+    cells = pd.Series(["2025-10-26 01:00:00 UTC"] * 1200 + ['="2025-10-27 02:00:00 UTC"'])
+    out = parse_timestamps(cells)
+    assert out.iloc[-1] == pd.Timestamp("2025-10-27T02:00:00", tz="UTC")
+    assert out.notna().all()
@@ -0,0 +1,91 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+import dvn_latency_legs
+from dvn_latency_legs import load_verifications, message_legs
+from pathways import split, process_pathway, rollup, find_pathways, pathway_eids, DT_FILE
+from synth_exports import generate
+
+T0 = pd.Timestamp("2025-10-01T00:00:00Z")
+
+
+def _t(s):
+    return pd.NaT if s is None else T0 + pd.Timedelta(seconds=s)
+
+
+def test_quorum_is_the_last_required_verification(tmp_path):
+    t = lambda s: "" if s is None else _t(s).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    pd.DataFrame([
+        ("g1", "0xa", "required", t(30)), ("g1", "0xb", "required", t(50)), ("g1", "0xc", "optional", t(90)),
+        ("g2", "0xa", "required", t(20)), ("g2", "0xb", "required", None),      # one required never verified
+        ("g3", "0xc", "optional", t(10)),                                       # no required DVN verified
+        ("g4", "0xa", "required", t(40)), ("g4", "0xd", "unlisted", t(5)),
+    ], columns=["GUID", "DVN_ADDR", "ROLE", "VERIFY_TIMESTAMP"]).to_csv(tmp_path / "v.csv", index=False)
+
+    per_dvn, quorum = load_verifications(tmp_path / "v.csv")
+    assert quorum.to_dict() == {"g1": _t(50), "g4": _t(40)}
+    assert len(per_dvn) == 7
+    assert per_dvn[("g1", "0xc")] == _t(90)
+    assert ("g2", "0xb") not in per_dvn.index
+
+
+def test_message_legs():
+    chunk = pd.DataFrame({
+        "GUID": ["g1", "g2", "g3"],
+        "SOURCETIMESTAMP": [_t(0), _t(0), _t(0)],
+        "DVNTIMESTAMP": [_t(4), _t(6), None],
+        "DESTINATIONDELIVEREDTIMESTAMP": [_t(100), None, _t(80)],
+    })
+    legs = message_legs(chunk)
+    assert legs["source_to_fee"].tolist()[:2] == [4.0, 6.0]
+    assert legs["fee_to_delivered"].tolist()[0] == 96.0
+    assert legs["end_to_end"].tolist()[::2] == [100.0, 80.0]
+    assert legs[["fee_to_verified", "verified_to_delivered"]].isna().all().all()
+    assert legs.iloc[1][["fee_to_delivered", "end_to_end"]].isna().all()
+
+    legs = message_legs(chunk, pd.Series({"g1": _t(60), "g3": _t(70)}))
+    assert legs["fee_to_verified"].tolist()[0] == 56.0
+    assert legs["verified_to_delivered"].tolist()[0] == 40.0
+    assert np.isnan(legs["fee_to_verified"].iloc[1])        # no quorum time
+    assert np.isnan(legs["fee_to_verified"].iloc[2])        # no fee time
+    assert legs["verified_to_delivered"].iloc[2] == 10.0
+
+
+def test_kpi_dir_gets_each_pathways_own_legs(tmp_path, monkeypatch):
+    dt, _ = generate(600, tmp_path / "src", seed=5, chunk_size=300, pathways=[(30184, 30101), (30110, 30101)])
+    root = tmp_path / "root"
+    split([dt], root)
+    for pdir in find_pathways(root):
+        process_pathway(pdir, boot=0)
+    rollup(root, boot=0)
+
+    argv = lambda src, out, *extra: ["dvn_latency_legs.py", str(src), "--out-dir", str(out), *extra]
+    monkeypatch.setattr(sys, "argv", argv(dt, tmp_path / "all", "--kpi-dir", str(root)))
+    dvn_latency_legs.main()
+
+    cols = ["DVN_NAME", "ROLE", "WINDOW", "end_to_end_p50", "end_to_end_p95"]
+    rolled = pd.read_csv(root / "rollup_kpi_by_dvn.csv")
+    per_pathway = pd.read_csv(root / "pathway_kpi_by_dvn.csv")
+    assert rolled["end_to_end_p50"].notna().any()
+    for pdir in find_pathways(root):
+        # the legs of the pathway's own export, as a run on just that file computes them
+        monkeypatch.setattr(sys, "argv", argv(pdir / DT_FILE, pdir / "own"))
+        dvn_latency_legs.main()
+        own = pd.read_csv(pdir / "own" / dvn_latency_legs.OUT_KPI)
+        own = own[(own["GRAIN"] == "dvn") & (own["LEG"] == "end_to_end")].set_index(["KEY", "ROLE", "WINDOW"])
+
+        table = pd.read_csv(pdir / "kpi_by_dvn.csv")
+        got = table.set_index(["DVN_NAME", "ROLE", "WINDOW"])[["end_to_end_p50", "end_to_end_p95"]].dropna()
+        assert len(got)
+        exp = own.loc[got.index, ["p50_s", "p95_s"]].to_numpy()
+        assert np.array_equal(got.to_numpy(), exp)
+
+        s, d = pathway_eids(pdir)
+        rows = per_pathway[per_pathway["PATHWAY_KEY"] == f"{s}-{d}"]
+        m = rows[cols].merge(table[cols], on=cols[:3])
+        assert len(m) == len(table)
+        assert np.allclose(m["end_to_end_p50_x"], m["end_to_end_p50_y"], equal_nan=True)
+        assert not np.array_equal(got.to_numpy(), rolled.set_index(["DVN_NAME", "ROLE", "WINDOW"])
+                                  .loc[got.index, ["end_to_end_p50", "end_to_end_p95"]].to_numpy())
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+from dvn_lifecycle import chunk_records, collapse, latency_by_guid
+
+G = {i: "0x" + f"{i:02x}" * 32 for i in range(1, 6)}
+SENT = "2025-10-01T00:00:00.000Z"
+
+
+def _row(guid, event="", block="", dest="", method="GUID", fee=""):
+    w = lambda v: f'="{v}"' if v else ""
+    return {"GUID": w(guid), "SOURCETIMESTAMP": w(SENT), "DVNTIMESTAMP": w(fee),
+            "DESTINATIONDELIVEREDBLOCKNUMBER": w(block), "DESTINATIONDELIVEREDTIMESTAMP": w(dest),
+            "DEST_EVENT_NAME": w(event), "MATCH_METHOD": w(method)}
+
+
+def _lifecycle():
+    t = lambda s: f"2025-10-01T00:{s // 60:02d}:{s % 60:02d}.000Z"
+    rows = [
+        # 1: every step; a later verification and an earlier-listed but later-block delivery
+        _row(G[1], "PacketDelivered", 105, t(90), "NONCE+SRC_EID", fee=t(5)),
+        _row(G[1], "PacketVerified", 102, t(70), "NONCE+SRC_EID"),
+        _row(G[1], "OFTReceived", 101, t(64)),
+        _row(G[1], "PacketDelivered", 101, t(64)),
+        _row(G[1], "PacketVerified", 100, t(40)),
+        # 2: verified only, matched on nonce
+        _row(G[2], "PacketVerified", 200, t(30), "NONCE+SRC_EID"),
+        # 3: fee paid, no destination event; an unknown method outranks NO_MATCH
+        _row(G[3], method="NO_MATCH", fee=t(3)),
+        _row(G[3], method="SOMETHING", fee=t(4)),
+        # 4: sent only
+        _row(G[4], method="NO_MATCH"),
+        # 5: delivery listed before the verification of the same block
+        _row(G[5], "PacketDelivered", 300, t(50)),
+        _row(G[5], "PacketVerified", 300, t(50)),
+        _row("0x12", "PacketVerified", 1, t(1)),
+    ]
+    rec, bad = chunk_records(pd.DataFrame(rows))
+    assert bad == 1
+    return collapse(rec).set_index("GUID")
+
+
+def test_state_is_the_furthest_step_reached():
+    df = _lifecycle()
+    assert df.loc[[G[i] for i in range(1, 6)], "STATE"].tolist() == ["RECEIVED", "VERIFIED", "FEE_PAID", "SENT",
+                                                                     "DELIVERED"]
+
+
+def test_first_event_of_each_type_by_block():
+    df = _lifecycle()
+    g = df.loc[G[1]]
+    assert (g["VERIFIED_BLOCK"], g["DELIVERED_BLOCK"], g["RECEIVED_BLOCK"]) == (100, 101, 101)
+    assert (g["VERIFIED_EVENTS"], g["DELIVERED_EVENTS"], g["EVENT_ROWS"]) == (2, 2, 5)
+    assert g["DELIVERED_TS"] == pd.Timestamp("2025-10-01T00:01:04Z")
+    assert g["LATENCYTODELIVERY_SECONDS"] == 64.0
+    assert g["FEE_PAID_TS"] == pd.Timestamp("2025-10-01T00:00:05Z")
+    assert g["LAST_EVENT"] == "PacketDelivered"                     # block 105
+    assert df.loc[G[5], "LAST_EVENT"] == "PacketDelivered"            # same block: protocol order
+    assert np.isnan(df.loc[G[2], "LATENCYTODELIVERY_SECONDS"])
+
+
+def test_match_method_is_the_best_rank():
+    m = _lifecycle()["MATCH_METHOD"]
+    assert [m[G[i]] for i in range(1, 5)] == ["GUID", "NONCE+SRC_EID", "OTHER", "NO_MATCH"]
+
+
+def test_consumers_take_the_lifecycle_latency(tmp_path):
+    path = tmp_path / "dvn_lifecycle.csv"
+    _lifecycle().reset_index().to_csv(path, index=False)
+    guids = pd.Series([f'="{G[1].upper().replace("0X", "0x")}"', G[1], "0xabc", G[2]])
+    got = latency_by_guid(guids, pd.Series([70.0, 90.0, 5.0, 30.0]), path)
+    assert got.tolist()[:3] == [64.0, 64.0, 5.0] and np.isnan(got[3])
+    assert latency_by_guid(guids, pd.Series([1.0] * 4), tmp_path / "missing.csv").tolist() == [1.0] * 4
@@ -0,0 +1,72 @@
+import json
+
+import pandas as pd
+
+from dvn_loader import load, zone_map, Predicates, ZONES_SUFFIX
+from synth_exports import generate
+
+RARE = "0x93ac538152e1bc4f093ae5666ee9fd1d84f4f4bf"
+QUERIES = [
+    dict(time_range=("2025-10-19", "2025-10-21")),
+    dict(time_range=(None, "2025-09-30"), delivered=False),
+    dict(dvn=RARE),
+    dict(dvn=RARE, delivered=True, time_range=("2025-10-01", None)),
+]
+
+
+def _export(tmp_path):
+    dt, _ = generate(2000, tmp_path, seed=4, chunk_size=500)
+    zone_map(dt, zone_bytes=100_000)                    # small zones, so there is something to skip
+    return dt
+
+
+def _unpruned(dt, **q):
+    """Every row read, then filtered by the same predicates."""
+    full = pd.read_csv(dt, dtype=str, keep_default_na=False, na_values=["", "NA", "N/A"])
+    return full[Predicates(q.get("time_range"), q.get("dvn"), q.get("delivered")).matches(full)]
+
+
+def test_pruned_load_returns_the_unpruned_rows(tmp_path):
+    dt = _export(tmp_path)
+    skipped = 0
+    for q in QUERIES:
+        stats = {}
+        got = load(dt, stats=stats, **q)
+        exp = _unpruned(dt, **q).reset_index(drop=True)
+        assert len(exp) > 0
+        pd.testing.assert_frame_equal(got, exp)
+        skipped += stats["zones_total"] - stats["zones_read"]
+        assert stats["zones_total"] > 10
+    assert skipped > 0
+
+    cols = ["GUID", "LATENCYTODELIVERY_SECONDS"]
+    got = load(dt, columns=cols, **QUERIES[0])
+    assert list(got.columns) == cols
+    assert got["GUID"].tolist() == _unpruned(dt, **QUERIES[0])["GUID"].tolist()
+
+
+def test_stale_zone_map_is_rebuilt(tmp_path):
+    dt = _export(tmp_path)
+    zpath = tmp_path / (dt.name + ZONES_SUFFIX)
+    before = json.loads(zpath.read_text())
+
+    # a changed file: new rows at the end, inside the queried window
+    with open(dt) as f:
+        lines = f.readlines()
+    late = [line for line in lines[1:] if "2025-10-20T" in line][:5]
+    with open(dt, "a") as f:
+        f.writelines(late)
+    q = QUERIES[0]
+    got = load(dt, **q)
+    after = json.loads(zpath.read_text())
+    assert after["size"] == dt.stat().st_size != before["size"]
+    assert sum(z["rows"] for z in after["zones"]) == sum(z["rows"] for z in before["zones"]) + 5
+    pd.testing.assert_frame_equal(got, _unpruned(dt, **q).reset_index(drop=True))
+
+    # a map written for another schema fingerprint
+    after["schema"] = "0" * 16
+    after["zones"] = [dict(z, ts_max="2000-01-01T00:00:00+00:00") for z in after["zones"]]
+    zpath.write_text(json.dumps(after))
+    got = load(dt, **q)
+    assert json.loads(zpath.read_text())["schema"] != "0" * 16
+    pd.testing.assert_frame_equal(got, _unpruned(dt, **q).reset_index(drop=True))
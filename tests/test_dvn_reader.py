@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+from dvn_io import read_export, unwrap
+from dvn_reader import read_wrapped, iter_wrapped, wrapped_dialect
+from dvn_schema import read_typed, detect, parse
+from synth_exports import generate
+
+COLUMNS = ["GUID", "SOURCEBLOCKNUMBER", "SOURCETIMESTAMP", "REQUIREDDVNS", "MESSAGESTATUS",
+           "LATENCYTODELIVERY_SECONDS"]
+
+
+@pytest.fixture(scope="module")
+def exports(tmp_path_factory):
+    """The same rows in the Excel-wrapped dialect (synth_exports) and CSV-quoted, as to_csv writes them."""
+    out = tmp_path_factory.mktemp("reader")
+    dt_csv, _ = generate(3000, out, seed=3)
+    quoted = out / "quoted.csv"
+    pd.read_csv(dt_csv, dtype=str, keep_default_na=False).to_csv(quoted, index=False)
+    return dt_csv, quoted
+
+
+def pandas_read(path, columns, typed):
+    df = read_export(path, usecols=columns)[columns]
+    for c in columns:
+        df[c] = unwrap(df[c]).where(df[c].notna())
+    return parse(df) if typed else df
+
+
+@pytest.mark.parametrize("kind", ["wrapped", "quoted"])
+@pytest.mark.parametrize("typed", [False, True])
+def test_read_wrapped_matches_pandas(exports, kind, typed):
+    path = exports[0] if kind == "wrapped" else exports[1]
+    got = read_wrapped(path, COLUMNS, typed=typed, workers=1, chunk_bytes=200_000)
+    pd.testing.assert_frame_equal(got, pandas_read(path, COLUMNS, typed))
+
+
+def test_quoted_file_is_not_read_raw(exports):
+    _, quoted = exports
+    assert not wrapped_dialect(quoted)
+    got = read_wrapped(quoted, COLUMNS, typed=True, workers=1)
+    assert got["SOURCEBLOCKNUMBER"].notna().all()
+    assert got["SOURCETIMESTAMP"].notna().all()
+    assert not got["GUID"].str.contains('"').any()
+
+
+@pytest.mark.parametrize("kind", ["wrapped", "quoted"])
+def test_read_typed_chunks(exports, kind):
+    path = exports[0] if kind == "wrapped" else exports[1]
+    chunks = list(read_typed(path, COLUMNS, chunksize=500))
+    assert len(chunks) > 1
+    whole = pd.concat(chunks)
+    schema = detect(path)
+    ref = parse(read_export(path, usecols=schema.usecols(COLUMNS)).rename(columns=schema.renames())[COLUMNS])
+    pd.testing.assert_frame_equal(whole, ref)
+
+
+def test_iter_wrapped_continues_index(exports):
+    frames = list(iter_wrapped(exports[0], ["GUID"], chunk_bytes=100_000))
+    assert pd.concat(frames).index.equals(pd.RangeIndex(3000))
+
+
+def test_bad_timestamps_fall_back(tmp_path):
+    path = tmp_path / "ts.csv"
+    cells = ['="2025-10-25T15:10:43.000Z"'] * 5000 + ['="2025-13-45T99:00:00.000Z"']
+    path.write_text("SOURCETIMESTAMP\n" + "\n".join(cells) + "\n")
+    got = read_wrapped(path, typed=True, workers=1)["SOURCETIMESTAMP"]
+    assert got.iloc[:5000].notna().all() and pd.isna(got.iloc[-1])
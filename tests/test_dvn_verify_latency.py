@@ -0,0 +1,96 @@
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+import dvn_verify_latency
+
+A, B, C = ("0x" + c * 40 for c in "abc")                  # required, optional, in no stack
+SENDER, RECEIVER = "12" * 20, "34" * 20
+G = {i: "0x" + f"{i:02x}" * 32 for i in range(1, 5)}
+T0 = pd.Timestamp("2025-10-01T00:00:00Z")
+
+
+def _ts(s):
+    return (T0 + pd.Timedelta(seconds=s)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _header(nonce, src=30184, dst=30101):
+    return "0x01" + f"{nonce:016x}{src:08x}" + "00" * 12 + SENDER + f"{dst:08x}" + "00" * 12 + RECEIVER
+
+
+def _log(tx, s, event, index=0, **decoded):
+    return {"tx_hash": tx, "block_number": 100 + s, "block_timestamp": _ts(s), "event_index": index,
+            "contract_address": "0x" + "99" * 20, "event_name": event, "decoded_log": json.dumps(decoded)}
+
+
+def _verified(tx, s, dvn, nonce, guid=None):
+    d = {"dvn": dvn, "header": _header(nonce), "confirmations": 5, "proofHash": "0x" + f"{nonce:064x}"}
+    if guid:
+        d["guid"] = guid
+    return _log(tx, s, "PayloadVerified", **d)
+
+
+def _fixture(tmp_path):
+    w = lambda v: f'="{v}"'
+    msgs = pd.DataFrame([{
+        "GUID": w(G[i]), "SOURCETIMESTAMP": w(_ts(10 * i)), "SOURCEENDPOINTID": w(30184),
+        "DESTINATIONENDPOINTID": w(30101), "MESSAGENONCEDECIMAL": w(i), "REQUIREDDVNS": w(f"[ {A} ]"),
+        "OPTIONALDVNS": w(f"[ {B} ]"), "DVN_FEES_ARRAY": w("[ 1000;2000 ]"), "LATENCYTODELIVERY_SECONDS": w(100),
+    } for i in range(1, 5)])
+    msgs.to_csv(tmp_path / "dt_clean.csv", index=False)
+    logs = pd.DataFrame([
+        # 1: the verification log carries the GUID
+        _verified("0xv1", 15, A, 1, guid=G[1]),
+        # 2: GUID from the PacketDelivered + OFTReceived pair of the delivery transaction
+        _verified("0xv2", 27, A, 2),
+        _log("0xd2", 40, "PacketDelivered", 3, origin={"srcEid": 30184, "sender": "0x" + "00" * 12 + SENDER,
+                                                       "nonce": 2}),
+        _log("0xd2", 40, "OFTReceived", 4, guid=G[2]),
+        # 3: nonce as-of only, verified by the optional DVN and by one outside the stack
+        _verified("0xv3", 33, B, 3),
+        _verified("0xv3b", 38, C, 3),
+        _verified("0xv3c", 50, C, 3),                        # re-verification, ignored
+        # 4: never verified, so its slots do not count
+    ])
+    logs.to_csv(tmp_path / "dest_logs.csv", index=False)
+    pd.DataFrame({"DVN_Name": ["Alpha", "Beta"], "DVN_Address": [A, B]}).to_csv(tmp_path / "names.csv", index=False)
+
+
+def test_verifications_match_on_guid_delivery_and_nonce(tmp_path, monkeypatch):
+    _fixture(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["dvn_verify_latency.py", str(tmp_path / "dt_clean.csv"),
+                                      str(tmp_path / "dest_logs.csv"), "--out-dir", str(tmp_path),
+                                      "--names", str(tmp_path / "names.csv")])
+    dvn_verify_latency.main()
+
+    rows = pd.read_csv(tmp_path / dvn_verify_latency.OUT_ROWS).fillna({"VERIFY_LATENCY_S": -1})
+    got = {(r.GUID, r.DVN_NAME): (r.ROLE, r.MATCH_METHOD, r.VERIFY_LATENCY_S) for r in rows.itertuples()}
+    assert got == {
+        (G[1], "Alpha"): ("required", "GUID", 5.0),
+        (G[1], "Beta"): ("optional", "NOT_VERIFIED", -1),
+        (G[2], "Alpha"): ("required", "DELIVERY", 7.0),
+        (G[2], "Beta"): ("optional", "NOT_VERIFIED", -1),
+        (G[3], "Alpha"): ("required", "NOT_VERIFIED", -1),
+        (G[3], "Beta"): ("optional", "NONCE_ASOF", 3.0),
+        (G[3], C): ("unlisted", "NONCE_ASOF", 8.0),
+    }
+
+    kpi = pd.read_csv(tmp_path / dvn_verify_latency.OUT_KPI).set_index(["DVN_NAME", "ROLE"])
+    assert kpi.loc[("Alpha", "required"), ["slots", "verified"]].tolist() == [3, 2]
+    assert kpi.loc[("Alpha", "required"), "verified_rate"] == round(2 / 3, 4)
+    assert kpi.loc[("Beta", "optional"), ["slots", "verified"]].tolist() == [3, 1]
+    assert kpi.loc[(C, "unlisted"), ["slots", "verified"]].tolist() == [0, 1]
+    assert np.isnan(kpi.loc[(C, "unlisted"), "verified_rate"])
+
+
+def test_nonce_asof_respects_max_lag(tmp_path, monkeypatch):
+    _fixture(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["dvn_verify_latency.py", str(tmp_path / "dt_clean.csv"),
+                                      str(tmp_path / "dest_logs.csv"), "--out-dir", str(tmp_path),
+                                      "--names", str(tmp_path / "names.csv"), "--max-lag", "2"])
+    dvn_verify_latency.main()
+    rows = pd.read_csv(tmp_path / dvn_verify_latency.OUT_ROWS)
+    assert set(rows["GUID"]) == {G[1], G[2]}
+    assert sorted(rows["MATCH_METHOD"]) == ["DELIVERY", "GUID", "NOT_VERIFIED", "NOT_VERIFIED"]
@@ -0,0 +1,64 @@
+import json
+
+import pandas as pd
+
+from match_events import match, SEND_LIB, DT_ADDRESS
+from dvn_schema import DT_COLUMNS
+
+OTHER = "0x" + "ab" * 20
+EXECUTOR = "0x" + "ee" * 20
+G = {i: "0x" + f"{i:02x}" * 32 for i in range(1, 6)}
+
+
+def _log(tx, block, s, event, index=0, contract="0x" + "11" * 20, **decoded):
+    return {"tx_hash": tx, "block_number": block, "block_timestamp": f"2025-10-01T00:00:{s:02d}.000Z",
+            "event_index": index, "contract_address": contract, "event_name": event, "decoded_log": decoded}
+
+
+def _sent(i, dvns, dst_eid=30101, optional=()):
+    tx = f"0xs{i}"
+    fees = [str(100 * (k + 1)) for k in range(len(dvns) + len(optional))]
+    return [
+        _log(tx, 100 + i, i, "OFTSent", 0, guid=G[i], nonce=i, dstEid=dst_eid, srcEid=30184,
+             fromAddress="0x" + "22" * 20, encodedPayload="0x12"),
+        _log(tx, 100 + i, i, "DVNFeePaid", 1, SEND_LIB, requiredDVNs=list(dvns), optionalDVNs=list(optional),
+             fees=fees),
+        _log(tx, 100 + i, i, "ExecutorFeePaid", 2, SEND_LIB, executor=EXECUTOR, fee=str(7 * i)),
+    ]
+
+
+def _delivered(tx, s, guid=None, nonce=None, src_eid=30184):
+    d = {"origin": {"srcEid": src_eid, "sender": "0x" + "00" * 12 + "22" * 20, "nonce": nonce}}
+    if guid:
+        d["guid"] = guid
+    row = _log(tx, 900 + s, s, "PacketDelivered", 0, **d)
+    row["decoded_log"] = json.dumps(row["decoded_log"])
+    return row
+
+
+def test_guid_then_nonce_join_and_unmatched(tmp_path):
+    src = (_sent(1, [DT_ADDRESS, OTHER]) + _sent(2, [OTHER], optional=[DT_ADDRESS]) + _sent(3, [DT_ADDRESS])
+           + _sent(4, [OTHER])                          # DT not in the stack
+           + _sent(5, [DT_ADDRESS], dst_eid=30110))     # another pathway
+    with open(tmp_path / "src.jsonl", "w") as f:
+        f.writelines(json.dumps(r) + "\n" for r in src)
+    pd.DataFrame([
+        _delivered("0xd1", 31, guid=G[1], nonce=99),                      # GUID wins over a wrong nonce
+        _delivered("0xd2", 40, nonce=2),                                  # no GUID: (nonce, srcEid)
+        _delivered("0xd3", 45, nonce=3, src_eid=30110),                   # same nonce, other source chain
+    ]).to_csv(tmp_path / "dst.csv", index=False)
+
+    out = match(tmp_path / "src.jsonl", tmp_path / "dst.csv")
+    assert list(out.columns) == DT_COLUMNS
+    assert out["GUID"].tolist() == [G[3], G[2], G[1]]     # newest source block first
+    rows = out.set_index("GUID")
+    assert rows["MATCH_METHOD"].to_dict() == {G[1]: "GUID", G[2]: "NONCE+SRC_EID", G[3]: "NO_MATCH"}
+    assert rows["DESTINATIONDELIVEREDTXHASH"].fillna("").tolist() == ["", "0xd2", "0xd1"]
+    assert rows["LATENCYTODELIVERY_SECONDS"].to_dict() == {G[1]: "30", G[2]: "38", G[3]: "N/A"}
+    assert rows["MESSAGESTATUS"].tolist() == ["SENT", "DELIVERED", "DELIVERED"]
+    assert rows.loc[G[1], "REQUIREDDVNS"] == f"[ {DT_ADDRESS};{OTHER} ]"
+    assert rows.loc[G[1], "DVN_FEES_ARRAY"] == "[ 100;200 ]"
+    assert rows[["DEUTSCHE_IS_REQUIRED", "DEUTSCHE_IS_OPTIONAL"]].loc[G[2]].tolist() == ["false", "true"]
+    assert rows.loc[G[2], "DEST_ORIGIN_NONCE"] == "2"
+    assert rows.loc[G[1], "EXECUTORFEE"] == "7"
+    assert rows.loc[G[1], "MESSAGE_PAIR_KEY"] == "101_931"
@@ -0,0 +1,43 @@
+import runpy
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dvn_io import read_export, explode_dvns, dvn_names, NAMES_CSV
+from ooc_aggregate import run
+from synth_exports import generate
+
+SCRIPTS = Path(__file__).resolve().parent.parent / "scripts"
+
+
+def test_stacks_match_compute_dvn_stack_latency_with_repeated_guids(tmp_path, monkeypatch):
+    dt, _ = generate(400, tmp_path / "src", seed=9, chunk_size=400)
+    df = read_export(dt)
+    no_latency = pd.to_numeric(df["LATENCYTODELIVERY_SECONDS"].str.strip('="'), errors="coerce").isna()
+    # repeats of a GUID: a later copy with another latency (ignored), and a latency on a copy of a
+    # message without one (taken, as the first latency of that GUID)
+    again = df[~no_latency].iloc[:60].assign(LATENCYTODELIVERY_SECONDS='="999"')
+    late = df[no_latency].iloc[:20].assign(LATENCYTODELIVERY_SECONDS='="500"')
+    assert len(late) == 20
+    df = pd.concat([df, again, late], ignore_index=True)
+    df.to_csv(tmp_path / "dt.csv", index=False)
+
+    monkeypatch.chdir(tmp_path)
+    kpi, stack = run(tmp_path / "dt.csv", partitions=3, spill_dir=tmp_path / "spill")
+
+    per = explode_dvns(df, dvn_names(NAMES_CSV))
+    r = per["row"].to_numpy()
+    pd.DataFrame({"GUID": df["GUID"].to_numpy()[r], "DVN_NAME": per["DVN_NAME"], "ROLE": per["ROLE"],
+                  "LATENCYTODELIVERY_SECONDS": df["LATENCYTODELIVERY_SECONDS"].to_numpy()[r]}
+                 ).to_csv("expanded_per_dvn_joined.csv", index=False)
+    runpy.run_path(str(SCRIPTS / "compute_dvn_stack_latency.py"), run_name="__main__")
+    ref = pd.read_csv("stack_latency_summary.csv").set_index("Required_Stack")
+    got = stack.set_index("Required_Stack").loc[ref.index]
+    assert got["transactions"].sum() == 400 - no_latency.sum() + 20
+    assert (got["transactions"] == ref["transactions"]).all()
+    assert np.allclose(got["median_latency"], ref["median_latency"])
+    assert np.allclose(got["p95_latency"], ref["p95_latency"])
+    # one record per GUID in the DVN groups too; rows keeps the repeats
+    assert (kpi["unique_messages"] <= kpi["rows"]).all() and (kpi["unique_messages"] < kpi["rows"]).any()
+    assert kpi.loc[kpi["ROLE"] == "required", "unique_messages"].max() <= 400
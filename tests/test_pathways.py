@@ -0,0 +1,37 @@
+import os
+import shutil
+
+from pathways import split, process_pathway, find_pathways, DT_FILE
+from synth_exports import generate
+
+
+def _lines(root):
+    return {p: sum(1 for _ in open(p / DT_FILE, "rb")) for p in find_pathways(root)}
+
+
+def test_split_appends_only_new_bytes_and_duplicates_do_not_count(tmp_path):
+    dt, _ = generate(400, tmp_path / "src", seed=3, chunk_size=200, pathways=[(30184, 30101), (30110, 30101)])
+    root = tmp_path / "root"
+    split([dt], root)
+    before = _lines(root)
+    assert sum(before.values()) == 400 + len(before)
+
+    os.utime(dt)                                        # touched: nothing new to split
+    split([dt], root)
+    shutil.copy(dt, tmp_path / "copy.csv")              # same bytes under another name
+    split([tmp_path / "copy.csv"], root)
+    assert _lines(root) == before
+
+    kpis = {}
+    for pdir in find_pathways(root):
+        process_pathway(pdir, boot=0)
+        kpis[pdir] = (pdir / "kpi_by_dvn.csv").read_bytes()
+    with open(dt) as f:
+        tail = f.readlines()[-50:]                      # re-exported rows: GUIDs already split
+    with open(dt, "a") as f:
+        f.writelines(tail)
+    split([dt], root)
+    assert sum(_lines(root).values()) == sum(before.values()) + 50
+    for pdir in find_pathways(root):
+        process_pathway(pdir, boot=0)
+        assert (pdir / "kpi_by_dvn.csv").read_bytes() == kpis[pdir]
@@ -0,0 +1,52 @@
+import pandas as pd
+
+from payload_decode import decode_payloads, fill_from_payload
+
+SENDER = "aff53fb46d0b10c90b3ef5c29df101c661e05620"
+RECEIVER = "e83f75907fb4c575414fa6f5cfe8cef24dc5870c"
+
+
+def _payload(sender=SENDER, receiver=RECEIVER, amount=123_456_789, tail="ab" * 10):
+    """4 leading bytes, sender and receiver as 32-byte words, a uint64 amount, then anything."""
+    return "0x" + "deadbeef" + "00" * 12 + sender + "00" * 12 + receiver + f"{amount:016x}" + tail
+
+
+def _substr(s, start, length):
+    """Snowflake SUBSTR: 1-based start."""
+    return s[start - 1:start - 1 + length]
+
+
+def test_fields_match_the_query_substr_offsets():
+    p = _payload()
+    payloads = pd.Series([p, f'="{p.upper().replace("0X", "0x")}"', _payload(amount=2 ** 64 - 1, tail="")],
+                         index=[10, 11, 12])
+    out = decode_payloads(payloads)
+    assert list(out.index) == [10, 11, 12]
+    # the query: '0x' || LOWER(SUBSTR(encodedPayload, 35, 40)) and SUBSTR(encodedPayload, 99, 40)
+    assert out["SENDERADDRESSHEX"].tolist() == ["0x" + _substr(p, 35, 40).lower()] * 3
+    assert out["RECEIVERADDRESS"].tolist() == ["0x" + _substr(p, 99, 40).lower()] * 3
+    assert _substr(p, 35, 40) == SENDER and _substr(p, 99, 40) == RECEIVER
+    assert out["AMOUNT_SD"].tolist() == [123_456_789, 123_456_789, 2 ** 64 - 1]
+
+
+def test_short_and_invalid_payloads_are_null():
+    good = _payload()
+    short = _payload(tail="")[:-2]                     # one byte short of the amount
+    bad = good[:40] + "zz" + good[42:]                 # non-hex digit inside the sender word
+    out = decode_payloads(pd.Series([short, bad, None, "", "0x", good, "0xé" + good[3:]]))
+    assert out.iloc[:5].isna().all().all()
+    assert out.loc[5, "SENDERADDRESSHEX"] == "0x" + SENDER
+    assert out.iloc[6].isna().all()
+
+
+def test_fill_only_replaces_empty_cells():
+    df = pd.DataFrame({
+        "ENCODED_PAYLOAD": [_payload(), _payload(), "0x12"],
+        "SENDERADDRESSHEX": ['="0x' + "11" * 20 + '"', "", None],
+        "RECEIVERADDRESS": [None, "nan", ""],
+    })
+    out, filled = fill_from_payload(df)
+    assert filled == 3
+    assert out["SENDERADDRESSHEX"].tolist()[:2] == ['="0x' + "11" * 20 + '"', "0x" + SENDER]
+    assert out["RECEIVERADDRESS"].tolist() == ["0x" + RECEIVER, "0x" + RECEIVER, ""]
+    assert out["AMOUNT_SD"].isna().tolist() == [False, False, True]
@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import pandas as pd
+
+from validate_export import validate_file
+
+SAMPLE = Path(__file__).resolve().parent.parent / "data" / "dt_clean.csv"
+
+
+def test_quarantine_rows_follow_parsed_rows_across_multiline_cells_and_blank_lines(tmp_path):
+    header, *rows = SAMPLE.read_text().splitlines(keepends=True)[:7]
+    guid = pd.read_csv(SAMPLE, dtype=str, nrows=6)["GUID"]
+    rows[0] = '"line one\nline two"' + rows[0][rows[0].index(","):]     # SOURCETXHASH with a line break
+    rows[2] = "\n" + rows[2]                                              # blank line before row 2
+    status = next(s for s in (',="DELIVERED",', ',="SENT",') if s in rows[3])
+    rows[3] = rows[3].replace(status, ',="BOGUS",')
+    rows[5] = rows[5].replace(guid[5], '="0x1234"')
+    src = tmp_path / "dt.csv"
+    src.write_text(header + "".join(rows))
+
+    q = validate_file(src, tmp_path / "valid.csv", tmp_path / "quarantine.csv")
+    assert (q.rows, q.failed) == (6, 2)
+    bad = pd.read_csv(tmp_path / "quarantine.csv", dtype=str)
+    assert bad["ROW"].tolist() == ["3", "5"]
+    assert bad["REASONS"].str.contains("STATUS_INVALID")[0] and bad["REASONS"][1] == "GUID_INVALID"
+    valid = (tmp_path / "valid.csv").read_text()
+    assert valid == header + rows[0] + rows[1] + rows[2].lstrip("\n") + rows[4]
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import mannwhitneyu
+
+from window_compare import mann_whitney
+
+
+def test_mann_whitney_matches_scipy_asymptotic_without_continuity():
+    rng = np.random.default_rng(3)
+    rows, samples = [], {}
+    for g, (shift, n_a, n_b) in enumerate([(0, 300, 200), (5, 40, 60), (-3, 1000, 15), (0, 7, 9)]):
+        a = rng.integers(50, 90, n_a)                       # whole seconds: many ties
+        b = rng.integers(50, 90, n_b) + shift
+        samples[("dvn", f"G{g}", "required")] = (a, b)
+        for window, values in (("before", a), ("during", b)):
+            v, c = np.unique(values, return_counts=True)
+            rows.append(pd.DataFrame({"GRAIN": "dvn", "KEY": f"G{g}", "ROLE": "required", "WINDOW": window,
+                                      "LATENCY_S": v.astype(float), "count": c}))
+    out = mann_whitney(pd.concat(rows, ignore_index=True), "before", "during")
+    for key, (a, b) in samples.items():
+        ref = mannwhitneyu(b, a, alternative="two-sided", method="asymptotic", use_continuity=False)
+        assert np.isclose(out.loc[key, "p_slower"] * len(a) * len(b), ref.statistic)
+        assert np.isclose(out.loc[key, "latency_p"], ref.pvalue, rtol=1e-9)